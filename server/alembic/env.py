@@ -19,7 +19,10 @@ if config.config_file_name is not None:
 from app.database import Base
 from app.models import fund  # Import your models to ensure they are registered
 from app.models import holding
+from app.models import rate_limit_bucket
 from app.models import stock
+from app.models import stock_candle
+from app.models import stock_price
 from app.models import transaction
 from app.models import user
 from app.models import watchlist
@@ -0,0 +1,45 @@
+"""add unique (user_id, stock_id) to holdings
+
+Revision ID: a3d5f7b9c1e2
+Revises: f2c4d6e8a1b3
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d5f7b9c1e2'
+down_revision: Union[str, None] = 'f2c4d6e8a1b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Merge duplicate positions (possible before trades were atomic) into the oldest row
+    op.execute("""
+        UPDATE holdings SET
+            quantity = merged.quantity,
+            average_cost = merged.average_cost
+        FROM (
+            SELECT MIN(holding_id) AS holding_id,
+                   SUM(quantity) AS quantity,
+                   SUM(quantity * average_cost) / NULLIF(SUM(quantity), 0) AS average_cost
+            FROM holdings
+            GROUP BY user_id, stock_id
+            HAVING COUNT(*) > 1
+        ) AS merged
+        WHERE holdings.holding_id = merged.holding_id
+    """)
+    op.execute("""
+        DELETE FROM holdings
+        WHERE holding_id NOT IN (SELECT MIN(holding_id) FROM holdings GROUP BY user_id, stock_id)
+    """)
+    # Lets trades upsert positions with ON CONFLICT (user_id, stock_id)
+    op.create_unique_constraint('uq_holdings_user_stock', 'holdings', ['user_id', 'stock_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_holdings_user_stock', 'holdings', type_='unique')
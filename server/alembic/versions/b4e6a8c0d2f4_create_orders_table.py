@@ -0,0 +1,48 @@
+"""create orders table
+
+Revision ID: b4e6a8c0d2f4
+Revises: a3d5f7b9c1e2
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e6a8c0d2f4'
+down_revision: Union[str, None] = 'a3d5f7b9c1e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('orders',
+    sa.Column('order_id', sa.BigInteger(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('stock_id', sa.Integer(), nullable=False),
+    sa.Column('side', sa.String(length=4), nullable=False),
+    sa.Column('order_type', sa.String(length=5), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('trigger_price', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('status', sa.String(length=9), nullable=False),
+    sa.Column('reason', sa.String(length=100), nullable=True),
+    sa.Column('transaction_id', sa.Integer(), nullable=True),
+    sa.Column('executed_price', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('executed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['stock_id'], ['stocks.stock_id'], ),
+    sa.ForeignKeyConstraint(['transaction_id'], ['transactions.transaction_id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ),
+    sa.PrimaryKeyConstraint('order_id')
+    )
+    op.create_index('ix_orders_status_stock', 'orders', ['status', 'stock_id'], unique=False)
+    op.create_index('ix_orders_user_created', 'orders', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_orders_user_created', table_name='orders')
+    op.drop_index('ix_orders_status_stock', table_name='orders')
+    op.drop_table('orders')
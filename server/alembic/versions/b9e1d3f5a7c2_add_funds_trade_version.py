@@ -0,0 +1,27 @@
+"""add funds trade_version
+
+Revision ID: b9e1d3f5a7c2
+Revises: f8d0a2c4e6b9
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9e1d3f5a7c2'
+down_revision: Union[str, None] = 'f8d0a2c4e6b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Per-user counter bumped by every trade; cached portfolio valuations compare it
+    op.add_column('funds', sa.Column('trade_version', sa.BigInteger(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    op.drop_column('funds', 'trade_version')
@@ -0,0 +1,36 @@
+"""create stock_prices table
+
+Revision ID: c4e8f1a2b3d5
+Revises: a203804c9674
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8f1a2b3d5'
+down_revision: Union[str, None] = 'a203804c9674'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('stock_prices',
+    sa.Column('price_id', sa.BigInteger(), nullable=False),
+    sa.Column('stock_id', sa.Integer(), nullable=False),
+    sa.Column('price', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('volume', sa.BigInteger(), nullable=True),
+    sa.Column('ts', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['stock_id'], ['stocks.stock_id'], ),
+    sa.PrimaryKeyConstraint('price_id')
+    )
+    op.create_index('ix_stock_prices_stock_id_ts', 'stock_prices', ['stock_id', 'ts'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_stock_prices_stock_id_ts', table_name='stock_prices')
+    op.drop_table('stock_prices')
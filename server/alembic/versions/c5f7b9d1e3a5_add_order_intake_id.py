@@ -0,0 +1,35 @@
+"""add order intake id and market orders
+
+Revision ID: c5f7b9d1e3a5
+Revises: b4e6a8c0d2f4
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5f7b9d1e3a5'
+down_revision: Union[str, None] = 'b4e6a8c0d2f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.add_column(sa.Column('intake_id', sa.String(length=32), nullable=True))
+        batch_op.alter_column('order_type', existing_type=sa.String(length=5), type_=sa.String(length=6))
+        batch_op.alter_column('trigger_price', existing_type=sa.Numeric(precision=10, scale=2), nullable=True)
+    op.create_index('ix_orders_intake_id', 'orders', ['intake_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_orders_intake_id', table_name='orders')
+    op.execute("DELETE FROM orders WHERE order_type = 'MARKET'")
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.alter_column('trigger_price', existing_type=sa.Numeric(precision=10, scale=2), nullable=False)
+        batch_op.alter_column('order_type', existing_type=sa.String(length=6), type_=sa.String(length=5))
+        batch_op.drop_column('intake_id')
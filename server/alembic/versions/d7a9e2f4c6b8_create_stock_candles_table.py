@@ -0,0 +1,39 @@
+"""create stock_candles table
+
+Revision ID: d7a9e2f4c6b8
+Revises: c4e8f1a2b3d5
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a9e2f4c6b8'
+down_revision: Union[str, None] = 'c4e8f1a2b3d5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('stock_candles',
+    sa.Column('candle_id', sa.BigInteger(), nullable=False),
+    sa.Column('stock_id', sa.Integer(), nullable=False),
+    sa.Column('interval', sa.String(length=4), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('open', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('high', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('low', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('close', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('volume', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['stock_id'], ['stocks.stock_id'], ),
+    sa.PrimaryKeyConstraint('candle_id'),
+    sa.UniqueConstraint('stock_id', 'interval', 'bucket_start', name='uq_stock_candles_stock_interval_bucket')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('stock_candles')
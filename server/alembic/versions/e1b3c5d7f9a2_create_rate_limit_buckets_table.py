@@ -0,0 +1,33 @@
+"""create rate_limit_buckets table
+
+Revision ID: e1b3c5d7f9a2
+Revises: d7a9e2f4c6b8
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1b3c5d7f9a2'
+down_revision: Union[str, None] = 'd7a9e2f4c6b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('rate_limit_buckets',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('tokens', sa.Float(), nullable=False),
+    sa.Column('capacity', sa.Float(), nullable=False),
+    sa.Column('rate_per_second', sa.Float(), nullable=False),
+    sa.Column('refilled_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('rate_limit_buckets')
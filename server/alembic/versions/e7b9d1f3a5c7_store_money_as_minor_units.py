@@ -0,0 +1,56 @@
+"""store money as integer minor units
+
+Revision ID: e7b9d1f3a5c7
+Revises: d6a8c0e2f4b6
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b9d1f3a5c7'
+down_revision: Union[str, None] = 'd6a8c0e2f4b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# table -> (decimal column, precision, nullable)
+MONEY_COLUMNS = {
+    'funds': [('balance', 15, False)],
+    'holdings': [('average_cost', 10, False)],
+    'transactions': [('price_per_share', 10, False)],
+    'orders': [('trigger_price', 10, True), ('executed_price', 10, True)],
+}
+
+
+def upgrade() -> None:
+    for table, columns in MONEY_COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for column, _, _ in columns:
+                batch_op.add_column(sa.Column(f'{column}_minor', sa.BigInteger(), nullable=True))
+        for column, _, _ in columns:
+            op.execute(f"UPDATE {table} SET {column}_minor = ROUND({column} * 100)")
+        with op.batch_alter_table(table) as batch_op:
+            for column, precision, nullable in columns:
+                if not nullable:
+                    batch_op.alter_column(f'{column}_minor', existing_type=sa.BigInteger(), nullable=False)
+                batch_op.drop_column(column)
+
+
+def downgrade() -> None:
+    for table, columns in MONEY_COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for column, precision, _ in columns:
+                batch_op.add_column(sa.Column(column, sa.Numeric(precision=precision, scale=2), nullable=True))
+        for column, _, _ in columns:
+            op.execute(f"UPDATE {table} SET {column} = {column}_minor / 100.0")
+        with op.batch_alter_table(table) as batch_op:
+            for column, precision, nullable in columns:
+                if not nullable:
+                    batch_op.alter_column(
+                        column, existing_type=sa.Numeric(precision=precision, scale=2), nullable=False
+                    )
+                batch_op.drop_column(f'{column}_minor')
@@ -0,0 +1,39 @@
+"""add stock search trigram indexes
+
+Revision ID: f2c4d6e8a1b3
+Revises: e1b3c5d7f9a2
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c4d6e8a1b3'
+down_revision: Union[str, None] = 'e1b3c5d7f9a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # pg_trgm GIN indexes serve ILIKE '%q%' and the similarity operators (%, <%)
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'ix_stocks_company_name_trgm', 'stocks', ['company_name'],
+        postgresql_using='gin', postgresql_ops={'company_name': 'gin_trgm_ops'}
+    )
+    op.create_index(
+        'ix_stocks_ticker_symbol_trgm', 'stocks', ['ticker_symbol'],
+        postgresql_using='gin', postgresql_ops={'ticker_symbol': 'gin_trgm_ops'}
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_stocks_ticker_symbol_trgm', table_name='stocks')
+    op.drop_index('ix_stocks_company_name_trgm', table_name='stocks')
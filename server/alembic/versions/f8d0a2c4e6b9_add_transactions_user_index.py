@@ -0,0 +1,25 @@
+"""add transactions user index
+
+Revision ID: f8d0a2c4e6b9
+Revises: e7b9d1f3a5c7
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f8d0a2c4e6b9'
+down_revision: Union[str, None] = 'e7b9d1f3a5c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_transactions_user_transaction', 'transactions', ['user_id', 'transaction_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_transactions_user_transaction', table_name='transactions')
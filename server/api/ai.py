@@ -1,12 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
+from datetime import datetime, timedelta, timezone
 
 from app.database import get_db
 from app.models.user import User
 from app.models.stock import Stock
 from app.utils.auth import get_current_user
 from app.utils.ai_service import ai_service
+from app.utils.candles import get_candles
+from app.utils.indicators import get_stock_indicators
 
 router = APIRouter()
 
@@ -22,14 +25,25 @@ def get_stock_insights(
         if not stock:
             raise HTTPException(status_code=404, detail="Stock not found")
         
-        # Mock historical data for demo
+        # Daily candles for the last 30 days
+        end = datetime.now(timezone.utc)
+        candles = get_candles(db, stock.stock_id, "1d", end - timedelta(days=30), end)
         historical_data = [
-            {"date": "2024-08-20", "price": float(stock.current_price), "volume": 1000000},
-            {"date": "2024-08-19", "price": float(stock.current_price) * 0.98, "volume": 950000},
-            {"date": "2024-08-18", "price": float(stock.current_price) * 1.02, "volume": 1100000},
+            {
+                "date": datetime.fromtimestamp(candle["time"], tz=timezone.utc).date().isoformat(),
+                "open": candle["open"],
+                "high": candle["high"],
+                "low": candle["low"],
+                "price": candle["close"],
+                "volume": candle["volume"]
+            }
+            for candle in candles
         ]
+        if not historical_data:
+            historical_data = [{"date": end.date().isoformat(), "price": float(stock.current_price)}]
         
-        insights = ai_service.get_stock_performance_insights(stock, historical_data)
+        indicators = get_stock_indicators(db, stock.stock_id)
+        insights = ai_service.get_stock_performance_insights(stock, historical_data, indicators)
         
         return {
             "ticker": ticker.upper(),
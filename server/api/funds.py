@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
-from decimal import Decimal
+from typing import Optional
 
 from app.database import get_db
 from app.models.fund import Fund
 from app.schemas.fund import FundResponse, FundUpdate
 from app.utils.auth import get_current_user
+from app.utils.idempotency import commit_unless_claimed, run_idempotent
+from app.utils.money import minor_to_float, to_minor
 from app.models.user import User
 
 router = APIRouter()
@@ -21,53 +26,77 @@ def get_user_funds(
     
     if not funds:
         # Create fund record if it doesn't exist
-        funds = Fund(user_id=current_user.user_id, balance=0.00)
+        funds = Fund(user_id=current_user.user_id, balance_minor=0)
         db.add(funds)
         db.commit()
         db.refresh(funds)
     
     return FundResponse(
         user_id=funds.user_id,
-        balance=float(funds.balance)
+        balance=minor_to_float(funds.balance_minor)
     )
 
+def _add_funds(db: Session, current_user: User, fund_update: FundUpdate) -> dict:
+    if fund_update.amount <= 0:
+        raise HTTPException(status_code=400, detail="Amount must be positive")
+    
+    amount = to_minor(fund_update.amount)
+    # One atomic upsert, so concurrent deposits cannot overwrite each other
+    insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(Fund).values(user_id=current_user.user_id, balance_minor=amount)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["user_id"], set_={"balance_minor": Fund.balance_minor + stmt.excluded.balance_minor}
+        )
+    )
+    commit_unless_claimed(db)
+    return {"message": "Funds added successfully"}
+
 @router.post("/add", response_model=dict)
 def add_funds(
     fund_update: FundUpdate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Add funds to user account"""
+    return run_idempotent(
+        db, current_user.user_id, idempotency_key, "funds/add", fund_update, response,
+        lambda: _add_funds(db, current_user, fund_update)
+    )
+
+def _withdraw_funds(db: Session, current_user: User, fund_update: FundUpdate) -> dict:
     if fund_update.amount <= 0:
         raise HTTPException(status_code=400, detail="Amount must be positive")
     
-    funds = db.query(Fund).filter(Fund.user_id == current_user.user_id).first()
+    amount = to_minor(fund_update.amount)
+    # The balance check and the debit are one conditional UPDATE, so it cannot overdraw
+    balance = db.execute(
+        update(Fund)
+        .where(Fund.user_id == current_user.user_id, Fund.balance_minor >= amount)
+        .values(balance_minor=Fund.balance_minor - amount)
+        .returning(Fund.balance_minor)
+    ).scalar()
     
-    if funds:
-        funds.balance += Decimal(fund_update.amount)
-    else:
-        funds = Fund(user_id=current_user.user_id, balance=Decimal(fund_update.amount))
-        db.add(funds)
+    if balance is None:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Insufficient funds")
     
-    db.commit()
-    return {"message": "Funds added successfully"}
+    commit_unless_claimed(db)
+    
+    return {"message": "Withdrawal successful"}
 
 @router.post("/withdraw", response_model=dict)
 def withdraw_funds(
     fund_update: FundUpdate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Withdraw funds from user account"""
-    if fund_update.amount <= 0:
-        raise HTTPException(status_code=400, detail="Amount must be positive")
-    
-    funds = db.query(Fund).filter(Fund.user_id == current_user.user_id).first()
-    
-    if not funds or funds.balance < Decimal(fund_update.amount):
-        raise HTTPException(status_code=400, detail="Insufficient funds")
-    
-    funds.balance -= Decimal(fund_update.amount)
-    db.commit()
-    
-    return {"message": "Withdrawal successful"}
\ No newline at end of file
+    return run_idempotent(
+        db, current_user.user_id, idempotency_key, "funds/withdraw", fund_update, response,
+        lambda: _withdraw_funds(db, current_user, fund_update)
+    )
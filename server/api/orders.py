@@ -0,0 +1,132 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from app.database import get_db
+from app.models.order import Order
+from app.models.stock import Stock
+from app.schemas.order import OrderCreate, OrderResponse
+from app.utils.auth import get_current_user
+from app.utils.money import minor_to_float
+from app.utils.order_book import CANCELLED, OPEN, RestingOrder, order_book
+from app.utils.order_intake import order_intake
+from app.models.user import User
+
+router = APIRouter()
+
+def _order_response(order: Order, ticker_symbol: Optional[str] = None) -> OrderResponse:
+    return OrderResponse(
+        order_id=order.order_id,
+        user_id=order.user_id,
+        stock_id=order.stock_id,
+        side=order.side,
+        order_type=order.order_type,
+        quantity=order.quantity,
+        trigger_price=minor_to_float(order.trigger_price_minor),
+        status=order.status,
+        reason=order.reason,
+        transaction_id=order.transaction_id,
+        executed_price=minor_to_float(order.executed_price_minor),
+        created_at=order.created_at,
+        executed_at=order.executed_at,
+        ticker_symbol=ticker_symbol
+    )
+
+@router.post("/", response_model=OrderResponse)
+def place_order(
+    order_request: OrderCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Rest a limit or stop order; it is filled at market once a price tick crosses it"""
+    if order_request.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be positive")
+    if order_request.trigger_price <= 0:
+        raise HTTPException(status_code=400, detail="Trigger price must be positive")
+    stock = db.query(Stock).filter(Stock.stock_id == order_request.stock_id).first()
+    if not stock:
+        raise HTTPException(status_code=404, detail="Stock not found")
+
+    order = Order(
+        user_id=current_user.user_id,
+        stock_id=order_request.stock_id,
+        side=order_request.side,
+        order_type=order_request.order_type,
+        quantity=order_request.quantity,
+        trigger_price=order_request.trigger_price,
+        status=OPEN
+    )
+    db.add(order)
+    db.commit()
+    db.refresh(order)
+    order_book.add(RestingOrder.from_row(order))
+    return _order_response(order, stock.ticker_symbol)
+
+@router.get("/", response_model=List[OrderResponse])
+def get_user_orders(
+    status: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """List the current user's orders, newest first"""
+    query = (
+        db.query(Order, Stock.ticker_symbol)
+        .join(Stock, Order.stock_id == Stock.stock_id)
+        .filter(Order.user_id == current_user.user_id)
+    )
+    if status:
+        query = query.filter(Order.status == status.upper())
+    rows = query.order_by(Order.created_at.desc(), Order.order_id.desc()).all()
+    return [_order_response(order, ticker_symbol) for order, ticker_symbol in rows]
+
+@router.get("/intake/{intake_id}", response_model=dict)
+async def get_intake_order(
+    intake_id: str,
+    wait: float = Query(0, ge=0, le=30),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Status of an order queued by the async trade intake; wait > 0 long-polls for the outcome"""
+    order = order_intake.get(intake_id)
+    if order is not None and order.user_id == current_user.user_id:
+        if wait:
+            await order_intake.wait(order, wait)
+        return order.to_dict()
+
+    # Forgotten by this worker, or taken by another one
+    stored = await run_in_threadpool(
+        lambda: db.query(Order).filter(Order.intake_id == intake_id, Order.user_id == current_user.user_id).first()
+    )
+    if not stored:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return {
+        "order_id": stored.intake_id,
+        "stock_id": stored.stock_id,
+        "side": stored.side,
+        "quantity": stored.quantity,
+        "status": stored.status,
+        "reason": stored.reason,
+        "transaction_id": stored.transaction_id,
+        "executed_price": minor_to_float(stored.executed_price_minor)
+    }
+
+@router.delete("/{order_id}", response_model=dict)
+def cancel_order(
+    order_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Cancel an open order"""
+    # Conditional, so an order the book is filling right now cannot also be cancelled
+    cancelled = db.execute(
+        update(Order)
+        .where(Order.order_id == order_id, Order.user_id == current_user.user_id, Order.status == OPEN)
+        .values(status=CANCELLED)
+    ).rowcount
+    db.commit()
+    if not cancelled:
+        raise HTTPException(status_code=404, detail="Open order not found")
+    order_book.cancel(order_id)
+    return {"message": "Order cancelled successfully"}
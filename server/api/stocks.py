@@ -1,11 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+
+from app.config import settings
 
 from app.database import get_db
 from app.models.stock import Stock
 from app.schemas.stock import StockResponse, StockSearchResponse, StockDetailResponse
-from app.utils.stock_data import fetch_stock_data, search_stocks, update_stock_prices
+from app.utils.stock_data import get_candle_page, get_last_known_quote, get_price_history_page, search_stocks_page, update_stock_prices_async
+from app.utils.candles import CANDLE_INTERVALS, candle_aggregator
+from app.utils.indicators import get_stock_indicators, indicator_engine
+from app.utils.market_overview import market_overview
+from app.utils.shared_quotes import shared_quote_store
+from app.utils.shared_quote_sync import shared_quote_sync
+from app.utils.market_simulator import market_simulator, simulator_enabled
+from app.utils.search_index import stock_search_index
+from app.utils.order_book import order_book
+from app.utils.order_intake import order_intake
+from app.utils.idempotency import idempotency_store
+from app.utils.portfolio_valuation import portfolio_valuations
+from app.utils.rate_limiter import INTERACTIVE, groq_rate_limiter, market_data_rate_limiter
+from app.utils.quote_cache import quote_cache
+from app.utils.circuit_breaker import market_data_breaker
+from app.utils.price_refresher import price_refresher
+from app.utils.trade_stream import trade_stream
+from app.utils.quote_hub import Subscription, quote_hub
 from app.utils.auth import get_current_user
 
 router = APIRouter()
@@ -15,44 +39,171 @@ def get_all_stocks(db: Session = Depends(get_db)):
     """Get all available stocks"""
     return db.query(Stock).all()
 
+def _not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
 @router.get("/market-overview")
-def get_market_overview(db: Session = Depends(get_db)):
-    """Get stocks with real-time data for market overview"""
-    # Get popular stocks that are more likely to have real-time data
-    popular_tickers = ['AAPL', 'GOOGL', 'MSFT', 'TSLA', 'AMZN', 'NVDA']
-    market_data = []
-    
-    for ticker in popular_tickers:
-        stock = db.query(Stock).filter(Stock.ticker_symbol == ticker).first()
-        if not stock:
+def get_market_overview(request: Request, db: Session = Depends(get_db)):
+    """Get stocks with last known prices for market overview
+
+    Served from a snapshot rebuilt only when one of its prices changes;
+    supports conditional GET via ETag / Last-Modified.
+    """
+    body, etag, last_modified = market_overview.get(db)
+    price_refresher.touch(*market_overview.tickers())
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+        "Cache-Control": "no-cache"
+    }
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/market-data/stats")
+def get_market_data_stats():
+    """Get quote cache and trade stream counters"""
+    store = shared_quote_store()
+    return {
+        "quote_cache": quote_cache.stats(),
+        "circuit_breaker": market_data_breaker.stats(),
+        "rate_limits": {
+            "market_data": market_data_rate_limiter.stats(),
+            "groq": groq_rate_limiter.stats()
+        },
+        "trade_stream": {
+            "trades_received": trade_stream.trades_received,
+            "malformed": trade_stream.malformed,
+            "flushes": trade_stream.flushes,
+            "rows_flushed": trade_stream.rows_flushed
+        },
+        "quote_hub": quote_hub.stats(),
+        "candles": candle_aggregator.stats(),
+        "indicators": indicator_engine.stats(),
+        "shared_quotes": dict(store.stats(), sync=shared_quote_sync.stats()) if store is not None else None,
+        "simulator": market_simulator.stats() if simulator_enabled() else None,
+        "search_index": stock_search_index.stats(),
+        "order_book": order_book.stats(),
+        "order_intake": order_intake.stats(),
+        "idempotency": idempotency_store.stats(),
+        "portfolio_valuations": portfolio_valuations.stats()
+    }
+
+def _parse_tickers(tickers: Optional[str]) -> List[str]:
+    return [ticker.strip().upper() for ticker in (tickers or "").split(",") if ticker.strip()]
+
+async def _next_quote_frame(subscription: Subscription) -> Optional[List[dict]]:
+    """Next batched frame of deltas, or None if nothing changed for half a hot window"""
+    try:
+        return await asyncio.wait_for(
+            subscription.next_frame(quote_hub.batch_interval_seconds),
+            timeout=settings.PRICE_HOT_WINDOW_SECONDS / 2
+        )
+    except asyncio.TimeoutError:
+        return None
+
+async def _push_quote_frames(websocket: WebSocket, subscription: Subscription, send_lock: asyncio.Lock):
+    while True:
+        frame = await _next_quote_frame(subscription)
+        # Keep subscribed tickers on the refresher's hot cadence
+        price_refresher.touch(*subscription.tickers)
+        if frame is None:
             continue
-            
-        stock_data = fetch_stock_data(stock.ticker_symbol)
-        if stock_data:
-            stock.current_price = stock_data["price"]
-            change = stock_data["change"]
-            change_percent = stock_data["change_percent"]
-        else:
-            change = 0.0
-            change_percent = 0.0
-            
-        market_data.append({
-            "stock_id": stock.stock_id,
-            "ticker_symbol": stock.ticker_symbol,
-            "company_name": stock.company_name,
-            "current_price": float(stock.current_price),
-            "change": change,
-            "change_percent": change_percent,
-            "last_updated": stock.last_updated
-        })
-    
-    db.commit()
-    return market_data
+        try:
+            async with send_lock:
+                await asyncio.wait_for(
+                    websocket.send_json({"type": "quotes", "data": frame}),
+                    timeout=settings.QUOTE_PUSH_SEND_TIMEOUT_SECONDS
+                )
+        except asyncio.TimeoutError:
+            # Client cannot keep up even with coalesced frames; drop it
+            await websocket.close(code=1013)
+            return
+
+@router.websocket("/stream")
+async def stream_quotes(websocket: WebSocket, tickers: Optional[str] = None):
+    """Push batched price deltas for subscribed tickers over a WebSocket
+
+    Clients send {"action": "subscribe" | "unsubscribe", "tickers": [...]}.
+    """
+    await websocket.accept()
+    subscription = quote_hub.connect()
+    price_refresher.touch(*quote_hub.subscribe(subscription, _parse_tickers(tickers)))
+    send_lock = asyncio.Lock()
+    sender = asyncio.create_task(_push_quote_frames(websocket, subscription, send_lock))
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                symbols = [str(ticker) for ticker in message.get("tickers") or []]
+                action = message.get("action")
+            except (ValueError, AttributeError, TypeError):
+                action = None
+            if action == "subscribe":
+                price_refresher.touch(*quote_hub.subscribe(subscription, symbols))
+                reply = {"type": "subscribed", "tickers": sorted(subscription.tickers)}
+            elif action == "unsubscribe":
+                quote_hub.unsubscribe(subscription, symbols)
+                reply = {"type": "subscribed", "tickers": sorted(subscription.tickers)}
+            else:
+                reply = {"type": "error", "detail": "Expected {\"action\": \"subscribe\" | \"unsubscribe\", \"tickers\": [...]}"}
+            async with send_lock:
+                await websocket.send_json(reply)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        quote_hub.disconnect(subscription)
+
+@router.get("/stream/sse")
+async def stream_quotes_sse(request: Request, tickers: str):
+    """Push batched price deltas for the given comma-separated tickers as Server-Sent Events"""
+    subscription = quote_hub.connect()
+    price_refresher.touch(*quote_hub.subscribe(subscription, _parse_tickers(tickers)))
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                frame = await _next_quote_frame(subscription)
+                price_refresher.touch(*subscription.tickers)
+                if frame is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: quotes\ndata: {json.dumps(frame)}\n\n"
+        finally:
+            quote_hub.disconnect(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 @router.get("/search", response_model=List[StockSearchResponse])
-def search_stocks_route(q: str, db: Session = Depends(get_db)):
-    """Search stocks by ticker symbol or company name"""
-    stocks = search_stocks(db, q)
+def search_stocks_route(
+    q: str,
+    response: Response,
+    limit: int = Query(settings.SEARCH_DEFAULT_LIMIT, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Search stocks by ticker symbol or company name, ranked, typo tolerant
+
+    Pass the X-Next-Cursor response header back as cursor to get the next page.
+    """
+    try:
+        stocks, next_cursor = search_stocks_page(db, q, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return stocks
 
 @router.get("/{ticker_symbol}", response_model=StockDetailResponse)
@@ -63,35 +214,138 @@ def get_stock_details(ticker_symbol: str, db: Session = Depends(get_db)):
     if not stock:
         raise HTTPException(status_code=404, detail="Stock not found")
     
-    # Fetch real-time data
-    stock_data = fetch_stock_data(ticker_symbol)
-    
-    if stock_data:
-        stock.current_price = stock_data["price"]
-        db.commit()
-        db.refresh(stock)
+    # Last known quote; never calls the market data provider inline
+    price_refresher.touch(stock.ticker_symbol)
+    quote = get_last_known_quote(stock)
 
-    response_data = {
+    return {
         "stock_id": stock.stock_id,
         "ticker_symbol": stock.ticker_symbol,
         "company_name": stock.company_name,
-        "current_price": stock.current_price,
-        "last_updated": stock.last_updated
+        "current_price": quote["price"],
+        "last_updated": quote["last_updated"],
+        "is_stale": quote["is_stale"],
+        "historical_data": {
+            "price": quote["price"],
+            "change": quote["change"],
+            "change_percent": quote["change_percent"]
+        }
     }
-    
-    if stock_data:
-        response_data["historical_data"] = stock_data
-    
-    return response_data
+
+def _resolve_range(
+    db: Session, ticker_symbol: str, start: Optional[datetime], end: Optional[datetime], interval: str,
+    allowed: List[str]
+):
+    if interval not in allowed:
+        raise HTTPException(status_code=400, detail=f"Invalid interval; expected one of {', '.join(allowed)}")
+    stock_id = db.query(Stock.stock_id).filter(Stock.ticker_symbol == ticker_symbol.upper()).scalar()
+    if stock_id is None:
+        raise HTTPException(status_code=404, detail="Stock not found")
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    return stock_id, start, end
+
+@router.get("/{ticker_symbol}/history")
+def get_stock_history(
+    ticker_symbol: str,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    interval: str = "raw",
+    limit: int = Query(settings.PRICE_HISTORY_MAX_POINTS, ge=1, le=settings.PRICE_HISTORY_MAX_POINTS),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Price history for a stock over a time range (defaults to the last day)
+
+    interval=raw returns the recorded prices, other intervals candle closes read
+    from the pre-aggregated buckets. At most limit points per page; pass the
+    X-Next-Cursor response header back as cursor to get the next page.
+    """
+    stock_id, start, end = _resolve_range(db, ticker_symbol, start, end, interval, ["raw", *CANDLE_INTERVALS])
+    try:
+        if interval == "raw":
+            timestamps, prices, next_cursor = get_price_history_page(db, stock_id, start, end, limit, cursor)
+        else:
+            candles, next_cursor = get_candle_page(db, stock_id, interval, start, end, limit, cursor)
+            timestamps, prices = candles["time"], candles["close"]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Columnar arrays keep the payload small and skip per-point model validation
+    response = JSONResponse({
+        "ticker_symbol": ticker_symbol.upper(),
+        "interval": interval,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "timestamps": timestamps,
+        "prices": prices
+    })
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+@router.get("/{ticker_symbol}/candles")
+def get_stock_candles(
+    ticker_symbol: str,
+    interval: str = "1m",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    limit: int = Query(settings.PRICE_HISTORY_MAX_POINTS, ge=1, le=settings.PRICE_HISTORY_MAX_POINTS),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """OHLCV candles for charts, including the currently open bucket
+
+    At most limit candles per page; pass the X-Next-Cursor response header back as cursor.
+    """
+    stock_id, start, end = _resolve_range(db, ticker_symbol, start, end, interval, list(CANDLE_INTERVALS))
+    try:
+        candles, next_cursor = get_candle_page(db, stock_id, interval, start, end, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response = JSONResponse({
+        "ticker_symbol": ticker_symbol.upper(),
+        "interval": interval,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        **candles
+    })
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+@router.get("/{ticker_symbol}/indicators")
+def get_stock_indicators_route(
+    ticker_symbol: str,
+    interval: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """SMA, EMA, RSI, MACD, Bollinger Bands and ATR over the stock's candles"""
+    interval = interval or settings.INDICATOR_INTERVAL
+    if interval not in CANDLE_INTERVALS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid interval; expected one of {', '.join(CANDLE_INTERVALS)}"
+        )
+    stock_id = db.query(Stock.stock_id).filter(Stock.ticker_symbol == ticker_symbol.upper()).scalar()
+    if stock_id is None:
+        raise HTTPException(status_code=404, detail="Stock not found")
+    return {"ticker_symbol": ticker_symbol.upper(), **get_stock_indicators(db, stock_id, interval)}
 
 @router.post("/refresh")
-def refresh_all_stocks(
+async def refresh_all_stocks(
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Refresh current_price for all stocks in the database."""
     try:
-        update_stock_prices(db)
-        return {"message": "Stock prices refreshed"}
+        # Requested by a user, so it is not held back behind background refreshes
+        result = await update_stock_prices_async(db, priority=INTERACTIVE)
+        return {
+            "message": "Stock prices refreshed",
+            "updated_count": result["updated"],
+            "failed": result["failed"]
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to refresh stock prices: {str(e)}")
\ No newline at end of file
@@ -1,15 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import datetime, timedelta
 
 from app.database import get_db
 from app.models.transaction import Transaction
 from app.models.stock import Stock
-from app.models.holding import Holding
-from app.models.fund import Fund
-from app.schemas.transaction import TransactionResponse, TransactionCreate, TradeRequest
+from app.config import settings
+from app.schemas.transaction import (
+    TransactionResponse, TransactionCreate, TradeRequest, BasketRequest, BasketResponse, BasketLegResult
+)
 from app.utils.auth import get_current_user
+from app.utils.idempotency import after_commit, run_idempotent
+from app.utils.money import minor_to_float
+from app.utils.order_intake import IntakeUnavailable, order_intake
+from app.utils.portfolio_valuation import portfolio_valuations
+from app.utils.trading import BUY, SELL, TradeError, execute_basket, execute_trade
 from app.models.user import User
 
 router = APIRouter()
@@ -30,7 +36,7 @@ def get_user_transactions(
             Transaction.stock_id,
             Transaction.transaction_type,
             Transaction.quantity,
-            Transaction.price_per_share,
+            Transaction.price_per_share_minor,
             Transaction.transaction_date,
             Stock.ticker_symbol,
             Stock.company_name
@@ -52,7 +58,7 @@ def get_user_transactions(
             stock_id=transaction.stock_id,
             transaction_type=transaction.transaction_type,
             quantity=transaction.quantity,
-            price_per_share=float(transaction.price_per_share),
+            price_per_share=minor_to_float(transaction.price_per_share_minor),
             transaction_date=transaction.transaction_date,
             ticker_symbol=transaction.ticker_symbol,
             company_name=transaction.company_name
@@ -60,108 +66,107 @@ def get_user_transactions(
     
     return response
 
+def _trade(db: Session, user_id: int, trade_request: TradeRequest, side: str):
+    try:
+        result = execute_trade(db, user_id, trade_request.stock_id, trade_request.quantity, side)
+    except TradeError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    # A keyed trade commits with its stored response; the cache must not see it before that
+    after_commit(db, lambda: portfolio_valuations.apply_fills(user_id, [result]))
+    return result
+
+def _enqueue(db: Session, user_id: int, trade_request: TradeRequest, side: str, response: Response) -> dict:
+    # The orders table cannot hold an unknown stock_id, so reject it before handing out an order ID
+    if db.query(Stock.stock_id).filter(Stock.stock_id == trade_request.stock_id).first() is None:
+        raise HTTPException(status_code=404, detail="Stock not found")
+    try:
+        order = order_intake.submit(user_id, trade_request.stock_id, trade_request.quantity, side)
+    except TradeError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except IntakeUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    response.status_code = 202
+    return {
+        "message": f"{side.capitalize()} order accepted",
+        "order_id": order.intake_id,
+        "status": order.status
+    }
+
+def _place(db: Session, user_id: int, trade_request: TradeRequest, side: str, response: Response) -> dict:
+    if settings.TRADE_INTAKE_MODE == "async":
+        return _enqueue(db, user_id, trade_request, side, response)
+    _trade(db, user_id, trade_request, side)
+    return {"message": f"{side.capitalize()} order executed successfully"}
+
 @router.post("/trade/buy", response_model=dict)
 def buy_stock(
     trade_request: TradeRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Execute a buy order"""
-    # Check if stock exists
-    stock = db.query(Stock).filter(Stock.stock_id == trade_request.stock_id).first()
-    if not stock:
-        raise HTTPException(status_code=404, detail="Stock not found")
-    
-    # Check user funds
-    user_funds = db.query(Fund).filter(Fund.user_id == current_user.user_id).first()
-    total_cost = trade_request.quantity * stock.current_price
-    
-    if not user_funds or user_funds.balance < total_cost:
-        raise HTTPException(status_code=400, detail="Insufficient funds")
-    
-    # Update user funds
-    user_funds.balance -= total_cost
-    
-    # Create transaction record
-    db_transaction = Transaction(
-        user_id=current_user.user_id,
-        stock_id=trade_request.stock_id,
-        transaction_type="BUY",
-        quantity=trade_request.quantity,
-        price_per_share=stock.current_price
+    """Execute a buy order as one atomic database operation, or queue it in async intake mode"""
+    return run_idempotent(
+        db, current_user.user_id, idempotency_key, "trade/buy", trade_request, response,
+        lambda: _place(db, current_user.user_id, trade_request, BUY, response)
     )
-    db.add(db_transaction)
-    
-    # Update or create holding
-    holding = db.query(Holding).filter(
-        Holding.user_id == current_user.user_id,
-        Holding.stock_id == trade_request.stock_id
-    ).first()
-    
-    if holding:
-        # Update existing holding
-        total_quantity = holding.quantity + trade_request.quantity
-        total_cost = (holding.quantity * holding.average_cost) + (trade_request.quantity * stock.current_price)
-        holding.average_cost = total_cost / total_quantity
-        holding.quantity = total_quantity
-    else:
-        # Create new holding
-        holding = Holding(
-            user_id=current_user.user_id,
-            stock_id=trade_request.stock_id,
-            quantity=trade_request.quantity,
-            average_cost=stock.current_price
-        )
-        db.add(holding)
-    
-    db.commit()
-    return {"message": "Buy order executed successfully"}
 
 @router.post("/trade/sell", response_model=dict)
 def sell_stock(
     trade_request: TradeRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Execute a sell order"""
-    # Check if stock exists
-    stock = db.query(Stock).filter(Stock.stock_id == trade_request.stock_id).first()
-    if not stock:
-        raise HTTPException(status_code=404, detail="Stock not found")
-    
-    # Check if user has enough shares
-    holding = db.query(Holding).filter(
-        Holding.user_id == current_user.user_id,
-        Holding.stock_id == trade_request.stock_id
-    ).first()
-    
-    if not holding or holding.quantity < trade_request.quantity:
-        raise HTTPException(status_code=400, detail="Insufficient shares")
-    
-    # Update user funds
-    user_funds = db.query(Fund).filter(Fund.user_id == current_user.user_id).first()
-    total_proceeds = trade_request.quantity * stock.current_price
-    
-    if user_funds:
-        user_funds.balance += total_proceeds
-    else:
-        user_funds = Fund(user_id=current_user.user_id, balance=total_proceeds)
-        db.add(user_funds)
-    
-    # Create transaction record
-    db_transaction = Transaction(
-        user_id=current_user.user_id,
-        stock_id=trade_request.stock_id,
-        transaction_type="SELL",
-        quantity=trade_request.quantity,
-        price_per_share=stock.current_price
+    """Execute a sell order as one atomic database operation, or queue it in async intake mode"""
+    return run_idempotent(
+        db, current_user.user_id, idempotency_key, "trade/sell", trade_request, response,
+        lambda: _place(db, current_user.user_id, trade_request, SELL, response)
+    )
+
+def _basket(db: Session, user_id: int, basket: BasketRequest) -> BasketResponse:
+    if len(basket.legs) > settings.BASKET_MAX_LEGS:
+        raise HTTPException(status_code=400, detail=f"A basket holds at most {settings.BASKET_MAX_LEGS} legs")
+    legs = [(leg.stock_id, leg.quantity, leg.side) for leg in basket.legs]
+    try:
+        result = execute_basket(db, user_id, legs, basket.mode)
+    except TradeError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    after_commit(db, lambda: portfolio_valuations.apply_fills(user_id, result.filled))
+
+    filled = len(result.filled)
+    return BasketResponse(
+        mode=basket.mode,
+        filled=filled,
+        rejected=len(result.legs) - filled,
+        balance=minor_to_float(result.balance_minor),
+        legs=[
+            BasketLegResult(
+                leg=fill.leg,
+                stock_id=fill.stock_id,
+                side=fill.side,
+                quantity=fill.quantity,
+                status="FILLED" if fill.error is None else "REJECTED",
+                price=minor_to_float(fill.price_minor),
+                transaction_id=fill.transaction_id,
+                reason=str(fill.error) if fill.error is not None else None
+            )
+            for fill in result.legs
+        ]
+    )
+
+@router.post("/trade/basket", response_model=BasketResponse)
+def trade_basket(
+    basket: BasketRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Execute many buy/sell legs in one transaction, checking funds and holdings once"""
+    return run_idempotent(
+        db, current_user.user_id, idempotency_key, "trade/basket", basket, response,
+        lambda: _basket(db, current_user.user_id, basket)
     )
-    db.add(db_transaction)
-    
-    # Update holding
-    holding.quantity -= trade_request.quantity
-    if holding.quantity == 0:
-        db.delete(holding)
-    
-    db.commit()
-    return {"message": "Sell order executed successfully"}
\ No newline at end of file
@@ -16,6 +16,129 @@ class Settings:
     
     # API Keys (for stock data - you might want to integrate with a real API later)
     FINNHUB_API_KEY: str = os.getenv("FINNHUB_API_KEY", "demo")
+
+    # Market data client
+    MARKET_DATA_BASE_URL: str = os.getenv("MARKET_DATA_BASE_URL", "https://finnhub.io/api/v1")
+    MARKET_DATA_MAX_CONNECTIONS: int = int(os.getenv("MARKET_DATA_MAX_CONNECTIONS", 100))
+    MARKET_DATA_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("MARKET_DATA_MAX_KEEPALIVE_CONNECTIONS", 20))
+    MARKET_DATA_KEEPALIVE_EXPIRY_SECONDS: float = float(os.getenv("MARKET_DATA_KEEPALIVE_EXPIRY_SECONDS", 30))
+    MARKET_DATA_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("MARKET_DATA_CONNECT_TIMEOUT_SECONDS", 3))
+    MARKET_DATA_READ_TIMEOUT_SECONDS: float = float(os.getenv("MARKET_DATA_READ_TIMEOUT_SECONDS", 5))
+
+    # Quote provider: "finnhub", or "simulator" for offline load testing (correlated GBM price paths)
+    MARKET_DATA_PROVIDER: str = os.getenv("MARKET_DATA_PROVIDER", "finnhub")
+    SIMULATOR_VOLATILITY: float = float(os.getenv("SIMULATOR_VOLATILITY", 0.3))
+    SIMULATOR_DRIFT: float = float(os.getenv("SIMULATOR_DRIFT", 0.05))
+    SIMULATOR_CORRELATION: float = float(os.getenv("SIMULATOR_CORRELATION", 0.5))
+    SIMULATOR_TICK_INTERVAL_SECONDS: float = float(os.getenv("SIMULATOR_TICK_INTERVAL_SECONDS", 0.1))
+    SIMULATOR_SEED: str = os.getenv("SIMULATOR_SEED", "")
+
+    # Provider quota and bulk refresh
+    MARKET_DATA_RATE_LIMIT_PER_MINUTE: int = int(os.getenv("MARKET_DATA_RATE_LIMIT_PER_MINUTE", 60))
+    MARKET_DATA_RATE_LIMIT_BURST: int = int(os.getenv("MARKET_DATA_RATE_LIMIT_BURST", 10))
+    MARKET_DATA_REFRESH_CONCURRENCY: int = int(os.getenv("MARKET_DATA_REFRESH_CONCURRENCY", 8))
+    MARKET_DATA_REFRESH_MAX_RETRIES: int = int(os.getenv("MARKET_DATA_REFRESH_MAX_RETRIES", 2))
+    MARKET_DATA_REFRESH_RETRY_BASE_DELAY_SECONDS: float = float(os.getenv("MARKET_DATA_REFRESH_RETRY_BASE_DELAY_SECONDS", 0.5))
+    
+    # Cluster-wide rate limiting: "database" shares each quota through a rate_limit_buckets row, "local" is per process
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "database")
+    RATE_LIMIT_BACKGROUND_RESERVE_FRACTION: float = float(os.getenv("RATE_LIMIT_BACKGROUND_RESERVE_FRACTION", 0.3))
+    RATE_LIMIT_MAX_WAIT_SECONDS: float = float(os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", 30))
+    GROQ_RATE_LIMIT_PER_MINUTE: int = int(os.getenv("GROQ_RATE_LIMIT_PER_MINUTE", 30))
+    GROQ_RATE_LIMIT_BURST: int = int(os.getenv("GROQ_RATE_LIMIT_BURST", 5))
+    
+    # Circuit breaker: trip after N consecutive failures/slow calls, probe again after the cool-down
+    MARKET_DATA_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("MARKET_DATA_BREAKER_FAILURE_THRESHOLD", 5))
+    MARKET_DATA_BREAKER_SLOW_CALL_SECONDS: float = float(os.getenv("MARKET_DATA_BREAKER_SLOW_CALL_SECONDS", 2))
+    MARKET_DATA_BREAKER_OPEN_SECONDS: float = float(os.getenv("MARKET_DATA_BREAKER_OPEN_SECONDS", 30))
+
+    # Quote cache
+    QUOTE_CACHE_TTL_SECONDS: float = float(os.getenv("QUOTE_CACHE_TTL_SECONDS", 15))
+    QUOTE_CACHE_MAX_SIZE: int = int(os.getenv("QUOTE_CACHE_MAX_SIZE", 5000))
+    
+    # Background price refresh
+    PRICE_REFRESHER_ENABLED: bool = os.getenv("PRICE_REFRESHER_ENABLED", "True").lower() == "true"
+    PRICE_REFRESH_INTERVAL_SECONDS: float = float(os.getenv("PRICE_REFRESH_INTERVAL_SECONDS", 60))
+    HOT_PRICE_REFRESH_INTERVAL_SECONDS: float = float(os.getenv("HOT_PRICE_REFRESH_INTERVAL_SECONDS", 10))
+    PRICE_HOT_WINDOW_SECONDS: float = float(os.getenv("PRICE_HOT_WINDOW_SECONDS", 300))
+    # Prices older than this are reported with is_stale=true
+    PRICE_FRESHNESS_SECONDS: float = float(os.getenv("PRICE_FRESHNESS_SECONDS", 120))
+    
+    # Streaming trade feed
+    TRADE_STREAM_ENABLED: bool = os.getenv("TRADE_STREAM_ENABLED", "False").lower() == "true"
+    TRADE_STREAM_URL: str = os.getenv("TRADE_STREAM_URL", "wss://ws.finnhub.io")
+    TRADE_STREAM_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("TRADE_STREAM_FLUSH_INTERVAL_SECONDS", 1))
+    TRADE_STREAM_RECONNECT_DELAY_SECONDS: float = float(os.getenv("TRADE_STREAM_RECONNECT_DELAY_SECONDS", 5))
+    TRADE_STREAM_MAX_SYMBOLS: int = int(os.getenv("TRADE_STREAM_MAX_SYMBOLS", 50))
+    # How often the subscriptions follow the price refresher's universe (held, watchlisted, requested)
+    TRADE_STREAM_RESUBSCRIBE_SECONDS: float = float(os.getenv("TRADE_STREAM_RESUBSCRIBE_SECONDS", 30))
+    
+    # Live quote push (WebSocket / SSE)
+    QUOTE_PUSH_BATCH_INTERVAL_SECONDS: float = float(os.getenv("QUOTE_PUSH_BATCH_INTERVAL_SECONDS", 0.25))
+    QUOTE_PUSH_MAX_TICKERS_PER_CONNECTION: int = int(os.getenv("QUOTE_PUSH_MAX_TICKERS_PER_CONNECTION", 200))
+    QUOTE_PUSH_SEND_TIMEOUT_SECONDS: float = float(os.getenv("QUOTE_PUSH_SEND_TIMEOUT_SECONDS", 5))
+    
+    # Shared quote store for multi-worker deployments: off | reader (uvicorn workers) | writer (quote_writer.py)
+    SHARED_QUOTES_ROLE: str = os.getenv("SHARED_QUOTES_ROLE", "off")
+    SHARED_QUOTES_NAME: str = os.getenv("SHARED_QUOTES_NAME", "kite_quotes")
+    SHARED_QUOTES_CAPACITY: int = int(os.getenv("SHARED_QUOTES_CAPACITY", 65536))
+    # How often readers apply new shared quotes to their price book and forward requested tickers
+    SHARED_QUOTES_SYNC_SECONDS: float = float(os.getenv("SHARED_QUOTES_SYNC_SECONDS", 0.25))
+    
+    # Candle aggregation
+    CANDLE_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("CANDLE_FLUSH_INTERVAL_SECONDS", 5))
+    
+    # Market overview (empty ticker list = most traded stocks)
+    MARKET_OVERVIEW_TICKERS: str = os.getenv("MARKET_OVERVIEW_TICKERS", "AAPL,GOOGL,MSFT,TSLA,AMZN,NVDA")
+    MARKET_OVERVIEW_SIZE: int = int(os.getenv("MARKET_OVERVIEW_SIZE", 6))
+    MARKET_OVERVIEW_ACTIVITY_DAYS: int = int(os.getenv("MARKET_OVERVIEW_ACTIVITY_DAYS", 7))
+    MARKET_OVERVIEW_UNIVERSE_TTL_SECONDS: float = float(os.getenv("MARKET_OVERVIEW_UNIVERSE_TTL_SECONDS", 300))
+    
+    # Stock search: "memory" (in-process index) or "database" (ranked SQL, pg_trgm GIN indexes on Postgres)
+    SEARCH_BACKEND: str = os.getenv("SEARCH_BACKEND", "memory")
+    # The in-memory index is fully reloaded on this interval to pick up other workers' listing changes
+    SEARCH_INDEX_RELOAD_SECONDS: float = float(os.getenv("SEARCH_INDEX_RELOAD_SECONDS", 300))
+    SEARCH_DEFAULT_LIMIT: int = int(os.getenv("SEARCH_DEFAULT_LIMIT", 20))
+    
+    # Price history and candles: points per page of /api/stocks/{ticker}/history and /candles
+    PRICE_HISTORY_MAX_POINTS: int = int(os.getenv("PRICE_HISTORY_MAX_POINTS", 5000))
+    
+    # Basket trades: legs per request
+    BASKET_MAX_LEGS: int = int(os.getenv("BASKET_MAX_LEGS", 500))
+    
+    # Trade intake: "sync" executes trades in the request, "async" queues them for sharded writers
+    TRADE_INTAKE_MODE: str = os.getenv("TRADE_INTAKE_MODE", "sync")
+    ORDER_INTAKE_SHARDS: int = int(os.getenv("ORDER_INTAKE_SHARDS", 4))
+    ORDER_INTAKE_MAX_BATCH: int = int(os.getenv("ORDER_INTAKE_MAX_BATCH", 200))
+    ORDER_INTAKE_MAX_PENDING: int = int(os.getenv("ORDER_INTAKE_MAX_PENDING", 10000))
+    # Finished orders kept in memory for polling; older ones are read from the orders table
+    ORDER_INTAKE_RESULTS_KEPT: int = int(os.getenv("ORDER_INTAKE_RESULTS_KEPT", 10000))
+    
+    # Idempotency-Key replay window, in-memory LRU size and purge interval of expired keys
+    IDEMPOTENCY_TTL_SECONDS: float = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", 86400))
+    # Unfinished claims older than this were left by a crashed worker and may be taken over
+    IDEMPOTENCY_LEASE_SECONDS: float = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", 60))
+    IDEMPOTENCY_CACHE_SIZE: int = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 10000))
+    IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS: float = float(os.getenv("IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS", 3600))
+    
+    # Limit/stop order book: triggered orders are filled in batches on this interval
+    ORDER_BOOK_ENABLED: bool = os.getenv("ORDER_BOOK_ENABLED", "true").lower() == "true"
+    ORDER_MATCH_INTERVAL_SECONDS: float = float(os.getenv("ORDER_MATCH_INTERVAL_SECONDS", 0.25))
+    # Full reload of open orders, picking up orders placed through other workers
+    ORDER_BOOK_RELOAD_SECONDS: float = float(os.getenv("ORDER_BOOK_RELOAD_SECONDS", 60))
+    # Failed executions are retried after 1x, 2x, 4x ... the base delay, then the order is rejected
+    ORDER_MAX_ATTEMPTS: int = int(os.getenv("ORDER_MAX_ATTEMPTS", 5))
+    ORDER_RETRY_BASE_DELAY_SECONDS: float = float(os.getenv("ORDER_RETRY_BASE_DELAY_SECONDS", 1))
+    
+    # Per-user portfolio valuation cache, updated by fills and price ticks; each read checks the
+    # user's transaction version, so trades on other workers reload it. The TTL evicts idle entries
+    PORTFOLIO_CACHE_ENABLED: bool = os.getenv("PORTFOLIO_CACHE_ENABLED", "true").lower() == "true"
+    PORTFOLIO_CACHE_MAX_USERS: int = int(os.getenv("PORTFOLIO_CACHE_MAX_USERS", 10000))
+    PORTFOLIO_CACHE_TTL_SECONDS: float = float(os.getenv("PORTFOLIO_CACHE_TTL_SECONDS", 60))
+    
+    # Technical indicators
+    INDICATOR_INTERVAL: str = os.getenv("INDICATOR_INTERVAL", "1d")
+    INDICATOR_LOOKBACK_BARS: int = int(os.getenv("INDICATOR_LOOKBACK_BARS", 250))
     
     # App Settings
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
@@ -5,13 +6,59 @@ from typing import List
 
 from app.database import SessionLocal, engine, get_db, Base
 from app import models, schemas
-from api import auth, stocks, holdings, transactions, funds, watchlist, ai, portfolio
+from app.config import settings
+from app.utils.market_data_client import market_data_client
+from app.utils.price_refresher import price_refresher
+from app.utils.trade_stream import trade_stream
+from app.utils.candles import candle_aggregator
+from app.utils.shared_quotes import start_shared_quotes, stop_shared_quotes
+from app.utils.shared_quote_sync import shared_quote_sync
+from app.utils.market_simulator import seed_simulator, simulator_enabled
+from app.utils.order_book import order_book
+from app.utils.order_intake import order_intake
+from app.utils.idempotency import idempotency_store
+from api import auth, stocks, holdings, transactions, funds, watchlist, ai, portfolio, orders
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_shared_quotes(settings.SHARED_QUOTES_ROLE)
+    if settings.SHARED_QUOTES_ROLE != "off":
+        # Readers feed their price book from the store; a writer picks up tickers readers want
+        shared_quote_sync.start()
+    if simulator_enabled():
+        # Simulated paths start from the stored prices
+        seed_simulator(SessionLocal)
+    candle_aggregator.start()
+    idempotency_store.start()
+    if settings.ORDER_BOOK_ENABLED:
+        # Loads the open orders, then fills triggered ones in batches
+        order_book.start()
+    if settings.TRADE_INTAKE_MODE == "async":
+        order_intake.start()
+    if settings.PRICE_REFRESHER_ENABLED:
+        price_refresher.start()
+    if settings.TRADE_STREAM_ENABLED:
+        await trade_stream.start()
+    yield
+    # Drain queued trades while the database is still reachable
+    await order_intake.stop()
+    await idempotency_store.stop()
+    await trade_stream.stop()
+    await price_refresher.stop()
+    await order_book.stop()
+    # After the price sources stop, so their last ticks land in the final flush
+    await candle_aggregator.stop()
+    # Release pooled market data connections on shutdown
+    await market_data_client.aclose()
+    await shared_quote_sync.stop()
+    stop_shared_quotes()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Stock Trading API",
     description="A Zerodha-like stock trading platform API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -21,6 +68,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Search pagination cursor
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -32,6 +81,7 @@ app.include_router(funds.router, prefix="/api/portfolio/funds", tags=["Funds"])
 app.include_router(watchlist.router, prefix="/api/watchlist", tags=["Watchlist"])
 app.include_router(ai.router, prefix="/api/ai", tags=["AI Insights"])
 app.include_router(portfolio.router, prefix="/api/portfolio", tags=["Portfolio"])
+app.include_router(orders.router, prefix="/api/orders", tags=["Orders"])
 
 @app.get("/")
 async def root():
@@ -4,3 +4,8 @@ from .holding import Holding
 from .transaction import Transaction
 from .fund import Fund
 from .watchlist import Watchlist
+from .stock_price import StockPrice
+from .stock_candle import StockCandle
+from .rate_limit_bucket import RateLimitBucket
+from .order import Order
+from .idempotency_key import IdempotencyKey
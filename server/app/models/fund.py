@@ -1,13 +1,18 @@
-from sqlalchemy import Column, Integer, Numeric, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, ForeignKey
 from sqlalchemy.orm import relationship
 from app.database import Base
+from app.utils.money import major_amount
 
 class Fund(Base):
     __tablename__ = "funds"
 
     fund_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id"), unique=True, nullable=False)
-    balance = Column(Numeric(15, 2), nullable=False, default=0.00)
+    # Integer minor units (cents/paise); see app.utils.money
+    balance_minor = Column(BigInteger, nullable=False, default=0)
+    balance = major_amount("balance_minor")
+    # Bumped by every trade in the trade's own transaction; portfolio caches compare it
+    trade_version = Column(BigInteger, nullable=False, default=0, server_default="0")
     
     # Relationship
     user = relationship("User", back_populates="fund")
\ No newline at end of file
@@ -1,15 +1,22 @@
-from sqlalchemy import Column, Integer, Numeric, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
 from app.database import Base
+from app.utils.money import major_amount
 
 class Holding(Base):
     __tablename__ = "holdings"
+    __table_args__ = (
+        # One position per user and stock; trades upsert into it
+        UniqueConstraint("user_id", "stock_id", name="uq_holdings_user_stock"),
+    )
 
     holding_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
     stock_id = Column(Integer, ForeignKey("stocks.stock_id"), nullable=False)
     quantity = Column(Integer, nullable=False)
-    average_cost = Column(Numeric(10, 2), nullable=False)
+    # Integer minor units (cents/paise); see app.utils.money
+    average_cost_minor = Column(BigInteger, nullable=False)
+    average_cost = major_amount("average_cost_minor")
     
     # Relationships
     user = relationship("User", back_populates="holdings")
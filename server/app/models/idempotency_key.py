@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, Float, Text, ForeignKey
+from app.database import Base
+
+class IdempotencyKey(Base):
+    """Outcome of a request sent with an Idempotency-Key, replayed to retries of the same request"""
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(Integer, ForeignKey("users.user_id"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    # sha256 of the endpoint and request body; a key reused for another request is rejected
+    fingerprint = Column(String(64), nullable=False)
+    # NULL while the first request is still running
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    # Epoch seconds of the claim; rows older than IDEMPOTENCY_TTL_SECONDS are purged, and
+    # unfinished claims older than IDEMPOTENCY_LEASE_SECONDS may be taken over
+    created_at = Column(Float, nullable=False, index=True)
@@ -0,0 +1,38 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from app.database import Base
+from app.utils.money import major_amount
+
+class Order(Base):
+    """Limit or stop order resting in the order book, or a market order taken by the async intake"""
+    __tablename__ = "orders"
+
+    # BIGINT in Postgres; SQLite only autoincrements INTEGER primary keys
+    order_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
+    stock_id = Column(Integer, ForeignKey("stocks.stock_id"), nullable=False)
+    side = Column(String(4), nullable=False)  # 'BUY' or 'SELL'
+    order_type = Column(String(6), nullable=False)  # 'LIMIT', 'STOP' or 'MARKET'
+    quantity = Column(Integer, nullable=False)
+    # Integer minor units (cents/paise); None for market orders
+    trigger_price_minor = Column(BigInteger, nullable=True)
+    trigger_price = major_amount("trigger_price_minor")
+    status = Column(String(9), nullable=False, default="OPEN")  # OPEN, FILLED, REJECTED, CANCELLED
+    reason = Column(String(100), nullable=True)
+    transaction_id = Column(Integer, ForeignKey("transactions.transaction_id"), nullable=True)
+    executed_price_minor = Column(BigInteger, nullable=True)
+    executed_price = major_amount("executed_price_minor")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    executed_at = Column(DateTime(timezone=True), nullable=True)
+    # ID handed out by the async intake before the order reached the database
+    intake_id = Column(String(32), unique=True, index=True, nullable=True)
+
+    # Open orders are loaded into the book on startup; users list their own orders
+    __table_args__ = (
+        Index("ix_orders_status_stock", "status", "stock_id"),
+        Index("ix_orders_user_created", "user_id", "created_at"),
+    )
+
+    # Relationships
+    stock = relationship("Stock")
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, Float
+from app.database import Base
+
+class RateLimitBucket(Base):
+    """Shared token bucket state; one row per upstream provider quota"""
+    __tablename__ = "rate_limit_buckets"
+
+    name = Column(String(64), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    capacity = Column(Float, nullable=False)
+    rate_per_second = Column(Float, nullable=False)
+    # Epoch seconds of the last refill; application clocks are NTP-synced
+    refilled_at = Column(Float, nullable=False)
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Numeric, DateTime, ForeignKey, UniqueConstraint
+from app.database import Base
+
+class StockCandle(Base):
+    """Closed OHLCV bucket for one stock at one resolution (1m, 5m, 15m, 1h, 1d)"""
+    __tablename__ = "stock_candles"
+
+    # BIGINT in Postgres; SQLite only autoincrements INTEGER primary keys
+    candle_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    stock_id = Column(Integer, ForeignKey("stocks.stock_id"), nullable=False)
+    interval = Column(String(4), nullable=False)
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    open = Column(Numeric(10, 2), nullable=False)
+    high = Column(Numeric(10, 2), nullable=False)
+    low = Column(Numeric(10, 2), nullable=False)
+    close = Column(Numeric(10, 2), nullable=False)
+    volume = Column(BigInteger, nullable=False, default=0)
+    
+    # Also serves chart range scans: one stock, one interval, ordered by time
+    __table_args__ = (
+        UniqueConstraint('stock_id', 'interval', 'bucket_start', name='uq_stock_candles_stock_interval_bucket'),
+    )
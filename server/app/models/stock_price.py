@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, BigInteger, Numeric, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+class StockPrice(Base):
+    """Append-only price history; one row per recorded price update"""
+    __tablename__ = "stock_prices"
+
+    # BIGINT in Postgres; SQLite only autoincrements INTEGER primary keys
+    price_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    stock_id = Column(Integer, ForeignKey("stocks.stock_id"), nullable=False)
+    price = Column(Numeric(10, 2), nullable=False)
+    volume = Column(BigInteger, nullable=True)
+    ts = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    
+    # Range queries are always "one stock, time window"
+    __table_args__ = (Index('ix_stock_prices_stock_id_ts', 'stock_id', 'ts'),)
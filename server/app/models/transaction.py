@@ -1,17 +1,22 @@
-from sqlalchemy import Column, Integer, Numeric, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
+from app.utils.money import major_amount
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    # Per-user transaction history
+    __table_args__ = (Index("ix_transactions_user_transaction", "user_id", "transaction_id"),)
 
     transaction_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
     stock_id = Column(Integer, ForeignKey("stocks.stock_id"), nullable=False)
     transaction_type = Column(String(4), nullable=False)  # 'BUY' or 'SELL'
     quantity = Column(Integer, nullable=False)
-    price_per_share = Column(Numeric(10, 2), nullable=False)
+    # Integer minor units (cents/paise); see app.utils.money
+    price_per_share_minor = Column(BigInteger, nullable=False)
+    price_per_share = major_amount("price_per_share_minor")
     transaction_date = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Literal, Optional
+
+class OrderCreate(BaseModel):
+    stock_id: int
+    side: Literal["BUY", "SELL"]
+    order_type: Literal["LIMIT", "STOP"]
+    quantity: int
+    # Limit price, or the stop price that turns the order into a market order
+    trigger_price: float
+
+class OrderResponse(BaseModel):
+    order_id: int
+    user_id: int
+    stock_id: int
+    side: str
+    order_type: str
+    quantity: int
+    trigger_price: Optional[float] = None
+    status: str
+    reason: Optional[str] = None
+    transaction_id: Optional[int] = None
+    executed_price: Optional[float] = None
+    created_at: Optional[datetime] = None
+    executed_at: Optional[datetime] = None
+    ticker_symbol: Optional[str] = None
+
+    class Config:
+        from_attributes = True
@@ -26,4 +26,5 @@ class StockSearchResponse(BaseModel):
         from_attributes = True
 
 class StockDetailResponse(StockResponse):
+    is_stale: Optional[bool] = None
     historical_data: Optional[dict] = None
\ No newline at end of file
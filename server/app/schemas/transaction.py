@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
 
 class TransactionBase(BaseModel):
     stock_id: int
@@ -15,6 +15,33 @@ class TradeRequest(BaseModel):
     stock_id: int
     quantity: int
 
+class BasketLeg(BaseModel):
+    stock_id: int
+    quantity: int
+    side: Literal["BUY", "SELL"]
+
+class BasketRequest(BaseModel):
+    legs: List[BasketLeg]
+    # "all_or_nothing" rejects the whole basket if any leg fails; "best_effort" fills what it can
+    mode: Literal["all_or_nothing", "best_effort"] = "all_or_nothing"
+
+class BasketLegResult(BaseModel):
+    leg: int
+    stock_id: int
+    side: str
+    quantity: int
+    status: str  # 'FILLED' or 'REJECTED'
+    price: Optional[float] = None
+    transaction_id: Optional[int] = None
+    reason: Optional[str] = None
+
+class BasketResponse(BaseModel):
+    mode: str
+    filled: int
+    rejected: int
+    balance: float
+    legs: List[BasketLegResult]
+
 class TransactionResponse(TransactionBase):
     transaction_id: int
     user_id: int
@@ -14,13 +14,23 @@ from sqlalchemy.orm import Session
 from app.models.stock import Stock
 from app.models.holding import Holding
 from app.models.transaction import Transaction
+from app.utils.money import minor_to_float
+from app.utils.rate_limiter import INTERACTIVE, groq_rate_limiter
 
 class AIService:
     def __init__(self):
         self.groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
         self.news_api_key = "demo"  # Using demo key for news API
         
-    def get_stock_performance_insights(self, stock: Stock, historical_data: List[Dict]) -> str:
+    def _chat_completion(self, **kwargs):
+        """Groq chat completion paced by the cluster-wide Groq rate limiter"""
+        if not groq_rate_limiter.acquire_blocking(INTERACTIVE):
+            raise RuntimeError("Groq rate limit exceeded")
+        return self.groq_client.chat.completions.create(**kwargs)
+
+    def get_stock_performance_insights(
+        self, stock: Stock, historical_data: List[Dict], indicators: Optional[Dict] = None
+    ) -> str:
         """Generate AI insights for stock performance"""
         try:
             # Prepare stock data for analysis
@@ -36,6 +46,7 @@ class AIService:
             
             Current Price: ${stock_info['current_price']}
             Recent Historical Data: {json.dumps(stock_info['historical_data'][-5:], indent=2)}
+            Technical Indicators: {json.dumps(indicators or {}, indent=2)}
             
             Please provide:
             1. A brief performance summary (2-3 sentences)
@@ -46,7 +57,7 @@ class AIService:
             Keep the response concise and investor-friendly, under 200 words.
             """
             
-            response = self.groq_client.chat.completions.create(
+            response = self._chat_completion(
                 messages=[
                     {"role": "system", "content": "You are a financial analyst providing stock insights to retail investors."},
                     {"role": "user", "content": prompt}
@@ -98,7 +109,7 @@ class AIService:
             }}
             """
             
-            response = self.groq_client.chat.completions.create(
+            response = self._chat_completion(
                 messages=[
                     {"role": "system", "content": "You are a financial sentiment analyst. Respond only in valid JSON format."},
                     {"role": "user", "content": prompt}
@@ -155,7 +166,7 @@ class AIService:
                 stock = db.query(Stock).filter(Stock.stock_id == holding.stock_id).first()
                 if stock:
                     current_value = float(holding.quantity * stock.current_price)
-                    invested_value = float(holding.quantity * holding.average_cost)
+                    invested_value = minor_to_float(holding.quantity * holding.average_cost_minor)
                     pnl = current_value - invested_value
                     pnl_percent = (pnl / invested_value * 100) if invested_value > 0 else 0
                     
@@ -198,7 +209,7 @@ class AIService:
             Keep it conversational and under 300 words.
             """
             
-            response = self.groq_client.chat.completions.create(
+            response = self._chat_completion(
                 messages=[
                     {"role": "system", "content": "You are a personal financial advisor providing portfolio analysis to retail investors."},
                     {"role": "user", "content": prompt}
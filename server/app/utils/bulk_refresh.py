@@ -0,0 +1,82 @@
+"""
+Bulk quote refresh engine
+Fetches many tickers concurrently while staying inside the provider quota:
+bounded concurrency, the shared provider rate limiter, and jittered retries on failure only
+"""
+
+import asyncio
+import random
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from app.config import settings
+from app.utils.circuit_breaker import OPEN, market_data_breaker
+from app.utils.market_data_client import market_data_client, uses_local_quotes
+from app.utils.quote_cache import quote_cache
+from app.utils.rate_limiter import BACKGROUND, TokenBucket, market_data_rate_limiter
+
+QuoteFetcher = Callable[[str], Awaitable[Optional[Dict[str, float]]]]
+
+
+async def _fetch_with_retry(
+    ticker_symbol: str,
+    fetcher: QuoteFetcher,
+    limiter: Optional[TokenBucket],
+    max_retries: int,
+    retry_base_delay: float,
+    priority: str,
+) -> Optional[Dict[str, float]]:
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            if not market_data_breaker.would_allow():
+                # Provider is failing; do not spend a permit on a call that would be rejected
+                break
+            if not await limiter.acquire(priority):
+                # No permit within the limiter's max wait; the quota is exhausted cluster-wide
+                return None
+        quote = await fetcher(ticker_symbol)
+        if quote is not None:
+            return quote
+        if market_data_breaker.state == OPEN:
+            # Provider is failing; retrying now would only be rejected
+            break
+        if attempt < max_retries:
+            # Exponential backoff with full jitter, only paid when a call fails
+            await asyncio.sleep(random.uniform(0, retry_base_delay * (2 ** attempt)))
+    return None
+
+
+async def fetch_quotes_bulk(
+    tickers: Iterable[str],
+    fetcher: Optional[QuoteFetcher] = None,
+    limiter: Optional[TokenBucket] = None,
+    concurrency: Optional[int] = None,
+    max_retries: Optional[int] = None,
+    retry_base_delay: Optional[float] = None,
+    priority: str = BACKGROUND,
+) -> Dict[str, Optional[Dict[str, float]]]:
+    """Fetch quotes for many tickers concurrently; failed tickers map to None"""
+    if fetcher is None and limiter is None and uses_local_quotes():
+        # Demo key or simulator: quotes are generated locally, there is no quota to pace
+        limiter = None
+    else:
+        limiter = limiter or market_data_rate_limiter
+    fetcher = fetcher or market_data_client.fetch_quote
+    concurrency = concurrency or settings.MARKET_DATA_REFRESH_CONCURRENCY
+    max_retries = settings.MARKET_DATA_REFRESH_MAX_RETRIES if max_retries is None else max_retries
+    retry_base_delay = (
+        settings.MARKET_DATA_REFRESH_RETRY_BASE_DELAY_SECONDS if retry_base_delay is None else retry_base_delay
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_one(ticker_symbol: str):
+        async with semaphore:
+            quote = await _fetch_with_retry(
+                ticker_symbol, fetcher, limiter, max_retries, retry_base_delay, priority
+            )
+        if quote is not None:
+            quote_cache.set(ticker_symbol, quote)
+        return ticker_symbol, quote
+
+    unique_tickers = list(dict.fromkeys(ticker.upper() for ticker in tickers))
+    results = await asyncio.gather(*[fetch_one(ticker) for ticker in unique_tickers])
+    return dict(results)
@@ -0,0 +1,375 @@
+"""
+Incremental OHLCV candle aggregation
+Rolls every price book tick into 1m/5m/15m/1h/1d buckets as it arrives.
+Open buckets live in memory; once a tick lands in a later bucket the previous
+one is closed and queued, and closed buckets are persisted to stock_candles
+in batches by a background flush loop. Charts read candles instead of
+scanning raw stock_prices rows.
+"""
+
+import asyncio
+import threading
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Float, cast, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.stock_candle import StockCandle
+from app.utils.price_book import price_book
+
+CANDLE_INTERVALS = {
+    "1m": 60,
+    "5m": 300,
+    "15m": 900,
+    "1h": 3600,
+    "1d": 86400
+}
+
+CandleKey = Tuple[int, str, float]
+
+
+def bucket_start(epoch: float, interval: str) -> float:
+    step = CANDLE_INTERVALS[interval]
+    return epoch - (epoch % step)
+
+
+def _epoch_seconds(ts: datetime) -> float:
+    if ts.tzinfo is None:
+        # SQLite returns naive timestamps; they are stored in UTC
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+def _epoch_column(db: Session, column):
+    """Timestamp column as epoch seconds computed by the database, skipping datetime parsing per row"""
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(func.extract("epoch", column), Float)
+    return cast(func.strftime("%s", column), Float)
+
+
+def _merge(older: dict, newer: dict) -> dict:
+    """Combine two partial candles for the same bucket"""
+    return {
+        "open": older["open"],
+        "high": max(older["high"], newer["high"]),
+        "low": min(older["low"], newer["low"]),
+        "close": newer["close"],
+        "volume": older["volume"] + newer["volume"],
+    }
+
+
+class CandleAggregator:
+    def __init__(self, flush_interval_seconds: float = 5.0, session_factory=SessionLocal):
+        self.flush_interval_seconds = flush_interval_seconds
+        self.session_factory = session_factory
+        # (stock_id, interval) -> open candle, including the bucket and last tick time
+        self._open: Dict[Tuple[int, str], dict] = {}
+        # Closed but not yet persisted
+        self._closed: Dict[CandleKey, dict] = {}
+        self._listeners: List[Callable[[int, str, float, dict], None]] = []
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.ticks = 0
+        self.candles_flushed = 0
+
+    def add_close_listener(self, listener: Callable[[int, str, float, dict], None]):
+        """Call listener(stock_id, interval, bucket_start, candle) when a tick closes a bucket"""
+        self._listeners.append(listener)
+
+    def add_tick(self, stock_id: int, price: float, ts: datetime, volume: int = 0):
+        """Apply one tick to the open bucket of every interval"""
+        epoch = _epoch_seconds(ts)
+        volume = volume or 0
+        closed_now = []
+        with self._lock:
+            self.ticks += 1
+            for interval in CANDLE_INTERVALS:
+                start = bucket_start(epoch, interval)
+                candle = self._open.get((stock_id, interval))
+                if candle is None or start > candle["bucket_start"]:
+                    if candle is not None:
+                        closed = self._close(stock_id, interval, candle)
+                        closed_now.append((interval, candle["bucket_start"], closed))
+                    self._open[(stock_id, interval)] = {
+                        "bucket_start": start,
+                        "open": price,
+                        "high": price,
+                        "low": price,
+                        "close": price,
+                        "volume": volume,
+                        "last_tick": epoch,
+                    }
+                elif start == candle["bucket_start"]:
+                    candle["high"] = max(candle["high"], price)
+                    candle["low"] = min(candle["low"], price)
+                    candle["volume"] += volume
+                    if epoch >= candle["last_tick"]:
+                        candle["close"] = price
+                        candle["last_tick"] = epoch
+                # Ticks for an already closed bucket are dropped
+        # Listeners run outside the lock so they may read candles back
+        for interval, start, candle in closed_now:
+            for listener in self._listeners:
+                try:
+                    listener(stock_id, interval, start, dict(candle))
+                except Exception as e:
+                    print(f"Error in candle listener: {e}")
+
+    def on_price(self, ticker_symbol: str, entry: dict):
+        """Price book listener"""
+        stock_id = price_book.stock_id_for(ticker_symbol)
+        if stock_id is None:
+            return
+        self.add_tick(stock_id, entry["price"], entry["last_updated"], entry.get("volume") or 0)
+
+    def _close(self, stock_id: int, interval: str, candle: dict) -> dict:
+        key = (stock_id, interval, candle["bucket_start"])
+        closed = {field: candle[field] for field in ("open", "high", "low", "close", "volume")}
+        if key in self._closed:
+            closed = _merge(self._closed[key], closed)
+        self._closed[key] = closed
+        return closed
+
+    def open_candle(self, stock_id: int, interval: str) -> Optional[dict]:
+        with self._lock:
+            candle = self._open.get((stock_id, interval))
+            return dict(candle) if candle is not None else None
+
+    def memory_candles(self, stock_id: int, interval: str, include_open: bool = True) -> Dict[float, dict]:
+        """Unpersisted closed candles plus (optionally) the open one, keyed by bucket start"""
+        with self._lock:
+            candles = {
+                key[2]: dict(candle)
+                for key, candle in self._closed.items()
+                if key[0] == stock_id and key[1] == interval
+            }
+            candle = self._open.get((stock_id, interval)) if include_open else None
+            if candle is not None:
+                current = {field: candle[field] for field in ("open", "high", "low", "close", "volume")}
+                previous = candles.get(candle["bucket_start"])
+                candles[candle["bucket_start"]] = _merge(previous, current) if previous else current
+        return candles
+
+    def _take(self, include_open: bool) -> Dict[CandleKey, dict]:
+        with self._lock:
+            if include_open:
+                for (stock_id, interval), candle in self._open.items():
+                    self._close(stock_id, interval, candle)
+                self._open.clear()
+            closed, self._closed = self._closed, {}
+        return closed
+
+    def _restore(self, closed: Dict[CandleKey, dict]):
+        with self._lock:
+            for key, candle in closed.items():
+                self._closed[key] = _merge(candle, self._closed[key]) if key in self._closed else candle
+
+    def _write(self, closed: Dict[CandleKey, dict]) -> int:
+        db = self.session_factory()
+        try:
+            return save_candles(db, closed)
+        finally:
+            db.close()
+
+    async def flush(self, include_open: bool = False) -> int:
+        """Persist closed candles (and open ones too on shutdown)"""
+        closed = self._take(include_open)
+        if not closed:
+            return 0
+        try:
+            written = await asyncio.to_thread(self._write, closed)
+        except Exception:
+            self._restore(closed)
+            raise
+        self.candles_flushed += written
+        return written
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error flushing candles: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Open buckets are persisted too; a later tick in the same bucket merges into the row
+        try:
+            await self.flush(include_open=True)
+        except Exception as e:
+            print(f"Error flushing candles: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._open.clear()
+            self._closed.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ticks": self.ticks,
+                "open": len(self._open),
+                "pending": len(self._closed),
+                "flushed": self.candles_flushed,
+            }
+
+
+def save_candles(db: Session, closed: Dict[CandleKey, dict]) -> int:
+    """Upsert closed candles; an existing row for the same bucket is merged, not replaced"""
+    if not closed:
+        return 0
+    if db.get_bind().dialect.name == "postgresql":
+        stmt, greatest, least = pg_insert(StockCandle), func.greatest, func.least
+    else:
+        stmt, greatest, least = sqlite_insert(StockCandle), func.max, func.min
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["stock_id", "interval", "bucket_start"],
+        set_={
+            "high": greatest(StockCandle.high, stmt.excluded.high),
+            "low": least(StockCandle.low, stmt.excluded.low),
+            "close": stmt.excluded.close,
+            "volume": StockCandle.volume + stmt.excluded.volume,
+        }
+    )
+    db.execute(stmt, [
+        {
+            "stock_id": stock_id,
+            "interval": interval,
+            "bucket_start": datetime.fromtimestamp(start, tz=timezone.utc),
+            **candle
+        }
+        for (stock_id, interval, start), candle in closed.items()
+    ])
+    db.commit()
+    return len(closed)
+
+
+CANDLE_FIELDS = ("time", "open", "high", "low", "close", "volume")
+
+
+def get_candle_columns(
+    db: Session, stock_id: int, interval: str, start: datetime, end: datetime,
+    limit: Optional[int] = None, after: Optional[float] = None
+) -> Dict[str, list]:
+    """Candles for one stock in [start, end] as parallel time/open/high/low/close/volume lists,
+    persisted rows merged with in-memory buckets.
+
+    With limit, returns at most limit + 1 candles after the bucket start `after`, so the
+    caller can tell whether another page follows.
+    """
+    statement = (
+        select(
+            _epoch_column(db, StockCandle.bucket_start), cast(StockCandle.open, Float), cast(StockCandle.high, Float),
+            cast(StockCandle.low, Float), cast(StockCandle.close, Float), StockCandle.volume
+        )
+        .where(StockCandle.stock_id == stock_id, StockCandle.interval == interval, StockCandle.bucket_start <= end)
+        .order_by(StockCandle.bucket_start)
+    )
+    # A single lower bound: given both, SQLite may seek the index to the range start and
+    # filter every row up to the cursor
+    after_ts = datetime.fromtimestamp(after, tz=timezone.utc) if after is not None else None
+    if after_ts is not None and after_ts >= start:
+        statement = statement.where(StockCandle.bucket_start > after_ts)
+    else:
+        statement = statement.where(StockCandle.bucket_start >= start)
+    if limit is not None:
+        statement = statement.limit(limit + 1)
+    # Plain Core rows transposed into columns; no per-candle objects
+    rows = db.connection().execute(statement).all()
+    columns = {field: list(values) for field, values in zip(CANDLE_FIELDS, zip(*rows))} if rows else {
+        field: [] for field in CANDLE_FIELDS
+    }
+
+    start_epoch, end_epoch = _epoch_seconds(start), _epoch_seconds(end)
+    if limit is not None and len(rows) > limit:
+        # Later in-memory buckets belong to a later page
+        end_epoch = rows[-1][0]
+    times = columns["time"]
+    for bucket, candle in sorted(candle_aggregator.memory_candles(stock_id, interval).items()):
+        if not start_epoch <= bucket <= end_epoch or (after is not None and bucket <= after):
+            continue
+        # Only the few unflushed buckets are merged in, each at its sorted position
+        i = bisect_left(times, bucket)
+        if i < len(times) and times[i] == bucket:
+            stored = {field: columns[field][i] for field in CANDLE_FIELDS[1:]}
+            candle = _merge(stored, candle)
+            for field in CANDLE_FIELDS[1:]:
+                columns[field][i] = candle[field]
+        else:
+            for field in CANDLE_FIELDS:
+                columns[field].insert(i, bucket if field == "time" else candle[field])
+
+    if limit is not None:
+        for field in CANDLE_FIELDS:
+            del columns[field][limit + 1:]
+    return columns
+
+
+def get_candles(db: Session, stock_id: int, interval: str, start: datetime, end: datetime) -> List[dict]:
+    """Candles for one stock in [start, end], persisted rows merged with in-memory buckets"""
+    columns = get_candle_columns(db, stock_id, interval, start, end)
+    return [dict(zip(CANDLE_FIELDS, values)) for values in zip(*(columns[field] for field in CANDLE_FIELDS))]
+
+
+def load_closed_candles(
+    db: Session, stock_ids: Iterable[int], interval: str, start: datetime
+) -> Dict[int, List[dict]]:
+    """Closed candles since start for many stocks in one query, merged with unpersisted ones"""
+    stock_ids = list(stock_ids)
+    candles: Dict[int, Dict[float, dict]] = {stock_id: {} for stock_id in stock_ids}
+    if not stock_ids:
+        return {}
+    rows = db.execute(
+        select(
+            StockCandle.stock_id, StockCandle.bucket_start, StockCandle.open, StockCandle.high,
+            StockCandle.low, StockCandle.close, StockCandle.volume
+        )
+        .where(
+            StockCandle.stock_id.in_(stock_ids),
+            StockCandle.interval == interval,
+            StockCandle.bucket_start >= start
+        )
+    ).all()
+    for row in rows:
+        candles[row.stock_id][_epoch_seconds(row.bucket_start)] = {
+            "open": float(row.open),
+            "high": float(row.high),
+            "low": float(row.low),
+            "close": float(row.close),
+            "volume": row.volume,
+        }
+
+    start_epoch = _epoch_seconds(start)
+    for stock_id in stock_ids:
+        by_bucket = candles[stock_id]
+        for bucket, candle in candle_aggregator.memory_candles(stock_id, interval, include_open=False).items():
+            if bucket >= start_epoch:
+                by_bucket[bucket] = _merge(by_bucket[bucket], candle) if bucket in by_bucket else candle
+    return {
+        stock_id: [dict(candle, time=bucket) for bucket, candle in sorted(by_bucket.items())]
+        for stock_id, by_bucket in candles.items()
+    }
+
+
+# Global aggregator fed by every price book update
+candle_aggregator = CandleAggregator(flush_interval_seconds=settings.CANDLE_FLUSH_INTERVAL_SECONDS)
+price_book.add_listener(candle_aggregator.on_price)
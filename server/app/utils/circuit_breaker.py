@@ -0,0 +1,130 @@
+"""
+Circuit breaker for the market data provider
+Trips after repeated failures or slow calls so callers fail fast (and fall
+back to the last good quote) instead of each waiting out the full timeout.
+After a cool-down one probe call is let through; its outcome closes the
+breaker or re-opens it.
+"""
+
+import threading
+import time
+from typing import Any, Dict
+
+from app.config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, slow_call_seconds: float, open_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.trips = 0
+        self.rejected = 0
+        self.slow_calls = 0
+        self.fallbacks = 0
+        self.revalidations = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """True if a call may go upstream now; an expired open breaker lets one probe through"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def would_allow(self) -> bool:
+        """allow() without taking the probe slot; for checks made before spending a rate limit permit"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            expired = self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds
+            return (expired or self._state == HALF_OPEN) and not self._probe_in_flight
+
+    def release(self):
+        """Give back an allowed call that was never made; records no outcome"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record_fallback(self):
+        with self._lock:
+            self.fallbacks += 1
+
+    def record_revalidation(self):
+        with self._lock:
+            self.revalidations += 1
+
+    def record(self, success: bool, latency_seconds: float):
+        """Report the outcome of an allowed call; slow successes count as failures"""
+        with self._lock:
+            if success and latency_seconds > self.slow_call_seconds:
+                self.slow_calls += 1
+                success = False
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+                if success:
+                    self._state = CLOSED
+                    self._failures = 0
+                else:
+                    self._trip()
+                return
+            if success:
+                self._failures = 0
+                return
+            self._failures += 1
+            if self._state == CLOSED and self._failures >= self.failure_threshold:
+                self._trip()
+
+    def _trip(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self.trips += 1
+
+    def reset(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+            self.trips = self.rejected = self.slow_calls = self.fallbacks = self.revalidations = 0
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "slow_calls": self.slow_calls,
+                "fallbacks": self.fallbacks,
+                "revalidations": self.revalidations,
+            }
+
+
+# Shared by the sync and async quote clients
+market_data_breaker = CircuitBreaker(
+    failure_threshold=settings.MARKET_DATA_BREAKER_FAILURE_THRESHOLD,
+    slow_call_seconds=settings.MARKET_DATA_BREAKER_SLOW_CALL_SECONDS,
+    open_seconds=settings.MARKET_DATA_BREAKER_OPEN_SECONDS,
+)
@@ -0,0 +1,380 @@
+"""
+Idempotency keys
+Trade and funds requests may carry an Idempotency-Key header so a client
+retrying after a timeout cannot execute the same request twice. The first
+request claims the key with an INSERT that is committed before any work
+runs, so a concurrent retry on any worker finds the claim and gets 409.
+A claim is a lease of IDEMPOTENCY_LEASE_SECONDS: an unfinished claim older
+than that was left by a worker that died mid-request, and the next retry
+takes it over. The request's own writes are committed in the same
+transaction as its stored response, and only while the claim (identified by
+its claim time) is still held, so a takeover can never run the work twice:
+either the first attempt committed its outcome and the retry replays it, or
+it committed nothing. The finished response is stored on the row and kept in a bounded
+in-memory LRU, so replays on the same worker cost one dict lookup. Rows
+expire after IDEMPOTENCY_TTL_SECONDS and are purged by a background loop.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.idempotency_key import IdempotencyKey
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+# Session.info key set while a handler runs under a claim
+CLAIM_INFO_KEY = "idempotency_claim"
+# Session.info key holding callbacks to run once the claimed request has committed
+AFTER_COMMIT_INFO_KEY = "idempotency_after_commit"
+
+
+class IdempotencyConflict(Exception):
+    """The key is in use by a running request (409) or was used for a different one (422)"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: str
+    status_code: int
+    body: Any
+    created_at: float
+
+
+def after_commit(db: Session, callback: Callable[[], None]):
+    """Run callback once the request's writes are committed: right away, or under an
+    idempotency claim after run_idempotent has committed them with the stored response"""
+    if db.info.get(CLAIM_INFO_KEY) is None:
+        callback()
+    else:
+        db.info.setdefault(AFTER_COMMIT_INFO_KEY, []).append(callback)
+
+
+def commit_unless_claimed(db: Session):
+    """Commit, unless the work runs under an idempotency claim: run_idempotent then commits
+    it together with the stored response"""
+    if db.info.get(CLAIM_INFO_KEY) is None:
+        db.commit()
+
+
+def request_fingerprint(endpoint: str, payload: Any) -> str:
+    return hashlib.sha256(
+        json.dumps([endpoint, jsonable_encoder(payload)], sort_keys=True).encode()
+    ).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(
+        self,
+        ttl_seconds: float = 86400,
+        lease_seconds: float = 60,
+        max_size: int = 10000,
+        cleanup_interval_seconds: float = 3600,
+        session_factory=SessionLocal,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.max_size = max_size
+        self.cleanup_interval_seconds = cleanup_interval_seconds
+        self.session_factory = session_factory
+        self._responses: "OrderedDict[Tuple[int, str], StoredResponse]" = OrderedDict()
+        # Keys claimed by requests running on this worker -> claim time
+        self._in_flight: Dict[Tuple[int, str], float] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.db_hits = 0
+        self.claims = 0
+        self.reclaimed = 0
+        self.purged = 0
+
+    def _cached(self, cache_key: Tuple[int, str], now: float) -> Optional[StoredResponse]:
+        with self._lock:
+            stored = self._responses.get(cache_key)
+            if stored is None:
+                return None
+            if now - stored.created_at > self.ttl_seconds:
+                del self._responses[cache_key]
+                return None
+            self._responses.move_to_end(cache_key)
+            self.hits += 1
+            return stored
+
+    def _remember(self, cache_key: Tuple[int, str], stored: StoredResponse):
+        with self._lock:
+            self._responses[cache_key] = stored
+            self._responses.move_to_end(cache_key)
+            while len(self._responses) > self.max_size:
+                self._responses.popitem(last=False)
+
+    def _release(self, cache_key: Tuple[int, str]):
+        with self._lock:
+            self._in_flight.pop(cache_key, None)
+
+    @staticmethod
+    def _matching(stored: StoredResponse, fingerprint: str) -> StoredResponse:
+        if stored.fingerprint != fingerprint:
+            raise IdempotencyConflict(422, "Idempotency-Key was already used for a different request")
+        return stored
+
+    def begin(self, db: Session, user_id: int, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """Claim the key for a new request, or return the response stored for an earlier one"""
+        now = time.time()
+        cache_key = (user_id, key)
+        stored = self._cached(cache_key, now)
+        if stored is not None:
+            return self._matching(stored, fingerprint)
+        with self._lock:
+            if cache_key in self._in_flight:
+                raise IdempotencyConflict(409, "A request with this Idempotency-Key is still in progress")
+            self._in_flight[cache_key] = now
+        try:
+            stored = self._claim(db, user_id, key, fingerprint, now)
+        except BaseException:
+            self._release(cache_key)
+            raise
+        if stored is not None:
+            self._release(cache_key)
+        return stored
+
+    def _claim(self, db: Session, user_id: int, key: str, fingerprint: str, now: float) -> Optional[StoredResponse]:
+        insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+        where = (IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        for _ in range(2):
+            claimed = db.execute(
+                insert(IdempotencyKey)
+                .values(user_id=user_id, key=key, fingerprint=fingerprint, created_at=now)
+                .on_conflict_do_nothing(index_elements=["user_id", "key"])
+            ).rowcount
+            db.commit()
+            if claimed:
+                self.claims += 1
+                return None
+
+            row = db.execute(
+                select(IdempotencyKey.fingerprint, IdempotencyKey.status_code,
+                       IdempotencyKey.response_body, IdempotencyKey.created_at)
+                .where(*where)
+            ).first()
+            if row is None:
+                # Purged between the two statements
+                continue
+            if now - row.created_at > self.ttl_seconds:
+                # Expired but not purged yet; the key is free again
+                db.execute(delete(IdempotencyKey).where(*where, IdempotencyKey.created_at == row.created_at))
+                db.commit()
+                continue
+            if row.fingerprint != fingerprint:
+                raise IdempotencyConflict(422, "Idempotency-Key was already used for a different request")
+            if row.status_code is None:
+                if now - row.created_at <= self.lease_seconds:
+                    raise IdempotencyConflict(409, "A request with this Idempotency-Key is still in progress")
+                # The claiming worker died mid-request; take the claim over unless another retry just did
+                claimed = db.execute(
+                    update(IdempotencyKey)
+                    .where(*where, IdempotencyKey.created_at == row.created_at, IdempotencyKey.status_code.is_(None))
+                    .values(created_at=now)
+                ).rowcount
+                db.commit()
+                if claimed:
+                    self.claims += 1
+                    self.reclaimed += 1
+                    return None
+                continue
+            stored = StoredResponse(row.fingerprint, row.status_code, json.loads(row.response_body), row.created_at)
+            self._remember((user_id, key), stored)
+            self.db_hits += 1
+            return stored
+        raise IdempotencyConflict(409, "A request with this Idempotency-Key is still in progress")
+
+    def complete(self, db: Session, user_id: int, key: str, fingerprint: str, status_code: int, body: Any):
+        """Store the response of a claimed request for replay, committing it with the request's own writes.
+
+        Raises IdempotencyConflict (and rolls everything back) if a retry has taken the claim over.
+        """
+        cache_key = (user_id, key)
+        body = jsonable_encoder(body)
+        with self._lock:
+            claimed_at = self._in_flight.get(cache_key)
+        where = [IdempotencyKey.user_id == user_id, IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None)]
+        if claimed_at is not None:
+            where.append(IdempotencyKey.created_at == claimed_at)
+        try:
+            stored = db.execute(
+                update(IdempotencyKey).where(*where).values(status_code=status_code, response_body=json.dumps(body))
+            ).rowcount
+            if not stored:
+                db.rollback()
+                raise IdempotencyConflict(409, "A retry of this request took over its Idempotency-Key")
+            db.commit()
+            self._remember(cache_key, StoredResponse(fingerprint, status_code, body, claimed_at or time.time()))
+        except BaseException:
+            db.rollback()
+            raise
+        finally:
+            self._release(cache_key)
+
+    def abandon(self, db: Session, user_id: int, key: str):
+        """Drop the claim of a request that failed unexpectedly, so a retry can run it"""
+        try:
+            db.rollback()
+            db.execute(
+                delete(IdempotencyKey)
+                .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key,
+                       IdempotencyKey.status_code.is_(None))
+            )
+            db.commit()
+        except Exception as e:
+            print(f"Error releasing idempotency key: {e}")
+        finally:
+            self._release((user_id, key))
+
+    def purge_expired(self, db: Session) -> int:
+        purged = db.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.created_at < time.time() - self.ttl_seconds)
+        ).rowcount
+        db.commit()
+        self.purged += purged
+        return purged
+
+    def _purge(self) -> int:
+        db = self.session_factory()
+        try:
+            return self.purge_expired(db)
+        finally:
+            db.close()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.cleanup_interval_seconds)
+            try:
+                await asyncio.to_thread(self._purge)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error purging idempotency keys: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def clear(self):
+        with self._lock:
+            self._responses.clear()
+            self._in_flight.clear()
+            self.hits = 0
+            self.db_hits = 0
+            self.claims = 0
+            self.reclaimed = 0
+            self.purged = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "cached": len(self._responses),
+                "in_flight": len(self._in_flight),
+                "hits": self.hits,
+                "db_hits": self.db_hits,
+                "claims": self.claims,
+                "reclaimed": self.reclaimed,
+                "purged": self.purged,
+            }
+
+
+def run_idempotent(
+    db: Session,
+    user_id: int,
+    key: Optional[str],
+    endpoint: str,
+    payload: Any,
+    response: Response,
+    handler: Callable[[], Any],
+) -> Any:
+    """Run a route handler at most once per Idempotency-Key; retries get the stored response.
+
+    Responses below 500 (including rejections such as insufficient funds) are stored;
+    anything else releases the key so the retry runs the request again.
+    """
+    if not key:
+        return handler()
+    fingerprint = request_fingerprint(endpoint, payload)
+    try:
+        stored = idempotency_store.begin(db, user_id, key, fingerprint)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    if stored is not None:
+        if stored.status_code >= 400:
+            raise HTTPException(
+                status_code=stored.status_code, detail=stored.body.get("detail"), headers={REPLAYED_HEADER: "true"}
+            )
+        response.status_code = stored.status_code
+        response.headers[REPLAYED_HEADER] = "true"
+        return stored.body
+
+    # The handler's writes are left for complete() to commit along with the response
+    db.info[CLAIM_INFO_KEY] = key
+    try:
+        try:
+            result = handler()
+        except HTTPException as e:
+            if e.status_code < 500:
+                # A rejection stores its response but none of the handler's partial writes
+                db.rollback()
+                _complete(db, user_id, key, fingerprint, e.status_code, {"detail": e.detail})
+            else:
+                idempotency_store.abandon(db, user_id, key)
+            raise
+        except BaseException:
+            idempotency_store.abandon(db, user_id, key)
+            raise
+        _complete(db, user_id, key, fingerprint, response.status_code or 200, result)
+        for callback in db.info.pop(AFTER_COMMIT_INFO_KEY, []):
+            callback()
+        return result
+    finally:
+        db.info.pop(CLAIM_INFO_KEY, None)
+        db.info.pop(AFTER_COMMIT_INFO_KEY, None)
+
+
+def _complete(db: Session, user_id: int, key: str, fingerprint: str, status_code: int, body: Any):
+    try:
+        idempotency_store.complete(db, user_id, key, fingerprint, status_code, body)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+# Global store shared by the trade and funds endpoints
+idempotency_store = IdempotencyStore(
+    ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+    lease_seconds=settings.IDEMPOTENCY_LEASE_SECONDS,
+    max_size=settings.IDEMPOTENCY_CACHE_SIZE,
+    cleanup_interval_seconds=settings.IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS,
+)
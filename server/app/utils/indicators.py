@@ -0,0 +1,360 @@
+"""
+Technical indicators
+SMA, EMA, RSI, MACD, Bollinger Bands and ATR over candle arrays with NumPy.
+compute_indicators() evaluates a full series; IndicatorEngine keeps the
+recursive state of every tracked stock in arrays indexed by slot, applies
+closed candles incrementally, and re-evaluates all refreshed stocks in one
+vectorized step with the open candle as a provisional bar.
+
+Recursive averages (EMA, MACD signal, Wilder RSI/ATR) are seeded with the
+first value so incremental updates match a full recomputation (to rounding);
+each indicator is reported as None until its warm-up period has passed.
+"""
+
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.utils.candles import CANDLE_INTERVALS, candle_aggregator, get_candles, load_closed_candles
+from app.utils.price_book import price_book
+
+SMA_PERIOD = 20
+EMA_FAST_PERIOD = 12
+EMA_SLOW_PERIOD = 26
+MACD_SIGNAL_PERIOD = 9
+RSI_PERIOD = 14
+BOLLINGER_PERIOD = 20
+BOLLINGER_STDDEV = 2.0
+ATR_PERIOD = 14
+
+# Bars needed before each value is reported
+WARMUP = {
+    "sma": SMA_PERIOD,
+    "ema_fast": EMA_FAST_PERIOD,
+    "ema_slow": EMA_SLOW_PERIOD,
+    "macd": EMA_SLOW_PERIOD,
+    "signal": EMA_SLOW_PERIOD + MACD_SIGNAL_PERIOD - 1,
+    "rsi": RSI_PERIOD + 1,
+    "bollinger": BOLLINGER_PERIOD,
+    "atr": ATR_PERIOD,
+}
+
+_WINDOW = max(SMA_PERIOD, BOLLINGER_PERIOD)
+
+
+def _ema_alpha(period: int) -> float:
+    return 2.0 / (period + 1)
+
+
+# Values per cumulative-sum block in _recursive_mean; keeps decay ** -_RECURSION_BLOCK
+# within float range for every alpha used here (at most 0.2, decay ** -256 ~ 1e25)
+_RECURSION_BLOCK = 256
+
+
+def _recursive_mean(values: np.ndarray, alpha: float) -> np.ndarray:
+    """out[0] = values[0]; out[t] = out[t-1] + alpha * (values[t] - out[t-1]), for 0 < alpha < 1
+
+    Unrolled with decay = 1 - alpha, out[t] = decay^t * (out[0] + alpha * sum(values[k] / decay^k, k=1..t)),
+    a cumulative sum. decay^-k grows without bound, so it is evaluated in blocks, each seeded with
+    the last value of the block before.
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.empty_like(values)
+    if not len(values):
+        return out
+    powers = (1.0 - alpha) ** np.arange(1, _RECURSION_BLOCK + 1)
+    out[0] = values[0]
+    for start in range(1, len(values), _RECURSION_BLOCK):
+        block = values[start:start + _RECURSION_BLOCK]
+        decay = powers[:len(block)]
+        out[start:start + len(block)] = decay * (out[start - 1] + alpha * np.cumsum(block / decay))
+    return out
+
+
+def _rsi_from_averages(avg_gain, avg_loss):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    rsi = np.where(avg_loss == 0, 100.0, rsi)
+    return np.where((avg_loss == 0) & (avg_gain == 0), 50.0, rsi)
+
+
+def compute_series(high, low, close) -> Dict[str, np.ndarray]:
+    """All indicator series for one stock, plus the Wilder averages needed to resume"""
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    close = np.asarray(close, dtype=float)
+    n = len(close)
+    series = {key: np.full(n, np.nan) for key in (
+        "sma", "bb_upper", "bb_lower", "rsi", "avg_gain", "avg_loss"
+    )}
+    if n == 0:
+        for key in ("ema_fast", "ema_slow", "macd", "signal", "atr"):
+            series[key] = np.empty(0)
+        return series
+
+    if n >= _WINDOW:
+        windows = sliding_window_view(close, _WINDOW)
+        mean, std = windows.mean(axis=1), windows.std(axis=1)
+        series["sma"][_WINDOW - 1:] = mean
+        series["bb_upper"][_WINDOW - 1:] = mean + BOLLINGER_STDDEV * std
+        series["bb_lower"][_WINDOW - 1:] = mean - BOLLINGER_STDDEV * std
+
+    series["ema_fast"] = _recursive_mean(close, _ema_alpha(EMA_FAST_PERIOD))
+    series["ema_slow"] = _recursive_mean(close, _ema_alpha(EMA_SLOW_PERIOD))
+    series["macd"] = series["ema_fast"] - series["ema_slow"]
+    series["signal"] = _recursive_mean(series["macd"], _ema_alpha(MACD_SIGNAL_PERIOD))
+
+    if n >= 2:
+        diff = np.diff(close)
+        series["avg_gain"][1:] = _recursive_mean(np.maximum(diff, 0.0), 1.0 / RSI_PERIOD)
+        series["avg_loss"][1:] = _recursive_mean(np.maximum(-diff, 0.0), 1.0 / RSI_PERIOD)
+        series["rsi"][1:] = _rsi_from_averages(series["avg_gain"][1:], series["avg_loss"][1:])
+
+    previous = np.concatenate(([close[0]], close[:-1]))
+    true_range = np.maximum(high - low, np.maximum(np.abs(high - previous), np.abs(low - previous)))
+    true_range[0] = high[0] - low[0]
+    series["atr"] = _recursive_mean(true_range, 1.0 / ATR_PERIOD)
+    return series
+
+
+def _format(values: Dict[str, float], bars: int, interval: str) -> dict:
+    """Latest indicator values as the API shape, hiding values still warming up"""
+
+    def ready(key: str, value: float) -> Optional[float]:
+        return float(value) if bars >= WARMUP[key] and np.isfinite(value) else None
+
+    macd, signal = ready("macd", values["macd"]), ready("signal", values["signal"])
+    middle = ready("bollinger", values["sma"])
+    return {
+        "interval": interval,
+        "bars": bars,
+        f"sma_{SMA_PERIOD}": ready("sma", values["sma"]),
+        f"ema_{EMA_FAST_PERIOD}": ready("ema_fast", values["ema_fast"]),
+        f"ema_{EMA_SLOW_PERIOD}": ready("ema_slow", values["ema_slow"]),
+        f"rsi_{RSI_PERIOD}": ready("rsi", values["rsi"]),
+        "macd": {
+            "macd": macd,
+            "signal": signal,
+            "histogram": macd - signal if macd is not None and signal is not None else None,
+        },
+        "bollinger": {
+            "upper": ready("bollinger", values["bb_upper"]),
+            "middle": middle,
+            "lower": ready("bollinger", values["bb_lower"]),
+        },
+        f"atr_{ATR_PERIOD}": ready("atr", values["atr"]),
+    }
+
+
+def compute_indicators(candles: List[dict], interval: str) -> dict:
+    """Latest indicator values over a list of candles (oldest first)"""
+    series = compute_series(
+        [candle["high"] for candle in candles],
+        [candle["low"] for candle in candles],
+        [candle["close"] for candle in candles],
+    )
+    latest = {key: values[-1] if len(values) else np.nan for key, values in series.items()}
+    return _format(latest, len(candles), interval)
+
+
+class IndicatorEngine:
+    _STATE_FIELDS = ("prev_close", "ema_fast", "ema_slow", "signal", "avg_gain", "avg_loss", "atr")
+
+    def __init__(self, interval: str, lookback_bars: int, capacity: int = 64):
+        self.interval = interval
+        self.lookback_bars = lookback_bars
+        self._slots: Dict[int, int] = {}
+        self._count = np.zeros(capacity, dtype=np.int64)
+        self._state = {field: np.zeros(capacity) for field in self._STATE_FIELDS}
+        self._window = np.zeros((capacity, _WINDOW))
+        self._latest: Dict[int, dict] = {}
+        self._lock = threading.Lock()
+        self.evaluations = 0
+
+    def _grow(self):
+        capacity = len(self._count) * 2
+        self._count = np.resize(self._count, capacity)
+        for field in self._STATE_FIELDS:
+            self._state[field] = np.resize(self._state[field], capacity)
+        window = np.zeros((capacity, _WINDOW))
+        window[:len(self._window)] = self._window
+        self._window = window
+
+    def _advance(self, slots: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray):
+        """One bar for many slots at once; returns (new state, new window, values) without storing"""
+        count = self._count[slots]
+        state = {field: self._state[field][slots] for field in self._STATE_FIELDS}
+        first = count == 0
+        previous = np.where(first, close, state["prev_close"])
+
+        ema_fast = np.where(first, close, state["ema_fast"] + _ema_alpha(EMA_FAST_PERIOD) * (close - state["ema_fast"]))
+        ema_slow = np.where(first, close, state["ema_slow"] + _ema_alpha(EMA_SLOW_PERIOD) * (close - state["ema_slow"]))
+        macd = ema_fast - ema_slow
+        signal = np.where(first, macd, state["signal"] + _ema_alpha(MACD_SIGNAL_PERIOD) * (macd - state["signal"]))
+
+        diff = close - previous
+        gain, loss = np.maximum(diff, 0.0), np.maximum(-diff, 0.0)
+        avg_gain = np.where(count == 1, gain, state["avg_gain"] + (gain - state["avg_gain"]) / RSI_PERIOD)
+        avg_loss = np.where(count == 1, loss, state["avg_loss"] + (loss - state["avg_loss"]) / RSI_PERIOD)
+        avg_gain, avg_loss = np.where(first, 0.0, avg_gain), np.where(first, 0.0, avg_loss)
+
+        true_range = np.maximum(high - low, np.maximum(np.abs(high - previous), np.abs(low - previous)))
+        true_range = np.where(first, high - low, true_range)
+        atr = np.where(first, true_range, state["atr"] + (true_range - state["atr"]) / ATR_PERIOD)
+
+        window = self._window[slots].copy()
+        window[np.arange(len(slots)), count % _WINDOW] = close
+        filled = np.minimum(count + 1, _WINDOW)
+        # Unfilled positions are zero; only read once the window is full
+        mean, std = window.mean(axis=1), window.std(axis=1)
+
+        new_state = {
+            "prev_close": close,
+            "ema_fast": ema_fast,
+            "ema_slow": ema_slow,
+            "signal": signal,
+            "avg_gain": avg_gain,
+            "avg_loss": avg_loss,
+            "atr": atr,
+        }
+        values = {
+            "sma": np.where(filled == _WINDOW, mean, np.nan),
+            "bb_upper": np.where(filled == _WINDOW, mean + BOLLINGER_STDDEV * std, np.nan),
+            "bb_lower": np.where(filled == _WINDOW, mean - BOLLINGER_STDDEV * std, np.nan),
+            "ema_fast": ema_fast,
+            "ema_slow": ema_slow,
+            "macd": macd,
+            "signal": signal,
+            "rsi": np.where(first, np.nan, _rsi_from_averages(avg_gain, avg_loss)),
+            "atr": atr,
+        }
+        return new_state, window, values
+
+    def _seed(self, stock_id: int, candles: List[dict]):
+        if len(self._slots) == len(self._count):
+            self._grow()
+        slot = len(self._slots)
+        self._slots[stock_id] = slot
+        n = len(candles)
+        self._count[slot] = n
+        self._window[slot] = 0.0
+        if n == 0:
+            return
+        close = np.array([candle["close"] for candle in candles], dtype=float)
+        series = compute_series([candle["high"] for candle in candles], [candle["low"] for candle in candles], close)
+        self._state["prev_close"][slot] = close[-1]
+        for field in ("ema_fast", "ema_slow", "signal", "avg_gain", "avg_loss", "atr"):
+            value = series[field][-1]
+            self._state[field][slot] = value if np.isfinite(value) else 0.0
+        # Ring positions follow the bar count so the next bar overwrites the oldest
+        recent = np.arange(max(0, n - _WINDOW), n)
+        self._window[slot, recent % _WINDOW] = close[recent]
+        self._latest[stock_id] = _format({key: values[-1] for key, values in series.items()}, n, self.interval)
+
+    def ensure_seeded(self, db: Session, stock_ids: Iterable[int]):
+        """Load closed-candle history for stocks not tracked yet (one query for all of them)"""
+        with self._lock:
+            missing = [stock_id for stock_id in stock_ids if stock_id not in self._slots]
+        if not missing:
+            return
+        start = datetime.now(timezone.utc) - timedelta(seconds=CANDLE_INTERVALS[self.interval] * self.lookback_bars)
+        history = load_closed_candles(db, missing, self.interval, start)
+        with self._lock:
+            for stock_id in missing:
+                if stock_id not in self._slots:
+                    self._seed(stock_id, history.get(stock_id, [])[-self.lookback_bars:])
+
+    def on_candle_closed(self, stock_id: int, interval: str, bucket_start: float, candle: dict):
+        """Candle aggregator listener: commit a closed bar to a tracked stock's state"""
+        if interval != self.interval:
+            return
+        with self._lock:
+            slot = self._slots.get(stock_id)
+            if slot is None:
+                return
+            slots = np.array([slot])
+            new_state, window, values = self._advance(
+                slots, np.array([candle["high"]]), np.array([candle["low"]]), np.array([candle["close"]])
+            )
+            for field, array in new_state.items():
+                self._state[field][slots] = array
+            self._window[slots] = window
+            self._count[slots] += 1
+            self._latest[stock_id] = _format(
+                {key: array[0] for key, array in values.items()}, int(self._count[slot]), self.interval
+            )
+
+    def evaluate(self, stock_ids: Iterable[int], prices: Optional[Dict[int, float]] = None) -> Dict[int, dict]:
+        """Vectorized pass over tracked stocks with the open candle (or latest price) as a provisional bar"""
+        prices = prices or {}
+        bars = {}
+        for stock_id in stock_ids:
+            candle = candle_aggregator.open_candle(stock_id, self.interval)
+            if candle is not None:
+                bars[stock_id] = (candle["high"], candle["low"], candle["close"])
+                continue
+            price = prices.get(stock_id)
+            if price is None:
+                entry = price_book.get_by_id(stock_id)
+                price = entry["price"] if entry else None
+            if price is not None:
+                bars[stock_id] = (price, price, price)
+
+        with self._lock:
+            tracked = [stock_id for stock_id in bars if stock_id in self._slots]
+            if tracked:
+                slots = np.array([self._slots[stock_id] for stock_id in tracked])
+                high, low, close = (np.array(column, dtype=float) for column in zip(*(bars[s] for s in tracked)))
+                _, _, values = self._advance(slots, high, low, close)
+                counts = self._count[slots] + 1
+                for i, stock_id in enumerate(tracked):
+                    self._latest[stock_id] = _format(
+                        {key: array[i] for key, array in values.items()}, int(counts[i]), self.interval
+                    )
+                self.evaluations += 1
+            return {stock_id: dict(self._latest[stock_id]) for stock_id in stock_ids if stock_id in self._latest}
+
+    def refresh(self, db: Session, prices: Dict[int, float]) -> Dict[int, dict]:
+        """Batch pass after a price refresh: seed new stocks, then evaluate all of them together"""
+        self.ensure_seeded(db, prices)
+        return self.evaluate(prices, prices)
+
+    def get(self, stock_id: int) -> Optional[dict]:
+        with self._lock:
+            latest = self._latest.get(stock_id)
+            return dict(latest) if latest is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._slots.clear()
+            self._latest.clear()
+            self._count[:] = 0
+
+    def stats(self) -> dict:
+        return {"interval": self.interval, "tracked": len(self._slots), "evaluations": self.evaluations}
+
+
+def get_stock_indicators(db: Session, stock_id: int, interval: Optional[str] = None) -> dict:
+    """Latest indicators for one stock; the engine's interval is served from its incremental state"""
+    interval = interval or indicator_engine.interval
+    if interval == indicator_engine.interval:
+        indicator_engine.ensure_seeded(db, [stock_id])
+        result = indicator_engine.evaluate([stock_id]).get(stock_id)
+        if result is not None:
+            return result
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(seconds=CANDLE_INTERVALS[interval] * indicator_engine.lookback_bars)
+    return compute_indicators(get_candles(db, stock_id, interval, start, end), interval)
+
+
+# Global engine fed by closed candles and run after each price refresh
+indicator_engine = IndicatorEngine(
+    interval=settings.INDICATOR_INTERVAL,
+    lookback_bars=settings.INDICATOR_LOOKBACK_BARS,
+)
+candle_aggregator.add_close_listener(indicator_engine.on_candle_closed)
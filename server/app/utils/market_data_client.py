@@ -0,0 +1,139 @@
+"""
+Async market data client
+Keeps a persistent, keep-alive connection pool to the quote provider so
+async endpoints do not pay a TLS handshake or hold a threadpool slot per quote
+"""
+
+import asyncio
+import importlib.util
+import time
+from typing import Dict, Optional
+
+import httpx
+
+from app.config import settings
+from app.utils.circuit_breaker import CircuitBreaker, market_data_breaker
+from app.utils.market_simulator import market_simulator, simulator_enabled
+
+FINNHUB_BASE_URL = "https://finnhub.io/api/v1"
+
+# Mock quote returned when no real API key is configured
+DEMO_QUOTE = {
+    "price": 150.25,
+    "change": 2.50,
+    "change_percent": 1.69
+}
+
+# HTTP/2 needs the optional h2 package; fall back to HTTP/1.1 keep-alive without it
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def parse_finnhub_quote(ticker_symbol: str, data) -> Optional[Dict[str, float]]:
+    """Convert a Finnhub /quote payload (c, d, dp) into our quote dict"""
+    if isinstance(data, dict) and 'c' in data and data['c'] is not None:
+        return {
+            "price": float(data['c']),           # Current price
+            "change": float(data['d']),          # Daily change
+            "change_percent": float(data['dp'])  # Daily change percent
+        }
+    print(f"Invalid data received for {ticker_symbol}: {data}")
+    return None
+
+
+def uses_local_quotes() -> bool:
+    """True when quotes are generated in process (simulator or demo key) instead of fetched from Finnhub"""
+    return simulator_enabled() or settings.FINNHUB_API_KEY == "demo"
+
+
+def local_quote(ticker_symbol: str) -> Optional[Dict[str, float]]:
+    """Quote served without calling Finnhub (simulator or demo key); None when the real provider is used"""
+    if simulator_enabled():
+        return parse_finnhub_quote(ticker_symbol, market_simulator.finnhub_quote(ticker_symbol))
+    if settings.FINNHUB_API_KEY == "demo":
+        return dict(DEMO_QUOTE)
+    return None
+
+
+class MarketDataClient:
+    def __init__(
+        self,
+        base_url: str = FINNHUB_BASE_URL,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 5.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.base_url = base_url
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._transport = transport
+        self.breaker = breaker
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the pooled client, creating it on the running event loop if needed"""
+        loop = asyncio.get_running_loop()
+        # Pooled connections are bound to the loop that opened them
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=HTTP2_AVAILABLE and self._transport is None,
+                limits=self.limits,
+                timeout=self.timeout,
+                transport=self._transport,
+            )
+            self._loop = loop
+        return self._client
+
+    async def fetch_quote(self, ticker_symbol: str) -> Optional[Dict[str, float]]:
+        """Fetch a real-time quote without blocking the event loop; None if it fails or the breaker is open"""
+        quote = local_quote(ticker_symbol)
+        if quote is not None:
+            return quote
+        if self.breaker is not None and not self.breaker.allow():
+            return None
+
+        started = time.monotonic()
+        quote = None
+        try:
+            response = await self._get_client().get(
+                "/quote",
+                params={"symbol": ticker_symbol, "token": settings.FINNHUB_API_KEY},
+            )
+            quote = parse_finnhub_quote(ticker_symbol, response.json())
+        except Exception as e:
+            print(f"Error fetching stock data for {ticker_symbol}: {e}")
+        finally:
+            if self.breaker is not None:
+                self.breaker.record(quote is not None, time.monotonic() - started)
+        return quote
+
+    async def aclose(self):
+        """Close pooled connections; called from the app lifespan on shutdown"""
+        if self._client is not None:
+            client, self._client, self._loop = self._client, None, None
+            try:
+                await client.aclose()
+            except RuntimeError:
+                # The loop that owned the pool is already gone
+                pass
+
+
+# Global async client shared by all async endpoints
+market_data_client = MarketDataClient(
+    base_url=settings.MARKET_DATA_BASE_URL,
+    max_connections=settings.MARKET_DATA_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.MARKET_DATA_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=settings.MARKET_DATA_KEEPALIVE_EXPIRY_SECONDS,
+    connect_timeout=settings.MARKET_DATA_CONNECT_TIMEOUT_SECONDS,
+    read_timeout=settings.MARKET_DATA_READ_TIMEOUT_SECONDS,
+    breaker=market_data_breaker,
+)
@@ -0,0 +1,181 @@
+"""
+Market overview snapshot
+Keeps the serialized market overview in memory and rebuilds it only when a
+price for one of its tickers changes (or a quote crosses the freshness
+threshold), so requests are answered without queries or upstream calls and
+clients can revalidate with ETag / Last-Modified. Prices come from the price
+book; only tickers it does not hold yet are read from the database, at
+rebuild time. The served (body, etag, last_modified) is one immutable tuple
+swapped in whole, so a request never mixes two snapshots.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.stock import Stock
+from app.models.transaction import Transaction
+from app.utils.price_book import is_stale, price_book
+from app.utils.stock_data import get_last_known_quotes
+
+
+def configured_tickers() -> List[str]:
+    return [ticker.strip().upper() for ticker in settings.MARKET_OVERVIEW_TICKERS.split(",") if ticker.strip()]
+
+
+class MarketOverviewSnapshot:
+    def __init__(self, universe_ttl_seconds: float, size: int, activity_days: int):
+        self.universe_ttl_seconds = universe_ttl_seconds
+        self.size = size
+        self.activity_days = activity_days
+        # (stock_id, ticker_symbol, company_name) rows of the overview, in display order
+        self._stocks: list = []
+        self._tickers = set()
+        self._universe_loaded_at: Optional[float] = None
+        self._dirty = True
+        self._stale_at: Optional[datetime] = None
+        self._snapshot: Tuple[bytes, Optional[str], Optional[datetime]] = (b"[]", None, None)
+        self.rebuilds = 0
+        self._lock = threading.Lock()
+
+    def on_price(self, ticker_symbol: str, entry: dict):
+        """Price book listener; only prices of overview tickers invalidate the snapshot"""
+        if ticker_symbol in self._tickers:
+            self._dirty = True
+
+    def _load_universe(self, db: Session) -> list:
+        """Configured tickers, or the most traded stocks when MARKET_OVERVIEW_TICKERS is empty"""
+        columns = (Stock.stock_id, Stock.ticker_symbol, Stock.company_name)
+        tickers = configured_tickers()
+        if tickers:
+            stocks = db.query(*columns).filter(Stock.ticker_symbol.in_(tickers)).all()
+            order = {ticker: i for i, ticker in enumerate(tickers)}
+            return sorted(stocks, key=lambda stock: order[stock.ticker_symbol.upper()])
+
+        since = datetime.now(timezone.utc) - timedelta(days=self.activity_days)
+        trade_count = func.count(Transaction.transaction_id)
+        stocks = (
+            db.query(*columns)
+            .join(Transaction, Transaction.stock_id == Stock.stock_id)
+            .filter(Transaction.transaction_date >= since)
+            .group_by(Stock.stock_id)
+            .order_by(trade_count.desc(), Stock.stock_id)
+            .limit(self.size)
+            .all()
+        )
+        if len(stocks) < self.size:
+            # Not enough recent trading yet; fill up with listed stocks
+            known = [stock.stock_id for stock in stocks]
+            stocks += (
+                db.query(*columns)
+                .filter(Stock.stock_id.notin_(known))
+                .order_by(Stock.stock_id)
+                .limit(self.size - len(stocks))
+                .all()
+            )
+        return stocks
+
+    def _needs_rebuild(self, now: float) -> bool:
+        return (
+            self._dirty
+            or self._universe_loaded_at is None
+            or now - self._universe_loaded_at >= self.universe_ttl_seconds
+            or (self._stale_at is not None and datetime.now(timezone.utc) >= self._stale_at)
+        )
+
+    def _rebuild(self, db: Session, now: float):
+        if self._universe_loaded_at is None or now - self._universe_loaded_at >= self.universe_ttl_seconds:
+            self._stocks = self._load_universe(db)
+            self._tickers = {stock.ticker_symbol.upper() for stock in self._stocks}
+            self._universe_loaded_at = now
+        self._dirty = False
+
+        quotes = self._quotes(db)
+        market_data = []
+        stale_at = None
+        for stock in self._stocks:
+            quote = quotes.get(stock.stock_id)
+            if quote is None:
+                # Delisted since the universe was loaded
+                continue
+            market_data.append({
+                "stock_id": stock.stock_id,
+                "ticker_symbol": stock.ticker_symbol,
+                "company_name": stock.company_name,
+                "current_price": quote["price"],
+                "change": quote["change"],
+                "change_percent": quote["change_percent"],
+                "last_updated": quote["last_updated"],
+                "is_stale": quote["is_stale"]
+            })
+            if not quote["is_stale"]:
+                last_updated = quote["last_updated"]
+                if last_updated.tzinfo is None:
+                    last_updated = last_updated.replace(tzinfo=timezone.utc)
+                expires = last_updated + timedelta(seconds=settings.PRICE_FRESHNESS_SECONDS)
+                stale_at = expires if stale_at is None else min(stale_at, expires)
+        self._stale_at = stale_at
+        self.rebuilds += 1
+
+        body = json.dumps(jsonable_encoder(market_data)).encode()
+        if body != self._snapshot[0] or self._snapshot[1] is None:
+            etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+            self._snapshot = (body, etag, datetime.now(timezone.utc).replace(microsecond=0))
+
+    def _quotes(self, db: Session) -> Dict[int, dict]:
+        """Current quotes from the price book; tickers it does not hold are read from the database"""
+        book = price_book.get_many(stock.ticker_symbol for stock in self._stocks)
+        quotes = {}
+        missing = []
+        for stock in self._stocks:
+            entry = book.get(stock.ticker_symbol.upper())
+            if entry is None:
+                missing.append(stock.stock_id)
+            else:
+                quotes[stock.stock_id] = dict(entry, is_stale=is_stale(entry["last_updated"]))
+        if missing:
+            rows = (
+                db.query(Stock.stock_id, Stock.ticker_symbol, Stock.current_price, Stock.last_updated)
+                .filter(Stock.stock_id.in_(missing))
+                .all()
+            )
+            quotes.update(get_last_known_quotes(rows))
+        return quotes
+
+    def get(self, db: Session) -> Tuple[bytes, Optional[str], Optional[datetime]]:
+        """Current (body, etag, last_modified), rebuilding first if anything changed"""
+        now = time.monotonic()
+        if self._needs_rebuild(now):
+            with self._lock:
+                if self._needs_rebuild(now):
+                    self._rebuild(db, now)
+        return self._snapshot
+
+    def tickers(self) -> List[str]:
+        return [stock.ticker_symbol for stock in self._stocks]
+
+    def reset(self):
+        with self._lock:
+            self._stocks = []
+            self._tickers = set()
+            self._universe_loaded_at = None
+            self._dirty = True
+            self._stale_at = None
+            self._snapshot = (b"[]", None, None)
+
+
+# Global snapshot invalidated by price book updates
+market_overview = MarketOverviewSnapshot(
+    universe_ttl_seconds=settings.MARKET_OVERVIEW_UNIVERSE_TTL_SECONDS,
+    size=settings.MARKET_OVERVIEW_SIZE,
+    activity_days=settings.MARKET_OVERVIEW_ACTIVITY_DAYS,
+)
+price_book.add_listener(market_overview.on_price)
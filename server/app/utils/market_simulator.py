@@ -0,0 +1,179 @@
+"""
+Simulated market data provider
+Correlated geometric Brownian motion price paths per ticker, served in the
+Finnhub formats (/quote payloads and trade stream messages) so quote
+fetching, streaming ingestion and everything downstream of the price book
+can be load tested offline at realistic update rates.
+
+Correlation uses a one-factor model: each ticker's shock is a mix of a shared
+market shock and its own noise, so every pair of tickers has correlation
+rho. Paths advance lazily in whole ticks of wall-clock time; a gap of many
+ticks is covered by a single draw, which has the same distribution as
+stepping through each tick.
+"""
+
+import asyncio
+import json
+import math
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.models.stock import Stock
+
+# Volatility and drift are annualized; time advances in trading seconds
+TRADING_SECONDS_PER_YEAR = 252 * 6.5 * 3600
+
+
+class MarketSimulator:
+    def __init__(
+        self,
+        volatility: float = 0.3,
+        drift: float = 0.05,
+        correlation: float = 0.5,
+        tick_interval_seconds: float = 0.1,
+        seed: Optional[int] = None,
+    ):
+        if not 0.0 <= correlation <= 1.0:
+            raise ValueError("correlation must be between 0 and 1")
+        self.volatility = volatility
+        self.drift = drift
+        self.correlation = correlation
+        self.tick_interval_seconds = tick_interval_seconds
+        self._rng = np.random.default_rng(seed)
+        self._slots: Dict[str, int] = {}
+        self._tickers: List[str] = []
+        self._prices = np.empty(0)
+        self._previous_close = np.empty(0)
+        self._volatility = np.empty(0)
+        self._clock = time.monotonic()
+        self._lock = threading.Lock()
+        self.ticks = 0
+
+    def add_ticker(self, ticker_symbol: str, price: Optional[float] = None, volatility: Optional[float] = None):
+        """Start (or restart) a ticker's path at the given price; unknown tickers get a stable pseudo-random one"""
+        ticker_symbol = ticker_symbol.upper()
+        if price is None:
+            price = 20.0 + zlib.crc32(ticker_symbol.encode()) % 48000 / 100.0
+        with self._lock:
+            self._add(ticker_symbol, float(price), self.volatility if volatility is None else volatility)
+
+    def _add(self, ticker_symbol: str, price: float, volatility: float):
+        slot = self._slots.get(ticker_symbol)
+        if slot is None:
+            slot = len(self._tickers)
+            self._slots[ticker_symbol] = slot
+            self._tickers.append(ticker_symbol)
+            self._prices = np.append(self._prices, price)
+            self._previous_close = np.append(self._previous_close, price)
+            self._volatility = np.append(self._volatility, volatility)
+        else:
+            self._prices[slot] = self._previous_close[slot] = price
+            self._volatility[slot] = volatility
+
+    def _step(self, ticks: int):
+        """Advance every path by a number of ticks with one correlated draw"""
+        if not ticks or not self._tickers:
+            return
+        dt = ticks * self.tick_interval_seconds / TRADING_SECONDS_PER_YEAR
+        market = self._rng.standard_normal()
+        own = self._rng.standard_normal(len(self._tickers))
+        shocks = math.sqrt(self.correlation) * market + math.sqrt(1.0 - self.correlation) * own
+        sigma = self._volatility
+        self._prices *= np.exp((self.drift - 0.5 * sigma ** 2) * dt + sigma * math.sqrt(dt) * shocks)
+        self.ticks += ticks
+
+    def step(self, ticks: int = 1) -> np.ndarray:
+        """Advance by a number of ticks regardless of the clock (offline recording); returns the prices"""
+        with self._lock:
+            self._step(ticks)
+            return self._prices.copy()
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """Catch the paths up with the wall clock; returns the number of ticks applied"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            ticks = int((now - self._clock) / self.tick_interval_seconds)
+            if ticks > 0:
+                self._step(ticks)
+                self._clock += ticks * self.tick_interval_seconds
+            return max(ticks, 0)
+
+    def finnhub_quote(self, ticker_symbol: str) -> dict:
+        """Current quote as a Finnhub /quote payload"""
+        ticker_symbol = ticker_symbol.upper()
+        if ticker_symbol not in self._slots:
+            self.add_ticker(ticker_symbol)
+        self.advance()
+        with self._lock:
+            slot = self._slots[ticker_symbol]
+            price = float(self._prices[slot])
+            previous_close = float(self._previous_close[slot])
+        change = price - previous_close
+        return {
+            "c": round(price, 4),
+            "d": round(change, 4),
+            "dp": round(change / previous_close * 100, 4),
+            "pc": round(previous_close, 4),
+            "t": int(time.time()),
+        }
+
+    def trade_message(self, tickers: Iterable[str], now: Optional[float] = None) -> str:
+        """Catch up with the clock and report a trade per ticker as a Finnhub trade stream message"""
+        tickers = [ticker.upper() for ticker in tickers]
+        for ticker in tickers:
+            if ticker not in self._slots:
+                self.add_ticker(ticker)
+        self.advance(now)
+        with self._lock:
+            prices = self._prices[[self._slots[ticker] for ticker in tickers]].tolist()
+            volumes = self._rng.integers(1, 500, len(tickers)).tolist()
+        now_ms = int(time.time() * 1000)
+        return json.dumps({
+            "type": "trade",
+            "data": [
+                {"s": ticker, "p": round(price, 4), "t": now_ms, "v": volume}
+                for ticker, price, volume in zip(tickers, prices, volumes)
+            ],
+        })
+
+    async def stream(self, tickers: Iterable[str]):
+        """Yield one trade message per tick, paced to the tick interval"""
+        tickers = list(tickers)
+        next_tick = time.monotonic()
+        while True:
+            yield self.trade_message(tickers)
+            next_tick += self.tick_interval_seconds
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+
+    def stats(self) -> dict:
+        return {"tickers": len(self._tickers), "ticks": self.ticks}
+
+
+def simulator_enabled() -> bool:
+    return settings.MARKET_DATA_PROVIDER == "simulator"
+
+
+def seed_simulator(session_factory):
+    """Start every listed stock's path at its stored price"""
+    db = session_factory()
+    try:
+        rows = db.query(Stock.ticker_symbol, Stock.current_price).all()
+    finally:
+        db.close()
+    for row in rows:
+        market_simulator.add_ticker(row.ticker_symbol, float(row.current_price or 0) or None)
+
+
+# Used instead of Finnhub when MARKET_DATA_PROVIDER=simulator
+market_simulator = MarketSimulator(
+    volatility=settings.SIMULATOR_VOLATILITY,
+    drift=settings.SIMULATOR_DRIFT,
+    correlation=settings.SIMULATOR_CORRELATION,
+    tick_interval_seconds=settings.SIMULATOR_TICK_INTERVAL_SECONDS,
+    seed=int(settings.SIMULATOR_SEED) if settings.SIMULATOR_SEED else None,
+)
@@ -0,0 +1,66 @@
+"""
+Money in integer minor units
+Balances, average costs and trade prices are stored as BIGINT counts of the
+currency's minor unit (cents, paise), so sums and products are exact
+integer arithmetic with no Numeric/Decimal/float round trips per row.
+Amounts are converted only at the edges: when a request amount or a market
+price (quotes stay decimal) comes in, and when a response goes out.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Optional, Union
+
+from sqlalchemy import Numeric, cast
+from sqlalchemy.ext.hybrid import hybrid_property
+
+MINOR_PER_UNIT = 100
+
+_UNIT = Decimal(MINOR_PER_UNIT)
+
+Amount = Union[Decimal, float, int, str]
+
+
+def to_minor(amount: Amount) -> int:
+    """Currency amount -> integer minor units, rounding half up"""
+    if isinstance(amount, int):
+        return amount * MINOR_PER_UNIT
+    # str() first so a float like 100.5 converts as written, not as its binary expansion
+    return int((Decimal(str(amount)) * _UNIT).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def from_minor(minor: int) -> Decimal:
+    """Integer minor units -> exact Decimal amount"""
+    return Decimal(minor).scaleb(-2)
+
+
+def minor_to_float(minor: Optional[int]) -> Optional[float]:
+    """For API responses, which carry amounts as JSON numbers"""
+    return minor / MINOR_PER_UNIT if minor is not None else None
+
+
+def divide_rounded(numerator: int, denominator: int) -> int:
+    """numerator / denominator rounded half up, for non-negative integers"""
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+def average_cost(held: int, held_cost: int, quantity: int, price: int) -> int:
+    """Average cost in minor units after buying quantity at price onto a position"""
+    return divide_rounded(held * held_cost + quantity * price, held + quantity)
+
+
+def major_amount(minor_attribute: str, precision: int = 15) -> hybrid_property:
+    """Decimal view of a minor-unit column, for code and fixtures written in currency units.
+
+    Assigning sets the integer column; in SQL it reads as a Numeric expression.
+    """
+    def fget(self):
+        minor = getattr(self, minor_attribute)
+        return from_minor(minor) if minor is not None else None
+
+    def fset(self, value):
+        setattr(self, minor_attribute, to_minor(value) if value is not None else None)
+
+    def expr(cls):
+        return cast(getattr(cls, minor_attribute), Numeric(precision, 2)) / MINOR_PER_UNIT
+
+    return hybrid_property(fget, fset, expr=expr)
@@ -0,0 +1,378 @@
+"""
+Limit and stop order book
+Resting orders live in the orders table and, per stock, in two in-memory
+heaps keyed by trigger price:
+
+- "below": fires when the price falls to or under the level (BUY LIMIT,
+  SELL STOP); a max-heap, so the highest level is checked first
+- "above": fires when the price rises to or over the level (SELL LIMIT,
+  BUY STOP); a min-heap
+
+A tick only peeks at the two heap tops, so it costs O(1) when nothing
+crosses and O(k log n) for k triggered orders, however many rest. Triggered
+orders are queued by the price book listener and filled in batches by a
+background loop through the trade path, at the tick price that crossed them.
+Cancelled orders are dropped lazily when they reach a heap top. Orders whose
+batch fails to execute are rested again after an exponential backoff and
+rejected after ORDER_MAX_ATTEMPTS failures.
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.order import Order
+from app.utils.money import minor_to_float
+from app.utils.portfolio_valuation import portfolio_valuations
+from app.utils.price_book import price_book
+from app.utils.trading import BEST_EFFORT, BUY, LegFill, fill_basket
+
+LIMIT = "LIMIT"
+STOP = "STOP"
+
+OPEN = "OPEN"
+FILLED = "FILLED"
+REJECTED = "REJECTED"
+CANCELLED = "CANCELLED"
+
+
+def fires_below(side: str, order_type: str) -> bool:
+    """True if the order triggers when the price falls to its level"""
+    return (side == BUY) == (order_type == LIMIT)
+
+
+class RestingOrder:
+    __slots__ = ("order_id", "user_id", "stock_id", "side", "order_type", "quantity", "trigger_price")
+
+    def __init__(self, order_id: int, user_id: int, stock_id: int, side: str, order_type: str,
+                 quantity: int, trigger_price: float):
+        self.order_id = order_id
+        self.user_id = user_id
+        self.stock_id = stock_id
+        self.side = side
+        self.order_type = order_type
+        self.quantity = quantity
+        self.trigger_price = float(trigger_price)
+
+    @classmethod
+    def from_row(cls, row) -> "RestingOrder":
+        return cls(row.order_id, row.user_id, row.stock_id, row.side, row.order_type, row.quantity,
+                   minor_to_float(row.trigger_price_minor))
+
+
+class OrderBook:
+    def __init__(
+        self,
+        match_interval_seconds: float = 0.25,
+        reload_interval_seconds: float = 60.0,
+        max_attempts: int = 5,
+        retry_base_delay_seconds: float = 1.0,
+        session_factory=SessionLocal,
+    ):
+        self.match_interval_seconds = match_interval_seconds
+        self.reload_interval_seconds = reload_interval_seconds
+        self.max_attempts = max_attempts
+        self.retry_base_delay_seconds = retry_base_delay_seconds
+        self.session_factory = session_factory
+        self._orders: Dict[int, RestingOrder] = {}
+        # stock_id -> heap of (-level, seq, order_id) / (level, seq, order_id)
+        self._below: Dict[int, list] = {}
+        self._above: Dict[int, list] = {}
+        self._seq = itertools.count()
+        # Heap entries of cancelled or reloaded-away orders still waiting to be dropped
+        self._stale = 0
+        # Triggered, not yet executed: order_id -> (order, tick price)
+        self._triggered: Dict[int, Tuple[RestingOrder, float]] = {}
+        # Failed executions: order_id -> attempts so far, and orders waiting out their backoff
+        self._attempts: Dict[int, int] = {}
+        self._retrying: Dict[int, Tuple[float, RestingOrder]] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._loaded_at = 0.0
+        self.ticks = 0
+        self.filled = 0
+        self.rejected = 0
+        self.failures = 0
+
+    def _push(self, order: RestingOrder):
+        if fires_below(order.side, order.order_type):
+            heap = self._below.setdefault(order.stock_id, [])
+            heapq.heappush(heap, (-order.trigger_price, next(self._seq), order.order_id))
+        else:
+            heap = self._above.setdefault(order.stock_id, [])
+            heapq.heappush(heap, (order.trigger_price, next(self._seq), order.order_id))
+
+    def add(self, order: RestingOrder):
+        """Rest an order; it triggers at once if the last known price already crosses it"""
+        with self._lock:
+            if order.order_id in self._orders or order.order_id in self._triggered:
+                return
+            self._orders[order.order_id] = order
+            self._push(order)
+        entry = price_book.get_by_id(order.stock_id)
+        if entry is not None:
+            self._queue(self.match(order.stock_id, entry["price"]), entry["price"])
+
+    def cancel(self, order_id: int) -> bool:
+        with self._lock:
+            self._attempts.pop(order_id, None)
+            if self._retrying.pop(order_id, None) is not None:
+                return True
+            if self._triggered.pop(order_id, None) is not None:
+                return True
+            if self._orders.pop(order_id, None) is None:
+                return False
+            self._stale += 1
+            if self._stale > 1024 and self._stale > len(self._orders):
+                self._rebuild()
+            return True
+
+    def _rebuild(self):
+        self._below.clear()
+        self._above.clear()
+        for order in self._orders.values():
+            self._push(order)
+        self._stale = 0
+
+    def _pop_crossed(self, heap: list, crossed, sign: float) -> List[RestingOrder]:
+        triggered = []
+        while heap and crossed(sign * heap[0][0]):
+            _, _, order_id = heapq.heappop(heap)
+            order = self._orders.pop(order_id, None)
+            if order is None:
+                self._stale = max(self._stale - 1, 0)
+                continue
+            triggered.append(order)
+        return triggered
+
+    def match(self, stock_id: int, price: float) -> List[RestingOrder]:
+        """Remove and return every resting order the price crosses"""
+        with self._lock:
+            self.ticks += 1
+            triggered = []
+            below = self._below.get(stock_id)
+            if below:
+                triggered += self._pop_crossed(below, lambda level: price <= level, -1)
+            above = self._above.get(stock_id)
+            if above:
+                triggered += self._pop_crossed(above, lambda level: price >= level, 1)
+            return triggered
+
+    def _queue(self, triggered: List[RestingOrder], price: float):
+        if not triggered:
+            return
+        with self._lock:
+            for order in triggered:
+                self._triggered[order.order_id] = (order, price)
+
+    def on_price(self, ticker_symbol: str, entry: dict):
+        """Price book listener; matching only, execution happens in the background loop"""
+        stock_id = price_book.stock_id_for(ticker_symbol)
+        if stock_id is None:
+            return
+        self._queue(self.match(stock_id, entry["price"]), entry["price"])
+
+    def load(self, db: Session):
+        """Replace the book with the open orders in the database"""
+        rows = db.execute(
+            select(Order.order_id, Order.user_id, Order.stock_id, Order.side, Order.order_type,
+                   Order.quantity, Order.trigger_price_minor)
+            .where(Order.status == OPEN)
+        ).all()
+        with self._lock:
+            self._orders = {
+                row.order_id: RestingOrder.from_row(row)
+                for row in rows
+                if row.order_id not in self._triggered and row.order_id not in self._retrying
+            }
+            self._rebuild()
+            self._loaded_at = time.monotonic()
+
+    def reload(self):
+        db = self.session_factory()
+        try:
+            self.load(db)
+        finally:
+            db.close()
+
+    def _take(self) -> Dict[int, Tuple[RestingOrder, float]]:
+        with self._lock:
+            triggered, self._triggered = self._triggered, {}
+        return triggered
+
+    def _execute_user(self, db: Session, user_id: int, batch: List[Tuple[RestingOrder, float]]) -> List[LegFill]:
+        # Claiming with a conditional UPDATE skips orders cancelled, or filled by another worker, meanwhile
+        claimed = set(db.execute(
+            update(Order)
+            .where(Order.order_id.in_([order.order_id for order, _ in batch]), Order.status == OPEN)
+            .values(status=FILLED)
+            .returning(Order.order_id)
+        ).scalars())
+        batch = [(order, price) for order, price in batch if order.order_id in claimed]
+        if not batch:
+            return []
+        result = fill_basket(
+            db, user_id,
+            [(order.stock_id, order.quantity, order.side) for order, _ in batch],
+            BEST_EFFORT,
+            fill_prices=[price for _, price in batch]
+        )
+        now = datetime.now(timezone.utc)
+        outcomes = []
+        for (order, _), fill in zip(batch, result.legs):
+            if fill.error is None:
+                outcomes.append({
+                    "order_id": order.order_id, "status": FILLED, "transaction_id": fill.transaction_id,
+                    "executed_price_minor": fill.price_minor, "executed_at": now
+                })
+            else:
+                outcomes.append({
+                    "order_id": order.order_id, "status": REJECTED, "reason": str(fill.error), "executed_at": now
+                })
+        db.execute(update(Order), outcomes)
+        filled = len(result.filled)
+        self.filled += filled
+        self.rejected += len(batch) - filled
+        with self._lock:
+            for order, _ in batch:
+                self._attempts.pop(order.order_id, None)
+        return result.filled
+
+    def _failed(self, db: Session, batch: List[Tuple[RestingOrder, float]]):
+        """Back off orders whose execution failed; reject the ones out of attempts"""
+        now = time.monotonic()
+        exhausted = []
+        with self._lock:
+            self.failures += 1
+            for order, _ in batch:
+                attempts = self._attempts.get(order.order_id, 0) + 1
+                if attempts >= self.max_attempts:
+                    self._attempts.pop(order.order_id, None)
+                    exhausted.append(order.order_id)
+                else:
+                    self._attempts[order.order_id] = attempts
+                    delay = self.retry_base_delay_seconds * 2 ** (attempts - 1)
+                    self._retrying[order.order_id] = (now + delay, order)
+        if not exhausted:
+            return
+        try:
+            db.execute(
+                update(Order)
+                .where(Order.order_id.in_(exhausted), Order.status == OPEN)
+                .values(status=REJECTED, reason=f"Execution failed {self.max_attempts} times",
+                        executed_at=datetime.now(timezone.utc))
+            )
+            db.commit()
+            self.rejected += len(exhausted)
+        except Exception as e:
+            db.rollback()
+            # Still open in the database; the next reload rests them again
+            print(f"Error rejecting orders {exhausted}: {e}")
+
+    def _rest_due_retries(self):
+        now = time.monotonic()
+        with self._lock:
+            due = [order for retry_at, order in self._retrying.values() if retry_at <= now]
+            for order in due:
+                del self._retrying[order.order_id]
+        for order in due:
+            self.add(order)
+
+    def execute_triggered(self) -> int:
+        """Fill queued orders, one transaction per user; returns how many were processed"""
+        self._rest_due_retries()
+        triggered = self._take()
+        if not triggered:
+            return 0
+        by_user: Dict[int, List[Tuple[RestingOrder, float]]] = {}
+        for order, price in triggered.values():
+            by_user.setdefault(order.user_id, []).append((order, price))
+
+        db = self.session_factory()
+        try:
+            for user_id, batch in by_user.items():
+                try:
+                    fills = self._execute_user(db, user_id, batch)
+                    db.commit()
+                    portfolio_valuations.apply_fills(user_id, fills)
+                except Exception as e:
+                    db.rollback()
+                    print(f"Error executing orders for user {user_id}: {e}")
+                    # Still open in the database; retried after a backoff, rejected once out of attempts
+                    self._failed(db, batch)
+        finally:
+            db.close()
+        return len(triggered)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.match_interval_seconds)
+            try:
+                if time.monotonic() - self._loaded_at > self.reload_interval_seconds:
+                    # Also picks up orders placed through other workers; a failed load waits a full interval
+                    self._loaded_at = time.monotonic()
+                    await asyncio.to_thread(self.reload)
+                await asyncio.to_thread(self.execute_triggered)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error running order book: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def clear(self):
+        with self._lock:
+            self._orders.clear()
+            self._below.clear()
+            self._above.clear()
+            self._triggered.clear()
+            self._attempts.clear()
+            self._retrying.clear()
+            self._stale = 0
+            self._loaded_at = 0.0
+            self.ticks = 0
+            self.filled = 0
+            self.rejected = 0
+            self.failures = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "resting": len(self._orders),
+                "triggered": len(self._triggered),
+                "retrying": len(self._retrying),
+                "ticks": self.ticks,
+                "filled": self.filled,
+                "rejected": self.rejected,
+                "failures": self.failures,
+            }
+
+
+# Global order book fed by every price book update
+order_book = OrderBook(
+    match_interval_seconds=settings.ORDER_MATCH_INTERVAL_SECONDS,
+    reload_interval_seconds=settings.ORDER_BOOK_RELOAD_SECONDS,
+    max_attempts=settings.ORDER_MAX_ATTEMPTS,
+    retry_base_delay_seconds=settings.ORDER_RETRY_BASE_DELAY_SECONDS,
+)
+price_book.add_listener(order_book.on_price)
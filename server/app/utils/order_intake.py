@@ -0,0 +1,313 @@
+"""
+Asynchronous order intake
+With TRADE_INTAKE_MODE=async the trade endpoints only validate an order,
+queue it and hand back an order ID. Writer tasks apply the queue: a user
+always maps to the same shard, so one user's orders are applied in arrival
+order while different shards write in parallel. Each writer drains
+whatever queued up during its previous write (up to ORDER_INTAKE_MAX_BATCH)
+and commits it in one transaction (group commit), recording every order in
+the orders table under its intake ID. Clients poll the order, optionally
+waiting for the outcome.
+"""
+
+import asyncio
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.order import Order
+from app.utils.money import minor_to_float
+from app.utils.portfolio_valuation import portfolio_valuations
+from app.utils.trading import BEST_EFFORT, BUY, SELL, LegFill, StockNotFound, TradeError, fill_basket
+
+MARKET = "MARKET"
+
+QUEUED = "QUEUED"
+FILLED = "FILLED"
+REJECTED = "REJECTED"
+
+NOT_PROCESSED = "Order could not be processed"
+SHUT_DOWN = "Order intake shut down before execution"
+
+
+class IntakeUnavailable(Exception):
+    """The intake is not running or its queue is full; the client should retry later"""
+
+
+class PendingOrder:
+    __slots__ = (
+        "intake_id", "user_id", "stock_id", "quantity", "side", "status", "reason",
+        "transaction_id", "executed_price", "done"
+    )
+
+    def __init__(self, user_id: int, stock_id: int, quantity: int, side: str):
+        self.intake_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.stock_id = stock_id
+        self.quantity = quantity
+        self.side = side
+        self.status = QUEUED
+        self.reason: Optional[str] = None
+        self.transaction_id: Optional[int] = None
+        self.executed_price: Optional[float] = None
+        self.done = asyncio.Event()
+
+    def to_dict(self) -> dict:
+        return {
+            "order_id": self.intake_id,
+            "stock_id": self.stock_id,
+            "side": self.side,
+            "quantity": self.quantity,
+            "status": self.status,
+            "reason": self.reason,
+            "transaction_id": self.transaction_id,
+            "executed_price": self.executed_price,
+        }
+
+
+def _by_user(orders: List[PendingOrder]) -> Dict[int, List[PendingOrder]]:
+    """Orders grouped per user, in ascending user_id so every batch takes its row locks in the same order"""
+    grouped: Dict[int, List[PendingOrder]] = {}
+    for order in orders:
+        grouped.setdefault(order.user_id, []).append(order)
+    return dict(sorted(grouped.items()))
+
+
+class OrderIntake:
+    def __init__(
+        self,
+        shards: int = 4,
+        max_batch: int = 200,
+        max_pending: int = 10000,
+        results_kept: int = 10000,
+        session_factory=SessionLocal,
+    ):
+        self.shards = shards
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.results_kept = results_kept
+        self.session_factory = session_factory
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        # intake_id -> order, oldest first; finished orders beyond results_kept are forgotten
+        self._orders: "OrderedDict[str, PendingOrder]" = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.orders_written = 0
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    def submit(self, user_id: int, stock_id: int, quantity: int, side: str) -> PendingOrder:
+        """Validate and queue an order; safe to call from any thread"""
+        if side not in (BUY, SELL):
+            raise TradeError(f"Unknown trade side {side}")
+        if quantity <= 0:
+            raise TradeError("Quantity must be positive")
+        loop = self._loop
+        if loop is None:
+            raise IntakeUnavailable("Order intake is not running")
+        order = PendingOrder(user_id, stock_id, quantity, side)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise IntakeUnavailable("Too many orders queued")
+            self._pending += 1
+            self._orders[order.intake_id] = order
+            self._forget_finished()
+        loop.call_soon_threadsafe(self._queues[user_id % len(self._queues)].put_nowait, order)
+        return order
+
+    def _forget_finished(self):
+        # Their outcome stays in the orders table
+        while len(self._orders) > self.results_kept:
+            intake_id, oldest = next(iter(self._orders.items()))
+            if oldest.status == QUEUED:
+                break
+            del self._orders[intake_id]
+
+    def get(self, intake_id: str) -> Optional[PendingOrder]:
+        with self._lock:
+            return self._orders.get(intake_id)
+
+    async def wait(self, order: PendingOrder, timeout: float) -> PendingOrder:
+        """Wait up to timeout seconds for the order to be applied"""
+        try:
+            await asyncio.wait_for(order.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return order
+
+    def _apply(self, db: Session, orders: List[PendingOrder]) -> List[Tuple[PendingOrder, LegFill]]:
+        outcomes = []
+        for user_id, user_orders in _by_user(orders).items():
+            result = fill_basket(
+                db, user_id, [(order.stock_id, order.quantity, order.side) for order in user_orders], BEST_EFFORT
+            )
+            outcomes += zip(user_orders, result.legs)
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                "intake_id": order.intake_id, "user_id": order.user_id, "stock_id": order.stock_id,
+                "side": order.side, "order_type": MARKET, "quantity": order.quantity,
+                "status": FILLED if fill.error is None else REJECTED,
+                "reason": str(fill.error) if fill.error is not None else None,
+                "transaction_id": fill.transaction_id, "executed_price_minor": fill.price_minor, "executed_at": now,
+            }
+            for order, fill in outcomes
+            # An unknown stock_id cannot be stored; the routes check the stock exists before queueing,
+            # so this only happens when it was deleted in between and the rejection stays in memory
+            if not isinstance(fill.error, StockNotFound)
+        ]
+        if rows:
+            db.execute(insert(Order), rows)
+        return outcomes
+
+    def _write(self, batch: List[PendingOrder]) -> List[Tuple[PendingOrder, Optional[LegFill]]]:
+        db = self.session_factory()
+        try:
+            try:
+                outcomes = self._apply(db, batch)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                # One failing user must not take everyone else's orders down with it
+                print(f"Error committing order batch, retrying per user: {e}")
+                outcomes = []
+                for user_orders in _by_user(batch).values():
+                    try:
+                        user_outcomes = self._apply(db, user_orders)
+                        db.commit()
+                        outcomes += user_outcomes
+                    except Exception as e:
+                        db.rollback()
+                        print(f"Error applying orders for user {user_orders[0].user_id}: {e}")
+                        # Recorded as rejected, so polling the orders does not 404
+                        self._write_rejections(user_orders, NOT_PROCESSED)
+                        outcomes += [(order, None) for order in user_orders]
+        finally:
+            db.close()
+        return outcomes
+
+    def _finish(self, outcomes: List[Tuple[PendingOrder, Optional[LegFill]]]):
+        # Each user's fills came from one basket, so they reach the valuation cache together
+        fills: Dict[int, List[LegFill]] = {}
+        for order, fill in outcomes:
+            if fill is None:
+                order.status, order.reason = REJECTED, NOT_PROCESSED
+            elif fill.error is not None:
+                order.status, order.reason = REJECTED, str(fill.error)
+            else:
+                order.status = FILLED
+                order.transaction_id = fill.transaction_id
+                order.executed_price = minor_to_float(fill.price_minor)
+                fills.setdefault(order.user_id, []).append(fill)
+        for user_id, user_fills in fills.items():
+            portfolio_valuations.apply_fills(user_id, user_fills)
+        for order, _ in outcomes:
+            order.done.set()
+
+    async def _writer(self, queue: asyncio.Queue):
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.max_batch and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                outcomes = await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                print(f"Error writing order batch: {e}")
+                outcomes = [(order, None) for order in batch]
+            self._finish(outcomes)
+            self.batches += 1
+            self.orders_written += len(batch)
+            with self._lock:
+                self._pending -= len(batch)
+            for _ in batch:
+                queue.task_done()
+
+    def start(self):
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queues = [asyncio.Queue() for _ in range(self.shards)]
+        self._tasks = [asyncio.create_task(self._writer(queue)) for queue in self._queues]
+
+    def _write_rejections(self, orders: List[PendingOrder], reason: str):
+        now = datetime.now(timezone.utc)
+        db = self.session_factory()
+        try:
+            db.execute(insert(Order), [
+                {
+                    "intake_id": order.intake_id, "user_id": order.user_id, "stock_id": order.stock_id,
+                    "side": order.side, "order_type": MARKET, "quantity": order.quantity,
+                    "status": REJECTED, "reason": reason, "executed_at": now,
+                }
+                for order in orders
+            ])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Error recording rejected orders: {e}")
+        finally:
+            db.close()
+
+    async def stop(self, timeout: float = 5.0):
+        """Stop taking orders, give the writers timeout seconds to drain, then cancel them"""
+        if self._loop is None:
+            return
+        self._loop = None
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues)), timeout)
+        except asyncio.TimeoutError:
+            print("Order intake stopped with orders still queued")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # Orders no writer picked up are rejected in the orders table, so polling them does not 404
+        dropped = []
+        for queue in self._queues:
+            while not queue.empty():
+                order = queue.get_nowait()
+                order.status, order.reason = REJECTED, SHUT_DOWN
+                order.done.set()
+                dropped.append(order)
+        if dropped:
+            await asyncio.to_thread(self._write_rejections, dropped, SHUT_DOWN)
+            with self._lock:
+                self._pending -= len(dropped)
+
+    def clear(self):
+        with self._lock:
+            self._orders.clear()
+            self.batches = 0
+            self.orders_written = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "running": self.running,
+                "shards": self.shards,
+                "queued": self._pending,
+                "batches": self.batches,
+                "orders_written": self.orders_written,
+            }
+
+
+# Global intake used by the trade endpoints when TRADE_INTAKE_MODE=async
+order_intake = OrderIntake(
+    shards=settings.ORDER_INTAKE_SHARDS,
+    max_batch=settings.ORDER_INTAKE_MAX_BATCH,
+    max_pending=settings.ORDER_INTAKE_MAX_PENDING,
+    results_kept=settings.ORDER_INTAKE_RESULTS_KEPT,
+)
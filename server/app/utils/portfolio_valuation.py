@@ -0,0 +1,365 @@
+"""
+Portfolio valuation cache
+Keeps each active user's portfolio valued in memory: per-holding rows plus
+invested value and current value totals in integer minor units. Nothing is
+recomputed on read. Fills update the affected position by delta, and a price
+tick reaches only the users holding that stock through a reverse index
+stock_id -> user_ids, so a tick costs O(holders of the stock).
+
+A user's valuation is loaded with one holdings/stocks join on first read.
+Every read first checks the user's trade version (funds.trade_version, which
+every trade bumps in its own transaction; one unique-key lookup) against the
+one the valuation was built from, so a fill committed by another worker is
+picked up on the next read;
+PORTFOLIO_CACHE_TTL_SECONDS only bounds how long an idle valuation is kept.
+Fills that open a position the cache does not know yet drop the user's
+valuation instead, so the next read loads the new holding row.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.fund import Fund
+from app.models.holding import Holding
+from app.models.stock import Stock
+from app.utils.money import average_cost, minor_to_float, to_minor
+from app.utils.price_book import is_stale, price_book
+from app.utils.stock_data import get_last_known_quotes
+from app.utils.trading import BUY
+
+
+def held_stocks(db: Session, user_id: int) -> list:
+    """The user's holdings joined with their stocks, in one query"""
+    return (
+        db.query(
+            Holding.holding_id,
+            Holding.stock_id,
+            Holding.quantity,
+            Holding.average_cost_minor,
+            Stock.ticker_symbol,
+            Stock.company_name,
+            Stock.current_price,
+            Stock.last_updated
+        )
+        .join(Stock, Holding.stock_id == Stock.stock_id)
+        .filter(Holding.user_id == user_id)
+        .order_by(Holding.holding_id)
+        .all()
+    )
+
+
+def trade_version(db: Session, user_id: int) -> int:
+    """The user's funds.trade_version; changes with every trade"""
+    return db.query(Fund.trade_version).filter(Fund.user_id == user_id).scalar() or 0
+
+
+def _utc(ts: Optional[datetime]) -> Optional[datetime]:
+    # SQLite returns naive timestamps; they are stored in UTC
+    return ts.replace(tzinfo=timezone.utc) if ts is not None and ts.tzinfo is None else ts
+
+
+class Position:
+    __slots__ = (
+        "holding_id", "stock_id", "ticker_symbol", "company_name", "quantity", "average_cost_minor",
+        "price", "price_minor", "change", "change_percent", "last_updated"
+    )
+
+    def __init__(self, row, quote: dict):
+        self.holding_id = row.holding_id
+        self.stock_id = row.stock_id
+        self.ticker_symbol = row.ticker_symbol.upper()
+        self.company_name = row.company_name
+        self.quantity = row.quantity
+        self.average_cost_minor = row.average_cost_minor
+        self.set_quote(quote)
+
+    def set_quote(self, quote: dict):
+        self.price = quote["price"]
+        self.price_minor = to_minor(quote["price"])
+        self.change = quote["change"]
+        self.change_percent = quote["change_percent"]
+        self.last_updated = _utc(quote["last_updated"])
+
+    @property
+    def invested_minor(self) -> int:
+        return self.quantity * self.average_cost_minor
+
+    @property
+    def value_minor(self) -> int:
+        return self.quantity * self.price_minor
+
+    def to_dict(self) -> dict:
+        invested, value = self.invested_minor, self.value_minor
+        return {
+            "holding_id": self.holding_id,
+            "stock_id": self.stock_id,
+            "ticker_symbol": self.ticker_symbol,
+            "company_name": self.company_name,
+            "quantity": self.quantity,
+            "average_cost": minor_to_float(self.average_cost_minor),
+            "current_price": self.price,
+            "invested_value": minor_to_float(invested),
+            "current_value": minor_to_float(value),
+            "pnl": minor_to_float(value - invested),
+            "pnl_percent": ((value - invested) / invested * 100) if invested > 0 else 0.0,
+            "change": self.change,
+            "change_percent": self.change_percent,
+            "last_updated": self.last_updated,
+            "is_stale": is_stale(self.last_updated),
+        }
+
+
+class Valuation:
+    __slots__ = ("positions", "invested_minor", "current_minor", "loaded_at", "version")
+
+    def __init__(self, positions: List[Position], loaded_at: float, version: int = 0):
+        # stock_id -> position, in holding order
+        self.positions: Dict[int, Position] = {position.stock_id: position for position in positions}
+        self.invested_minor = sum(position.invested_minor for position in positions)
+        self.current_minor = sum(position.value_minor for position in positions)
+        self.loaded_at = loaded_at
+        # trade_version() the positions reflect, advanced by applied fills
+        self.version = version
+
+    def to_dict(self) -> dict:
+        """The /api/portfolio/current-value body"""
+        profit_loss = self.current_minor - self.invested_minor
+        return {
+            "invested_value": minor_to_float(self.invested_minor),
+            "current_value": minor_to_float(self.current_minor),
+            "profit_loss": minor_to_float(profit_loss),
+            "profit_loss_percentage": (
+                (profit_loss / self.invested_minor * 100) if self.invested_minor > 0 else 0.0
+            ),
+            "holdings": [position.to_dict() for position in self.positions.values()],
+        }
+
+
+class PortfolioValuations:
+    def __init__(self, max_users: int = 10000, ttl_seconds: float = 60, enabled: bool = True):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._valuations: "OrderedDict[int, Valuation]" = OrderedDict()
+        # stock_id -> users whose cached valuation holds it
+        self._holders: Dict[int, Set[int]] = {}
+        # Tickers seen in loaded valuations, for ticks the price book cannot map to a stock_id
+        self._stock_ids: Dict[str, int] = {}
+        # Loads in progress per user, and users that traded while one was running
+        self._loading: Dict[int, int] = {}
+        self._traded_while_loading: Set[int] = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.stale = 0
+        self.ticks = 0
+        self.revalued = 0
+        self.fills = 0
+
+    def _load(self, db: Session, user_id: int) -> Valuation:
+        # Read before the holdings: a fill landing in between only makes the next check reload
+        version = trade_version(db, user_id)
+        rows = held_stocks(db, user_id)
+        quotes = get_last_known_quotes(rows)
+        return Valuation([Position(row, quotes[row.stock_id]) for row in rows], time.monotonic(), version)
+
+    def _catch_up(self, valuation: Valuation):
+        # Ticks published while the valuation was loading missed the reverse index
+        book = price_book.get_many(position.ticker_symbol for position in valuation.positions.values())
+        for position in valuation.positions.values():
+            entry = book.get(position.ticker_symbol)
+            if entry is not None and (
+                position.last_updated is None or _utc(entry["last_updated"]) > position.last_updated
+            ):
+                self._reprice(valuation, position, entry)
+
+    def _store(self, user_id: int, valuation: Valuation):
+        self._drop(user_id)
+        self._catch_up(valuation)
+        self._valuations[user_id] = valuation
+        for position in valuation.positions.values():
+            self._holders.setdefault(position.stock_id, set()).add(user_id)
+            self._stock_ids[position.ticker_symbol] = position.stock_id
+        while len(self._valuations) > self.max_users:
+            self._drop(next(iter(self._valuations)))
+
+    def _drop(self, user_id: int):
+        valuation = self._valuations.pop(user_id, None)
+        if valuation is None:
+            return
+        for stock_id in valuation.positions:
+            holders = self._holders.get(stock_id)
+            if holders is not None:
+                holders.discard(user_id)
+                if not holders:
+                    del self._holders[stock_id]
+
+    def _unexpired(self, user_id: int) -> Optional[Valuation]:
+        valuation = self._valuations.get(user_id)
+        if valuation is None or time.monotonic() - valuation.loaded_at >= self.ttl_seconds:
+            return None
+        return valuation
+
+    def _read(self, db: Session, user_id: int, render):
+        if not self.enabled:
+            return render(self._load(db, user_id))
+        with self._lock:
+            cached = self._unexpired(user_id)
+        if cached is not None:
+            version = trade_version(db, user_id)
+            with self._lock:
+                if self._valuations.get(user_id) is cached and cached.version == version:
+                    self._valuations.move_to_end(user_id)
+                    self.hits += 1
+                    return render(cached)
+                # Traded through another worker (or mid-way through a local fill); reload
+                self.stale += 1
+        with self._lock:
+            self._loading[user_id] = self._loading.get(user_id, 0) + 1
+        try:
+            valuation = self._load(db, user_id)
+        except BaseException:
+            with self._lock:
+                self._finish_load(user_id)
+            raise
+        with self._lock:
+            self.loads += 1
+            # A fill committed during the load may be missing from it; serve it once, do not keep it
+            if self._finish_load(user_id):
+                self._store(user_id, valuation)
+            return render(valuation)
+
+    def _finish_load(self, user_id: int) -> bool:
+        """End a load; False if the user traded while it ran"""
+        self._loading[user_id] -= 1
+        clean = user_id not in self._traded_while_loading
+        if not self._loading[user_id]:
+            del self._loading[user_id]
+            self._traded_while_loading.discard(user_id)
+        return clean
+
+    def current_value(self, db: Session, user_id: int) -> dict:
+        """The user's totals and per-holding rows"""
+        return self._read(db, user_id, Valuation.to_dict)
+
+    def holdings(self, db: Session, user_id: int) -> List[dict]:
+        return self._read(db, user_id, lambda valuation: [p.to_dict() for p in valuation.positions.values()])
+
+    def holding(self, db: Session, user_id: int, stock_id: int) -> Optional[dict]:
+        def render(valuation: Valuation) -> Optional[dict]:
+            position = valuation.positions.get(stock_id)
+            return position.to_dict() if position is not None else None
+        return self._read(db, user_id, render)
+
+    @staticmethod
+    def _reprice(valuation: Valuation, position: Position, entry: dict):
+        before = position.value_minor
+        position.set_quote(entry)
+        valuation.current_minor += position.value_minor - before
+
+    def on_price(self, ticker_symbol: str, entry: dict):
+        """Price book listener; revalues the positions of the stock's holders only"""
+        with self._lock:
+            stock_id = price_book.stock_id_for(ticker_symbol) or self._stock_ids.get(ticker_symbol)
+            holders = self._holders.get(stock_id)
+            if not holders:
+                return
+            self.ticks += 1
+            self.revalued += len(holders)
+            for user_id in holders:
+                valuation = self._valuations[user_id]
+                self._reprice(valuation, valuation.positions[stock_id], entry)
+
+    def apply_fills(self, user_id: int, fills: Iterable):
+        """Apply the committed fills (TradeResult or filled LegFill) of one trade or basket"""
+        fills = list(fills)
+        with self._lock:
+            if user_id in self._loading:
+                self._traded_while_loading.add(user_id)
+            valuation = self._valuations.get(user_id)
+            if valuation is None or not fills:
+                return
+            version = fills[0].version
+            if version <= valuation.version:
+                # Committed before the valuation was loaded, so already part of it
+                return
+            if version != valuation.version + 1:
+                # Another worker traded in between; its fills come with the next load
+                self._drop(user_id)
+                return
+            valuation.version = version
+            for fill in fills:
+                self.fills += 1
+                position = valuation.positions.get(fill.stock_id)
+                if position is None:
+                    # New position: its holding row and stock details come with the next load
+                    self._drop(user_id)
+                    return
+                held, cost = position.quantity, position.average_cost_minor
+                if fill.side == BUY:
+                    quantity = held + fill.quantity
+                    cost = average_cost(held, cost, fill.quantity, fill.price_minor)
+                else:
+                    quantity = held - fill.quantity
+                    if quantity < 0:
+                        # Out of step with the database (changed by another worker); reload
+                        self._drop(user_id)
+                        return
+                valuation.invested_minor += quantity * cost - position.invested_minor
+                valuation.current_minor += (quantity - held) * position.price_minor
+                position.quantity, position.average_cost_minor = quantity, cost
+                if quantity == 0:
+                    del valuation.positions[fill.stock_id]
+                    holders = self._holders[fill.stock_id]
+                    holders.discard(user_id)
+                    if not holders:
+                        del self._holders[fill.stock_id]
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            if user_id in self._loading:
+                self._traded_while_loading.add(user_id)
+            self._drop(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._valuations.clear()
+            self._holders.clear()
+            self._stock_ids.clear()
+            self._loading.clear()
+            self._traded_while_loading.clear()
+            self.hits = 0
+            self.loads = 0
+            self.stale = 0
+            self.ticks = 0
+            self.revalued = 0
+            self.fills = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "users": len(self._valuations),
+                "stocks_held": len(self._holders),
+                "hits": self.hits,
+                "loads": self.loads,
+                "stale": self.stale,
+                "ticks": self.ticks,
+                "revalued": self.revalued,
+                "fills": self.fills,
+            }
+
+
+# Global cache kept current by fills and price book updates
+portfolio_valuations = PortfolioValuations(
+    max_users=settings.PORTFOLIO_CACHE_MAX_USERS,
+    ttl_seconds=settings.PORTFOLIO_CACHE_TTL_SECONDS,
+    enabled=settings.PORTFOLIO_CACHE_ENABLED,
+)
+price_book.add_listener(portfolio_valuations.on_price)
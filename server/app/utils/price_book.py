@@ -0,0 +1,142 @@
+"""
+In-memory price book
+Holds the last known quote for every ticker so read endpoints can answer
+from memory instead of calling the market data provider inline
+"""
+
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+from app.config import settings
+
+
+def is_stale(last_updated: Optional[datetime], now: Optional[datetime] = None) -> bool:
+    """True if a price is older than PRICE_FRESHNESS_SECONDS (or has no timestamp)"""
+    if last_updated is None:
+        return True
+    if last_updated.tzinfo is None:
+        # SQLite returns naive timestamps; they are stored in UTC
+        last_updated = last_updated.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return (now - last_updated).total_seconds() > settings.PRICE_FRESHNESS_SECONDS
+
+
+class PriceBook:
+    def __init__(self):
+        self._quotes: Dict[str, dict] = {}
+        self._tickers_by_id: Dict[int, str] = {}
+        self._ids_by_ticker: Dict[str, int] = {}
+        self._listeners: List[Callable[[str, dict], None]] = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: Callable[[str, dict], None]):
+        """Call listener(ticker_symbol, entry) after every price update"""
+        self._listeners.append(listener)
+
+    def _notify(self, ticker_symbol: str, entry: dict):
+        for listener in self._listeners:
+            try:
+                listener(ticker_symbol, dict(entry))
+            except Exception as e:
+                print(f"Error in price book listener: {e}")
+
+    def register(self, stock_id: int, ticker_symbol: str):
+        """Map a stock_id to its ticker so entries can be looked up by either key"""
+        ticker_symbol = ticker_symbol.upper()
+        with self._lock:
+            self._tickers_by_id[stock_id] = ticker_symbol
+            self._ids_by_ticker[ticker_symbol] = stock_id
+
+    def update(
+        self,
+        ticker_symbol: str,
+        quote: Dict[str, float],
+        last_updated: Optional[datetime] = None,
+        stock_id: Optional[int] = None,
+    ):
+        """Record the latest quote for a ticker"""
+        ticker_symbol = ticker_symbol.upper()
+        price = quote["price"]
+        change = quote.get("change", 0.0)
+        entry = {
+            "price": price,
+            "change": change,
+            "change_percent": quote.get("change_percent", 0.0),
+            "previous_close": price - change,
+            "last_updated": last_updated or datetime.now(timezone.utc),
+        }
+        with self._lock:
+            self._quotes[ticker_symbol] = entry
+            if stock_id is not None:
+                self._tickers_by_id[stock_id] = ticker_symbol
+                self._ids_by_ticker[ticker_symbol] = stock_id
+        self._notify(ticker_symbol, entry)
+
+    def update_trade(
+        self,
+        ticker_symbol: str,
+        price: float,
+        traded_at: Optional[datetime] = None,
+        volume: Optional[int] = None,
+    ) -> dict:
+        """Record a streamed trade, deriving change from the last known previous close
+
+        volume is passed on to listeners with this tick but not kept in the book.
+        """
+        ticker_symbol = ticker_symbol.upper()
+        traded_at = traded_at or datetime.now(timezone.utc)
+        with self._lock:
+            current = self._quotes.get(ticker_symbol)
+            if current is not None and current["last_updated"] > traded_at:
+                # Out-of-order trade; keep the newer price
+                return dict(current)
+            previous_close = current["previous_close"] if current else price
+            change = price - previous_close
+            entry = {
+                "price": price,
+                "change": change,
+                "change_percent": (change / previous_close * 100) if previous_close else 0.0,
+                "previous_close": previous_close,
+                "last_updated": traded_at,
+            }
+            self._quotes[ticker_symbol] = entry
+        self._notify(ticker_symbol, dict(entry, volume=volume) if volume else entry)
+        return dict(entry)
+
+    def get(self, ticker_symbol: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._quotes.get(ticker_symbol.upper())
+            return dict(entry) if entry is not None else None
+
+    def get_by_id(self, stock_id: int) -> Optional[dict]:
+        with self._lock:
+            ticker_symbol = self._tickers_by_id.get(stock_id)
+            entry = self._quotes.get(ticker_symbol) if ticker_symbol else None
+            return dict(entry) if entry is not None else None
+
+    def stock_id_for(self, ticker_symbol: str) -> Optional[int]:
+        with self._lock:
+            return self._ids_by_ticker.get(ticker_symbol.upper())
+
+    def get_many(self, ticker_symbols: Iterable[str]) -> Dict[str, dict]:
+        """Return the known quotes for the given tickers, skipping unknown ones"""
+        with self._lock:
+            return {
+                ticker.upper(): dict(self._quotes[ticker.upper()])
+                for ticker in ticker_symbols
+                if ticker.upper() in self._quotes
+            }
+
+    def clear(self):
+        with self._lock:
+            self._quotes.clear()
+            self._tickers_by_id.clear()
+            self._ids_by_ticker.clear()
+
+    def __len__(self):
+        return len(self._quotes)
+
+
+# Global price book shared by the refresher and read endpoints
+price_book = PriceBook()
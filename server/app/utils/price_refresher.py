@@ -0,0 +1,166 @@
+"""
+Background price refresher
+Runs inside the app (started from the FastAPI lifespan) and keeps the price
+book and stocks table current, so read endpoints never call the provider inline.
+Tickers requested recently are "hot" and refreshed more often than the rest
+of the active universe (held or watchlisted stocks).
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import or_, select
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.holding import Holding
+from app.models.stock import Stock
+from app.models.watchlist import Watchlist
+from app.utils.bulk_refresh import fetch_quotes_bulk
+from app.utils.stock_data import apply_stock_quotes
+
+
+class PriceRefresher:
+    def __init__(
+        self,
+        interval_seconds: float,
+        hot_interval_seconds: float,
+        hot_window_seconds: float,
+        tick_seconds: float = 1.0,
+        session_factory=SessionLocal,
+    ):
+        self.interval_seconds = interval_seconds
+        self.hot_interval_seconds = hot_interval_seconds
+        self.hot_window_seconds = hot_window_seconds
+        self.tick_seconds = tick_seconds
+        self.session_factory = session_factory
+        self._last_requested: Dict[str, float] = {}
+        self._last_refreshed: Dict[str, float] = {}
+        self._universe: Dict[str, int] = {}
+        self._universe_loaded_at: Optional[float] = None
+        self._universe_dirty = True
+        self._task: Optional[asyncio.Task] = None
+        self.cycles = 0
+        self.refreshed = 0
+
+    def touch(self, *ticker_symbols: str):
+        """Mark tickers as recently requested so they are refreshed on the hot cadence"""
+        now = time.monotonic()
+        for ticker in ticker_symbols:
+            ticker = ticker.upper()
+            self._last_requested[ticker] = now
+            if ticker not in self._universe:
+                self._universe_dirty = True
+
+    def requested_since(self, since: float) -> List[str]:
+        """Tickers touched after the monotonic time `since`"""
+        return [ticker for ticker, requested_at in list(self._last_requested.items()) if requested_at > since]
+
+    def is_hot(self, ticker_symbol: str, now: float) -> bool:
+        requested_at = self._last_requested.get(ticker_symbol)
+        return requested_at is not None and now - requested_at <= self.hot_window_seconds
+
+    def universe(self) -> Dict[str, int]:
+        """The active universe (ticker -> stock_id), recently requested tickers first"""
+        now = time.monotonic()
+        universe = dict(self._universe)
+        hot = {ticker: stock_id for ticker, stock_id in universe.items() if self.is_hot(ticker, now)}
+        return {**hot, **universe}
+
+    def due_tickers(self, now: float) -> List[str]:
+        """Tickers in the universe whose refresh interval has elapsed"""
+        due = []
+        for ticker in self._universe:
+            interval = self.hot_interval_seconds if self.is_hot(ticker, now) else self.interval_seconds
+            last = self._last_refreshed.get(ticker)
+            if last is None or now - last >= interval:
+                due.append(ticker)
+        return due
+
+    def _load_universe(self, requested: List[str]) -> Dict[str, int]:
+        """Held, watchlisted and recently requested stocks"""
+        db = self.session_factory()
+        try:
+            rows = db.query(Stock.stock_id, Stock.ticker_symbol).filter(or_(
+                Stock.stock_id.in_(select(Holding.stock_id)),
+                Stock.stock_id.in_(select(Watchlist.stock_id)),
+                Stock.ticker_symbol.in_(requested)
+            )).all()
+            return {row.ticker_symbol.upper(): row.stock_id for row in rows}
+        finally:
+            db.close()
+
+    def _apply(self, stock_ids: Dict[str, int], quotes: dict) -> int:
+        db = self.session_factory()
+        try:
+            return apply_stock_quotes(db, stock_ids, quotes)
+        finally:
+            db.close()
+
+    async def refresh_once(self) -> int:
+        """Run one scheduling pass and return the number of prices updated"""
+        now = time.monotonic()
+        # Forget tickers that have not been requested for a full hot window
+        for ticker, requested_at in list(self._last_requested.items()):
+            if now - requested_at > self.hot_window_seconds:
+                del self._last_requested[ticker]
+
+        if (
+            self._universe_dirty
+            or self._universe_loaded_at is None
+            or now - self._universe_loaded_at >= self.interval_seconds
+        ):
+            self._universe_dirty = False
+            self._universe = await asyncio.to_thread(self._load_universe, list(self._last_requested))
+            self._universe_loaded_at = now
+
+        due = self.due_tickers(now)
+        if not due:
+            return 0
+        quotes = await fetch_quotes_bulk(due)
+        for ticker in due:
+            # Failed tickers wait for their next slot too; the engine already retried them
+            self._last_refreshed[ticker] = now
+        updated = await asyncio.to_thread(self._apply, {t: self._universe[t] for t in due}, quotes)
+        self.refreshed += updated
+        return updated
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh_once()
+                self.cycles += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in background price refresh: {e}")
+            await asyncio.sleep(self.tick_seconds)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def reset(self):
+        self._last_requested.clear()
+        self._last_refreshed.clear()
+        self._universe.clear()
+        self._universe_loaded_at = None
+        self._universe_dirty = True
+
+
+# Global refresher started from the app lifespan
+price_refresher = PriceRefresher(
+    interval_seconds=settings.PRICE_REFRESH_INTERVAL_SECONDS,
+    hot_interval_seconds=settings.HOT_PRICE_REFRESH_INTERVAL_SECONDS,
+    hot_window_seconds=settings.PRICE_HOT_WINDOW_SECONDS,
+)
@@ -0,0 +1,171 @@
+"""
+In-process quote cache
+TTL + LRU cache with single-flight loading so concurrent misses for the
+same ticker share one upstream call
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.config import settings
+
+
+class _Flight:
+    """A single in-progress upstream load that other callers can wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+
+
+class QuoteCache:
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, _Flight] = {}
+        self._async_inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _lookup(self, key: str, now: float):
+        """Return a fresh cached value or None; caller must hold the lock"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= now:
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key: str, value: Any, now: float):
+        """Insert a value and evict least recently used entries; caller must hold the lock"""
+        self._entries[key] = (now + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key if it has not expired"""
+        with self._lock:
+            value = self._lookup(key, time.monotonic())
+            if value is not None:
+                self.hits += 1
+            return value
+
+    def get_stale(self, key: str) -> Optional[Any]:
+        """Return the last stored value for key even if it has expired (kept until LRU eviction)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None else None
+
+    def set(self, key: str, value: Any):
+        """Store a value, e.g. one fetched by a bulk refresh"""
+        if value is None:
+            return
+        with self._lock:
+            self._store(key, value, time.monotonic())
+
+    def get_or_fetch(self, key: str, loader: Callable[[], Optional[Any]]) -> Optional[Any]:
+        """Return the cached value or load it, coalescing concurrent loads of the same key"""
+        with self._lock:
+            value = self._lookup(key, time.monotonic())
+            if value is not None:
+                self.hits += 1
+                return value
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.misses += 1
+                flight = _Flight()
+                self._inflight[key] = flight
+                leader = True
+
+        if not leader:
+            flight.event.wait()
+            return flight.value
+
+        try:
+            flight.value = loader()
+        finally:
+            with self._lock:
+                # Failed loads (None) are not cached so the next caller retries
+                if flight.value is not None:
+                    self._store(key, flight.value, time.monotonic())
+                self._inflight.pop(key, None)
+            flight.event.set()
+        return flight.value
+
+    async def get_or_fetch_async(self, key: str, loader: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        """Async variant of get_or_fetch for callers running on the event loop"""
+        with self._lock:
+            value = self._lookup(key, time.monotonic())
+            if value is not None:
+                self.hits += 1
+                return value
+            future = self._async_inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.misses += 1
+                future = asyncio.get_running_loop().create_future()
+                self._async_inflight[key] = future
+                leader = True
+
+        if not leader:
+            # Shield so a cancelled follower does not cancel the shared load
+            return await asyncio.shield(future)
+
+        value = None
+        try:
+            value = await loader()
+        finally:
+            with self._lock:
+                if value is not None:
+                    self._store(key, value, time.monotonic())
+                self._async_inflight.pop(key, None)
+            if not future.done():
+                future.set_result(value)
+        return value
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop all entries and reset counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.coalesced = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
+
+
+# Global quote cache shared by every caller of fetch_stock_data
+quote_cache = QuoteCache(
+    ttl_seconds=settings.QUOTE_CACHE_TTL_SECONDS,
+    max_size=settings.QUOTE_CACHE_MAX_SIZE,
+)
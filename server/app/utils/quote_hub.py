@@ -0,0 +1,153 @@
+"""
+Live quote fan-out hub
+Pushes price deltas from the price book to WebSocket/SSE subscribers.
+Each connection keeps only the latest pending quote per ticker, so a slow
+client drops stale ticks instead of building an unbounded backlog, and
+pending quotes are sent as one batched frame per interval.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from app.config import settings
+from app.utils.price_book import price_book
+
+
+def _quote_frame_item(ticker_symbol: str, entry: dict) -> dict:
+    last_updated = entry.get("last_updated")
+    return {
+        "ticker_symbol": ticker_symbol,
+        "price": entry["price"],
+        "change": entry.get("change", 0.0),
+        "change_percent": entry.get("change_percent", 0.0),
+        "last_updated": last_updated.isoformat() if isinstance(last_updated, datetime) else last_updated,
+    }
+
+
+class Subscription:
+    """Per-connection state: subscribed tickers and the latest undelivered quote per ticker"""
+
+    def __init__(self, max_tickers: int):
+        self.max_tickers = max_tickers
+        self.tickers: Set[str] = set()
+        self.pending: Dict[str, dict] = {}
+        self.last_sent: Dict[str, float] = {}
+        self.event = asyncio.Event()
+        self.dropped = 0
+        self.frames_sent = 0
+
+    def offer(self, ticker_symbol: str, entry: dict):
+        """Queue a quote for delivery, replacing (dropping) any undelivered older one"""
+        if self.last_sent.get(ticker_symbol) == entry["price"] and ticker_symbol not in self.pending:
+            # Not a delta for this client
+            return
+        if ticker_symbol in self.pending:
+            self.dropped += 1
+        self.pending[ticker_symbol] = entry
+        self.event.set()
+
+    def take_frame(self) -> List[dict]:
+        pending, self.pending = self.pending, {}
+        self.event.clear()
+        for ticker_symbol, entry in pending.items():
+            self.last_sent[ticker_symbol] = entry["price"]
+        if pending:
+            self.frames_sent += 1
+        return [_quote_frame_item(ticker, entry) for ticker, entry in pending.items()]
+
+    async def next_frame(self, batch_interval: float) -> List[dict]:
+        """Wait for at least one delta, then linger briefly so more can join the same frame"""
+        while True:
+            await self.event.wait()
+            if batch_interval > 0:
+                await asyncio.sleep(batch_interval)
+            frame = self.take_frame()
+            if frame:
+                return frame
+
+
+class QuoteHub:
+    def __init__(self, batch_interval_seconds: float, max_tickers_per_connection: int):
+        self.batch_interval_seconds = batch_interval_seconds
+        self.max_tickers_per_connection = max_tickers_per_connection
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._connections: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+
+    def connect(self) -> Subscription:
+        # Fan-out runs on the loop that owns the connections
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(self.max_tickers_per_connection)
+        self._connections.add(subscription)
+        return subscription
+
+    def subscribe(self, subscription: Subscription, ticker_symbols: Iterable[str]) -> List[str]:
+        """Subscribe to tickers and queue their current quotes as the initial snapshot"""
+        added = []
+        for ticker in ticker_symbols:
+            ticker = ticker.upper()
+            if ticker in subscription.tickers:
+                continue
+            if len(subscription.tickers) >= subscription.max_tickers:
+                break
+            subscription.tickers.add(ticker)
+            self._subscribers.setdefault(ticker, set()).add(subscription)
+            added.append(ticker)
+        for ticker, entry in price_book.get_many(added).items():
+            subscription.offer(ticker, entry)
+        return added
+
+    def unsubscribe(self, subscription: Subscription, ticker_symbols: Iterable[str]):
+        for ticker in ticker_symbols:
+            ticker = ticker.upper()
+            subscription.tickers.discard(ticker)
+            subscription.pending.pop(ticker, None)
+            subscribers = self._subscribers.get(ticker)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[ticker]
+
+    def disconnect(self, subscription: Subscription):
+        self.unsubscribe(subscription, list(subscription.tickers))
+        self._connections.discard(subscription)
+
+    def publish(self, ticker_symbol: str, entry: dict):
+        """Price book listener; safe to call from any thread"""
+        if ticker_symbol not in self._subscribers or self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._fanout(ticker_symbol, entry)
+        else:
+            try:
+                self._loop.call_soon_threadsafe(self._fanout, ticker_symbol, entry)
+            except RuntimeError:
+                # Loop already closed
+                pass
+
+    def _fanout(self, ticker_symbol: str, entry: dict):
+        self.published += 1
+        for subscription in tuple(self._subscribers.get(ticker_symbol, ())):
+            subscription.offer(ticker_symbol, entry)
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self._connections),
+            "tickers": len(self._subscribers),
+            "published": self.published,
+            "dropped": sum(subscription.dropped for subscription in self._connections),
+        }
+
+
+# Global hub fed by every price book update
+quote_hub = QuoteHub(
+    batch_interval_seconds=settings.QUOTE_PUSH_BATCH_INTERVAL_SECONDS,
+    max_tickers_per_connection=settings.QUOTE_PUSH_MAX_TICKERS_PER_CONNECTION,
+)
+price_book.add_listener(quote_hub.publish)
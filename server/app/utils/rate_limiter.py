@@ -0,0 +1,242 @@
+"""
+Provider rate limiting
+Token buckets that pace calls to quota-limited upstreams (market data, Groq).
+DatabaseTokenBucket keeps the bucket in a rate_limit_buckets row so every
+worker and node shares one quota: a permit is a single conditional UPDATE
+that refills and takes a token atomically. TokenBucket is the in-process
+equivalent, used as the "local" backend and as a fallback if the database is
+unreachable.
+
+Priority classes: interactive callers may use the whole bucket, background
+callers (refreshers) only take a token while a reserve stays free, so user
+requests are not starved by bulk refreshes.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import case, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.rate_limit_bucket import RateLimitBucket
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+
+class TokenBucket:
+    """Token bucket limiter; callers reserve a token and sleep until it is available"""
+
+    def __init__(self, rate_per_second: float, capacity: float, background_reserve: float = 0.0):
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self.background_reserve = background_reserve
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+    def _reserve(self) -> float:
+        """Take one token, possibly going into debt, and return how long to wait for it"""
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate_per_second
+
+    def _try_take_background(self) -> float:
+        """Take a token only if the reserve stays free; otherwise return how long to wait before retrying"""
+        with self._lock:
+            self._refill()
+            if self._tokens - 1 >= self.background_reserve:
+                self._tokens -= 1
+                return 0.0
+            return (self.background_reserve + 1 - self._tokens) / self.rate_per_second
+
+    async def acquire(self, priority: str = INTERACTIVE) -> bool:
+        if priority != BACKGROUND:
+            wait = self._reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            return True
+        while True:
+            wait = self._try_take_background()
+            if wait <= 0:
+                return True
+            await asyncio.sleep(wait)
+
+    def acquire_blocking(self, priority: str = INTERACTIVE) -> bool:
+        if priority != BACKGROUND:
+            wait = self._reserve()
+            if wait > 0:
+                time.sleep(wait)
+            return True
+        while True:
+            wait = self._try_take_background()
+            if wait <= 0:
+                return True
+            time.sleep(wait)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refill()
+            return {"backend": "local", "tokens": self._tokens}
+
+
+class DatabaseTokenBucket:
+    """Token bucket shared through a database row"""
+
+    def __init__(
+        self,
+        name: str,
+        rate_per_second: float,
+        capacity: float,
+        background_reserve: float = 0.0,
+        max_wait_seconds: float = 30.0,
+        session_factory=SessionLocal,
+    ):
+        self.name = name
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self.background_reserve = background_reserve
+        self.max_wait_seconds = max_wait_seconds
+        self.session_factory = session_factory
+        # Used only while the database is unreachable
+        self.fallback = TokenBucket(rate_per_second, capacity, background_reserve)
+        self._row_ready = False
+        self.granted = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.fallbacks = 0
+
+    def _ensure_row(self, db):
+        """Create the bucket row on first use and apply the configured rate and capacity"""
+        bucket = db.get(RateLimitBucket, self.name)
+        if bucket is None:
+            db.add(RateLimitBucket(
+                name=self.name,
+                tokens=self.capacity,
+                capacity=self.capacity,
+                rate_per_second=self.rate_per_second,
+                refilled_at=time.time(),
+            ))
+        else:
+            bucket.capacity = self.capacity
+            bucket.rate_per_second = self.rate_per_second
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another worker created it first
+            db.rollback()
+        self._row_ready = True
+
+    def _try_take(self, priority: str) -> float:
+        """One round trip: refill and take a token atomically; returns 0 or seconds to wait"""
+        reserve = self.background_reserve if priority == BACKGROUND else 0.0
+        now = time.time()
+        db = self.session_factory()
+        try:
+            if not self._row_ready:
+                self._ensure_row(db)
+            bucket = RateLimitBucket.__table__.c
+            elapsed = case((bucket.refilled_at < now, now - bucket.refilled_at), else_=0.0)
+            refilled = bucket.tokens + elapsed * bucket.rate_per_second
+            level = case((refilled > bucket.capacity, bucket.capacity), else_=refilled)
+            result = db.execute(
+                update(RateLimitBucket.__table__)
+                .where(bucket.name == self.name, level - 1 >= reserve)
+                .values(
+                    tokens=level - 1,
+                    refilled_at=case((bucket.refilled_at > now, bucket.refilled_at), else_=now),
+                )
+            )
+            db.commit()
+            if result.rowcount == 1:
+                return 0.0
+
+            row = db.execute(
+                select(bucket.tokens, bucket.capacity, bucket.rate_per_second, bucket.refilled_at)
+                .where(bucket.name == self.name)
+            ).one()
+            current = min(row.capacity, row.tokens + max(0.0, now - row.refilled_at) * row.rate_per_second)
+            return max((reserve + 1 - current) / row.rate_per_second, 0.001)
+        finally:
+            db.close()
+
+    def acquire_blocking(self, priority: str = INTERACTIVE, timeout: Optional[float] = None) -> bool:
+        """Wait for a permit; False if none was granted within the timeout"""
+        deadline = time.monotonic() + (self.max_wait_seconds if timeout is None else timeout)
+        while True:
+            try:
+                wait = self._try_take(priority)
+            except Exception as e:
+                print(f"Rate limiter {self.name} unavailable, using local limits: {e}")
+                self.fallbacks += 1
+                return self.fallback.acquire_blocking(priority)
+            if wait <= 0:
+                self.granted += 1
+                return True
+            if time.monotonic() + wait > deadline:
+                self.timeouts += 1
+                return False
+            self.waits += 1
+            time.sleep(wait)
+
+    async def acquire(self, priority: str = INTERACTIVE, timeout: Optional[float] = None) -> bool:
+        """Async variant; the database round trip runs in a worker thread"""
+        deadline = time.monotonic() + (self.max_wait_seconds if timeout is None else timeout)
+        while True:
+            try:
+                wait = await asyncio.to_thread(self._try_take, priority)
+            except Exception as e:
+                print(f"Rate limiter {self.name} unavailable, using local limits: {e}")
+                self.fallbacks += 1
+                return await self.fallback.acquire(priority)
+            if wait <= 0:
+                self.granted += 1
+                return True
+            if time.monotonic() + wait > deadline:
+                self.timeouts += 1
+                return False
+            self.waits += 1
+            await asyncio.sleep(wait)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "database",
+            "granted": self.granted,
+            "waits": self.waits,
+            "timeouts": self.timeouts,
+            "fallbacks": self.fallbacks,
+        }
+
+
+def make_rate_limiter(name: str, per_minute: float, burst: float):
+    """Limiter for one upstream quota using the configured RATE_LIMIT_BACKEND"""
+    rate_per_second = per_minute / 60.0
+    background_reserve = burst * settings.RATE_LIMIT_BACKGROUND_RESERVE_FRACTION
+    if settings.RATE_LIMIT_BACKEND == "database":
+        return DatabaseTokenBucket(
+            name,
+            rate_per_second,
+            burst,
+            background_reserve=background_reserve,
+            max_wait_seconds=settings.RATE_LIMIT_MAX_WAIT_SECONDS,
+        )
+    return TokenBucket(rate_per_second, burst, background_reserve)
+
+
+# Cluster-wide limiters sized to each provider's per-minute quota
+market_data_rate_limiter = make_rate_limiter(
+    "market_data", settings.MARKET_DATA_RATE_LIMIT_PER_MINUTE, settings.MARKET_DATA_RATE_LIMIT_BURST
+)
+groq_rate_limiter = make_rate_limiter("groq", settings.GROQ_RATE_LIMIT_PER_MINUTE, settings.GROQ_RATE_LIMIT_BURST)
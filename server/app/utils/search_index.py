@@ -0,0 +1,308 @@
+"""
+In-memory stock search index
+Answers /api/stocks/search from memory instead of an ILIKE '%q%' scan:
+a prefix trie over tickers, a trigram index over company names (the same
+word-padded trigrams as pg_trgm) and a one-edit neighbourhood lookup for
+mistyped tickers. Results are ranked and limited. Lookups for rare terms
+touch a handful of postings; ranked results are also kept in a small LRU so
+repeated keystroke queries for common words ("inc", "hold...") stay cheap.
+
+The index loads lazily from the stocks table, applies ticker/name changes
+committed through the ORM in this process incrementally, and reloads every
+SEARCH_INDEX_RELOAD_SECONDS to pick up changes made by other processes.
+"""
+
+import heapq
+import re
+import string
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.stock import Stock
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+TICKER_ALPHABET = string.ascii_uppercase + string.digits + ".-"
+
+# Rank bands; within a band the finer score breaks ties
+EXACT_TICKER = 4.0
+TICKER_PREFIX = 3.0
+NAME_PREFIX = 2.0
+FUZZY_TICKER = 1.5
+NAME_SUBSTRING = 1.0
+
+
+def trigrams(text: str) -> Set[str]:
+    """pg_trgm style trigrams: lower-cased alphanumeric words padded with two spaces in front, one behind"""
+    grams = set()
+    for word in WORD_RE.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def one_edit_variants(word: str) -> Set[str]:
+    """Every ticker one deletion, transposition, substitution or insertion away"""
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    deletes = {left + right[1:] for left, right in splits if right}
+    transposes = {left + right[1] + right[0] + right[2:] for left, right in splits if len(right) > 1}
+    replaces = {left + c + right[1:] for left, right in splits if right for c in TICKER_ALPHABET}
+    inserts = {left + c + right for left, right in splits for c in TICKER_ALPHABET}
+    return deletes | transposes | replaces | inserts
+
+
+class IndexedStock:
+    """Listing as held by the index; attribute-compatible with Stock for the search response"""
+
+    __slots__ = ("stock_id", "ticker_symbol", "company_name", "name_lower", "name_trigrams")
+
+    def __init__(self, stock_id: int, ticker_symbol: str, company_name: str):
+        self.stock_id = stock_id
+        self.ticker_symbol = ticker_symbol
+        self.company_name = company_name
+        self.name_lower = company_name.lower()
+        self.name_trigrams = trigrams(company_name)
+
+
+class _TrieNode:
+    __slots__ = ("children", "stock_ids")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.stock_ids: Set[int] = set()
+
+
+class StockSearchIndex:
+    def __init__(self, reload_seconds: float = 300.0, min_similarity: float = 0.5, result_cache_size: int = 1024):
+        self.reload_seconds = reload_seconds
+        self.min_similarity = min_similarity
+        self.result_cache_size = result_cache_size
+        # (query, limit) -> ranked results; emptied by every change to the index
+        self._results: "OrderedDict[tuple, List[IndexedStock]]" = OrderedDict()
+        self._stocks: Dict[int, IndexedStock] = {}
+        self._by_ticker: Dict[str, int] = {}
+        self._trie = _TrieNode()
+        self._trigrams: Dict[str, Set[int]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.RLock()
+        # Held while one request reloads the index, so concurrent stale requests don't each rebuild it
+        self._load_lock = threading.Lock()
+        self.loads = 0
+        self.updates = 0
+        self.cache_hits = 0
+
+    # Maintenance
+
+    def _add(self, stock: IndexedStock):
+        self._stocks[stock.stock_id] = stock
+        self._by_ticker[stock.ticker_symbol] = stock.stock_id
+        node = self._trie
+        for char in stock.ticker_symbol:
+            node = node.children.setdefault(char, _TrieNode())
+            node.stock_ids.add(stock.stock_id)
+        for gram in stock.name_trigrams:
+            self._trigrams.setdefault(gram, set()).add(stock.stock_id)
+
+    def _remove(self, stock_id: int):
+        stock = self._stocks.pop(stock_id, None)
+        if stock is None:
+            return
+        if self._by_ticker.get(stock.ticker_symbol) == stock_id:
+            del self._by_ticker[stock.ticker_symbol]
+        node = self._trie
+        for char in stock.ticker_symbol:
+            child = node.children.get(char)
+            if child is None:
+                break
+            child.stock_ids.discard(stock_id)
+            if not child.stock_ids:
+                # Nothing below this node any more
+                del node.children[char]
+                break
+            node = child
+        for gram in stock.name_trigrams:
+            postings = self._trigrams.get(gram)
+            if postings is not None:
+                postings.discard(stock_id)
+                if not postings:
+                    del self._trigrams[gram]
+
+    def upsert(self, stock_id: int, ticker_symbol: str, company_name: str):
+        """Apply one listing change; ignored until the index has been loaded"""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            ticker_symbol = ticker_symbol.upper()
+            current = self._stocks.get(stock_id)
+            if current is not None and current.ticker_symbol == ticker_symbol and current.company_name == company_name:
+                return
+            self._remove(stock_id)
+            self._add(IndexedStock(stock_id, ticker_symbol, company_name))
+            self._results.clear()
+            self.updates += 1
+
+    def remove(self, stock_id: int):
+        with self._lock:
+            if self._loaded_at is not None and stock_id in self._stocks:
+                self._remove(stock_id)
+                self._results.clear()
+                self.updates += 1
+
+    def load(self, db: Session):
+        """Build the whole index from the stocks table and swap it in"""
+        rows = db.query(Stock.stock_id, Stock.ticker_symbol, Stock.company_name).all()
+        fresh = StockSearchIndex(self.reload_seconds, self.min_similarity)
+        for row in rows:
+            fresh._add(IndexedStock(row.stock_id, row.ticker_symbol.upper(), row.company_name))
+        with self._lock:
+            self._stocks, self._by_ticker = fresh._stocks, fresh._by_ticker
+            self._trie, self._trigrams = fresh._trie, fresh._trigrams
+            self._loaded_at = time.monotonic()
+            self._results.clear()
+            self.loads += 1
+
+    def _stale(self) -> bool:
+        loaded_at = self._loaded_at
+        return loaded_at is None or time.monotonic() - loaded_at >= self.reload_seconds
+
+    def ensure_loaded(self, db: Session):
+        """Load or reload the index when due; only one caller rebuilds it at a time"""
+        if not self._stale():
+            return
+        if self._loaded_at is None:
+            # Nothing to answer from yet: wait for whoever is loading it
+            self._load_lock.acquire()
+        elif not self._load_lock.acquire(blocking=False):
+            # Another request is already reloading; the current index is good enough meanwhile
+            return
+        try:
+            if self._stale():
+                self.load(db)
+        finally:
+            self._load_lock.release()
+
+    def clear(self):
+        with self._lock:
+            self._stocks = {}
+            self._by_ticker = {}
+            self._trie = _TrieNode()
+            self._trigrams = {}
+            self._loaded_at = None
+            self._results.clear()
+
+    # Lookup
+
+    def search(self, query: str, limit: int = 20) -> List[IndexedStock]:
+        """Ranked matches: exact ticker, ticker prefix, company word prefix, one-typo ticker, similar names"""
+        query = query.strip()
+        if not query or limit <= 0:
+            return []
+        ticker_query = query.upper().replace(" ", "")
+        query_lower = query.lower()
+        key = (query_lower, limit)
+        scores: Dict[int, float] = {}
+
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                self._results.move_to_end(key)
+                self.cache_hits += 1
+                return list(cached)
+
+            node = self._trie
+            for char in ticker_query:
+                node = node.children.get(char)
+                if node is None:
+                    break
+            if node is not None and ticker_query:
+                for stock_id in node.stock_ids:
+                    ticker = self._stocks[stock_id].ticker_symbol
+                    # Shorter completions first
+                    scores[stock_id] = EXACT_TICKER if ticker == ticker_query else TICKER_PREFIX + len(ticker_query) / len(ticker)
+
+            if 2 <= len(ticker_query) <= 10:
+                for variant in one_edit_variants(ticker_query):
+                    stock_id = self._by_ticker.get(variant)
+                    if stock_id is not None and stock_id not in scores:
+                        scores[stock_id] = FUZZY_TICKER
+
+            query_grams = trigrams(query)
+            shared = Counter()
+            for gram in query_grams:
+                shared.update(self._trigrams.get(gram, ()))
+            for stock_id, count in shared.items():
+                stock = self._stocks[stock_id]
+                # Share of the query's trigrams found in the name (like pg_trgm word_similarity),
+                # so a typo in one word of a long name still matches
+                similarity = count / len(query_grams)
+                if stock.name_lower.startswith(query_lower):
+                    score = NAME_PREFIX + 0.5 + similarity / 2
+                elif f" {query_lower}" in stock.name_lower:
+                    score = NAME_PREFIX + similarity / 2
+                elif query_lower in stock.name_lower:
+                    score = NAME_SUBSTRING + similarity / 2
+                elif similarity >= self.min_similarity:
+                    score = similarity
+                else:
+                    continue
+                if score > scores.get(stock_id, 0.0):
+                    scores[stock_id] = score
+
+            stocks = self._stocks
+            best = heapq.nsmallest(limit, ((-score, stocks[stock_id].ticker_symbol, stock_id) for stock_id, score in scores.items()))
+            results = [stocks[stock_id] for _, _, stock_id in best]
+            self._results[key] = results
+            if len(self._results) > self.result_cache_size:
+                self._results.popitem(last=False)
+            return list(results)
+
+    def stats(self) -> dict:
+        return {
+            "stocks": len(self._stocks),
+            "trigrams": len(self._trigrams),
+            "loads": self.loads,
+            "updates": self.updates,
+            "cache_hits": self.cache_hits,
+        }
+
+
+# Process-wide index used by the search endpoint
+stock_search_index = StockSearchIndex(reload_seconds=settings.SEARCH_INDEX_RELOAD_SECONDS)
+
+
+# Keep the index in step with listing changes committed through the ORM
+
+def _changes(session: Session) -> list:
+    return session.info.setdefault("stock_search_changes", [])
+
+
+@event.listens_for(Stock, "after_insert")
+@event.listens_for(Stock, "after_update")
+def _stock_written(mapper, connection, target: Stock):
+    state = inspect(target)
+    if state.attrs.ticker_symbol.history.has_changes() or state.attrs.company_name.history.has_changes():
+        _changes(state.session).append((target.stock_id, target.ticker_symbol, target.company_name))
+
+
+@event.listens_for(Stock, "after_delete")
+def _stock_deleted(mapper, connection, target: Stock):
+    _changes(inspect(target).session).append((target.stock_id, None, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session: Session):
+    for stock_id, ticker_symbol, company_name in session.info.pop("stock_search_changes", []):
+        if ticker_symbol is None:
+            stock_search_index.remove(stock_id)
+        else:
+            stock_search_index.upsert(stock_id, ticker_symbol, company_name)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session: Session):
+    session.info.pop("stock_search_changes", None)
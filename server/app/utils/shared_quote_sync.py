@@ -0,0 +1,174 @@
+"""
+Shared quote store sync
+Bridges the shared quote store and the in-process price book in both
+directions, so multi-worker deployments behave like a single process:
+
+- reader (uvicorn workers): polls the store's sequence numbers, and every slot
+  whose sequence moved since the last pass is read and applied with
+  price_book.update, so listeners (quote push, market overview, candles,
+  indicators, order book, portfolio valuations) fire in every worker. Tickers
+  requested in the worker (price_refresher.touch) are stamped as "wanted" in
+  the store.
+- writer (quote_writer.py): picks up the tickers readers want and touches them
+  on its own price refresher, which is the only one fetching quotes.
+"""
+
+import asyncio
+import time
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.stock import Stock
+from app.utils.price_book import price_book
+from app.utils.price_refresher import price_refresher
+from app.utils.shared_quotes import SharedQuoteStore, shared_quote_role, shared_quote_store
+
+
+class SharedQuoteSync:
+    def __init__(self, interval_seconds: float = 0.25, session_factory=SessionLocal):
+        self.interval_seconds = interval_seconds
+        self.session_factory = session_factory
+        # Last applied sequence per slot (reader)
+        self._seen: Optional[np.ndarray] = None
+        self._tickers: Dict[int, str] = {}
+        self._stock_ids: Dict[str, int] = {}
+        # Monotonic time of the last forwarded touches (reader), epoch of the last wanted scan (writer)
+        self._forwarded_at = time.monotonic()
+        self._wanted_at = time.time()
+        self._task: Optional[asyncio.Task] = None
+        self.applied = 0
+        self.forwarded = 0
+        self.touched = 0
+
+    def _load_tickers(self, stock_ids: Iterable[int]):
+        """Fill the stock_id <-> ticker maps for ids seen for the first time"""
+        missing = [stock_id for stock_id in stock_ids if stock_id not in self._tickers]
+        if not missing:
+            return
+        db = self.session_factory()
+        try:
+            rows = db.query(Stock.stock_id, Stock.ticker_symbol).filter(Stock.stock_id.in_(missing)).all()
+        finally:
+            db.close()
+        for row in rows:
+            self._tickers[row.stock_id] = row.ticker_symbol.upper()
+            self._stock_ids[row.ticker_symbol.upper()] = row.stock_id
+
+    def _load_stock_ids(self, tickers: Iterable[str]):
+        missing = [ticker for ticker in tickers if ticker not in self._stock_ids]
+        if not missing:
+            return
+        db = self.session_factory()
+        try:
+            rows = db.query(Stock.stock_id, Stock.ticker_symbol).filter(Stock.ticker_symbol.in_(missing)).all()
+        finally:
+            db.close()
+        for row in rows:
+            self._tickers[row.stock_id] = row.ticker_symbol.upper()
+            self._stock_ids[row.ticker_symbol.upper()] = row.stock_id
+
+    def _apply_updates(self, store: SharedQuoteStore) -> int:
+        """Apply every quote published since the last pass to the local price book"""
+        seq = store.sequences()
+        if self._seen is None or len(self._seen) != len(seq):
+            self._seen = np.zeros_like(seq)
+        changed = np.flatnonzero((seq != self._seen) & (seq % 2 == 0))
+        if not len(changed):
+            return 0
+        quotes = store.read_many(changed.tolist())
+        self._load_tickers(quotes)
+        applied = 0
+        for stock_id, quote in quotes.items():
+            ticker = self._tickers.get(stock_id)
+            if ticker is None:
+                continue
+            price_book.update(ticker, quote, last_updated=quote["last_updated"], stock_id=stock_id)
+            applied += 1
+        # A slot rewritten during this pass is applied again on the next one
+        self._seen[changed] = seq[changed]
+        self.applied += applied
+        return applied
+
+    def _forward_requests(self, store: SharedQuoteStore) -> int:
+        now = time.monotonic()
+        tickers = price_refresher.requested_since(self._forwarded_at)
+        self._forwarded_at = now
+        if not tickers:
+            return 0
+        self._load_stock_ids(tickers)
+        stock_ids = [self._stock_ids[ticker] for ticker in tickers if ticker in self._stock_ids]
+        store.want(stock_ids)
+        self.forwarded += len(stock_ids)
+        return len(stock_ids)
+
+    def _touch_wanted(self, store: SharedQuoteStore) -> int:
+        now = time.time()
+        stock_ids = store.wanted_since(self._wanted_at)
+        self._wanted_at = now
+        if not stock_ids:
+            return 0
+        self._load_tickers(stock_ids)
+        tickers = [self._tickers[stock_id] for stock_id in stock_ids if stock_id in self._tickers]
+        price_refresher.touch(*tickers)
+        self.touched += len(tickers)
+        return len(tickers)
+
+    def sync_once(self) -> int:
+        """One pass for this process's role; returns the quotes applied or tickers touched"""
+        store = shared_quote_store()
+        if store is None:
+            return 0
+        if shared_quote_role() == "reader":
+            self._forward_requests(store)
+            return self._apply_updates(store)
+        if shared_quote_role() == "writer":
+            return self._touch_wanted(store)
+        return 0
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.sync_once)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error syncing shared quotes: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def clear(self):
+        self._seen = None
+        self._tickers.clear()
+        self._stock_ids.clear()
+        self._forwarded_at = time.monotonic()
+        self._wanted_at = time.time()
+        self.applied = 0
+        self.forwarded = 0
+        self.touched = 0
+
+    def stats(self) -> dict:
+        return {
+            "role": shared_quote_role(),
+            "applied": self.applied,
+            "forwarded": self.forwarded,
+            "touched": self.touched,
+        }
+
+
+# Global sync started next to the shared quote store
+shared_quote_sync = SharedQuoteSync(interval_seconds=settings.SHARED_QUOTES_SYNC_SECONDS)
@@ -0,0 +1,227 @@
+"""
+Cross-process shared quote store
+A fixed-layout multiprocessing.shared_memory segment indexed by stock_id so
+several uvicorn workers on one host read the quotes written by a single
+refresher process (see quote_writer.py) instead of each fetching them again.
+
+Layout: 16-byte header (magic, capacity), then one uint64 sequence number per
+slot, then four float64 values per slot (price, change, change_percent,
+updated_at as epoch seconds), then one float64 "wanted at" epoch per slot.
+Each quote slot is guarded by a seqlock: the writer makes the sequence odd,
+writes the values, then makes it even again; readers retry until they see the
+same even sequence before and after reading. Readers stamp "wanted at" for
+tickers requested in their process so the writer refreshes them on the hot
+cadence (see shared_quote_sync.py).
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.utils.price_book import price_book
+
+MAGIC = 0x4B49544551554F32  # "KITEQUO2"
+HEADER_BYTES = 16
+VALUES_PER_SLOT = 4
+MAX_READ_ATTEMPTS = 100
+
+
+class SharedQuoteStore:
+    def __init__(self, name: str, capacity: int = 65536, create: bool = False):
+        self.name = name
+        self.create = create
+        size = HEADER_BYTES + capacity * 8 * (VALUES_PER_SLOT + 2)
+        if create:
+            try:
+                self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                # Left behind by a writer that did not shut down cleanly
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            header = np.ndarray((2,), dtype=np.uint64, buffer=self._shm.buf)
+            header[:] = (MAGIC, capacity)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            # Readers must not unlink the writer's segment when they exit
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+            header = np.ndarray((2,), dtype=np.uint64, buffer=self._shm.buf)
+            if int(header[0]) != MAGIC:
+                self._shm.close()
+                raise ValueError(f"Shared memory segment {name} is not a quote store")
+            capacity = int(header[1])
+        self.capacity = capacity
+        self._seq = np.ndarray((capacity,), dtype=np.uint64, buffer=self._shm.buf, offset=HEADER_BYTES)
+        self._values = np.ndarray(
+            (capacity, VALUES_PER_SLOT), dtype=np.float64, buffer=self._shm.buf, offset=HEADER_BYTES + capacity * 8
+        )
+        self._wanted = np.ndarray(
+            (capacity,), dtype=np.float64, buffer=self._shm.buf,
+            offset=HEADER_BYTES + capacity * 8 * (VALUES_PER_SLOT + 1)
+        )
+        self.writes = 0
+        self.read_retries = 0
+
+    def write(self, stock_id: int, price: float, change: float, change_percent: float, updated_at: datetime):
+        """Publish a quote; only one process may write to a store"""
+        if not 0 <= stock_id < self.capacity:
+            print(f"stock_id {stock_id} does not fit in the shared quote store (capacity {self.capacity})")
+            return
+        seq = int(self._seq[stock_id])
+        self._seq[stock_id] = seq + 1
+        self._values[stock_id] = (price, change, change_percent, updated_at.timestamp())
+        self._seq[stock_id] = seq + 2
+        self.writes += 1
+
+    def read(self, stock_id: int) -> Optional[dict]:
+        """Consistent snapshot of one slot, or None if nothing was written for it"""
+        if not 0 <= stock_id < self.capacity:
+            return None
+        for _ in range(MAX_READ_ATTEMPTS):
+            before = int(self._seq[stock_id])
+            if before & 1 == 0:
+                price, change, change_percent, updated_at = self._values[stock_id].tolist()
+                if int(self._seq[stock_id]) == before:
+                    break
+            self.read_retries += 1
+        else:
+            return None
+        if before == 0:
+            return None
+        return {
+            "price": price,
+            "change": change,
+            "change_percent": change_percent,
+            "last_updated": datetime.fromtimestamp(updated_at, tz=timezone.utc),
+        }
+
+    def read_many(self, stock_ids: Iterable[int]) -> Dict[int, dict]:
+        """Vectorized read of many slots; torn slots are re-read individually"""
+        ids = np.array([stock_id for stock_id in stock_ids if 0 <= stock_id < self.capacity], dtype=np.int64)
+        if not len(ids):
+            return {}
+        before = self._seq[ids].copy()
+        values = self._values[ids].copy()
+        after = self._seq[ids]
+        quotes = {}
+        for i, stock_id in enumerate(ids.tolist()):
+            seq = int(before[i])
+            if seq == 0:
+                continue
+            if seq != int(after[i]) or seq & 1:
+                quote = self.read(stock_id)
+                if quote is not None:
+                    quotes[stock_id] = quote
+                continue
+            price, change, change_percent, updated_at = values[i].tolist()
+            quotes[stock_id] = {
+                "price": price,
+                "change": change,
+                "change_percent": change_percent,
+                "last_updated": datetime.fromtimestamp(updated_at, tz=timezone.utc),
+            }
+        return quotes
+
+    def sequences(self) -> np.ndarray:
+        """Snapshot of every slot's sequence number; a changed even value means a new quote"""
+        return self._seq.copy()
+
+    def want(self, stock_ids: Iterable[int], at: Optional[float] = None):
+        """Ask the writer to keep these stocks on the hot refresh cadence"""
+        ids = [stock_id for stock_id in stock_ids if 0 <= stock_id < self.capacity]
+        if ids:
+            # Single aligned float64 stores; concurrent readers at worst overwrite a similar time
+            self._wanted[ids] = at if at is not None else time.time()
+
+    def wanted_since(self, since: float) -> list:
+        """stock_ids requested by any reader after the epoch `since`"""
+        return np.flatnonzero(self._wanted > since).tolist()
+
+    def close(self):
+        # Drop the numpy views first; the buffer cannot be released while they exist
+        self._seq = self._values = self._wanted = None
+        self._shm.close()
+        if self.create:
+            self._shm.unlink()
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "role": "writer" if self.create else "reader",
+            "capacity": self.capacity,
+            "writes": self.writes,
+            "read_retries": self.read_retries,
+        }
+
+
+_store: Optional[SharedQuoteStore] = None
+_role = "off"
+_next_attach_at = 0.0
+_mirroring = False
+_attach_lock = threading.Lock()
+
+
+def _mirror(ticker_symbol: str, entry: dict):
+    """Price book listener in the writer process"""
+    stock_id = price_book.stock_id_for(ticker_symbol)
+    if _store is not None and stock_id is not None:
+        _store.write(stock_id, entry["price"], entry["change"], entry["change_percent"], entry["last_updated"])
+
+
+def start_shared_quotes(role: str):
+    """Create the segment (writer) or attach to it (reader); "off" does nothing"""
+    global _store, _role, _mirroring
+    _role = role
+    if role == "writer":
+        _store = SharedQuoteStore(settings.SHARED_QUOTES_NAME, settings.SHARED_QUOTES_CAPACITY, create=True)
+        if not _mirroring:
+            price_book.add_listener(_mirror)
+            _mirroring = True
+    elif role == "reader":
+        _attach()
+
+
+def _attach() -> Optional[SharedQuoteStore]:
+    """Attach to the writer's segment; retried at most once a second until the writer is up"""
+    global _store, _next_attach_at
+    with _attach_lock:
+        if _store is None and time.monotonic() >= _next_attach_at:
+            try:
+                _store = SharedQuoteStore(settings.SHARED_QUOTES_NAME)
+            except (FileNotFoundError, ValueError):
+                _next_attach_at = time.monotonic() + 1.0
+        return _store
+
+
+def shared_quote_role() -> str:
+    return _role
+
+
+def shared_quote_store() -> Optional[SharedQuoteStore]:
+    if _role == "reader" and _store is None:
+        return _attach()
+    return _store
+
+
+def read_shared_quote(stock_id: int) -> Optional[dict]:
+    store = shared_quote_store()
+    return store.read(stock_id) if store is not None else None
+
+
+def read_shared_quotes(stock_ids: Iterable[int]) -> Dict[int, dict]:
+    store = shared_quote_store()
+    return store.read_many(stock_ids) if store is not None else {}
+
+
+def stop_shared_quotes():
+    global _store, _role
+    if _store is not None:
+        _store.close()
+    _store = None
+    _role = "off"
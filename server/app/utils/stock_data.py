@@ -1,54 +1,377 @@
+import asyncio
+import base64
+import json
+import threading
+import time
 import requests
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import Float, and_, case, cast, func, insert, literal, or_, select, update
 from sqlalchemy.orm import Session
 from app.config import settings
 from app.models.stock import Stock
+from app.models.stock_price import StockPrice
+from app.utils.quote_cache import quote_cache
+from app.utils.circuit_breaker import OPEN, market_data_breaker
+from app.utils.market_data_client import local_quote, market_data_client, parse_finnhub_quote
+from app.utils.bulk_refresh import fetch_quotes_bulk
+from app.utils.rate_limiter import BACKGROUND, INTERACTIVE, market_data_rate_limiter
+from app.utils.price_book import is_stale, price_book
+from app.utils.indicators import indicator_engine
+from app.utils.candles import get_candle_columns
+from app.utils.shared_quotes import read_shared_quote, read_shared_quotes
+from app.utils.search_index import stock_search_index
+
+def _stale_fallback(ticker_symbol: str) -> Optional[dict]:
+    """Last good quote for a ticker, marked stale, or None if there never was one"""
+    quote = quote_cache.get_stale(ticker_symbol)
+    if quote is None:
+        return None
+    market_data_breaker.record_fallback()
+    return dict(quote, is_stale=True)
+
+_background_tasks = set()
+# Tickers with a revalidation running; misses while the breaker is open share it
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+def _finish_revalidation(ticker_symbol: str):
+    with _revalidating_lock:
+        _revalidating.discard(ticker_symbol)
+
+def _revalidate_sync(ticker_symbol: str):
+    try:
+        quote_cache.get_or_fetch(ticker_symbol, lambda: _fetch_quote_from_finnhub(ticker_symbol, BACKGROUND))
+    finally:
+        _finish_revalidation(ticker_symbol)
+
+def _revalidate_in_background(ticker_symbol: str):
+    """Refresh a ticker off the request path, at most once at a time per ticker;
+    the breaker decides whether it goes upstream"""
+    with _revalidating_lock:
+        if ticker_symbol in _revalidating:
+            return
+        _revalidating.add(ticker_symbol)
+    market_data_breaker.record_revalidation()
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if loop is not None:
+        task = loop.create_task(quote_cache.get_or_fetch_async(
+            ticker_symbol, lambda: _fetch_quote_async(ticker_symbol, BACKGROUND)
+        ))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        task.add_done_callback(lambda _: _finish_revalidation(ticker_symbol))
+    else:
+        threading.Thread(target=_revalidate_sync, args=(ticker_symbol,), daemon=True).start()
 
 def fetch_stock_data(ticker_symbol: str):
+    """Fetch real-time stock data, served from the shared quote cache when fresh
+
+    While the provider's circuit breaker is open, or if the call fails, the
+    last good quote is returned with is_stale=True instead.
+    """
+    ticker_symbol = ticker_symbol.upper()
+    quote = quote_cache.get(ticker_symbol)
+    if quote is not None:
+        return quote
+    if market_data_breaker.state == OPEN:
+        _revalidate_in_background(ticker_symbol)
+        return _stale_fallback(ticker_symbol)
+    quote = quote_cache.get_or_fetch(ticker_symbol, lambda: _fetch_quote_from_finnhub(ticker_symbol))
+    return quote if quote is not None else _stale_fallback(ticker_symbol)
+
+async def fetch_stock_data_async(ticker_symbol: str):
+    """Async variant of fetch_stock_data using the pooled market data client"""
+    ticker_symbol = ticker_symbol.upper()
+    quote = quote_cache.get(ticker_symbol)
+    if quote is not None:
+        return quote
+    if market_data_breaker.state == OPEN:
+        _revalidate_in_background(ticker_symbol)
+        return _stale_fallback(ticker_symbol)
+    quote = await quote_cache.get_or_fetch_async(
+        ticker_symbol, lambda: _fetch_quote_async(ticker_symbol)
+    )
+    return quote if quote is not None else _stale_fallback(ticker_symbol)
+
+async def _fetch_quote_async(ticker_symbol: str, priority: str = INTERACTIVE):
+    """Pooled client call paced by the shared provider rate limiter"""
+    quote = local_quote(ticker_symbol)
+    if quote is not None:
+        return quote
+    # No permit is spent on a call the breaker would reject; fetch_quote takes the actual slot
+    if not market_data_breaker.would_allow():
+        return None
+    if not await market_data_rate_limiter.acquire(priority):
+        return None
+    return await market_data_client.fetch_quote(ticker_symbol)
+
+def _fetch_quote_from_finnhub(ticker_symbol: str, priority: str = INTERACTIVE):
     """Fetch real-time stock data from Finnhub API"""
+    quote = local_quote(ticker_symbol)
+    if quote is not None:
+        # Demo key or simulator: no upstream call, no quota
+        return quote
+    # Breaker first, so calls it rejects do not spend a rate limit permit
+    if not market_data_breaker.allow():
+        return None
+    if not market_data_rate_limiter.acquire_blocking(priority):
+        market_data_breaker.release()
+        return None
+
+    started = time.monotonic()
+    quote = None
     try:
-        if settings.FINNHUB_API_KEY == "demo":
-            # Mock data for demo purposes
-            return {
-                "price": 150.25,
-                "change": 2.50,
-                "change_percent": 1.69
-            }
-        
-        url = f"https://finnhub.io/api/v1/quote?symbol={ticker_symbol}&token={settings.FINNHUB_API_KEY}"
-        response = requests.get(url, timeout=10)
-        data = response.json()
-        
-        # Check if we got valid data
-        if isinstance(data, dict) and 'c' in data and data['c'] is not None:
-            current_price = float(data['c'])  # Current price
-            daily_change = float(data['d'])   # Daily change
-            daily_change_percent = float(data['dp'])  # Daily change percent
-            
-            return {
-                "price": current_price,
-                "change": daily_change,
-                "change_percent": daily_change_percent
-            }
-        else:
-            print(f"Invalid data received for {ticker_symbol}: {data}")
-            return None
-            
+        url = f"{settings.MARKET_DATA_BASE_URL}/quote?symbol={ticker_symbol}&token={settings.FINNHUB_API_KEY}"
+        response = requests.get(
+            url,
+            timeout=(settings.MARKET_DATA_CONNECT_TIMEOUT_SECONDS, settings.MARKET_DATA_READ_TIMEOUT_SECONDS)
+        )
+        quote = parse_finnhub_quote(ticker_symbol, response.json())
     except Exception as e:
         print(f"Error fetching stock data for {ticker_symbol}: {e}")
-        return None
+    finally:
+        market_data_breaker.record(quote is not None, time.monotonic() - started)
+    return quote
 
-def update_stock_prices(db: Session):
-    """Update all stock prices in the database"""
-    stocks = db.query(Stock).all()
-    for stock in stocks:
-        stock_data = fetch_stock_data(stock.ticker_symbol)
-        if stock_data:
-            stock.current_price = stock_data["price"]
+def get_last_known_quote(stock: Stock) -> dict:
+    """Last known quote for a stock from the price book or shared store, falling back to the database row"""
+    return _last_known_quote(stock, price_book.get(stock.ticker_symbol), read_shared_quote(stock.stock_id))
+
+def get_last_known_quotes(stocks) -> Dict[int, dict]:
+    """get_last_known_quote for many stocks (rows with stock_id, ticker_symbol, current_price and
+    last_updated) with one price book lookup and one shared store read, keyed by stock_id"""
+    book = price_book.get_many(stock.ticker_symbol for stock in stocks)
+    shared = read_shared_quotes(stock.stock_id for stock in stocks)
+    return {
+        stock.stock_id: _last_known_quote(stock, book.get(stock.ticker_symbol.upper()), shared.get(stock.stock_id))
+        for stock in stocks
+    }
+
+def _last_known_quote(stock, quote: Optional[dict], shared: Optional[dict]) -> dict:
+    if shared is not None and (quote is None or shared["last_updated"] > quote["last_updated"]):
+        # Written by the quote writer process in multi-worker deployments
+        quote = shared
+    if quote is None or _is_newer(stock.last_updated, quote["last_updated"]):
+        quote = {
+            "price": float(stock.current_price),
+            "change": quote["change"] if quote else 0.0,
+            "change_percent": quote["change_percent"] if quote else 0.0,
+            "last_updated": stock.last_updated
+        }
+    quote["is_stale"] = is_stale(quote["last_updated"])
+    return quote
+
+def _is_newer(db_timestamp, book_timestamp) -> bool:
+    """True if the database row was written after the price book entry (e.g. by another worker)"""
+    if db_timestamp is None:
+        return False
+    if db_timestamp.tzinfo is None:
+        db_timestamp = db_timestamp.replace(tzinfo=timezone.utc)
+    return db_timestamp > book_timestamp
+
+def save_stock_prices(
+    db: Session,
+    prices: Dict[int, float],
+    volumes: Optional[Dict[int, int]] = None,
+    recorded_at: Optional[Dict[int, datetime]] = None,
+) -> int:
+    """Write new prices for many stocks in a single bulk UPDATE and append them to price history
+
+    recorded_at holds the time each price was observed (e.g. the trade time from
+    the stream); stocks without one are recorded at the time of the write.
+    """
+    if not prices:
+        return 0
+    volumes = volumes or {}
+    recorded_at = recorded_at or {}
+    now = datetime.now(timezone.utc)
+    db.execute(
+        update(Stock)
+        .where(Stock.stock_id.in_(list(prices)))
+        .values(current_price=case(prices, value=Stock.stock_id))
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(insert(StockPrice), [
+        {"stock_id": stock_id, "price": price, "volume": volumes.get(stock_id), "ts": recorded_at.get(stock_id, now)}
+        for stock_id, price in prices.items()
+    ])
     db.commit()
+    return len(prices)
+
+def _utc(ts: datetime) -> datetime:
+    # SQLite returns naive timestamps; they are stored in UTC
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts
+
+def get_price_history_page(
+    db: Session, stock_id: int, start: datetime, end: datetime, limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> Tuple[List[float], List[float], Optional[str]]:
+    """Up to limit raw prices as parallel (epoch seconds, price) lists, plus the cursor of the next page"""
+    position = _decode_cursor(cursor)
+    statement = (
+        select(StockPrice.price_id, StockPrice.ts, cast(StockPrice.price, Float))
+        .where(StockPrice.stock_id == stock_id, StockPrice.ts <= end)
+        .order_by(StockPrice.ts, StockPrice.price_id)
+    )
+    if position:
+        try:
+            after_ts, after_id = datetime.fromisoformat(position["ts"]), int(position["price_id"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+    if position and after_ts >= start:
+        # Keyset pagination on (ts, price_id); several prices can share a timestamp. The lower
+        # bound is a single range predicate so the index seeks straight to the cursor.
+        statement = statement.where(
+            StockPrice.ts >= after_ts,
+            or_(StockPrice.ts != after_ts, StockPrice.price_id > after_id)
+        )
+    else:
+        statement = statement.where(StockPrice.ts >= start)
+    if limit is not None:
+        statement = statement.limit(limit + 1)
+    rows = db.execute(statement).all()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = _encode_cursor({"ts": _utc(last.ts).isoformat(), "price_id": last.price_id})
+    return [_utc(ts).timestamp() for _, ts, _ in rows], [price for _, _, price in rows], next_cursor
+
+def get_candle_page(
+    db: Session, stock_id: int, interval: str, start: datetime, end: datetime, limit: int,
+    cursor: Optional[str] = None
+) -> Tuple[Dict[str, list], Optional[str]]:
+    """Up to limit candles read from the pre-aggregated buckets as parallel lists, plus the cursor of the next page"""
+    position = _decode_cursor(cursor)
+    after = position.get("bucket")
+    if position and not isinstance(after, (int, float)):
+        raise ValueError("Invalid cursor")
+    columns = get_candle_columns(db, stock_id, interval, start, end, limit, after)
+    next_cursor = None
+    if len(columns["time"]) > limit:
+        for values in columns.values():
+            del values[limit:]
+        next_cursor = _encode_cursor({"bucket": columns["time"][-1]})
+    return columns, next_cursor
+
+def get_price_history(db: Session, stock_id: int, start: datetime, end: datetime) -> Tuple[List[float], List[float]]:
+    """Raw price history for one stock as parallel (epoch seconds, price) lists"""
+    timestamps, prices, _ = get_price_history_page(db, stock_id, start, end)
+    return timestamps, prices
+
+def apply_stock_quotes(db: Session, stock_ids: Dict[str, int], quotes: Dict[str, Optional[dict]]) -> int:
+    """Publish fresh quotes to the price book and persist their prices"""
+    prices = {}
+    for ticker, quote in quotes.items():
+        if quote is None or ticker not in stock_ids:
+            continue
+        price_book.update(ticker, quote, stock_id=stock_ids[ticker])
+        prices[stock_ids[ticker]] = quote["price"]
+    updated = save_stock_prices(db, prices)
+    try:
+        # One batched indicator pass over everything that was refreshed
+        indicator_engine.refresh(db, prices)
+    except Exception as e:
+        print(f"Error updating indicators: {e}")
+    return updated
+
+async def update_stock_prices_async(
+    db: Session, stocks: Optional[List[Stock]] = None, priority: str = BACKGROUND
+) -> dict:
+    """Refresh prices for the given stocks (default: all) through the bulk refresh engine
+
+    The blocking database reads and writes run in a worker thread, off the event loop.
+    """
+    if stocks is None:
+        stocks = await asyncio.to_thread(lambda: db.query(Stock.stock_id, Stock.ticker_symbol).all())
+    stock_ids = {stock.ticker_symbol.upper(): stock.stock_id for stock in stocks}
+    quotes = await fetch_quotes_bulk(stock_ids.keys(), priority=priority)
+
+    updated = await asyncio.to_thread(apply_stock_quotes, db, stock_ids, quotes)
+    return {
+        "requested": len(stock_ids),
+        "updated": updated,
+        "failed": sorted(ticker for ticker, quote in quotes.items() if quote is None),
+        "quotes": quotes
+    }
+
+def update_stock_prices(db: Session, stocks: Optional[List[Stock]] = None) -> dict:
+    """Update all stock prices in the database"""
+    return asyncio.run(update_stock_prices_async(db, stocks))
+
+def _encode_cursor(position: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def _decode_cursor(cursor: Optional[str]) -> dict:
+    if not cursor:
+        return {}
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(position, dict):
+        raise ValueError("Invalid cursor")
+    return position
+
+def _search_database(db: Session, query: str, limit: int, after: dict):
+    """Ranked search in SQL; on Postgres the pg_trgm GIN indexes serve every predicate"""
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    ticker_prefix = Stock.ticker_symbol.ilike(f"{escaped}%", escape="\\")
+    name_prefix = Stock.company_name.ilike(f"{escaped}%", escape="\\")
+    name_contains = Stock.company_name.ilike(f"%{escaped}%", escape="\\")
+    rank = (
+        case((func.upper(Stock.ticker_symbol) == query.upper(), 3.0), else_=0.0)
+        + case((ticker_prefix, 1.0), else_=0.0)
+        + case((name_prefix, 0.5), else_=0.0)
+    )
+    match = [ticker_prefix, name_contains]
+    if db.get_bind().dialect.name == "postgresql":
+        # Similarity for ranking and typo tolerance: q <% name (a word of the name is close), ticker % q
+        rank = rank + func.greatest(
+            func.word_similarity(query, Stock.company_name), func.similarity(Stock.ticker_symbol, query)
+        )
+        match += [literal(query).op("<%")(Stock.company_name), Stock.ticker_symbol.op("%")(query)]
+
+    ranked = (
+        select(Stock.stock_id, Stock.ticker_symbol, Stock.company_name, rank.label("rank"))
+        .where(or_(*match))
+        .subquery()
+    )
+    statement = select(ranked).order_by(ranked.c.rank.desc(), ranked.c.stock_id)
+    if after:
+        # Keyset pagination on (rank desc, stock_id asc)
+        statement = statement.where(or_(
+            ranked.c.rank < after["rank"],
+            and_(ranked.c.rank == after["rank"], ranked.c.stock_id > after["stock_id"])
+        ))
+    rows = db.execute(statement.limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = _encode_cursor({"rank": float(last.rank), "stock_id": last.stock_id})
+    return rows[:limit], next_cursor
+
+def search_stocks_page(db: Session, query: str, limit: Optional[int] = None, cursor: Optional[str] = None):
+    """One page of ranked search results and the cursor of the next page (None on the last page)"""
+    limit = limit or settings.SEARCH_DEFAULT_LIMIT
+    position = _decode_cursor(cursor)
+    if settings.SEARCH_BACKEND == "database":
+        if position and not {"rank", "stock_id"} <= position.keys():
+            raise ValueError("Invalid cursor")
+        return _search_database(db, query, limit, position)
+
+    offset = position.get("offset", 0)
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError("Invalid cursor")
+    stock_search_index.ensure_loaded(db)
+    results = stock_search_index.search(query, offset + limit + 1)
+    next_cursor = _encode_cursor({"offset": offset + limit}) if len(results) > offset + limit else None
+    return results[offset:offset + limit], next_cursor
 
-def search_stocks(db: Session, query: str):
-    """Search stocks by ticker symbol or company name"""
-    return db.query(Stock).filter(
-        (Stock.ticker_symbol.ilike(f"%{query}%")) | 
-        (Stock.company_name.ilike(f"%{query}%"))
-    ).all()
\ No newline at end of file
+def search_stocks(db: Session, query: str, limit: Optional[int] = None):
+    """Search stocks by ticker symbol or company name, best matches first"""
+    return search_stocks_page(db, query, limit)[0]
\ No newline at end of file
@@ -0,0 +1,236 @@
+"""
+Tick replay
+Replays a recorded tick file through the live price-update path - the price
+book and its listeners (push hub, candles, market overview, order book and
+the portfolio valuation cache) and the coalesced bulk price write - at the
+recorded pace, a multiple of it, or as fast as possible, and reports
+throughput and lag percentiles from each tick's due time to the revaluation
+of its holders' portfolios and to the commit that persisted it.
+
+Tick files are CSV (timestamp,ticker,price,volume with epoch milliseconds or
+ISO timestamps) or the compact binary format written by write_binary_ticks:
+a header with the symbol table followed by fixed 24-byte little-endian
+records, which numpy reads without parsing.
+"""
+
+import csv
+import struct
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.models.holding import Holding
+from app.models.stock import Stock
+from app.utils.portfolio_valuation import portfolio_valuations
+from app.utils.price_book import price_book
+from app.utils.stock_data import save_stock_prices
+
+BINARY_MAGIC = b"KTIK"
+BINARY_VERSION = 1
+# Epoch milliseconds, index into the symbol table, price, volume
+TICK_DTYPE = np.dtype([("t", "<i8"), ("s", "<u4"), ("p", "<f8"), ("v", "<u4")])
+
+
+def _epoch_ms(value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        ts = datetime.fromisoformat(value)
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        return int(ts.timestamp() * 1000)
+
+
+def read_csv_ticks(path: str) -> Tuple[List[str], np.ndarray]:
+    symbols: Dict[str, int] = {}
+    rows = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            ticker = row["ticker"].strip().upper()
+            index = symbols.setdefault(ticker, len(symbols))
+            rows.append((_epoch_ms(row["timestamp"].strip()), index, float(row["price"]), int(row.get("volume") or 0)))
+    return list(symbols), np.array(rows, dtype=TICK_DTYPE)
+
+
+def write_binary_ticks(path: str, symbols: List[str], ticks: np.ndarray):
+    with open(path, "wb") as f:
+        f.write(BINARY_MAGIC + struct.pack("<HI", BINARY_VERSION, len(symbols)))
+        for symbol in symbols:
+            encoded = symbol.encode()
+            f.write(struct.pack("<B", len(encoded)) + encoded)
+        f.write(np.ascontiguousarray(ticks, dtype=TICK_DTYPE).tobytes())
+
+
+def read_binary_ticks(path: str) -> Tuple[List[str], np.ndarray]:
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != BINARY_MAGIC:
+        raise ValueError(f"{path} is not a binary tick file")
+    version, count = struct.unpack_from("<HI", data, 4)
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unsupported tick file version {version}")
+    offset = 10
+    symbols = []
+    for _ in range(count):
+        length = data[offset]
+        symbols.append(data[offset + 1:offset + 1 + length].decode())
+        offset += 1 + length
+    return symbols, np.frombuffer(data, dtype=TICK_DTYPE, offset=offset)
+
+
+def load_ticks(path: str) -> Tuple[List[str], np.ndarray]:
+    """Read a tick file in either format, ordered by timestamp"""
+    with open(path, "rb") as f:
+        binary = f.read(4) == BINARY_MAGIC
+    symbols, ticks = read_binary_ticks(path) if binary else read_csv_ticks(path)
+    return symbols, ticks[np.argsort(ticks["t"], kind="stable")]
+
+
+def lag_percentiles(lags_seconds: np.ndarray) -> dict:
+    if not len(lags_seconds):
+        return {"p50": None, "p90": None, "p99": None, "max": None}
+    p50, p90, p99 = np.percentile(lags_seconds * 1000, [50, 90, 99])
+    return {
+        "p50": round(float(p50), 3),
+        "p90": round(float(p90), 3),
+        "p99": round(float(p99), 3),
+        "max": round(float(lags_seconds.max() * 1000), 3),
+    }
+
+
+class TickReplayer:
+    """Replay ticks through the price-update path; speed None means as fast as possible"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        speed: Optional[float] = 1.0,
+        flush_interval_seconds: float = 0.1,
+        max_batch: int = 5000,
+    ):
+        self.session_factory = session_factory
+        self.speed = speed
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_batch = max_batch
+        self.flushes = 0
+        self.rows_written = 0
+
+    def _stock_ids(self, db: Session, symbols: List[str]) -> Dict[str, int]:
+        rows = db.query(Stock.stock_id, Stock.ticker_symbol).filter(Stock.ticker_symbol.in_(symbols)).all()
+        return {row.ticker_symbol.upper(): row.stock_id for row in rows}
+
+    def _load_valuations(self, db: Session, stock_ids: List[int]) -> int:
+        """Load the holders of the replayed stocks into the valuation cache, so ticks revalue them"""
+        if not portfolio_valuations.enabled or not stock_ids:
+            return 0
+        holders = db.query(Holding.user_id).filter(Holding.stock_id.in_(stock_ids)).distinct().all()
+        for row in holders:
+            portfolio_valuations.current_value(db, row.user_id)
+        return len(holders)
+
+    def _flush(self, db: Session, prices: Dict[int, float], volumes: Dict[int, int], traded_at: Dict[int, datetime]):
+        self.rows_written += save_stock_prices(db, prices, volumes, traded_at)
+        self.flushes += 1
+
+    def replay(self, symbols: List[str], ticks: np.ndarray) -> dict:
+        db = self.session_factory()
+        try:
+            return self._replay(db, symbols, ticks)
+        finally:
+            db.close()
+
+    def _replay(self, db: Session, symbols: List[str], ticks: np.ndarray) -> dict:
+        stock_ids = self._stock_ids(db, symbols)
+        for ticker, stock_id in stock_ids.items():
+            price_book.register(stock_id, ticker)
+        # Symbol table index -> (ticker, stock_id); unknown tickers are skipped
+        targets = [(symbol, stock_ids.get(symbol)) for symbol in symbols]
+        holders = self._load_valuations(db, list(stock_ids.values()))
+        revalued_before = portfolio_valuations.stats()["revalued"]
+
+        timestamps = ticks["t"].tolist()
+        indexes = ticks["s"].tolist()
+        tick_prices = ticks["p"].tolist()
+        tick_volumes = ticks["v"].tolist()
+        first_ms = timestamps[0] if timestamps else 0
+        last_ms = timestamps[-1] if timestamps else 0
+
+        # Due time to revaluation (the price book calls the valuation listener before returning)
+        # and due time to the commit of the batch that persisted the tick
+        valued_lags = np.empty(len(timestamps))
+        lags = np.empty(len(timestamps))
+        valued = 0
+        applied = 0
+        skipped = 0
+        pending_prices: Dict[int, float] = {}
+        pending_volumes: Dict[int, int] = {}
+        pending_traded_at: Dict[int, datetime] = {}
+        pending_due: List[float] = []
+
+        def flush():
+            nonlocal applied
+            if pending_due:
+                self._flush(db, pending_prices, pending_volumes, pending_traded_at)
+                done = time.perf_counter()
+                lags[applied:applied + len(pending_due)] = [done - due for due in pending_due]
+                applied += len(pending_due)
+                pending_prices.clear()
+                pending_volumes.clear()
+                pending_traded_at.clear()
+                pending_due.clear()
+            return time.perf_counter()
+
+        # Ticks keep their recorded spacing. Paced ticks are stamped on the replay clock, starting
+        # now (divided by the speed), so each lands about when it is applied. Unpaced ticks are
+        # applied far faster than recorded, so they are shifted to end now instead and never
+        # carry a time in the future
+        replay_epoch = datetime.now(timezone.utc)
+        if not self.speed:
+            replay_epoch -= timedelta(milliseconds=last_ms - first_ms)
+        spacing = self.speed or 1.0
+        started = last_flush = time.perf_counter()
+        for t, index, price, volume in zip(timestamps, indexes, tick_prices, tick_volumes):
+            ticker, stock_id = targets[index]
+            if stock_id is None:
+                skipped += 1
+                continue
+            now = time.perf_counter()
+            if self.speed:
+                due = started + (t - first_ms) / 1000.0 / self.speed
+                if due > now:
+                    # Idle until the tick is due; persist what is pending first
+                    if pending_due:
+                        last_flush = flush()
+                    time.sleep(max(0.0, due - time.perf_counter()))
+            else:
+                due = now
+            traded_at = replay_epoch + timedelta(milliseconds=(t - first_ms) / spacing)
+            price_book.update_trade(ticker, price, traded_at, volume or None)
+            valued_lags[valued] = time.perf_counter() - due
+            valued += 1
+            pending_prices[stock_id] = price
+            pending_traded_at[stock_id] = traded_at
+            if volume:
+                pending_volumes[stock_id] = pending_volumes.get(stock_id, 0) + volume
+            pending_due.append(due)
+            if len(pending_due) >= self.max_batch or time.perf_counter() - last_flush >= self.flush_interval_seconds:
+                last_flush = flush()
+        flush()
+        duration = time.perf_counter() - started
+
+        return {
+            "ticks": applied,
+            "skipped": skipped,
+            "speed": self.speed or "max",
+            "duration_seconds": round(duration, 3),
+            "ticks_per_second": round(applied / duration, 1) if duration > 0 else None,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "portfolios_loaded": holders,
+            "portfolios_valued": portfolio_valuations.stats()["revalued"] - revalued_before,
+            "lag_ms": lag_percentiles(valued_lags[:valued]),
+            "persist_lag_ms": lag_percentiles(lags[:applied]),
+        }
@@ -0,0 +1,262 @@
+"""
+Streaming trade ingestion
+Subscribes to a Finnhub-style trade WebSocket, keeps the price book current
+tick by tick, and flushes the latest price (plus traded volume) per stock to
+stocks.current_price and stock_prices on a coalesced interval instead of
+writing every trade. Subscriptions follow the price refresher's universe
+(recently requested tickers first, then held and watchlisted stocks) and are
+resynced while connected.
+"""
+
+import asyncio
+import json
+import math
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+import websockets
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.stock import Stock
+from app.utils.market_simulator import market_simulator, simulator_enabled
+from app.utils.price_book import price_book
+from app.utils.price_refresher import price_refresher
+from app.utils.stock_data import save_stock_prices
+
+
+def finnhub_stream_url() -> str:
+    return f"{settings.TRADE_STREAM_URL}?token={settings.FINNHUB_API_KEY}"
+
+
+class TradeStreamIngestor:
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        flush_interval_seconds: float = 1.0,
+        reconnect_delay_seconds: float = 5.0,
+        max_symbols: int = 50,
+        resubscribe_interval_seconds: float = 30.0,
+        session_factory=SessionLocal,
+    ):
+        self.url = url
+        self.flush_interval_seconds = flush_interval_seconds
+        self.reconnect_delay_seconds = reconnect_delay_seconds
+        self.max_symbols = max_symbols
+        self.resubscribe_interval_seconds = resubscribe_interval_seconds
+        self.session_factory = session_factory
+        self._stock_ids: Dict[str, int] = {}
+        self._dirty: Dict[int, float] = {}
+        # Trade time of each dirty price, stored as its stock_prices timestamp
+        self._traded_at: Dict[int, datetime] = {}
+        self._volumes: Dict[int, int] = {}
+        self._websocket = None
+        self._subscribed: Set[str] = set()
+        self._tasks = []
+        self.trades_received = 0
+        self.malformed = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+
+    def _load_stocks(self) -> Dict[str, int]:
+        db = self.session_factory()
+        try:
+            rows = db.query(Stock.stock_id, Stock.ticker_symbol).order_by(Stock.stock_id).all()
+            return {row.ticker_symbol.upper(): row.stock_id for row in rows}
+        finally:
+            db.close()
+
+    def set_stocks(self, stock_ids: Dict[str, int]):
+        self._stock_ids = dict(stock_ids)
+        for ticker, stock_id in self._stock_ids.items():
+            price_book.register(stock_id, ticker)
+
+    def symbols(self) -> List[str]:
+        """Tickers to subscribe to, at most max_symbols"""
+        universe = price_refresher.universe()
+        if not universe:
+            # Refresher disabled or not loaded yet
+            return list(self._stock_ids)[:self.max_symbols]
+        symbols = list(universe)[:self.max_symbols]
+        for ticker in symbols:
+            if ticker not in self._stock_ids:
+                # Listed after the ingestor started
+                self._stock_ids[ticker] = universe[ticker]
+                price_book.register(universe[ticker], ticker)
+        return symbols
+
+    async def _sync_subscriptions(self, websocket) -> int:
+        """Subscribe to symbols() and drop the symbols that left it; returns the number of changes"""
+        wanted = self.symbols()
+        dropped = [symbol for symbol in self._subscribed if symbol not in wanted]
+        added = [symbol for symbol in wanted if symbol not in self._subscribed]
+        for symbol in dropped:
+            await websocket.send(json.dumps({"type": "unsubscribe", "symbol": symbol}))
+            self._subscribed.discard(symbol)
+        for symbol in added:
+            await websocket.send(json.dumps({"type": "subscribe", "symbol": symbol}))
+            self._subscribed.add(symbol)
+        return len(dropped) + len(added)
+
+    def handle_message(self, raw) -> int:
+        """Apply one feed message to the price book; returns the number of trades applied"""
+        try:
+            message = json.loads(raw)
+        except ValueError as e:
+            print(f"Skipping malformed trade stream message: {e}")
+            self.malformed += 1
+            return 0
+        if not isinstance(message, dict) or message.get("type") != "trade":
+            # ping / error / subscription acks
+            return 0
+
+        trades = message.get("data") or []
+        if not isinstance(trades, list):
+            self.malformed += 1
+            return 0
+
+        # Coalesce within the message: only the latest trade per symbol matters
+        latest: Dict[str, Tuple[float, int, Optional[datetime]]] = {}
+        message_volumes: Dict[str, int] = {}
+        for trade in trades:
+            try:
+                ticker = str(trade.get("s", "")).upper()
+                if ticker not in self._stock_ids or trade.get("p") is None:
+                    continue
+                price = float(trade["p"])
+                if not math.isfinite(price) or price <= 0:
+                    raise ValueError(f"bad price {trade['p']!r}")
+                traded_ms = int(trade.get("t") or 0)
+                traded_at = datetime.fromtimestamp(traded_ms / 1000, tz=timezone.utc) if traded_ms else None
+                volume = int(trade.get("v") or 0)
+            except (AttributeError, TypeError, ValueError, OverflowError, OSError):
+                # One bad entry must not take the rest of the batch (or the connection) with it
+                self.malformed += 1
+                continue
+            if volume:
+                message_volumes[ticker] = message_volumes.get(ticker, 0) + volume
+            if ticker not in latest or traded_ms >= latest[ticker][1]:
+                latest[ticker] = (price, traded_ms, traded_at)
+
+        for ticker, (price, _, traded_at) in latest.items():
+            entry = price_book.update_trade(ticker, price, traded_at, message_volumes.get(ticker))
+            stock_id = self._stock_ids[ticker]
+            self._dirty[stock_id] = entry["price"]
+            self._traded_at[stock_id] = entry["last_updated"]
+            if ticker in message_volumes:
+                self._volumes[stock_id] = self._volumes.get(stock_id, 0) + message_volumes[ticker]
+        self.trades_received += len(latest)
+        return len(latest)
+
+    def _write(self, prices: Dict[int, float], volumes: Dict[int, int], traded_at: Dict[int, datetime]) -> int:
+        db = self.session_factory()
+        try:
+            return save_stock_prices(db, prices, volumes, traded_at)
+        finally:
+            db.close()
+
+    async def flush(self) -> int:
+        """Persist the latest price of every stock that traded since the last flush"""
+        if not self._dirty:
+            return 0
+        prices, self._dirty = self._dirty, {}
+        volumes, self._volumes = self._volumes, {}
+        traded_at, self._traded_at = self._traded_at, {}
+        try:
+            written = await asyncio.to_thread(self._write, prices, volumes, traded_at)
+        except Exception:
+            # Put the prices back unless a newer trade already replaced them
+            for stock_id, price in prices.items():
+                if stock_id not in self._dirty:
+                    self._dirty[stock_id] = price
+                    self._traded_at[stock_id] = traded_at[stock_id]
+            for stock_id, volume in volumes.items():
+                self._volumes[stock_id] = self._volumes.get(stock_id, 0) + volume
+            raise
+        self.flushes += 1
+        self.rows_flushed += written
+        return written
+
+    async def _consume_simulator(self):
+        """Feed simulated Finnhub trade messages for every known stock through the same handler"""
+        async for raw in market_simulator.stream(list(self._stock_ids)):
+            self.handle_message(raw)
+
+    async def _consume(self):
+        if simulator_enabled() and self.url is None:
+            return await self._consume_simulator()
+        url = self.url or finnhub_stream_url()
+        while True:
+            try:
+                async with websockets.connect(url) as websocket:
+                    self._websocket = websocket
+                    self._subscribed = set()
+                    await self._sync_subscriptions(websocket)
+                    async for raw in websocket:
+                        self.handle_message(raw)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Trade stream disconnected: {e}")
+            finally:
+                self._websocket = None
+            await asyncio.sleep(self.reconnect_delay_seconds)
+
+    async def _resubscribe_loop(self):
+        while True:
+            await asyncio.sleep(self.resubscribe_interval_seconds)
+            websocket = self._websocket
+            if websocket is None:
+                continue
+            try:
+                await self._sync_subscriptions(websocket)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error updating trade stream subscriptions: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error flushing streamed prices: {e}")
+
+    async def start(self):
+        if self._tasks:
+            return
+        if not self._stock_ids:
+            self.set_stocks(await asyncio.to_thread(self._load_stocks))
+        self._tasks = [
+            asyncio.create_task(self._consume()),
+            asyncio.create_task(self._flush_loop()),
+            asyncio.create_task(self._resubscribe_loop()),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        # Final flush so trades received just before shutdown are not lost
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Error flushing streamed prices: {e}")
+
+
+# Global ingestor started from the app lifespan when TRADE_STREAM_ENABLED is set
+trade_stream = TradeStreamIngestor(
+    url=None,
+    flush_interval_seconds=settings.TRADE_STREAM_FLUSH_INTERVAL_SECONDS,
+    reconnect_delay_seconds=settings.TRADE_STREAM_RECONNECT_DELAY_SECONDS,
+    max_symbols=settings.TRADE_STREAM_MAX_SYMBOLS,
+    resubscribe_interval_seconds=settings.TRADE_STREAM_RESUBSCRIBE_SECONDS,
+)
@@ -0,0 +1,428 @@
+"""
+Trade execution
+Buys and sells run as one atomic database operation. On Postgres a trade is
+a single statement: data-modifying CTEs take the cash (or shares) with a
+conditional UPDATE ... RETURNING, upsert the position and record the
+transaction, so it costs one round trip and the row locks taken by the
+UPDATE serialize concurrent trades of the same user without lost updates.
+SQLite (tests, local development) runs the same conditional statements one
+after another inside one transaction; other databases are not supported.
+
+Baskets of many legs check cash and positions once, in memory, and write
+every row in bulk inside a single transaction.
+
+Every trade and basket bumps the user's funds.trade_version in the same
+statement or transaction, so caches of the user's positions can tell with
+one row lookup whether anything was traded since they were loaded.
+
+All amounts are integer minor units (app.utils.money); the stock's decimal
+market price is converted once, when it becomes the trade price.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, insert, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.models.fund import Fund
+from app.models.holding import Holding
+from app.models.stock import Stock
+from app.models.transaction import Transaction
+from app.utils.idempotency import commit_unless_claimed
+from app.utils.money import average_cost, to_minor
+
+BUY = "BUY"
+SELL = "SELL"
+
+ALL_OR_NOTHING = "all_or_nothing"
+BEST_EFFORT = "best_effort"
+
+
+class TradeError(Exception):
+    """Trade rejected; nothing was written"""
+
+    status_code = 400
+
+
+class StockNotFound(TradeError):
+    status_code = 404
+
+    def __init__(self):
+        super().__init__("Stock not found")
+
+
+class InsufficientFunds(TradeError):
+    def __init__(self):
+        super().__init__("Insufficient funds")
+
+
+class InsufficientShares(TradeError):
+    def __init__(self):
+        super().__init__("Insufficient shares")
+
+
+class BasketRejected(TradeError):
+    """A leg of an all-or-nothing basket could not be filled"""
+
+    def __init__(self, leg: int, error: TradeError):
+        super().__init__(f"Leg {leg}: {error}")
+        self.leg = leg
+        self.status_code = error.status_code
+
+
+@dataclass
+class TradeResult:
+    transaction_id: int
+    side: str
+    stock_id: int
+    quantity: int
+    price_minor: int
+    balance_minor: int
+    position: int
+    # The user's funds.trade_version after this trade
+    version: int
+
+
+# Missing stock, missing cash and success are told apart by which CTEs produced a row.
+# The new average cost is an integer division rounded half up, (2n + d) / 2d, as in
+# app.utils.money.average_cost.
+_PG_BUY = text("""
+    WITH stock AS (
+        SELECT CAST(ROUND(current_price * 100) AS BIGINT) AS price FROM stocks WHERE stock_id = :stock_id
+    ), debit AS (
+        UPDATE funds SET balance_minor = funds.balance_minor - :quantity * stock.price,
+                         trade_version = funds.trade_version + 1
+        FROM stock
+        WHERE funds.user_id = :user_id AND funds.balance_minor >= :quantity * stock.price
+        RETURNING funds.balance_minor AS balance, funds.trade_version AS version, stock.price
+    ), position AS (
+        INSERT INTO holdings (user_id, stock_id, quantity, average_cost_minor)
+        SELECT :user_id, :stock_id, :quantity, price FROM debit
+        ON CONFLICT (user_id, stock_id) DO UPDATE SET
+            quantity = holdings.quantity + EXCLUDED.quantity,
+            average_cost_minor = (
+                2 * (holdings.quantity * holdings.average_cost_minor + EXCLUDED.quantity * EXCLUDED.average_cost_minor)
+                + holdings.quantity + EXCLUDED.quantity
+            ) / (2 * (holdings.quantity + EXCLUDED.quantity))
+        RETURNING quantity
+    ), recorded AS (
+        INSERT INTO transactions (user_id, stock_id, transaction_type, quantity, price_per_share_minor)
+        SELECT :user_id, :stock_id, 'BUY', :quantity, price FROM debit
+        RETURNING transaction_id
+    )
+    SELECT (SELECT price FROM stock) AS stock_price, debit.balance, debit.version, debit.price,
+           position.quantity AS position, recorded.transaction_id
+    FROM (SELECT 1) AS one
+    LEFT JOIN debit ON true LEFT JOIN position ON true LEFT JOIN recorded ON true
+""")
+
+# Every trade path locks the user's funds row before any holdings row, or a sell and a
+# basket of the same user could deadlock. The sell cannot modify funds before holdings
+# (credit depends on the shares taken), so it locks the row first: the holdings UPDATE
+# joins the materialized FOR UPDATE CTE, which must produce (and lock) its row before the
+# UPDATE reaches a holdings row.
+_PG_SELL = text("""
+    WITH stock AS (
+        SELECT CAST(ROUND(current_price * 100) AS BIGINT) AS price FROM stocks WHERE stock_id = :stock_id
+    ), cash AS MATERIALIZED (
+        SELECT user_id FROM funds WHERE user_id = :user_id FOR UPDATE
+    ), shares AS (
+        UPDATE holdings SET quantity = holdings.quantity - :quantity
+        FROM stock LEFT JOIN cash ON true
+        WHERE holdings.user_id = :user_id AND holdings.stock_id = :stock_id AND holdings.quantity >= :quantity
+        RETURNING holdings.quantity, stock.price
+    ), credit AS (
+        INSERT INTO funds (user_id, balance_minor, trade_version)
+        SELECT :user_id, :quantity * price, 1 FROM shares
+        ON CONFLICT (user_id) DO UPDATE SET
+            balance_minor = funds.balance_minor + EXCLUDED.balance_minor,
+            trade_version = funds.trade_version + 1
+        RETURNING balance_minor AS balance, trade_version AS version
+    ), recorded AS (
+        INSERT INTO transactions (user_id, stock_id, transaction_type, quantity, price_per_share_minor)
+        SELECT :user_id, :stock_id, 'SELL', :quantity, price FROM shares
+        RETURNING transaction_id
+    )
+    SELECT (SELECT price FROM stock) AS stock_price, credit.balance, credit.version, shares.price,
+           shares.quantity AS position, recorded.transaction_id
+    FROM (SELECT 1) AS one
+    LEFT JOIN shares ON true LEFT JOIN credit ON true LEFT JOIN recorded ON true
+""")
+
+
+def _close_empty_position(db: Session, user_id: int, stock_id: int):
+    # A CTE cannot delete the row another CTE of the same statement updates, so a sell
+    # that closes the position takes this one extra statement in the same transaction
+    db.execute(
+        Holding.__table__.delete().where(
+            Holding.user_id == user_id, Holding.stock_id == stock_id, Holding.quantity == 0
+        )
+    )
+
+
+def _execute_postgres(db: Session, user_id: int, stock_id: int, quantity: int, side: str) -> TradeResult:
+    params = {"user_id": user_id, "stock_id": stock_id, "quantity": quantity}
+    row = db.execute(_PG_BUY if side == BUY else _PG_SELL, params).one()
+    if row.stock_price is None:
+        raise StockNotFound()
+    if row.transaction_id is None:
+        raise InsufficientFunds() if side == BUY else InsufficientShares()
+    if side == SELL and row.position == 0:
+        _close_empty_position(db, user_id, stock_id)
+    return TradeResult(
+        row.transaction_id, side, stock_id, quantity, row.price, row.balance, row.position, row.version
+    )
+
+
+def _execute_sqlite(db: Session, user_id: int, stock_id: int, quantity: int, side: str) -> TradeResult:
+    market_price = db.execute(select(Stock.current_price).where(Stock.stock_id == stock_id)).scalar()
+    if market_price is None:
+        raise StockNotFound()
+    price = to_minor(market_price)
+    amount = quantity * price
+
+    if side == BUY:
+        debit = db.execute(
+            update(Fund)
+            .where(Fund.user_id == user_id, Fund.balance_minor >= amount)
+            .values(balance_minor=Fund.balance_minor - amount, trade_version=Fund.trade_version + 1)
+            .returning(Fund.balance_minor, Fund.trade_version)
+        ).first()
+        if debit is None:
+            raise InsufficientFunds()
+        balance, version = debit
+        stmt = sqlite_insert(Holding).values(
+            user_id=user_id, stock_id=stock_id, quantity=quantity, average_cost_minor=price
+        )
+        held, added = Holding.quantity, stmt.excluded.quantity
+        position = db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["user_id", "stock_id"],
+                set_={
+                    "quantity": held + added,
+                    "average_cost_minor": (
+                        2 * (held * Holding.average_cost_minor + added * stmt.excluded.average_cost_minor)
+                        + held + added
+                    ) // (2 * (held + added)),
+                }
+            ).returning(Holding.quantity)
+        ).scalar()
+    else:
+        position = db.execute(
+            update(Holding)
+            .where(Holding.user_id == user_id, Holding.stock_id == stock_id, Holding.quantity >= quantity)
+            .values(quantity=Holding.quantity - quantity)
+            .returning(Holding.quantity)
+        ).scalar()
+        if position is None:
+            raise InsufficientShares()
+        stmt = sqlite_insert(Fund).values(user_id=user_id, balance_minor=amount, trade_version=1)
+        balance, version = db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["user_id"],
+                set_={
+                    "balance_minor": Fund.balance_minor + stmt.excluded.balance_minor,
+                    "trade_version": Fund.trade_version + 1,
+                }
+            ).returning(Fund.balance_minor, Fund.trade_version)
+        ).one()
+        if position == 0:
+            _close_empty_position(db, user_id, stock_id)
+
+    transaction_id = db.execute(
+        insert(Transaction)
+        .values(user_id=user_id, stock_id=stock_id, transaction_type=side, quantity=quantity,
+                price_per_share_minor=price)
+        .returning(Transaction.transaction_id)
+    ).scalar()
+    return TradeResult(transaction_id, side, stock_id, quantity, price, balance, position, version)
+
+
+def execute_trade(db: Session, user_id: int, stock_id: int, quantity: int, side: str) -> TradeResult:
+    """Buy or sell at the stock's current price; raises TradeError (and rolls back) if it cannot be filled"""
+    if side not in (BUY, SELL):
+        raise TradeError(f"Unknown trade side {side}")
+    if quantity <= 0:
+        raise TradeError("Quantity must be positive")
+    try:
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            result = _execute_postgres(db, user_id, stock_id, quantity, side)
+        elif dialect == "sqlite":
+            result = _execute_sqlite(db, user_id, stock_id, quantity, side)
+        else:
+            # The fallback relies on SQLite's ON CONFLICT and whole-database write lock
+            raise RuntimeError(f"Trades are not supported on {dialect}")
+        commit_unless_claimed(db)
+        return result
+    except Exception:
+        db.rollback()
+        raise
+
+
+@dataclass
+class LegFill:
+    leg: int
+    side: str
+    stock_id: int
+    quantity: int
+    price_minor: Optional[int] = None
+    transaction_id: Optional[int] = None
+    error: Optional[TradeError] = None
+    # The user's funds.trade_version after the basket, on filled legs
+    version: Optional[int] = None
+
+
+@dataclass
+class BasketResult:
+    legs: List[LegFill]
+    balance_minor: int
+
+    @property
+    def filled(self) -> List[LegFill]:
+        return [fill for fill in self.legs if fill.error is None]
+
+
+def _fill_legs(legs, mode, cash, prices, positions, fill_prices=None) -> List[LegFill]:
+    """Check every leg in order against the running cash and positions, updating both in place"""
+    fills = []
+    for index, (stock_id, quantity, side) in enumerate(legs):
+        fill = LegFill(index, side, stock_id, quantity)
+        try:
+            if side not in (BUY, SELL):
+                raise TradeError(f"Unknown trade side {side}")
+            if quantity <= 0:
+                raise TradeError("Quantity must be positive")
+            price = prices.get(stock_id)
+            if price is None:
+                raise StockNotFound()
+            if fill_prices is not None:
+                price = to_minor(fill_prices[index])
+            amount = quantity * price
+            held, cost = positions.get(stock_id, (0, 0))
+            if side == BUY:
+                if cash[0] < amount:
+                    raise InsufficientFunds()
+                cash[0] -= amount
+                positions[stock_id] = (held + quantity, average_cost(held, cost, quantity, price))
+            else:
+                if held < quantity:
+                    raise InsufficientShares()
+                cash[0] += amount
+                positions[stock_id] = (held - quantity, cost)
+            fill.price_minor = price
+        except TradeError as e:
+            if mode == ALL_OR_NOTHING:
+                raise BasketRejected(index, e)
+            fill.error = e
+        fills.append(fill)
+    return fills
+
+
+def fill_basket(
+    db: Session, user_id: int, legs: Sequence[Tuple[int, int, str]], mode: str = BEST_EFFORT,
+    fill_prices: Optional[Sequence[float]] = None
+) -> BasketResult:
+    """Write a basket without committing, so callers can record more in the same transaction.
+
+    fill_prices, aligned with legs, replaces the stocks' current prices (the order book
+    fills triggered orders at the tick price that crossed them).
+    """
+    stock_ids = {stock_id for stock_id, _, _ in legs}
+
+    # Touching the cash row first takes the user's write lock (a row lock on Postgres, the
+    # database write lock on SQLite) so nothing read below can change before the writes.
+    # The row is created first if missing, so there is always a row to lock and concurrent
+    # first trades of a user do not race to insert it.
+    dialect_insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    db.execute(
+        dialect_insert(Fund).values(user_id=user_id, balance_minor=0)
+        .on_conflict_do_nothing(index_elements=["user_id"])
+    )
+    balance = db.execute(
+        update(Fund).where(Fund.user_id == user_id)
+        .values(balance_minor=Fund.balance_minor)
+        .returning(Fund.balance_minor)
+    ).scalar()
+    prices = {
+        row.stock_id: to_minor(row.current_price)
+        for row in db.execute(select(Stock.stock_id, Stock.current_price).where(Stock.stock_id.in_(stock_ids)))
+    }
+    existing = {
+        row.stock_id: row
+        for row in db.execute(
+            select(Holding.holding_id, Holding.stock_id, Holding.quantity, Holding.average_cost_minor)
+            .where(Holding.user_id == user_id, Holding.stock_id.in_(stock_ids))
+            .with_for_update()
+        )
+    }
+    positions = {stock_id: (row.quantity, row.average_cost_minor) for stock_id, row in existing.items()}
+    cash = [balance]
+
+    result = BasketResult(_fill_legs(legs, mode, cash, prices, positions, fill_prices), cash[0])
+    filled = result.filled
+    if not filled:
+        return result
+
+    version = db.execute(
+        update(Fund).where(Fund.user_id == user_id)
+        .values(balance_minor=cash[0], trade_version=Fund.trade_version + 1)
+        .returning(Fund.trade_version)
+    ).scalar()
+
+    opened, changed, closed = [], [], []
+    for stock_id in {fill.stock_id for fill in filled}:
+        quantity, cost = positions[stock_id]
+        row = existing.get(stock_id)
+        if row is None:
+            if quantity:
+                opened.append({
+                    "user_id": user_id, "stock_id": stock_id, "quantity": quantity, "average_cost_minor": cost
+                })
+        elif quantity == 0:
+            closed.append(row.holding_id)
+        else:
+            changed.append({"holding_id": row.holding_id, "quantity": quantity, "average_cost_minor": cost})
+    if opened:
+        db.execute(insert(Holding), opened)
+    if changed:
+        db.execute(update(Holding), changed)
+    if closed:
+        db.execute(delete(Holding).where(Holding.holding_id.in_(closed)))
+
+    transaction_ids = db.execute(
+        insert(Transaction).returning(Transaction.transaction_id, sort_by_parameter_order=True),
+        [
+            {"user_id": user_id, "stock_id": fill.stock_id, "transaction_type": fill.side,
+             "quantity": fill.quantity, "price_per_share_minor": fill.price_minor}
+            for fill in filled
+        ]
+    ).scalars().all()
+    for fill, transaction_id in zip(filled, transaction_ids):
+        fill.transaction_id = transaction_id
+        fill.version = version
+    return result
+
+
+def execute_basket(
+    db: Session, user_id: int, legs: Sequence[Tuple[int, int, str]], mode: str = ALL_OR_NOTHING
+) -> BasketResult:
+    """Fill (stock_id, quantity, side) legs in order in one transaction at current prices.
+
+    All-or-nothing baskets raise BasketRejected for the first leg that cannot be filled;
+    best-effort baskets skip such legs and report them on the result.
+    """
+    if mode not in (ALL_OR_NOTHING, BEST_EFFORT):
+        raise TradeError(f"Unknown basket mode {mode}")
+    if not legs:
+        raise TradeError("Basket has no legs")
+    try:
+        result = fill_basket(db, user_id, legs, mode)
+        commit_unless_claimed(db)
+        return result
+    except Exception:
+        db.rollback()
+        raise
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Standalone Finnhub-compatible market simulator
+
+Serves the simulated price paths over HTTP (/quote) and a trade WebSocket
+(subscribe messages, trade pushes) so a whole deployment - several workers,
+the quote writer, external load generators - sees the same simulated market.
+Point the API at it instead of Finnhub:
+
+    python market_simulator.py --port 9000
+    FINNHUB_API_KEY=sim MARKET_DATA_BASE_URL=http://localhost:9000 \\
+        TRADE_STREAM_ENABLED=true TRADE_STREAM_URL=ws://localhost:9000/ws uvicorn app.main:app
+
+Volatility, drift, correlation and tick rate come from the SIMULATOR_* settings.
+"""
+
+import argparse
+import asyncio
+import json
+
+import uvicorn
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+
+from app.database import SessionLocal
+from app.utils.market_simulator import market_simulator, seed_simulator
+
+app = FastAPI(title="Market Simulator")
+
+
+@app.on_event("startup")
+def seed():
+    try:
+        seed_simulator(SessionLocal)
+    except Exception as e:
+        print(f"Could not seed simulator from the database, using generated prices: {e}")
+
+
+@app.get("/quote")
+def quote(symbol: str, token: str = ""):
+    return market_simulator.finnhub_quote(symbol)
+
+
+@app.websocket("/ws")
+async def trades(websocket: WebSocket):
+    await websocket.accept()
+    symbols = set()
+
+    async def receive():
+        while True:
+            message = json.loads(await websocket.receive_text())
+            symbol = str(message.get("symbol", "")).upper()
+            if message.get("type") == "subscribe" and symbol:
+                symbols.add(symbol)
+            elif message.get("type") == "unsubscribe":
+                symbols.discard(symbol)
+
+    receiver = asyncio.create_task(receive())
+    try:
+        while not receiver.done():
+            if symbols:
+                await websocket.send_text(market_simulator.trade_message(sorted(symbols)))
+            await asyncio.sleep(market_simulator.tick_interval_seconds)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Finnhub-compatible market simulator")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=9000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Single quote writer for multi-worker deployments
+
+Runs the price refresher (and trade stream, if enabled) in one process and
+publishes every quote into the shared memory quote store. Start it once per
+host next to the API workers, which apply the store's quotes to their own
+price book and ask the writer for the tickers their clients request:
+
+    python quote_writer.py
+    SHARED_QUOTES_ROLE=reader PRICE_REFRESHER_ENABLED=false uvicorn app.main:app --workers 4
+"""
+
+import asyncio
+
+from app.config import settings
+from app.utils.candles import candle_aggregator
+from app.database import SessionLocal
+from app.utils.market_data_client import market_data_client
+from app.utils.market_simulator import seed_simulator, simulator_enabled
+from app.utils.price_refresher import price_refresher
+from app.utils.shared_quotes import shared_quote_store, start_shared_quotes, stop_shared_quotes
+from app.utils.shared_quote_sync import shared_quote_sync
+from app.utils.trade_stream import trade_stream
+
+async def run_writer():
+    start_shared_quotes("writer")
+    print(f"Publishing quotes to shared memory segment '{settings.SHARED_QUOTES_NAME}'")
+    if simulator_enabled():
+        seed_simulator(SessionLocal)
+    candle_aggregator.start()
+    price_refresher.start()
+    shared_quote_sync.start()
+    if settings.TRADE_STREAM_ENABLED:
+        await trade_stream.start()
+    try:
+        while True:
+            await asyncio.sleep(60)
+            print(f"Shared quote store: {shared_quote_store().stats()}, sync: {shared_quote_sync.stats()}")
+    finally:
+        await shared_quote_sync.stop()
+        await trade_stream.stop()
+        await price_refresher.stop()
+        await candle_aggregator.stop()
+        await market_data_client.aclose()
+        stop_shared_quotes()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run_writer())
+    except KeyboardInterrupt:
+        print("Quote writer stopped")
@@ -1,14 +1,13 @@
 #!/usr/bin/env python3
 """
-Script to refresh existing stock data with real-time prices from Alpha Vantage
+Script to refresh existing stock data with real-time prices from Finnhub
 """
 
-import time
 from sqlalchemy.orm import Session
 from app.database import SessionLocal, engine
 from app.models.stock import Stock
 from app.database import Base
-from app.utils.stock_data import fetch_stock_data
+from app.utils.stock_data import update_stock_prices
 
 def refresh_stock_prices():
     """Refresh all existing stock prices with real-time data"""
@@ -22,35 +21,18 @@ def refresh_stock_prices():
             return
         
         print(f"Found {len(stocks)} stocks to refresh...")
-        updated_count = 0
+        old_prices = {stock.ticker_symbol.upper(): stock.current_price for stock in stocks}
         
-        for i, stock in enumerate(stocks):
-            ticker = stock.ticker_symbol
-            old_price = stock.current_price
-            
-            print(f"Refreshing {ticker} ({i+1}/{len(stocks)}) - Current: ${old_price}")
-            
-            # Fetch real-time price
-            stock_data_result = fetch_stock_data(ticker)
-            new_price = stock_data_result["price"] if stock_data_result else None
-            
-            if new_price is None:
+        # Concurrent fetch paced by the provider rate limiter, then one bulk UPDATE
+        result = update_stock_prices(db, stocks)
+        
+        for ticker, quote in result["quotes"].items():
+            if quote is None:
                 print(f"Warning: Could not fetch price for {ticker}, keeping old price")
-                continue
-            
-            # Update the stock price
-            stock.current_price = new_price
-            updated_count += 1
-            
-            print(f"Updated {ticker}: ${old_price} -> ${new_price}")
-            
-            # Add delay to avoid API rate limits (Alpha Vantage allows 5 calls per minute)
-            if i < len(stocks) - 1:  # Don't sleep after the last stock
-                print("Waiting 12 seconds to avoid API rate limits...")
-                time.sleep(12)
+            else:
+                print(f"Updated {ticker}: ${old_prices[ticker]} -> ${quote['price']}")
         
-        db.commit()
-        print(f"\nSuccessfully updated {updated_count} out of {len(stocks)} stock prices")
+        print(f"\nSuccessfully updated {result['updated']} out of {result['requested']} stock prices")
         
     except Exception as e:
         print(f"Error refreshing stock prices: {e}")
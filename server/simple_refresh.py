@@ -13,8 +13,10 @@ def main():
     db = SessionLocal()
     try:
         print("Updating stock prices...")
-        update_stock_prices(db)
-        print("Stock prices updated successfully!")
+        result = update_stock_prices(db)
+        print(f"Stock prices updated successfully! ({result['updated']}/{result['requested']} refreshed)")
+        if result["failed"]:
+            print(f"Could not fetch: {', '.join(result['failed'])}")
         
     except Exception as e:
         print(f"Error updating stock prices: {e}")
@@ -1,11 +1,30 @@
 
+import os
+
+# Keep background workers off; tests drive them explicitly
+os.environ["PRICE_REFRESHER_ENABLED"] = "false"
+os.environ["RATE_LIMIT_BACKEND"] = "local"
+os.environ["ORDER_BOOK_ENABLED"] = "false"
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.main import app
 from app.database import Base, get_db
-from app.models import user, stock, holding, transaction, fund, watchlist
+from app.models import user, stock, holding, transaction, fund, watchlist, stock_price, stock_candle, rate_limit_bucket, order, idempotency_key
+from app.utils.quote_cache import quote_cache
+from app.utils.price_book import price_book
+from app.utils.price_refresher import price_refresher
+from app.utils.candles import candle_aggregator
+from app.utils.indicators import indicator_engine
+from app.utils.market_overview import market_overview
+from app.utils.circuit_breaker import market_data_breaker
+from app.utils.search_index import stock_search_index
+from app.utils.order_book import order_book
+from app.utils.order_intake import order_intake
+from app.utils.idempotency import idempotency_store
+from app.utils.portfolio_valuation import portfolio_valuations
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
@@ -23,6 +42,34 @@ def override_get_db():
 
 app.dependency_overrides[get_db] = override_get_db
 
+@pytest.fixture(autouse=True)
+def reset_market_data_state():
+    quote_cache.clear()
+    price_book.clear()
+    price_refresher.reset()
+    candle_aggregator.clear()
+    indicator_engine.clear()
+    market_overview.reset()
+    market_data_breaker.reset()
+    stock_search_index.clear()
+    order_book.clear()
+    order_intake.clear()
+    idempotency_store.clear()
+    portfolio_valuations.clear()
+    yield
+    quote_cache.clear()
+    price_book.clear()
+    price_refresher.reset()
+    candle_aggregator.clear()
+    indicator_engine.clear()
+    market_overview.reset()
+    market_data_breaker.reset()
+    stock_search_index.clear()
+    order_book.clear()
+    order_intake.clear()
+    idempotency_store.clear()
+    portfolio_valuations.clear()
+
 @pytest.fixture(scope="function")
 def db_session():
     Base.metadata.create_all(bind=engine)
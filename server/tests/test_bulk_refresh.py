@@ -0,0 +1,75 @@
+import asyncio
+from unittest.mock import patch
+
+from app.utils.bulk_refresh import TokenBucket, fetch_quotes_bulk
+from app.utils.quote_cache import quote_cache
+
+
+class TestTokenBucket:
+    """Test cases for TokenBucket"""
+
+    def test_burst_within_capacity_does_not_wait(self):
+        bucket = TokenBucket(rate_per_second=1, capacity=3)
+        assert [bucket._reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+
+    def test_waits_once_capacity_exhausted(self):
+        with patch("app.utils.rate_limiter.time.monotonic", return_value=100.0):
+            bucket = TokenBucket(rate_per_second=2, capacity=1)
+            assert bucket._reserve() == 0.0
+            assert bucket._reserve() == 0.5
+            assert bucket._reserve() == 1.0
+
+    def test_refills_over_time(self):
+        with patch("app.utils.rate_limiter.time.monotonic", return_value=100.0):
+            bucket = TokenBucket(rate_per_second=1, capacity=1)
+            bucket._reserve()
+        with patch("app.utils.rate_limiter.time.monotonic", return_value=101.0):
+            assert bucket._reserve() == 0.0
+
+
+class TestFetchQuotesBulk:
+    """Test cases for fetch_quotes_bulk"""
+
+    def test_respects_concurrency_limit(self):
+        in_flight = []
+        peak = []
+
+        async def fetcher(ticker):
+            in_flight.append(ticker)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(ticker)
+            return {"price": 1.0, "change": 0.0, "change_percent": 0.0}
+
+        tickers = [f"T{i}" for i in range(20)]
+        results = asyncio.run(fetch_quotes_bulk(
+            tickers, fetcher=fetcher, limiter=TokenBucket(1000, 1000), concurrency=4
+        ))
+
+        assert set(results) == set(tickers)
+        assert max(peak) <= 4
+
+    def test_retries_only_failures(self):
+        attempts = {}
+
+        async def fetcher(ticker):
+            attempts[ticker] = attempts.get(ticker, 0) + 1
+            if ticker == "FLAKY" and attempts[ticker] < 2:
+                return None
+            return {"price": 2.0, "change": 0.0, "change_percent": 0.0}
+
+        results = asyncio.run(fetch_quotes_bulk(
+            ["AAPL", "FLAKY"], fetcher=fetcher, limiter=TokenBucket(1000, 1000),
+            max_retries=3, retry_base_delay=0
+        ))
+
+        assert attempts == {"AAPL": 1, "FLAKY": 2}
+        assert results["FLAKY"]["price"] == 2.0
+
+    def test_populates_quote_cache(self):
+        async def fetcher(ticker):
+            return {"price": 3.0, "change": 0.0, "change_percent": 0.0}
+
+        asyncio.run(fetch_quotes_bulk(["msft"], fetcher=fetcher, limiter=TokenBucket(1000, 1000)))
+
+        assert quote_cache.get("MSFT")["price"] == 3.0
@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import Session
+
+from app.models.stock import Stock
+from app.models.stock_candle import StockCandle
+from app.utils.candles import CandleAggregator, get_candles
+from app.utils.price_book import price_book
+from tests.conftest import TestingSessionLocal
+
+BASE = datetime(2024, 8, 20, 14, 0, tzinfo=timezone.utc)
+
+
+def _stock(db_session: Session) -> Stock:
+    stock = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.00)
+    db_session.add(stock)
+    db_session.commit()
+    return stock
+
+
+class TestCandleAggregator:
+    def test_ticks_roll_into_open_bucket(self):
+        aggregator = CandleAggregator(session_factory=TestingSessionLocal)
+        aggregator.add_tick(1, 150.0, BASE, 100)
+        aggregator.add_tick(1, 153.0, BASE + timedelta(seconds=10), 50)
+        aggregator.add_tick(1, 149.0, BASE + timedelta(seconds=20))
+        # Late tick inside the bucket moves high/low/volume but not close
+        aggregator.add_tick(1, 148.0, BASE + timedelta(seconds=15), 10)
+
+        candle = aggregator.memory_candles(1, "1m")[BASE.timestamp()]
+        assert candle == {"open": 150.0, "high": 153.0, "low": 148.0, "close": 149.0, "volume": 160}
+        assert aggregator.stats()["pending"] == 0
+
+    def test_later_bucket_closes_previous(self):
+        aggregator = CandleAggregator(session_factory=TestingSessionLocal)
+        aggregator.add_tick(1, 150.0, BASE)
+        aggregator.add_tick(1, 151.0, BASE + timedelta(minutes=1))
+
+        # Only the 1m bucket closed; 5m and above are still open
+        assert aggregator.stats()["pending"] == 1
+        assert sorted(aggregator.memory_candles(1, "1m")) == [
+            BASE.timestamp(), (BASE + timedelta(minutes=1)).timestamp()
+        ]
+        assert aggregator.memory_candles(1, "5m")[BASE.timestamp()]["close"] == 151.0
+
+    def test_flush_persists_closed_buckets(self, db_session: Session):
+        stock = _stock(db_session)
+        aggregator = CandleAggregator(session_factory=TestingSessionLocal)
+        aggregator.add_tick(stock.stock_id, 150.0, BASE, 10)
+        aggregator.add_tick(stock.stock_id, 151.0, BASE + timedelta(minutes=1), 5)
+
+        assert asyncio.run(aggregator.flush()) == 1
+        rows = db_session.query(StockCandle).all()
+        assert [(row.interval, float(row.close), row.volume) for row in rows] == [("1m", 150.0, 10)]
+
+    def test_shutdown_flush_merges_into_existing_rows(self, db_session: Session):
+        stock = _stock(db_session)
+        aggregator = CandleAggregator(session_factory=TestingSessionLocal)
+        aggregator.add_tick(stock.stock_id, 150.0, BASE, 10)
+        asyncio.run(aggregator.flush(include_open=True))
+
+        # Restarted process continues the same buckets
+        aggregator = CandleAggregator(session_factory=TestingSessionLocal)
+        aggregator.add_tick(stock.stock_id, 155.0, BASE + timedelta(seconds=30), 5)
+        asyncio.run(aggregator.flush(include_open=True))
+
+        db_session.expire_all()
+        candle = db_session.query(StockCandle).filter_by(stock_id=stock.stock_id, interval="1m").one()
+        assert (float(candle.open), float(candle.high), float(candle.close), candle.volume) == (150.0, 155.0, 155.0, 15)
+        assert db_session.query(StockCandle).count() == 5
+
+    def test_price_book_ticks_feed_global_aggregator(self, db_session: Session):
+        stock = _stock(db_session)
+        now = datetime.now(timezone.utc)
+        price_book.update("AAPL", {"price": 150.0}, stock_id=stock.stock_id, last_updated=now)
+        price_book.update_trade("AAPL", 151.5, now + timedelta(milliseconds=1), volume=300)
+
+        candles = get_candles(db_session, stock.stock_id, "1d", now - timedelta(days=1), now + timedelta(days=1))
+        assert len(candles) == 1
+        assert candles[0]["close"] == 151.5
+        assert candles[0]["volume"] == 300
@@ -0,0 +1,182 @@
+import asyncio
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import httpx
+
+from app.config import settings
+from app.utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, market_data_breaker
+from app.utils.market_data_client import MarketDataClient
+from app.utils.quote_cache import quote_cache
+from app.utils.rate_limiter import market_data_rate_limiter
+from app.utils import stock_data
+from app.utils.stock_data import _fetch_quote_async, _fetch_quote_from_finnhub, fetch_stock_data, fetch_stock_data_async
+
+
+class TestCircuitBreaker:
+    """Test cases for CircuitBreaker state transitions"""
+
+    def test_trips_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=3, slow_call_seconds=1.0, open_seconds=60)
+        for _ in range(2):
+            assert breaker.allow()
+            breaker.record(False, 0.1)
+        assert breaker.state == CLOSED
+        breaker.allow()
+        breaker.record(False, 0.1)
+
+        assert breaker.state == OPEN
+        assert not breaker.allow()
+        assert breaker.stats()["rejected"] == 1
+        assert breaker.stats()["trips"] == 1
+
+    def test_success_resets_failure_count(self):
+        breaker = CircuitBreaker(failure_threshold=2, slow_call_seconds=1.0, open_seconds=60)
+        breaker.record(False, 0.1)
+        breaker.record(True, 0.1)
+        breaker.record(False, 0.1)
+        assert breaker.state == CLOSED
+
+    def test_slow_calls_count_as_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, slow_call_seconds=0.5, open_seconds=60)
+        breaker.record(True, 2.0)
+        breaker.record(True, 2.0)
+        assert breaker.state == OPEN
+        assert breaker.stats()["slow_calls"] == 2
+
+    def test_half_open_allows_single_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, slow_call_seconds=1.0, open_seconds=0.01)
+        breaker.record(False, 0.1)
+        time.sleep(0.02)
+
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record(True, 0.1)
+        assert breaker.state == CLOSED
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=1, slow_call_seconds=1.0, open_seconds=0.01)
+        breaker.record(False, 0.1)
+        time.sleep(0.02)
+        assert breaker.allow()
+        breaker.record(False, 0.1)
+        assert breaker.state == OPEN
+        assert breaker.stats()["trips"] == 2
+
+
+    def test_would_allow_does_not_take_the_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, slow_call_seconds=1.0, open_seconds=0.01)
+        breaker.record(False, 0.1)
+        assert not breaker.would_allow()
+        time.sleep(0.02)
+
+        assert breaker.would_allow()
+        assert breaker.allow()
+        assert not breaker.would_allow()
+        # A probe that was never sent frees the slot again
+        breaker.release()
+        assert breaker.would_allow()
+
+
+class TestRateLimitPermits:
+    """An open breaker must not spend provider quota"""
+
+    def _trip(self):
+        for _ in range(market_data_breaker.failure_threshold):
+            market_data_breaker.record(False, 0.1)
+
+    def test_rejected_calls_do_not_acquire_permits(self):
+        self._trip()
+        with patch.object(settings, "FINNHUB_API_KEY", "test_key"), \
+                patch.object(market_data_rate_limiter, "acquire_blocking") as acquire_blocking, \
+                patch.object(market_data_rate_limiter, "acquire") as acquire:
+            assert _fetch_quote_from_finnhub("AAPL") is None
+            assert asyncio.run(_fetch_quote_async("AAPL")) is None
+        acquire_blocking.assert_not_called()
+        acquire.assert_not_called()
+
+    def test_probe_without_a_permit_is_given_back(self):
+        with patch.object(market_data_breaker, "open_seconds", 0):
+            self._trip()
+            with patch.object(settings, "FINNHUB_API_KEY", "test_key"), \
+                    patch.object(market_data_rate_limiter, "acquire_blocking", return_value=False):
+                assert _fetch_quote_from_finnhub("AAPL") is None
+            assert market_data_breaker.would_allow()
+
+
+class TestStaleFallback:
+    """Test cases for serving the last good quote when the provider is failing"""
+
+    def _trip(self):
+        for _ in range(market_data_breaker.failure_threshold):
+            market_data_breaker.record(False, 0.1)
+
+    @patch("app.utils.stock_data.requests.get")
+    def test_open_breaker_serves_stale_without_calling_upstream(self, mock_get):
+        with patch.object(quote_cache, "ttl_seconds", 0):
+            quote_cache.set("AAPL", {"price": 150.0, "change": 1.0, "change_percent": 0.5})
+        self._trip()
+
+        with patch.object(settings, "FINNHUB_API_KEY", "test_key"):
+            result = fetch_stock_data("AAPL")
+
+        assert result["price"] == 150.0
+        assert result["is_stale"] is True
+        # The background revalidation was rejected by the open breaker
+        mock_get.assert_not_called()
+        stats = market_data_breaker.stats()
+        assert stats["fallbacks"] == 1
+        assert stats["revalidations"] == 1
+
+    def test_concurrent_misses_share_one_revalidation(self):
+        with patch.object(quote_cache, "ttl_seconds", 0):
+            quote_cache.set("AAPL", {"price": 150.0, "change": 1.0, "change_percent": 0.5})
+        self._trip()
+        release = threading.Event()
+
+        def slow_fetch(ticker_symbol, priority):
+            release.wait(5)
+            return None
+
+        with patch("app.utils.stock_data._fetch_quote_from_finnhub", side_effect=slow_fetch):
+            results = [fetch_stock_data("AAPL") for _ in range(5)]
+            assert market_data_breaker.stats()["revalidations"] == 1
+            release.set()
+            deadline = time.monotonic() + 5
+            while stock_data._revalidating and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        assert all(result["is_stale"] for result in results)
+        assert market_data_breaker.stats()["fallbacks"] == 5
+        assert not stock_data._revalidating
+
+    @patch("app.utils.stock_data.requests.get")
+    def test_failed_call_falls_back_to_stale(self, mock_get):
+        mock_get.side_effect = Exception("timeout")
+        with patch.object(quote_cache, "ttl_seconds", 0):
+            quote_cache.set("AAPL", {"price": 150.0, "change": 1.0, "change_percent": 0.5})
+
+        with patch.object(settings, "FINNHUB_API_KEY", "test_key"):
+            result = fetch_stock_data("AAPL")
+
+        assert result["is_stale"] is True
+        assert market_data_breaker.stats()["consecutive_failures"] == 1
+
+    def test_async_client_fails_fast_when_open(self):
+        handler = Mock(return_value=httpx.Response(200, json={"c": 1.0, "d": 0.0, "dp": 0.0}))
+        breaker = CircuitBreaker(failure_threshold=1, slow_call_seconds=1.0, open_seconds=60)
+        client = MarketDataClient(
+            base_url="https://finnhub.test/api/v1", transport=httpx.MockTransport(handler), breaker=breaker
+        )
+        breaker.record(False, 0.1)
+
+        with patch.object(settings, "FINNHUB_API_KEY", "test_key"):
+            assert asyncio.run(client.fetch_quote("AAPL")) is None
+        handler.assert_not_called()
+
+    def test_async_fetch_without_history_returns_none(self):
+        self._trip()
+        with patch.object(settings, "FINNHUB_API_KEY", "test_key"):
+            assert asyncio.run(fetch_stock_data_async("AAPL")) is None
@@ -1,10 +1,17 @@
 
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
+
+from api.funds import _add_funds, _withdraw_funds
+from app.schemas.fund import FundUpdate
 from app.models.user import User
 from app.models.fund import Fund
 from app.utils.auth import get_password_hash
+from tests.conftest import TestingSessionLocal
 
 
 @pytest.fixture
@@ -60,3 +67,26 @@ def test_withdraw_insufficient_funds(authenticated_client: TestClient):
     response = authenticated_client.post("/api/portfolio/funds/withdraw", json={"amount": 1000.00})
     assert response.status_code == 400
     assert response.json() == {"detail": "Insufficient funds"}
+
+
+def test_concurrent_deposits_and_withdrawals_are_atomic(db_session: Session):
+    user = User(username="racer", email="racer@example.com", password_hash="x")
+    db_session.add(user)
+    db_session.commit()
+
+    def run(handler, amount: float) -> bool:
+        db = TestingSessionLocal()
+        try:
+            handler(db, user, FundUpdate(amount=amount))
+            return True
+        except HTTPException:
+            return False
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: run(_add_funds, 10.0), range(20)))
+        withdrawn = sum(pool.map(lambda _: run(_withdraw_funds, 30.0), range(10)))
+
+    assert withdrawn == 6
+    assert float(db_session.query(Fund).filter(Fund.user_id == user.user_id).one().balance) == 20.0
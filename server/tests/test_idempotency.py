@@ -0,0 +1,195 @@
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.models.fund import Fund
+from app.models.idempotency_key import IdempotencyKey
+from app.models.stock import Stock
+from app.models.transaction import Transaction
+from app.models.user import User
+from app.utils.auth import get_password_hash
+from app.utils.idempotency import IdempotencyConflict, IdempotencyStore, idempotency_store
+from app.utils.portfolio_valuation import portfolio_valuations
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture
+def user(db_session: Session):
+    user = User(username="retrier", email="retrier@example.com", password_hash=get_password_hash("password"))
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+@pytest.fixture
+def headers(client: TestClient, user: User):
+    response = client.post("/api/auth/login", data={"username": "retrier@example.com", "password": "password"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+class TestIdempotentRoutes:
+    def test_retried_buy_executes_once(self, client: TestClient, db_session: Session, user: User, headers: dict):
+        stock = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=100.00)
+        db_session.add_all([stock, Fund(user_id=user.user_id, balance=1000.0)])
+        db_session.commit()
+        request = {"stock_id": stock.stock_id, "quantity": 2}
+        keyed = dict(headers, **{"Idempotency-Key": "buy-1"})
+
+        first = client.post("/api/trade/buy", headers=keyed, json=request)
+        retry = client.post("/api/trade/buy", headers=keyed, json=request)
+
+        assert first.json() == retry.json() == {"message": "Buy order executed successfully"}
+        assert "Idempotent-Replayed" not in first.headers
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        assert db_session.query(Transaction).count() == 1
+        assert idempotency_store.stats()["hits"] == 1
+
+        # Without a key every request runs
+        client.post("/api/trade/buy", headers=headers, json=request)
+        assert db_session.query(Transaction).count() == 2
+
+    def test_rejections_are_replayed_too(self, client: TestClient, db_session: Session, user: User, headers: dict):
+        keyed = dict(headers, **{"Idempotency-Key": "withdraw-1"})
+        first = client.post("/api/portfolio/funds/withdraw", headers=keyed, json={"amount": 50.0})
+        client.post("/api/portfolio/funds/add", headers=headers, json={"amount": 100.0})
+        retry = client.post("/api/portfolio/funds/withdraw", headers=keyed, json={"amount": 50.0})
+
+        assert first.status_code == retry.status_code == 400
+        assert retry.json() == {"detail": "Insufficient funds"}
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        assert float(db_session.query(Fund).one().balance) == 100.0
+
+    def test_trade_commits_only_with_its_stored_response(
+        self, client: TestClient, db_session: Session, user: User, headers: dict
+    ):
+        stock = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=100.00)
+        db_session.add_all([stock, Fund(user_id=user.user_id, balance=1000.0)])
+        db_session.commit()
+        request = {"stock_id": stock.stock_id, "quantity": 2}
+        keyed = dict(headers, **{"Idempotency-Key": "buy-crash"})
+        client.get("/api/portfolio/current-value", headers=headers)
+
+        # The worker dies after the trade but before the response is stored
+        with patch.object(idempotency_store, "complete", side_effect=RuntimeError("worker died")):
+            with pytest.raises(RuntimeError):
+                client.post("/api/trade/buy", headers=keyed, json=request)
+        assert db_session.query(Transaction).count() == 0
+        assert float(db_session.query(Fund).one().balance) == 1000.0
+        # The rolled-back fill never reached the valuation cache
+        assert portfolio_valuations.stats()["fills"] == 0
+
+        # The crashed claim stays leased; a new request fills and reaches the cache once committed
+        again = client.post("/api/trade/buy", headers=dict(headers, **{"Idempotency-Key": "buy-2"}), json=request)
+        assert again.json() == {"message": "Buy order executed successfully"}
+        assert portfolio_valuations.stats()["fills"] == 1
+        assert db_session.query(Fund).one().trade_version == 1
+
+    def test_attempt_that_lost_its_claim_is_rolled_back(
+        self, client: TestClient, db_session: Session, user: User, headers: dict
+    ):
+        stock = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=100.00)
+        db_session.add_all([stock, Fund(user_id=user.user_id, balance=1000.0)])
+        db_session.commit()
+        real_begin = idempotency_store.begin
+
+        def begin_then_lose_claim(db, user_id, key, fingerprint):
+            stored = real_begin(db, user_id, key, fingerprint)
+            # A retry on another worker takes the claim over while this attempt runs
+            other = TestingSessionLocal()
+            try:
+                other.query(IdempotencyKey).update({IdempotencyKey.created_at: time.time() + 1})
+                other.commit()
+            finally:
+                other.close()
+            return stored
+
+        with patch.object(idempotency_store, "begin", begin_then_lose_claim):
+            response = client.post(
+                "/api/trade/buy", headers=dict(headers, **{"Idempotency-Key": "buy-slow"}),
+                json={"stock_id": stock.stock_id, "quantity": 2}
+            )
+        assert response.status_code == 409
+        assert db_session.query(Transaction).count() == 0
+        # The new owner's claim is left for it to complete
+        assert db_session.query(IdempotencyKey).one().status_code is None
+
+    def test_key_reused_for_another_request(self, client: TestClient, db_session: Session, headers: dict):
+        keyed = dict(headers, **{"Idempotency-Key": "add-1"})
+        assert client.post("/api/portfolio/funds/add", headers=keyed, json={"amount": 10.0}).status_code == 200
+        response = client.post("/api/portfolio/funds/add", headers=keyed, json={"amount": 20.0})
+        assert response.status_code == 422
+        assert float(db_session.query(Fund).one().balance) == 10.0
+
+
+class TestIdempotencyStore:
+    def test_running_request_blocks_retries(self, db_session: Session, user: User):
+        store = IdempotencyStore()
+        assert store.begin(db_session, user.user_id, "k", "f") is None
+        with pytest.raises(IdempotencyConflict) as excinfo:
+            store.begin(db_session, user.user_id, "k", "f")
+        assert excinfo.value.status_code == 409
+
+        # Another worker sees the claim in the database
+        with pytest.raises(IdempotencyConflict):
+            IdempotencyStore().begin(db_session, user.user_id, "k", "f")
+
+    def test_completed_response_is_shared_through_the_database(self, db_session: Session, user: User):
+        store = IdempotencyStore()
+        store.begin(db_session, user.user_id, "k", "f")
+        store.complete(db_session, user.user_id, "k", "f", 200, {"message": "done"})
+
+        other_worker = IdempotencyStore()
+        stored = other_worker.begin(db_session, user.user_id, "k", "f")
+        assert (stored.status_code, stored.body) == (200, {"message": "done"})
+        assert other_worker.stats()["db_hits"] == 1
+        other_worker.begin(db_session, user.user_id, "k", "f")
+        assert other_worker.stats()["hits"] == 1
+
+    def test_abandoned_key_can_be_retried(self, db_session: Session, user: User):
+        store = IdempotencyStore()
+        store.begin(db_session, user.user_id, "k", "f")
+        store.abandon(db_session, user.user_id, "k")
+        assert store.begin(db_session, user.user_id, "k", "f") is None
+
+    def test_claim_left_by_a_crashed_worker_is_taken_over(self, db_session: Session, user: User):
+        store = IdempotencyStore(lease_seconds=30)
+        db_session.add_all([
+            IdempotencyKey(user_id=user.user_id, key="crashed", fingerprint="f", created_at=time.time() - 45),
+            IdempotencyKey(user_id=user.user_id, key="running", fingerprint="f", created_at=time.time() - 5),
+        ])
+        db_session.commit()
+
+        assert store.begin(db_session, user.user_id, "crashed", "f") is None
+        assert store.stats()["reclaimed"] == 1
+        with pytest.raises(IdempotencyConflict) as excinfo:
+            store.begin(db_session, user.user_id, "running", "f")
+        assert excinfo.value.status_code == 409
+
+        # The takeover renewed the lease, so other workers wait for it
+        with pytest.raises(IdempotencyConflict):
+            IdempotencyStore(lease_seconds=30).begin(db_session, user.user_id, "crashed", "f")
+
+    def test_expired_keys_are_reusable_and_purged(self, db_session: Session, user: User):
+        store = IdempotencyStore(ttl_seconds=60)
+        db_session.add_all([
+            IdempotencyKey(user_id=user.user_id, key="old", fingerprint="f", status_code=200,
+                           response_body="{}", created_at=time.time() - 120),
+            IdempotencyKey(user_id=user.user_id, key="stale", fingerprint="f", status_code=200,
+                           response_body="{}", created_at=time.time() - 120),
+        ])
+        db_session.commit()
+
+        # A different request may take an expired key
+        assert store.begin(db_session, user.user_id, "old", "other") is None
+        assert store.purge_expired(db_session) == 1
+        assert [row.key for row in db_session.query(IdempotencyKey)] == ["old"]
+
+    def test_lru_is_bounded(self, db_session: Session, user: User):
+        store = IdempotencyStore(max_size=2)
+        for key in ("a", "b", "c"):
+            store.begin(db_session, user.user_id, key, "f")
+            store.complete(db_session, user.user_id, key, "f", 200, {})
+        assert store.stats()["cached"] == 2
@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.models.stock import Stock
+from app.utils.candles import candle_aggregator
+from app.utils.indicators import IndicatorEngine, _recursive_mean, compute_indicators, compute_series
+from app.utils.price_book import price_book
+
+BASE = datetime(2024, 8, 1, tzinfo=timezone.utc)
+
+
+def _candles(n: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    return [
+        {"open": c, "high": c + 1.0, "low": c - 1.5, "close": c, "volume": 0}
+        for c in close
+    ]
+
+
+def _assert_same(left: dict, right: dict):
+    for key, value in left.items():
+        if isinstance(value, dict):
+            _assert_same(value, right[key])
+        elif isinstance(value, float):
+            assert np.isclose(value, right[key]), key
+        else:
+            assert value == right[key], key
+
+
+def _recursive_mean_loop(values, alpha):
+    """The recursion one value at a time; oracle for the vectorized version"""
+    out = np.empty_like(values)
+    if len(values):
+        out[0] = values[0]
+        for t in range(1, len(values)):
+            out[t] = out[t - 1] + alpha * (values[t] - out[t - 1])
+    return out
+
+
+class TestComputeSeries:
+    def test_recursive_mean_matches_the_recursion(self):
+        rng = np.random.default_rng(3)
+        for n in (0, 1, 2, 255, 256, 257, 5000):
+            values = 100 + np.cumsum(rng.normal(0, 1, n))
+            for alpha in (2.0 / 10, 2.0 / 27, 1.0 / 14):
+                assert np.allclose(_recursive_mean(values, alpha), _recursive_mean_loop(values, alpha), rtol=1e-12)
+        # Signed input such as MACD
+        values = rng.normal(0, 1, 3000)
+        assert np.allclose(_recursive_mean(values, 0.2), _recursive_mean_loop(values, 0.2), rtol=0, atol=1e-12)
+
+    def test_sma_and_bollinger(self):
+        close = np.arange(1.0, 26.0)
+        series = compute_series(close, close, close)
+        assert np.isnan(series["sma"][18])
+        assert series["sma"][19] == np.mean(close[:20])
+        assert np.isclose(series["bb_upper"][-1] - series["sma"][-1], 2 * np.std(close[-20:]))
+
+    def test_rsi_extremes(self):
+        rising = np.arange(1.0, 31.0)
+        assert compute_series(rising, rising, rising)["rsi"][-1] == 100.0
+        flat = np.full(30, 5.0)
+        assert compute_series(flat, flat, flat)["rsi"][-1] == 50.0
+
+    def test_atr_of_constant_range(self):
+        close = np.full(30, 10.0)
+        series = compute_series(close + 1, close - 1, close)
+        assert np.isclose(series["atr"][-1], 2.0)
+
+    def test_warmup_values_are_none(self):
+        result = compute_indicators(_candles(15), "1d")
+        assert result["bars"] == 15
+        assert result["sma_20"] is None
+        assert result["rsi_14"] is not None
+        assert result["macd"]["macd"] is None
+
+
+class TestIndicatorEngine:
+    def test_incremental_updates_match_full_recomputation(self):
+        candles = _candles(60)
+        engine = IndicatorEngine("1d", lookback_bars=250)
+        with engine._lock:
+            engine._seed(1, candles[:30])
+        for i, candle in enumerate(candles[30:]):
+            engine.on_candle_closed(1, "1d", i, candle)
+
+        _assert_same(engine.get(1), compute_indicators(candles, "1d"))
+
+    def test_vectorized_pass_over_many_stocks(self):
+        engine = IndicatorEngine("1d", lookback_bars=250, capacity=2)
+        histories = {stock_id: _candles(40, seed=stock_id) for stock_id in range(1, 6)}
+        with engine._lock:
+            for stock_id, candles in histories.items():
+                engine._seed(stock_id, candles)
+
+        prices = {stock_id: 120.0 + stock_id for stock_id in histories}
+        results = engine.evaluate(prices, prices)
+
+        assert engine.stats()["tracked"] == 5
+        for stock_id, candles in histories.items():
+            provisional = {"open": prices[stock_id], "high": prices[stock_id], "low": prices[stock_id],
+                           "close": prices[stock_id], "volume": 0}
+            _assert_same(results[stock_id], compute_indicators(candles + [provisional], "1d"))
+
+    def test_seeds_from_closed_candles(self, db_session: Session):
+        stock = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.00)
+        db_session.add(stock)
+        db_session.commit()
+        now = datetime.now(timezone.utc)
+        for day in range(25, 0, -1):
+            candle_aggregator.add_tick(stock.stock_id, 100.0 + day, now - timedelta(days=day))
+
+        engine = IndicatorEngine("1d", lookback_bars=250)
+        engine.ensure_seeded(db_session, [stock.stock_id])
+
+        # The last tick's bucket is still open, so 24 closed bars
+        assert engine.get(stock.stock_id)["bars"] == 24
+
+
+def test_get_stock_indicators_endpoint(client, db_session: Session):
+    stock = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.00)
+    db_session.add(stock)
+    db_session.commit()
+    now = datetime.now(timezone.utc)
+    for day in range(30, 0, -1):
+        candle_aggregator.add_tick(stock.stock_id, 100.0 + day, now - timedelta(days=day))
+    price_book.update("AAPL", {"price": 95.0}, stock_id=stock.stock_id)
+
+    response = client.get("/api/stocks/AAPL/indicators")
+    assert response.status_code == 200
+    indicators = response.json()
+    assert indicators["interval"] == "1d"
+    assert indicators["bars"] == 31
+    assert indicators["sma_20"] is not None
+    assert indicators["rsi_14"] < 50
+
+    assert client.get("/api/stocks/AAPL/indicators?interval=2w").status_code == 400
+    assert client.get("/api/stocks/NONEXISTENT/indicators").status_code == 404
@@ -0,0 +1,101 @@
+import asyncio
+from unittest.mock import patch
+
+import httpx
+
+from app.config import settings
+from app.utils.market_data_client import MarketDataClient, DEMO_QUOTE, parse_finnhub_quote
+from app.utils.quote_cache import quote_cache
+from app.utils.stock_data import fetch_stock_data_async
+
+
+def make_client(handler):
+    return MarketDataClient(base_url="https://finnhub.test/api/v1", transport=httpx.MockTransport(handler))
+
+
+class TestParseFinnhubQuote:
+    """Test cases for parse_finnhub_quote"""
+
+    def test_valid_quote(self):
+        assert parse_finnhub_quote("AAPL", {"c": 175.5, "d": 3.25, "dp": 1.89}) == {
+            "price": 175.5,
+            "change": 3.25,
+            "change_percent": 1.89
+        }
+
+    def test_invalid_quote(self):
+        assert parse_finnhub_quote("AAPL", {"c": None}) is None
+        assert parse_finnhub_quote("AAPL", {"error": "API limit exceeded"}) is None
+
+
+class TestMarketDataClient:
+    """Test cases for the async MarketDataClient"""
+
+    def test_fetch_quote_success(self):
+        requests_seen = []
+
+        def handler(request: httpx.Request):
+            requests_seen.append(request)
+            return httpx.Response(200, json={"c": 175.5, "d": 3.25, "dp": 1.89})
+
+        client = make_client(handler)
+
+        async def run():
+            try:
+                return await client.fetch_quote("AAPL")
+            finally:
+                await client.aclose()
+
+        with patch.object(settings, 'FINNHUB_API_KEY', 'test_key'):
+            result = asyncio.run(run())
+
+        assert result == {"price": 175.5, "change": 3.25, "change_percent": 1.89}
+        assert requests_seen[0].url.path == "/api/v1/quote"
+        assert requests_seen[0].url.params["symbol"] == "AAPL"
+
+    def test_fetch_quote_reuses_pooled_client(self):
+        client = make_client(lambda request: httpx.Response(200, json={"c": 1, "d": 0, "dp": 0}))
+
+        async def run():
+            try:
+                await client.fetch_quote("AAPL")
+                first = client._client
+                await client.fetch_quote("MSFT")
+                return first is client._client
+            finally:
+                await client.aclose()
+
+        with patch.object(settings, 'FINNHUB_API_KEY', 'test_key'):
+            assert asyncio.run(run()) is True
+
+    def test_fetch_quote_error_returns_none(self):
+        def handler(request: httpx.Request):
+            raise httpx.ConnectTimeout("timed out")
+
+        client = make_client(handler)
+        with patch.object(settings, 'FINNHUB_API_KEY', 'test_key'):
+            assert asyncio.run(client.fetch_quote("AAPL")) is None
+
+    def test_fetch_quote_demo_mode(self):
+        client = make_client(lambda request: httpx.Response(500))
+        with patch.object(settings, 'FINNHUB_API_KEY', 'demo'):
+            assert asyncio.run(client.fetch_quote("AAPL")) == DEMO_QUOTE
+
+
+def test_fetch_stock_data_async_coalesces_concurrent_misses():
+    calls = []
+
+    async def fake_fetch(ticker_symbol):
+        calls.append(ticker_symbol)
+        await asyncio.sleep(0.01)
+        return {"price": 10.0, "change": 0.0, "change_percent": 0.0}
+
+    async def run():
+        return await asyncio.gather(*[fetch_stock_data_async("aapl") for _ in range(5)])
+
+    with patch("app.utils.stock_data.market_data_client.fetch_quote", side_effect=fake_fetch):
+        results = asyncio.run(run())
+
+    assert calls == ["AAPL"]
+    assert all(result["price"] == 10.0 for result in results)
+    assert quote_cache.stats()["coalesced"] == 4
@@ -0,0 +1,79 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+import numpy as np
+
+from app.config import settings
+from app.utils.market_data_client import MarketDataClient
+from app.utils.market_simulator import MarketSimulator, market_simulator
+from app.utils.price_book import price_book
+from app.utils.trade_stream import TradeStreamIngestor
+
+
+class TestMarketSimulator:
+    """Test cases for the correlated GBM simulator"""
+
+    def test_quote_uses_finnhub_format(self):
+        simulator = MarketSimulator(seed=1)
+        simulator.add_ticker("AAPL", 100.0)
+        quote = simulator.finnhub_quote("aapl")
+        assert set(quote) == {"c", "d", "dp", "pc", "t"}
+        assert quote["pc"] == 100.0
+        assert abs(quote["d"] - (quote["c"] - 100.0)) < 1e-3
+
+    def test_unknown_ticker_gets_stable_starting_price(self):
+        first, second = MarketSimulator(seed=1), MarketSimulator(seed=2)
+        assert first.finnhub_quote("NEWCO")["pc"] == second.finnhub_quote("NEWCO")["pc"]
+
+    def test_advance_steps_whole_ticks(self):
+        simulator = MarketSimulator(tick_interval_seconds=0.5, seed=1)
+        simulator.add_ticker("AAPL", 100.0)
+        start = simulator._clock
+        assert simulator.advance(start + 1.2) == 2
+        assert simulator.advance(start + 1.4) == 0
+        assert simulator.advance(start + 1.5) == 1
+        assert simulator.stats()["ticks"] == 3
+
+    def test_log_returns_follow_volatility_and_correlation(self):
+        simulator = MarketSimulator(volatility=0.4, drift=0.0, correlation=0.6, tick_interval_seconds=60, seed=7)
+        for ticker in ("A", "B", "C"):
+            simulator.add_ticker(ticker, 100.0)
+        returns = []
+        for _ in range(4000):
+            before = simulator._prices.copy()
+            simulator._step(1)
+            returns.append(np.log(simulator._prices / before))
+        returns = np.array(returns)
+
+        dt = 60 / (252 * 6.5 * 3600)
+        assert abs(returns.std(axis=0).mean() / np.sqrt(dt) - 0.4) < 0.03
+        correlation = np.corrcoef(returns.T)
+        assert abs(correlation[0, 1] - 0.6) < 0.05
+        assert abs(correlation[1, 2] - 0.6) < 0.05
+
+    def test_trade_message_matches_finnhub_stream(self):
+        simulator = MarketSimulator(seed=1)
+        message = json.loads(simulator.trade_message(["AAPL", "MSFT"]))
+        assert message["type"] == "trade"
+        assert [trade["s"] for trade in message["data"]] == ["AAPL", "MSFT"]
+        assert all(trade["p"] > 0 and trade["v"] >= 1 and trade["t"] > 0 for trade in message["data"])
+
+
+class TestSimulatorProvider:
+    """Test cases for serving simulated data through the provider interfaces"""
+
+    def test_client_serves_simulated_quotes(self):
+        client = MarketDataClient(base_url="https://finnhub.test/api/v1")
+        market_simulator.add_ticker("SIMCO", 250.0)
+        with patch.object(settings, "MARKET_DATA_PROVIDER", "simulator"):
+            quote = asyncio.run(client.fetch_quote("SIMCO"))
+        assert set(quote) == {"price", "change", "change_percent"}
+        assert abs(quote["price"] - 250.0) < 25.0
+
+    def test_trade_stream_consumes_simulator(self):
+        ingestor = TradeStreamIngestor(session_factory=None)
+        ingestor.set_stocks({"SIMCO": 1})
+        message = market_simulator.trade_message(["SIMCO"])
+        assert ingestor.handle_message(message) == 1
+        assert price_book.get("SIMCO")["price"] == json.loads(message)["data"][0]["p"]
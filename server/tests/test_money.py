@@ -0,0 +1,45 @@
+from decimal import Decimal
+
+from sqlalchemy.orm import Session
+
+from app.models.fund import Fund
+from app.models.user import User
+from app.utils.auth import get_password_hash
+from app.utils.money import average_cost, from_minor, minor_to_float, to_minor
+
+
+class TestConversions:
+    def test_to_minor_rounds_half_up(self):
+        assert to_minor(100) == 10000
+        assert to_minor(100.5) == 10050
+        assert to_minor(Decimal("0.005")) == 1
+        assert to_minor("19.994") == 1999
+        # Binary floats convert as written
+        assert to_minor(0.29) == 29
+
+    def test_back_to_currency_units(self):
+        assert from_minor(10050) == Decimal("100.50")
+        assert minor_to_float(-250) == -2.5
+        assert minor_to_float(None) is None
+
+    def test_average_cost_rounds_half_up(self):
+        assert average_cost(0, 0, 3, 1000) == 1000
+        # (1 * 100 + 2 * 101) / 3 = 100.67
+        assert average_cost(1, 100, 2, 101) == 101
+        # (1 * 100 + 1 * 101) / 2 = 100.5
+        assert average_cost(1, 100, 1, 101) == 101
+
+
+class TestMajorAmount:
+    def test_decimal_view_of_minor_column(self, db_session: Session):
+        user = User(username="saver", email="saver@example.com", password_hash=get_password_hash("password"))
+        db_session.add(user)
+        db_session.commit()
+        fund = Fund(user_id=user.user_id, balance=100.10)
+        db_session.add(fund)
+        db_session.commit()
+
+        assert fund.balance_minor == 10010
+        assert fund.balance == Decimal("100.10")
+        assert db_session.query(Fund).filter(Fund.balance > 100).count() == 1
+        assert db_session.query(Fund).filter(Fund.balance > 100.10).count() == 0
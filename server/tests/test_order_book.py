@@ -0,0 +1,218 @@
+import random
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.models.fund import Fund
+from app.models.holding import Holding
+from app.models.order import Order
+from app.models.stock import Stock
+from app.models.transaction import Transaction
+from app.models.user import User
+from app.utils.auth import get_password_hash
+from app.utils.order_book import (
+    CANCELLED, FILLED, LIMIT, OPEN, REJECTED, STOP, OrderBook, RestingOrder, order_book
+)
+from app.utils.price_book import price_book
+from app.utils.trading import BUY, SELL
+from tests.conftest import TestingSessionLocal
+
+
+def _order(order_id: int, side: str, order_type: str, trigger_price: float, stock_id: int = 1, user_id: int = 1):
+    return RestingOrder(order_id, user_id, stock_id, side, order_type, 1, trigger_price)
+
+
+def _ids(orders):
+    return [order.order_id for order in orders]
+
+
+class TestMatching:
+    def test_each_order_kind_fires_on_its_side(self):
+        book = OrderBook()
+        book.add(_order(1, BUY, LIMIT, 95))
+        book.add(_order(2, SELL, STOP, 90))
+        book.add(_order(3, SELL, LIMIT, 105))
+        book.add(_order(4, BUY, STOP, 110))
+
+        assert book.match(1, 100) == []
+        assert _ids(book.match(1, 95)) == [1]
+        assert _ids(book.match(1, 80)) == [2]
+        assert _ids(book.match(1, 120)) == [3, 4]
+        assert book.stats()["resting"] == 0
+
+    def test_crossed_orders_come_out_best_level_first(self):
+        book = OrderBook()
+        for order_id, level in enumerate([97, 99, 98, 90], start=1):
+            book.add(_order(order_id, BUY, LIMIT, level))
+        assert _ids(book.match(1, 97.5)) == [2, 3]
+        assert _ids(book.match(2, 50)) == []
+
+    def test_cancelled_orders_never_fire(self):
+        book = OrderBook()
+        book.add(_order(1, BUY, LIMIT, 95))
+        book.add(_order(2, BUY, LIMIT, 94))
+        assert book.cancel(1)
+        assert not book.cancel(1)
+        assert _ids(book.match(1, 90)) == [2]
+
+    def test_new_order_triggers_against_last_known_price(self):
+        price_book.register(1, "AAPL")
+        price_book.update_trade("AAPL", 100.0)
+        book = OrderBook()
+        book.add(_order(1, BUY, LIMIT, 101))
+        assert book.stats()["triggered"] == 1
+
+    def test_ticks_do_not_scan_resting_orders(self):
+        rng = random.Random(7)
+        book = OrderBook()
+        for order_id in range(100000):
+            side = BUY if order_id % 2 else SELL
+            # Buys rest below 100, sells above, so no tick between them crosses anything
+            level = rng.uniform(50, 99) if side == BUY else rng.uniform(101, 150)
+            book.add(_order(order_id, side, LIMIT, level, stock_id=order_id % 10))
+
+        started = time.perf_counter()
+        for tick in range(10000):
+            assert book.match(tick % 10, 99.5 + (tick % 2)) == []
+        assert (time.perf_counter() - started) / 10000 < 0.0002
+
+        triggered = book.match(3, 98.0)
+        assert triggered and all(order.trigger_price >= 98.0 for order in triggered)
+        assert book.stats()["resting"] == 100000 - len(triggered)
+
+
+@pytest.fixture
+def trader(db_session: Session):
+    user = User(username="orders", email="orders@example.com", password_hash=get_password_hash("password"))
+    stock = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=100.00)
+    db_session.add_all([user, stock])
+    db_session.commit()
+    db_session.add(Fund(user_id=user.user_id, balance=1000.0))
+    db_session.commit()
+    price_book.register(stock.stock_id, "AAPL")
+    with patch.object(order_book, "session_factory", TestingSessionLocal):
+        yield user, stock
+
+
+def _rest(db_session: Session, user: User, stock: Stock, side: str, order_type: str, quantity: int, level: float):
+    order = Order(user_id=user.user_id, stock_id=stock.stock_id, side=side, order_type=order_type,
+                  quantity=quantity, trigger_price=level, status=OPEN)
+    db_session.add(order)
+    db_session.commit()
+    order_book.add(RestingOrder.from_row(order))
+    return order.order_id
+
+
+class TestExecution:
+    def test_triggered_orders_fill_at_the_tick_price(self, db_session: Session, trader):
+        user, stock = trader
+        buy = _rest(db_session, user, stock, BUY, LIMIT, 5, 95.0)
+        stop = _rest(db_session, user, stock, SELL, STOP, 5, 90.0)
+
+        price_book.update_trade("AAPL", 94.5)
+        assert order_book.execute_triggered() == 1
+        price_book.update_trade("AAPL", 89.0)
+        assert order_book.execute_triggered() == 1
+
+        db_session.expire_all()
+        orders = {order.order_id: order for order in db_session.query(Order)}
+        assert orders[buy].status == FILLED and float(orders[buy].executed_price) == 94.5
+        assert orders[stop].status == FILLED and float(orders[stop].executed_price) == 89.0
+        assert float(db_session.query(Fund).one().balance) == 1000.0 - 472.5 + 445.0
+        assert db_session.query(Holding).count() == 0
+        transaction_ids = {orders[buy].transaction_id, orders[stop].transaction_id}
+        assert {t.transaction_id for t in db_session.query(Transaction)} == transaction_ids
+
+    def test_unfillable_orders_are_rejected_with_reason(self, db_session: Session, trader):
+        user, stock = trader
+        order_id = _rest(db_session, user, stock, BUY, LIMIT, 50, 95.0)
+        price_book.update_trade("AAPL", 95.0)
+        order_book.execute_triggered()
+
+        order = db_session.query(Order).filter(Order.order_id == order_id).one()
+        assert (order.status, order.reason) == (REJECTED, "Insufficient funds")
+        assert order_book.stats()["rejected"] == 1
+
+    def test_failing_orders_back_off_and_are_rejected(self, db_session: Session, trader):
+        user, stock = trader
+        order_id = _rest(db_session, user, stock, BUY, LIMIT, 1, 95.0)
+        price_book.update_trade("AAPL", 94.0)
+
+        with patch("app.utils.order_book.fill_basket", side_effect=RuntimeError("database went away")), \
+                patch.object(order_book, "max_attempts", 3), \
+                patch.object(order_book, "retry_base_delay_seconds", 60):
+            assert order_book.execute_triggered() == 1
+            # Waiting out its backoff, not re-triggered straight away
+            assert order_book.execute_triggered() == 0
+            assert order_book.stats()["retrying"] == 1
+
+            order_book.retry_base_delay_seconds = 0
+            order_book._retrying[order_id] = (0.0, order_book._retrying[order_id][1])
+            assert order_book.execute_triggered() == 1
+            assert order_book.execute_triggered() == 1
+            assert order_book.execute_triggered() == 0
+
+        order = db_session.query(Order).filter(Order.order_id == order_id).one()
+        assert (order.status, order.reason) == (REJECTED, "Execution failed 3 times")
+        assert order_book.stats()["failures"] == 3
+        assert order_book.stats()["retrying"] == 0
+
+    def test_orders_cancelled_before_execution_are_skipped(self, db_session: Session, trader):
+        user, stock = trader
+        order_id = _rest(db_session, user, stock, BUY, LIMIT, 1, 95.0)
+        price_book.update_trade("AAPL", 90.0)
+        db_session.query(Order).update({"status": CANCELLED})
+        db_session.commit()
+        order_book.execute_triggered()
+
+        assert db_session.query(Order).one().status == CANCELLED
+        assert db_session.query(Transaction).count() == 0
+
+    def test_load_rests_open_orders_only(self, db_session: Session, trader):
+        user, stock = trader
+        _rest(db_session, user, stock, BUY, LIMIT, 1, 95.0)
+        _rest(db_session, user, stock, SELL, LIMIT, 1, 120.0)
+        db_session.query(Order).filter(Order.side == SELL).update({"status": CANCELLED})
+        db_session.commit()
+
+        book = OrderBook(session_factory=TestingSessionLocal)
+        book.reload()
+        assert book.stats()["resting"] == 1
+
+
+class TestOrderRoutes:
+    def _headers(self, client: TestClient):
+        response = client.post("/api/auth/login", data={"username": "orders@example.com", "password": "password"})
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def test_place_list_and_cancel(self, client: TestClient, db_session: Session, trader):
+        _, stock = trader
+        headers = self._headers(client)
+        response = client.post("/api/orders/", headers=headers, json={
+            "stock_id": stock.stock_id, "side": "BUY", "order_type": "LIMIT", "quantity": 2, "trigger_price": 95.0
+        })
+        assert response.status_code == 200
+        order_id = response.json()["order_id"]
+        assert response.json()["status"] == OPEN
+        assert order_book.stats()["resting"] == 1
+
+        listed = client.get("/api/orders/?status=open", headers=headers).json()
+        assert [order["order_id"] for order in listed] == [order_id]
+        assert listed[0]["ticker_symbol"] == "AAPL"
+
+        assert client.delete(f"/api/orders/{order_id}", headers=headers).status_code == 200
+        assert client.delete(f"/api/orders/{order_id}", headers=headers).status_code == 404
+        assert order_book.stats()["resting"] == 0
+
+    def test_rejects_invalid_orders(self, client: TestClient, db_session: Session, trader):
+        _, stock = trader
+        headers = self._headers(client)
+        order = {"stock_id": stock.stock_id, "side": "BUY", "order_type": "LIMIT", "quantity": 0, "trigger_price": 95.0}
+        assert client.post("/api/orders/", headers=headers, json=order).status_code == 400
+        order.update(quantity=1, stock_id=9999)
+        assert client.post("/api/orders/", headers=headers, json=order).status_code == 404
+        order.update(stock_id=stock.stock_id, order_type="MARKET")
+        assert client.post("/api/orders/", headers=headers, json=order).status_code == 422
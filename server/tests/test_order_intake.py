@@ -0,0 +1,198 @@
+import asyncio
+import threading
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.fund import Fund
+from app.models.order import Order
+from app.models.stock import Stock
+from app.models.user import User
+from app.utils.auth import get_password_hash
+from app.utils.order_intake import FILLED, QUEUED, REJECTED, IntakeUnavailable, OrderIntake, order_intake
+from app.utils.trading import BUY, SELL, TradeError, fill_basket
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture
+def traders(db_session: Session):
+    users = [
+        User(username=f"intake{i}", email=f"intake{i}@example.com", password_hash=get_password_hash("password"))
+        for i in range(2)
+    ]
+    stock = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=100.00)
+    db_session.add_all(users + [stock])
+    db_session.commit()
+    db_session.add_all([Fund(user_id=user.user_id, balance=1000.0) for user in users])
+    db_session.commit()
+    return users, stock
+
+
+async def _run(intake: OrderIntake, orders):
+    intake.start()
+    try:
+        pending = [intake.submit(*order) for order in orders]
+        for order in pending:
+            await intake.wait(order, 5)
+        return pending
+    finally:
+        await intake.stop()
+
+
+class TestOrderIntake:
+    def test_orders_apply_in_order_per_user_with_group_commit(self, db_session: Session, traders):
+        (first, second), stock = traders
+        intake = OrderIntake(shards=2, session_factory=TestingSessionLocal)
+        orders = []
+        for _ in range(5):
+            orders.append((first.user_id, stock.stock_id, 2, BUY))
+            orders.append((second.user_id, stock.stock_id, 2, BUY))
+        # Only fillable after the buys queued before it
+        orders.append((first.user_id, stock.stock_id, 10, SELL))
+        orders.append((second.user_id, stock.stock_id, 1, BUY))
+
+        pending = asyncio.run(_run(intake, orders))
+
+        assert [order.status for order in pending] == [FILLED] * 11 + [REJECTED]
+        assert pending[-1].reason == "Insufficient funds"
+        # Everything queued before the writers woke up went out in one commit per shard
+        assert intake.stats()["batches"] == 2
+        balances = {fund.user_id: float(fund.balance) for fund in db_session.query(Fund)}
+        assert balances == {first.user_id: 1000.0, second.user_id: 0.0}
+        stored = {order.intake_id: order.status for order in db_session.query(Order)}
+        assert stored == {order.intake_id: order.status for order in pending}
+
+    def test_rejects_orders_it_cannot_take(self):
+        intake = OrderIntake(max_pending=1)
+        with pytest.raises(IntakeUnavailable):
+            intake.submit(1, 1, 1, BUY)
+
+        async def overfill():
+            intake.start()
+            try:
+                with pytest.raises(TradeError):
+                    intake.submit(1, 1, 0, BUY)
+                intake._pending = 1
+                with pytest.raises(IntakeUnavailable):
+                    intake.submit(1, 1, 1, BUY)
+            finally:
+                intake._pending = 0
+                await intake.stop()
+
+        asyncio.run(overfill())
+
+    def test_unknown_stock_is_rejected_in_memory_only(self, db_session: Session, traders):
+        (first, _), _ = traders
+        intake = OrderIntake(shards=1, session_factory=TestingSessionLocal)
+        (order,) = asyncio.run(_run(intake, [(first.user_id, 9999, 1, BUY)]))
+        assert (order.status, order.reason) == (REJECTED, "Stock not found")
+        assert db_session.query(Order).count() == 0
+
+    def test_failing_user_is_rejected_in_the_table_without_blocking_others(self, db_session: Session, traders):
+        (first, second), stock = traders
+        intake = OrderIntake(shards=1, session_factory=TestingSessionLocal)
+
+        def fail_for_first(db, user_id, *args, **kwargs):
+            if user_id == first.user_id:
+                raise RuntimeError("lock timeout")
+            return fill_basket(db, user_id, *args, **kwargs)
+
+        with patch("app.utils.order_intake.fill_basket", fail_for_first):
+            failed, filled = asyncio.run(_run(intake, [
+                (first.user_id, stock.stock_id, 1, BUY), (second.user_id, stock.stock_id, 1, BUY)
+            ]))
+
+        assert (failed.status, failed.reason) == (REJECTED, "Order could not be processed")
+        assert filled.status == FILLED
+        stored = {order.intake_id: (order.status, order.reason) for order in db_session.query(Order)}
+        assert stored == {
+            failed.intake_id: (REJECTED, "Order could not be processed"),
+            filled.intake_id: (FILLED, None),
+        }
+
+    def test_orders_left_queued_at_shutdown_are_rejected_in_the_table(self, db_session: Session, traders):
+        (first, _), stock = traders
+        intake = OrderIntake(shards=1, session_factory=TestingSessionLocal)
+        release = threading.Event()
+
+        def stuck_write(batch):
+            release.wait(5)
+            return []
+
+        async def shut_down_while_writing():
+            intake.start()
+            try:
+                intake.submit(first.user_id, stock.stock_id, 1, BUY)
+                # Let the writer take the first order into a write that never finishes in time
+                await asyncio.sleep(0.05)
+                left = intake.submit(first.user_id, stock.stock_id, 2, BUY)
+                await intake.stop(timeout=0.1)
+                return left
+            finally:
+                release.set()
+
+        with patch.object(intake, "_write", stuck_write):
+            left = asyncio.run(shut_down_while_writing())
+
+        assert (left.status, left.reason) == (REJECTED, "Order intake shut down before execution")
+        stored = db_session.query(Order).one()
+        assert (stored.intake_id, stored.status, stored.quantity) == (left.intake_id, REJECTED, 2)
+
+
+class TestAsyncTradeRoutes:
+    def test_trade_is_queued_and_polled(self, client: TestClient, db_session: Session, traders):
+        (first, _), stock = traders
+        token = client.post(
+            "/api/auth/login", data={"username": first.email, "password": "password"}
+        ).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        async def start():
+            order_intake.start()
+
+        with patch.object(settings, "TRADE_INTAKE_MODE", "async"), \
+                patch.object(order_intake, "session_factory", TestingSessionLocal):
+            client.portal.call(start)
+            try:
+                response = client.post(
+                    "/api/trade/buy", headers=headers, json={"stock_id": stock.stock_id, "quantity": 4}
+                )
+                assert response.status_code == 202
+                body = response.json()
+                assert (body["message"], body["status"]) == ("Buy order accepted", QUEUED)
+
+                polled = client.get(f"/api/orders/intake/{body['order_id']}?wait=5", headers=headers).json()
+                assert (polled["status"], polled["executed_price"]) == (FILLED, 100.0)
+            finally:
+                client.portal.call(order_intake.stop)
+
+        # Once forgotten in memory the outcome is read back from the orders table
+        order_intake.clear()
+        stored = client.get(f"/api/orders/intake/{body['order_id']}", headers=headers)
+        assert stored.json()["status"] == FILLED
+        assert stored.json()["transaction_id"] == polled["transaction_id"]
+        assert client.get("/api/orders/intake/unknown", headers=headers).status_code == 404
+
+    def test_unknown_stock_is_rejected_before_queueing(self, client: TestClient, db_session: Session, traders):
+        (first, _), _ = traders
+        token = client.post(
+            "/api/auth/login", data={"username": first.email, "password": "password"}
+        ).json()["access_token"]
+
+        async def start():
+            order_intake.start()
+
+        with patch.object(settings, "TRADE_INTAKE_MODE", "async"):
+            client.portal.call(start)
+            try:
+                response = client.post(
+                    "/api/trade/buy", headers={"Authorization": f"Bearer {token}"},
+                    json={"stock_id": 9999, "quantity": 1}
+                )
+            finally:
+                client.portal.call(order_intake.stop)
+        assert (response.status_code, response.json()["detail"]) == (404, "Stock not found")
+        assert order_intake.stats()["queued"] == 0
@@ -1,6 +1,10 @@
 
+import asyncio
+import threading
+
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 from unittest.mock import patch
 
@@ -8,6 +12,10 @@ from app.models.user import User
 from app.models.holding import Holding
 from app.models.stock import Stock
 from app.utils.auth import get_password_hash
+from app.utils.portfolio_valuation import held_stocks
+from app.utils.price_book import price_book
+from app.utils.stock_data import save_stock_prices
+from tests.conftest import engine
 
 @pytest.fixture(scope="function")
 def test_user(db_session: Session):
@@ -37,17 +45,11 @@ def test_get_portfolio_current_value_no_holdings(client: TestClient, auth_header
     assert data["profit_loss_percentage"] == 0.0
     assert data["holdings"] == []
 
-@patch("api.portfolio.fetch_stock_data")
+@patch("api.portfolio.fetch_stock_data_async")
 def test_get_portfolio_current_value_with_holdings(mock_fetch, client: TestClient, db_session: Session, auth_headers: dict, test_user: User):
-    # Mock fetch_stock_data to return expected prices
-    def mock_fetch_side_effect(ticker):
-        if ticker == "AAPL":
-            return {"price": 150.0, "change": 10.0, "change_percent": 7.14}
-        elif ticker == "GOOGL":
-            return {"price": 2800.0, "change": 100.0, "change_percent": 3.70}
-        return None
-    
-    mock_fetch.side_effect = mock_fetch_side_effect
+    # Prices come from the price book kept current by the background refresher
+    price_book.update("AAPL", {"price": 150.0, "change": 10.0, "change_percent": 7.14})
+    price_book.update("GOOGL", {"price": 2800.0, "change": 100.0, "change_percent": 3.70})
     
     stock1 = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.0)
     stock2 = Stock(ticker_symbol="GOOGL", company_name="Alphabet Inc.", current_price=2800.0)
@@ -67,8 +69,11 @@ def test_get_portfolio_current_value_with_holdings(mock_fetch, client: TestClien
     assert data["current_value"] == (10 * 150.0) + (5 * 2800.0)
     assert data["profit_loss"] == ((10 * 150.0) + (5 * 2800.0)) - ((10 * 140.0) + (5 * 2700.0))
     assert len(data["holdings"]) == 2
+    assert data["holdings"][0]["change"] == 10.0
+    # Read path never calls the market data provider inline
+    mock_fetch.assert_not_called()
 
-@patch("api.portfolio.fetch_stock_data")
+@patch("api.portfolio.fetch_stock_data_async")
 def test_refresh_portfolio_prices(mock_fetch_stock_data, client: TestClient, db_session: Session, auth_headers: dict, test_user: User):
     stock1 = Stock(ticker_symbol="MSFT", company_name="Microsoft", current_price=300.0)
     db_session.add(stock1)
@@ -89,3 +94,75 @@ def test_refresh_portfolio_prices(mock_fetch_stock_data, client: TestClient, db_
     db_session.refresh(stock1)
     assert stock1.current_price == 310.0
     mock_fetch_stock_data.assert_called_once_with("MSFT")
+
+def _hold(db_session: Session, user: User, count: int):
+    stocks = [Stock(ticker_symbol=f"T{i}", company_name=f"Company {i}", current_price=10.0 + i) for i in range(count)]
+    db_session.add_all(stocks)
+    db_session.commit()
+    db_session.add_all([
+        Holding(user_id=user.user_id, stock_id=stock.stock_id, quantity=1, average_cost=10.0) for stock in stocks
+    ])
+    db_session.commit()
+    return stocks
+
+def test_current_value_reads_all_holdings_in_one_query(client: TestClient, db_session: Session, auth_headers: dict, test_user: User):
+    _hold(db_session, test_user, 20)
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if "stocks" in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/api/portfolio/current-value", headers=auth_headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    assert [holding["ticker_symbol"] for holding in response.json()["holdings"]] == [f"T{i}" for i in range(20)]
+    assert response.json()["current_value"] == sum(10.0 + i for i in range(20))
+    assert len(statements) == 1
+
+@patch("api.portfolio.fetch_stock_data_async")
+def test_refresh_fetches_quotes_concurrently(mock_fetch, client: TestClient, db_session: Session, auth_headers: dict, test_user: User):
+    _hold(db_session, test_user, 6)
+    in_flight = [0, 0]
+
+    async def slow_quote(ticker_symbol):
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight)
+        await asyncio.sleep(0.05)
+        in_flight[0] -= 1
+        return {"price": 50.0}
+
+    mock_fetch.side_effect = slow_quote
+    response = client.post("/api/portfolio/refresh-prices", headers=auth_headers)
+
+    assert response.json()["updated_count"] == 6
+    assert mock_fetch.call_count == 6
+    assert in_flight[1] > 1
+    db_session.expire_all()
+    assert {float(stock.current_price) for stock in db_session.query(Stock)} == {50.0}
+
+def test_refresh_keeps_database_work_off_the_event_loop(client: TestClient, db_session: Session, auth_headers: dict, test_user: User):
+    _hold(db_session, test_user, 2)
+    threads = {}
+
+    def record(name, fn):
+        def wrapper(*args):
+            threads[name] = threading.get_ident()
+            return fn(*args)
+        return wrapper
+
+    async def quote(ticker_symbol):
+        threads["loop"] = threading.get_ident()
+        return {"price": 50.0}
+
+    with patch("api.portfolio.held_stocks", record("read", held_stocks)), \
+            patch("api.portfolio.save_stock_prices", record("write", save_stock_prices)), \
+            patch("api.portfolio.fetch_stock_data_async", side_effect=quote):
+        assert client.post("/api/portfolio/refresh-prices", headers=auth_headers).json()["updated_count"] == 2
+
+    assert threads["read"] != threads["loop"]
+    assert threads["write"] != threads["loop"]
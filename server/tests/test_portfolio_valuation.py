@@ -0,0 +1,168 @@
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.models.fund import Fund
+from app.models.holding import Holding
+from app.models.stock import Stock
+from app.models.user import User
+from app.utils.auth import get_password_hash
+from app.utils.portfolio_valuation import PortfolioValuations, portfolio_valuations
+from app.utils.price_book import price_book
+from app.utils.trading import BUY, SELL, execute_trade
+
+
+@pytest.fixture
+def market(db_session: Session):
+    users = [
+        User(username=f"valued{i}", email=f"valued{i}@example.com", password_hash=get_password_hash("password"))
+        for i in range(2)
+    ]
+    stocks = [
+        Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=100.00),
+        Stock(ticker_symbol="MSFT", company_name="Microsoft", current_price=200.00),
+    ]
+    db_session.add_all(users + stocks)
+    db_session.commit()
+    db_session.add_all([Fund(user_id=user.user_id, balance=10000.0) for user in users])
+    db_session.add_all([
+        Holding(user_id=users[0].user_id, stock_id=stocks[0].stock_id, quantity=10, average_cost=90.0),
+        Holding(user_id=users[0].user_id, stock_id=stocks[1].stock_id, quantity=1, average_cost=150.0),
+        Holding(user_id=users[1].user_id, stock_id=stocks[1].stock_id, quantity=2, average_cost=180.0),
+    ])
+    db_session.commit()
+    return users, stocks
+
+
+def _tick(price: float) -> dict:
+    return {"price": price, "change": 0.0, "change_percent": 0.0, "last_updated": datetime.now(timezone.utc)}
+
+
+class TestPortfolioValuations:
+    def test_ticks_revalue_only_the_holders(self, db_session: Session, market):
+        (first, second), _ = market
+        valuations = PortfolioValuations()
+        assert valuations.current_value(db_session, first.user_id)["current_value"] == 1200.0
+        assert valuations.current_value(db_session, second.user_id)["current_value"] == 400.0
+
+        valuations.on_price("AAPL", _tick(110.0))
+        first_value = valuations.current_value(db_session, first.user_id)
+        assert (first_value["current_value"], first_value["profit_loss"]) == (1300.0, 1300.0 - 1050.0)
+        assert first_value["holdings"][0]["current_price"] == 110.0
+        assert valuations.current_value(db_session, second.user_id)["current_value"] == 400.0
+
+        # Nobody cached holds this stock
+        valuations.on_price("TSLA", _tick(1.0))
+        assert valuations.stats()["ticks"] == 1
+        assert valuations.stats()["loads"] == 2
+
+    def test_fills_update_by_delta(self, db_session: Session, market):
+        (first, _), (apple, microsoft) = market
+        valuations = PortfolioValuations()
+        valuations.current_value(db_session, first.user_id)
+
+        valuations.apply_fills(first.user_id, [execute_trade(db_session, first.user_id, apple.stock_id, 10, BUY)])
+        valuations.apply_fills(first.user_id, [execute_trade(db_session, first.user_id, microsoft.stock_id, 1, SELL)])
+        cached = valuations.current_value(db_session, first.user_id)
+
+        assert valuations.stats()["loads"] == 1
+        assert [(row["ticker_symbol"], row["quantity"], row["average_cost"]) for row in cached["holdings"]] == [
+            ("AAPL", 20, 95.0)
+        ]
+        assert (cached["invested_value"], cached["current_value"]) == (1900.0, 2000.0)
+        assert cached == PortfolioValuations().current_value(db_session, first.user_id)
+
+    def test_new_position_is_loaded_from_the_database(self, db_session: Session, market):
+        (_, second), (apple, _) = market
+        valuations = PortfolioValuations()
+        valuations.current_value(db_session, second.user_id)
+        valuations.apply_fills(second.user_id, [execute_trade(db_session, second.user_id, apple.stock_id, 1, BUY)])
+
+        rows = valuations.holdings(db_session, second.user_id)
+        assert [row["ticker_symbol"] for row in rows] == ["MSFT", "AAPL"]
+        assert valuations.stats()["loads"] == 2
+
+    def test_fill_during_load_is_not_cached(self, db_session: Session, market):
+        (first, _), (apple, _) = market
+        valuations = PortfolioValuations()
+        load = valuations._load
+
+        def load_then_trade(db, user_id):
+            valuation = load(db, user_id)
+            valuations.apply_fills(user_id, [execute_trade(db_session, user_id, apple.stock_id, 1, BUY)])
+            return valuation
+
+        with patch.object(valuations, "_load", load_then_trade):
+            valuations.current_value(db_session, first.user_id)
+        assert valuations.stats()["users"] == 0
+        assert valuations.holding(db_session, first.user_id, apple.stock_id)["quantity"] == 11
+
+    def test_fills_from_other_workers_are_picked_up_on_read(self, db_session: Session, market):
+        (first, _), (apple, _) = market
+        valuations = PortfolioValuations()
+        valuations.current_value(db_session, first.user_id)
+        valuations.current_value(db_session, first.user_id)
+        assert (valuations.stats()["hits"], valuations.stats()["loads"]) == (1, 1)
+
+        # Committed by another worker: nothing is applied to this cache
+        execute_trade(db_session, first.user_id, apple.stock_id, 5, BUY)
+        assert valuations.holding(db_session, first.user_id, apple.stock_id)["quantity"] == 15
+        assert (valuations.stats()["stale"], valuations.stats()["loads"]) == (1, 2)
+
+    def test_fill_after_a_trade_by_another_worker_reloads(self, db_session: Session, market):
+        (first, _), (apple, _) = market
+        valuations = PortfolioValuations()
+        valuations.current_value(db_session, first.user_id)
+        execute_trade(db_session, first.user_id, apple.stock_id, 5, BUY)
+        # Applying the next fill would skip the other worker's trade (trade_version 1)
+        result = execute_trade(db_session, first.user_id, apple.stock_id, 1, BUY)
+        assert result.version == 2
+        valuations.apply_fills(first.user_id, [result])
+
+        assert valuations.stats()["users"] == 0
+        assert valuations.holding(db_session, first.user_id, apple.stock_id)["quantity"] == 16
+
+    def test_fill_already_in_the_loaded_valuation_is_skipped(self, db_session: Session, market):
+        (first, _), (apple, _) = market
+        valuations = PortfolioValuations()
+        valuations.current_value(db_session, first.user_id)
+        result = execute_trade(db_session, first.user_id, apple.stock_id, 5, BUY)
+        # A read between the commit and apply_fills reloads with the fill included
+        valuations.current_value(db_session, first.user_id)
+        valuations.apply_fills(first.user_id, [result])
+
+        assert valuations.holding(db_session, first.user_id, apple.stock_id)["quantity"] == 15
+        assert valuations.stats()["fills"] == 0
+
+    def test_expired_and_evicted_valuations_are_reloaded(self, db_session: Session, market):
+        (first, second), _ = market
+        valuations = PortfolioValuations(max_users=1, ttl_seconds=0)
+        valuations.current_value(db_session, first.user_id)
+        valuations.current_value(db_session, first.user_id)
+        assert valuations.stats()["loads"] == 2
+
+        valuations.ttl_seconds = 60
+        valuations.current_value(db_session, second.user_id)
+        assert valuations.stats()["users"] == 1
+        assert valuations.stats()["stocks_held"] == 1
+
+
+def test_routes_serve_trades_and_ticks_from_the_cache(client: TestClient, db_session: Session, market):
+    (first, _), (apple, _) = market
+    token = client.post(
+        "/api/auth/login", data={"username": first.email, "password": "password"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.get("/api/portfolio/current-value", headers=headers).json()["current_value"] == 1200.0
+    client.post("/api/trade/buy", headers=headers, json={"stock_id": apple.stock_id, "quantity": 5})
+    price_book.update("AAPL", {"price": 120.0}, stock_id=apple.stock_id)
+
+    data = client.get("/api/portfolio/current-value", headers=headers).json()
+    assert data["current_value"] == 15 * 120.0 + 200.0
+    holding = client.get(f"/api/portfolio/holdings/{apple.stock_id}", headers=headers).json()
+    assert (holding["quantity"], holding["current_price"], holding["total_value"]) == (15, 120.0, 1800.0)
+    assert portfolio_valuations.stats()["loads"] == 1
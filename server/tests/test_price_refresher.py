@@ -0,0 +1,84 @@
+import asyncio
+from unittest.mock import patch
+
+from sqlalchemy.orm import Session
+
+from app.models.holding import Holding
+from app.models.stock import Stock
+from app.models.user import User
+from app.utils.price_book import price_book
+from app.utils.price_refresher import PriceRefresher
+from tests.conftest import TestingSessionLocal
+
+
+def make_refresher():
+    return PriceRefresher(
+        interval_seconds=60,
+        hot_interval_seconds=5,
+        hot_window_seconds=300,
+        session_factory=TestingSessionLocal,
+    )
+
+
+def quote_for(ticker):
+    prices = {"AAPL": 190.0, "MSFT": 410.0, "TSLA": 250.0}
+    return {"price": prices[ticker], "change": 1.0, "change_percent": 0.5}
+
+
+async def fake_fetch_quotes_bulk(tickers):
+    return {ticker: quote_for(ticker) for ticker in tickers}
+
+
+def seed(db_session: Session):
+    user = User(username="refresher", email="refresher@example.com", password_hash="x")
+    stocks = [
+        Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.0),
+        Stock(ticker_symbol="MSFT", company_name="Microsoft Corporation", current_price=300.0),
+        Stock(ticker_symbol="TSLA", company_name="Tesla, Inc.", current_price=200.0),
+    ]
+    db_session.add(user)
+    db_session.add_all(stocks)
+    db_session.commit()
+    db_session.add(Holding(user_id=user.user_id, stock_id=stocks[0].stock_id, quantity=1, average_cost=100.0))
+    db_session.commit()
+    return stocks
+
+
+class TestPriceRefresher:
+    """Test cases for the background PriceRefresher"""
+
+    def test_refreshes_held_and_requested_tickers(self, db_session: Session):
+        seed(db_session)
+        refresher = make_refresher()
+        refresher.touch("MSFT")
+
+        with patch("app.utils.price_refresher.fetch_quotes_bulk", side_effect=fake_fetch_quotes_bulk):
+            updated = asyncio.run(refresher.refresh_once())
+
+        # TSLA is neither held, watchlisted nor requested
+        assert updated == 2
+        assert price_book.get("AAPL")["price"] == 190.0
+        assert price_book.get("MSFT")["price"] == 410.0
+        assert price_book.get("TSLA") is None
+        db_session.expire_all()
+        assert db_session.query(Stock).filter_by(ticker_symbol="MSFT").first().current_price == 410.0
+
+    def test_hot_tickers_refresh_on_faster_cadence(self, db_session: Session):
+        seed(db_session)
+        refresher = make_refresher()
+        refresher.touch("MSFT")
+
+        with patch("app.utils.price_refresher.time.monotonic", return_value=1000.0), \
+                patch("app.utils.price_refresher.fetch_quotes_bulk", side_effect=fake_fetch_quotes_bulk):
+            asyncio.run(refresher.refresh_once())
+
+        # Hot interval (5 s) has elapsed, base interval (60 s) has not
+        assert refresher.due_tickers(1006.0) == ["MSFT"]
+        assert sorted(refresher.due_tickers(1061.0)) == ["AAPL", "MSFT"]
+
+    def test_untouched_tickers_cool_down(self):
+        refresher = make_refresher()
+        with patch("app.utils.price_refresher.time.monotonic", return_value=1000.0):
+            refresher.touch("MSFT")
+        assert refresher.is_hot("MSFT", 1100.0)
+        assert not refresher.is_hot("MSFT", 1301.0)
@@ -0,0 +1,84 @@
+import threading
+import time
+from unittest.mock import patch
+
+from app.utils.quote_cache import QuoteCache
+
+
+class TestQuoteCache:
+    """Test cases for QuoteCache"""
+
+    def test_hit_after_miss(self):
+        """Test second lookup is served from the cache"""
+        cache = QuoteCache(ttl_seconds=60, max_size=10)
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return {"price": 100.0}
+
+        assert cache.get_or_fetch("AAPL", loader) == {"price": 100.0}
+        assert cache.get_or_fetch("AAPL", loader) == {"price": 100.0}
+        assert len(calls) == 1
+        stats = cache.stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 1
+
+    def test_entry_expires_after_ttl(self):
+        """Test expired entries are reloaded"""
+        cache = QuoteCache(ttl_seconds=10, max_size=10)
+        with patch("app.utils.quote_cache.time.monotonic", return_value=1000.0):
+            cache.get_or_fetch("AAPL", lambda: {"price": 100.0})
+        with patch("app.utils.quote_cache.time.monotonic", return_value=1011.0):
+            result = cache.get_or_fetch("AAPL", lambda: {"price": 101.0})
+        assert result == {"price": 101.0}
+        assert cache.stats()["misses"] == 2
+
+    def test_lru_eviction(self):
+        """Test least recently used ticker is evicted when full"""
+        cache = QuoteCache(ttl_seconds=60, max_size=2)
+        cache.set("AAPL", {"price": 1.0})
+        cache.set("MSFT", {"price": 2.0})
+        cache.get("AAPL")
+        cache.set("TSLA", {"price": 3.0})
+
+        assert cache.get("MSFT") is None
+        assert cache.get("AAPL") == {"price": 1.0}
+        assert cache.get("TSLA") == {"price": 3.0}
+        assert cache.stats()["evictions"] == 1
+
+    def test_failed_load_not_cached(self):
+        """Test None results are retried on the next call"""
+        cache = QuoteCache(ttl_seconds=60, max_size=10)
+        assert cache.get_or_fetch("BAD", lambda: None) is None
+        assert cache.get_or_fetch("BAD", lambda: {"price": 5.0}) == {"price": 5.0}
+
+    def test_concurrent_misses_share_one_load(self):
+        """Test single-flight coalesces concurrent misses for the same ticker"""
+        cache = QuoteCache(ttl_seconds=60, max_size=10)
+        calls = []
+        release = threading.Event()
+
+        def loader():
+            calls.append(1)
+            release.wait(timeout=5)
+            return {"price": 42.0}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_fetch("AAPL", loader)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        # Give followers time to queue up behind the leader
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert results == [{"price": 42.0}] * 8
+        stats = cache.stats()
+        assert stats["misses"] == 1
+        assert stats["coalesced"] == 7
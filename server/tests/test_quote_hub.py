@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.utils.price_book import price_book
+from app.utils.quote_hub import QuoteHub, quote_hub
+
+
+def quote(price):
+    return {"price": price, "change": 0.0, "change_percent": 0.0, "last_updated": None}
+
+
+class TestQuoteHub:
+    """Test cases for QuoteHub fan-out"""
+
+    def test_fanout_only_to_subscribers(self):
+        hub = QuoteHub(batch_interval_seconds=0, max_tickers_per_connection=10)
+
+        async def run():
+            aapl = hub.connect()
+            msft = hub.connect()
+            hub.subscribe(aapl, ["aapl"])
+            hub.subscribe(msft, ["MSFT"])
+            hub.publish("AAPL", quote(190.0))
+            return aapl.take_frame(), msft.take_frame()
+
+        aapl_frame, msft_frame = asyncio.run(run())
+        assert [item["ticker_symbol"] for item in aapl_frame] == ["AAPL"]
+        assert msft_frame == []
+
+    def test_slow_consumer_drops_stale_ticks(self):
+        hub = QuoteHub(batch_interval_seconds=0, max_tickers_per_connection=10)
+
+        async def run():
+            subscription = hub.connect()
+            hub.subscribe(subscription, ["AAPL"])
+            for price in (190.0, 191.0, 192.0):
+                hub.publish("AAPL", quote(price))
+            return subscription, subscription.take_frame()
+
+        subscription, frame = asyncio.run(run())
+        assert [item["price"] for item in frame] == [192.0]
+        assert subscription.dropped == 2
+
+    def test_unchanged_price_is_not_resent(self):
+        hub = QuoteHub(batch_interval_seconds=0, max_tickers_per_connection=10)
+
+        async def run():
+            subscription = hub.connect()
+            hub.subscribe(subscription, ["AAPL"])
+            hub.publish("AAPL", quote(190.0))
+            first = subscription.take_frame()
+            hub.publish("AAPL", quote(190.0))
+            return first, subscription.take_frame()
+
+        first, second = asyncio.run(run())
+        assert len(first) == 1
+        assert second == []
+
+    def test_ticker_limit_per_connection(self):
+        hub = QuoteHub(batch_interval_seconds=0, max_tickers_per_connection=2)
+
+        async def run():
+            subscription = hub.connect()
+            return hub.subscribe(subscription, ["A", "B", "C"])
+
+        assert asyncio.run(run()) == ["A", "B"]
+
+    def test_disconnect_removes_subscriptions(self):
+        hub = QuoteHub(batch_interval_seconds=0, max_tickers_per_connection=10)
+
+        async def run():
+            subscription = hub.connect()
+            hub.subscribe(subscription, ["AAPL"])
+            hub.disconnect(subscription)
+
+        asyncio.run(run())
+        assert hub.stats()["connections"] == 0
+        assert hub.stats()["tickers"] == 0
+
+
+@pytest.fixture
+def fast_frames(monkeypatch):
+    monkeypatch.setattr(quote_hub, "batch_interval_seconds", 0.01)
+
+
+def receive_until(websocket, message_type):
+    while True:
+        message = websocket.receive_json()
+        if message["type"] == message_type:
+            return message
+
+
+def test_stream_websocket_pushes_snapshot_and_deltas(client: TestClient, fast_frames):
+    price_book.update("AAPL", {"price": 190.0, "change": 1.0, "change_percent": 0.5})
+
+    with client.websocket_connect("/api/stocks/stream?tickers=AAPL") as websocket:
+        snapshot = receive_until(websocket, "quotes")
+        assert snapshot["data"][0]["ticker_symbol"] == "AAPL"
+        assert snapshot["data"][0]["price"] == 190.0
+
+        websocket.send_json({"action": "subscribe", "tickers": ["MSFT"]})
+        assert receive_until(websocket, "subscribed")["tickers"] == ["AAPL", "MSFT"]
+
+        price_book.update("MSFT", {"price": 410.0, "change": 2.0, "change_percent": 0.49})
+        delta = receive_until(websocket, "quotes")
+        assert [item["ticker_symbol"] for item in delta["data"]] == ["MSFT"]
+
+        websocket.send_text("not json")
+        assert receive_until(websocket, "error")["type"] == "error"
+
+    # Server-side cleanup runs once the disconnect reaches the handler
+    for _ in range(50):
+        if quote_hub.stats()["connections"] == 0:
+            break
+        time.sleep(0.02)
+    assert quote_hub.stats()["connections"] == 0
@@ -0,0 +1,81 @@
+import asyncio
+from unittest.mock import Mock, patch
+
+from app.models.rate_limit_bucket import RateLimitBucket
+from app.utils.rate_limiter import BACKGROUND, INTERACTIVE, DatabaseTokenBucket, TokenBucket
+from tests.conftest import TestingSessionLocal
+
+
+def make_bucket(**kwargs):
+    options = dict(
+        rate_per_second=1.0, capacity=3, background_reserve=1, max_wait_seconds=0.0, session_factory=TestingSessionLocal
+    )
+    options.update(kwargs)
+    return DatabaseTokenBucket("test_provider", **options)
+
+
+class TestDatabaseTokenBucket:
+    """Test cases for the database-backed token bucket"""
+
+    def test_grants_burst_then_denies(self, db_session):
+        bucket = make_bucket()
+        with patch("app.utils.rate_limiter.time.time", return_value=1000.0):
+            assert all(bucket.acquire_blocking(INTERACTIVE) for _ in range(3))
+            assert not bucket.acquire_blocking(INTERACTIVE)
+
+        row = db_session.get(RateLimitBucket, "test_provider")
+        assert row.tokens == 0
+        assert bucket.stats()["granted"] == 3
+        assert bucket.stats()["timeouts"] == 1
+
+    def test_refills_over_time(self, db_session):
+        bucket = make_bucket()
+        with patch("app.utils.rate_limiter.time.time", return_value=1000.0):
+            for _ in range(3):
+                bucket.acquire_blocking(INTERACTIVE)
+        with patch("app.utils.rate_limiter.time.time", return_value=1002.0):
+            assert bucket.acquire_blocking(INTERACTIVE)
+            assert bucket.acquire_blocking(INTERACTIVE)
+            assert not bucket.acquire_blocking(INTERACTIVE)
+
+    def test_background_keeps_reserve_for_interactive(self, db_session):
+        bucket = make_bucket()
+        with patch("app.utils.rate_limiter.time.time", return_value=1000.0):
+            assert bucket.acquire_blocking(BACKGROUND)
+            assert bucket.acquire_blocking(BACKGROUND)
+            assert not bucket.acquire_blocking(BACKGROUND)
+            assert bucket.acquire_blocking(INTERACTIVE)
+
+    def test_buckets_share_one_row(self, db_session):
+        # Two limiters with the same name stand in for two workers
+        first, second = make_bucket(), make_bucket()
+        with patch("app.utils.rate_limiter.time.time", return_value=1000.0):
+            assert first.acquire_blocking(INTERACTIVE)
+            assert second.acquire_blocking(INTERACTIVE)
+            assert first.acquire_blocking(INTERACTIVE)
+            assert not second.acquire_blocking(INTERACTIVE)
+
+    def test_async_acquire_waits_for_refill(self, db_session):
+        bucket = make_bucket(rate_per_second=50.0, capacity=1, background_reserve=0, max_wait_seconds=1.0)
+
+        async def run():
+            return [await bucket.acquire(INTERACTIVE) for _ in range(2)]
+
+        assert asyncio.run(run()) == [True, True]
+        assert bucket.stats()["waits"] >= 1
+
+    def test_falls_back_to_local_bucket_when_database_fails(self):
+        bucket = make_bucket(session_factory=Mock(side_effect=RuntimeError("db down")))
+        assert bucket.acquire_blocking(INTERACTIVE)
+        assert bucket.stats()["fallbacks"] == 1
+
+
+class TestLocalTokenBucketPriority:
+    """Test cases for background priority on the in-process bucket"""
+
+    def test_background_waits_while_reserve_is_low(self):
+        with patch("app.utils.rate_limiter.time.monotonic", return_value=0.0):
+            bucket = TokenBucket(rate_per_second=10, capacity=2, background_reserve=1)
+            assert bucket._try_take_background() == 0.0
+            assert bucket._try_take_background() > 0
+            assert bucket._reserve() == 0.0
@@ -0,0 +1,192 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.stock import Stock
+from app.utils.search_index import StockSearchIndex, stock_search_index, trigrams
+from app.utils.stock_data import search_stocks, search_stocks_page
+from tests.conftest import TestingSessionLocal
+
+LISTINGS = [
+    ("AAPL", "Apple Inc."),
+    ("AMZN", "Amazon.com Inc."),
+    ("AMD", "Advanced Micro Devices Inc."),
+    ("MSFT", "Microsoft Corporation"),
+    ("GOOGL", "Alphabet Inc."),
+    ("APLE", "Apple Hospitality REIT Inc."),
+]
+
+
+def _index(listings=LISTINGS) -> StockSearchIndex:
+    index = StockSearchIndex()
+    index._loaded_at = time.monotonic()
+    for stock_id, (ticker, name) in enumerate(listings, start=1):
+        index.upsert(stock_id, ticker, name)
+    return index
+
+
+def _tickers(results):
+    return [stock.ticker_symbol for stock in results]
+
+
+class TestStockSearchIndex:
+    def test_trigrams_match_pg_trgm_padding(self):
+        assert trigrams("Ab") == {"  a", " ab", "ab "}
+
+    def test_exact_ticker_ranks_first(self):
+        assert _tickers(_index().search("aple"))[0] == "APLE"
+
+    def test_ticker_prefix_prefers_shorter_completion(self):
+        assert _tickers(_index().search("AM")) == ["AMD", "AMZN"]
+
+    def test_company_word_prefix(self):
+        assert _tickers(_index().search("micro")) == ["MSFT", "AMD"]
+
+    def test_mistyped_ticker_and_name(self):
+        index = _index()
+        assert "AAPL" in _tickers(index.search("APPL"))
+        assert _tickers(index.search("Microsfot"))[0] == "MSFT"
+
+    def test_limit(self):
+        assert len(_index().search("a", limit=2)) == 2
+
+    def test_upsert_and_remove_are_incremental(self):
+        index = _index()
+        index.upsert(1, "AAPL", "Pineapple Holdings")
+        assert _tickers(index.search("pineapple")) == ["AAPL"]
+        index.remove(1)
+        assert "AAPL" not in _tickers(index.search("AAPL"))
+        assert index.search("pineapple") == []
+        # Other tickers below the removed trie node are kept
+        assert _tickers(index.search("APL")) == ["APLE"]
+
+    def test_lookup_is_fast_on_large_universe(self):
+        listings = [(f"T{i:04d}", f"Company {i} Holdings Group") for i in range(10000)]
+        index = _index(listings + LISTINGS)
+        queries = [f"T{i:03d}" for i in range(100)] + ["MSF", "Microsfot", "APPL"]
+        started = time.perf_counter()
+        for query in queries:
+            index.search(query)
+        assert (time.perf_counter() - started) / len(queries) < 0.005
+
+    def test_repeated_queries_served_from_cache_until_index_changes(self):
+        index = _index()
+        first = index.search("apple")
+        assert index.search("apple") == first
+        assert index.stats()["cache_hits"] == 1
+        index.upsert(7, "APPN", "Appian Corporation")
+        assert "APPN" in _tickers(index.search("apple"))
+        assert index.stats()["cache_hits"] == 1
+
+
+class TestSearchIndexSync:
+    def test_committed_changes_update_loaded_index(self, db_session: Session):
+        db_session.add(Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.00))
+        db_session.commit()
+        assert _tickers(search_stocks(db_session, "apple")) == ["AAPL"]
+        loads = stock_search_index.loads
+
+        db_session.add(Stock(ticker_symbol="NVDA", company_name="NVIDIA Corporation", current_price=900.00))
+        db_session.commit()
+        stock = db_session.query(Stock).filter(Stock.ticker_symbol == "AAPL").one()
+        stock.company_name = "Apple Computer"
+        db_session.commit()
+
+        assert _tickers(search_stocks(db_session, "nvidia")) == ["NVDA"]
+        assert search_stocks(db_session, "computer")[0].company_name == "Apple Computer"
+        assert stock_search_index.loads == loads
+
+        db_session.delete(stock)
+        db_session.commit()
+        assert search_stocks(db_session, "AAPL") == []
+
+    def test_rolled_back_changes_are_ignored(self, db_session: Session):
+        search_stocks(db_session, "x")
+        db_session.add(Stock(ticker_symbol="TSLA", company_name="Tesla Inc.", current_price=200.00))
+        db_session.flush()
+        db_session.rollback()
+        assert search_stocks(db_session, "TSLA") == []
+
+    def test_concurrent_requests_load_the_index_once(self, db_session: Session):
+        _add_listings(db_session)
+        index = StockSearchIndex(reload_seconds=60)
+        real_load = index.load
+
+        def slow_load(db):
+            time.sleep(0.05)
+            real_load(db)
+
+        def request(_):
+            db = TestingSessionLocal()
+            try:
+                index.ensure_loaded(db)
+                return _tickers(index.search("AAPL"))[:1]
+            finally:
+                db.close()
+
+        with patch.object(index, "load", slow_load):
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                # Nobody answers before the first load finished
+                assert list(pool.map(request, range(8))) == [["AAPL"]] * 8
+            assert index.loads == 1
+
+            # Expired: one request reloads while the others keep using the current index
+            index._loaded_at -= 120
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                assert list(pool.map(request, range(8))) == [["AAPL"]] * 8
+            assert index.loads == 2
+
+
+def _add_listings(db_session: Session, listings=LISTINGS):
+    db_session.add_all([
+        Stock(ticker_symbol=ticker, company_name=name, current_price=100.00) for ticker, name in listings
+    ])
+    db_session.commit()
+
+
+def _all_pages(db_session: Session, query: str, limit: int):
+    pages, cursor = [], None
+    while True:
+        results, cursor = search_stocks_page(db_session, query, limit, cursor)
+        pages.append(_tickers(results))
+        if cursor is None:
+            return pages
+
+
+class TestSearchPagination:
+    def test_memory_backend_pages_through_ranked_results(self, db_session: Session):
+        _add_listings(db_session)
+        assert _all_pages(db_session, "inc", 2) == [["AAPL", "AMD"], ["AMZN", "APLE"], ["GOOGL"]]
+
+    def test_database_backend_ranks_exact_ticker_first(self, db_session: Session):
+        _add_listings(db_session)
+        with patch.object(settings, "SEARCH_BACKEND", "database"):
+            assert _tickers(search_stocks(db_session, "aple")) == ["APLE"]
+            assert _tickers(search_stocks(db_session, "apple"))[0] == "AAPL"
+            # Wildcards in the query are matched literally
+            assert search_stocks(db_session, "%") == []
+
+    def test_database_backend_keyset_pages_cover_every_match_once(self, db_session: Session):
+        _add_listings(db_session)
+        with patch.object(settings, "SEARCH_BACKEND", "database"):
+            pages = _all_pages(db_session, "a", 2)
+        # Ticker and name prefix, then name prefix only, then substring; ties by stock_id
+        assert pages == [["AAPL", "AMZN"], ["AMD", "APLE"], ["GOOGL", "MSFT"]]
+
+    def test_search_route_returns_next_cursor(self, client: TestClient, db_session: Session):
+        _add_listings(db_session)
+        response = client.get("/api/stocks/search?q=inc&limit=3")
+        assert response.status_code == 200
+        assert len(response.json()) == 3
+        cursor = response.headers["X-Next-Cursor"]
+
+        response = client.get(f"/api/stocks/search?q=inc&limit=3&cursor={cursor}")
+        assert [stock["ticker_symbol"] for stock in response.json()] == ["APLE", "GOOGL"]
+        assert "X-Next-Cursor" not in response.headers
+
+    def test_search_route_rejects_bad_cursor(self, client: TestClient, db_session: Session):
+        assert client.get("/api/stocks/search?q=inc&cursor=nope").status_code == 400
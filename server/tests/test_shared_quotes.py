@@ -0,0 +1,123 @@
+import subprocess
+import sys
+import uuid
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.stock import Stock
+from app.utils import shared_quotes
+from app.utils.price_book import price_book
+from app.utils.price_refresher import price_refresher
+from app.utils.shared_quote_sync import SharedQuoteSync
+from app.utils.shared_quotes import SharedQuoteStore
+from app.utils.stock_data import get_last_known_quote
+from tests.conftest import TestingSessionLocal
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture
+def writer():
+    store = SharedQuoteStore(f"test_quotes_{uuid.uuid4().hex[:8]}", capacity=128, create=True)
+    yield store
+    store.close()
+
+
+class TestSharedQuoteStore:
+    def test_write_and_read(self, writer):
+        writer.write(7, 150.25, 2.5, 1.69, NOW)
+
+        reader = SharedQuoteStore(writer.name)
+        try:
+            quote = reader.read(7)
+            assert quote["price"] == 150.25
+            assert quote["change_percent"] == 1.69
+            assert abs((quote["last_updated"] - NOW).total_seconds()) < 1e-3
+            assert reader.read(8) is None
+            assert reader.capacity == 128
+        finally:
+            reader.close()
+
+    def test_read_many(self, writer):
+        writer.write(1, 10.0, 0.0, 0.0, NOW)
+        writer.write(3, 30.0, 1.0, 3.4, NOW)
+
+        quotes = writer.read_many([1, 2, 3, 500])
+        assert sorted(quotes) == [1, 3]
+        assert quotes[3]["price"] == 30.0
+
+    def test_write_in_progress_is_not_returned(self, writer):
+        writer.write(5, 10.0, 0.0, 0.0, NOW)
+        # Simulate a writer stopped halfway through an update
+        writer._seq[5] += 1
+        assert writer.read(5) is None
+        assert writer.read_many([5]) == {}
+        assert writer.read_retries > 0
+
+    def test_visible_to_other_processes(self, writer):
+        writer.write(42, 99.5, -0.5, -0.5, NOW)
+        script = (
+            "from app.utils.shared_quotes import SharedQuoteStore\n"
+            f"store = SharedQuoteStore('{writer.name}')\n"
+            "print(store.read(42)['price'])\n"
+            "store.close()\n"
+        )
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=60)
+        assert result.stdout.strip().splitlines()[-1] == "99.5"
+
+
+def test_writer_mirrors_price_book_and_readers_prefer_newer_quotes():
+    name = f"test_quotes_{uuid.uuid4().hex[:8]}"
+    with patch.object(settings, "SHARED_QUOTES_NAME", name):
+        shared_quotes.start_shared_quotes("writer")
+        try:
+            price_book.update("AAPL", {"price": 151.0, "change": 1.0, "change_percent": 0.67}, stock_id=1)
+            assert shared_quotes.read_shared_quote(1)["price"] == 151.0
+
+            # A worker that never saw the update locally still gets it from the store
+            price_book.clear()
+            stock = Stock(stock_id=1, ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.00)
+            quote = get_last_known_quote(stock)
+            assert quote["price"] == 151.0
+            assert quote["is_stale"] is False
+        finally:
+            shared_quotes.stop_shared_quotes()
+    assert shared_quotes.read_shared_quote(1) is None
+
+
+def test_sync_feeds_reader_price_book_and_forwards_requests(writer, db_session: Session):
+    apple = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.00)
+    db_session.add(apple)
+    db_session.commit()
+    reader_store = SharedQuoteStore(writer.name)
+    reader = SharedQuoteSync(session_factory=TestingSessionLocal)
+    publisher = SharedQuoteSync(session_factory=TestingSessionLocal)
+    try:
+        with patch("app.utils.shared_quote_sync.shared_quote_store", return_value=reader_store), \
+                patch("app.utils.shared_quote_sync.shared_quote_role", return_value="reader"):
+            writer.write(apple.stock_id, 151.0, 1.0, 0.67, NOW)
+            assert reader.sync_once() == 1
+            assert price_book.get("AAPL")["price"] == 151.0
+            assert price_book.stock_id_for("AAPL") == apple.stock_id
+            # Unchanged slots are not applied again
+            assert reader.sync_once() == 0
+            writer.write(apple.stock_id, 152.0, 2.0, 1.33, NOW)
+            assert reader.sync_once() == 1
+            assert price_book.get("AAPL")["price"] == 152.0
+
+            price_refresher.touch("AAPL")
+            reader.sync_once()
+            assert writer.wanted_since(0) == [apple.stock_id]
+
+        price_refresher.reset()
+        with patch("app.utils.shared_quote_sync.shared_quote_store", return_value=writer), \
+                patch("app.utils.shared_quote_sync.shared_quote_role", return_value="writer"):
+            assert publisher.sync_once() == 1
+            assert price_refresher.requested_since(0) == ["AAPL"]
+            assert publisher.sync_once() == 0
+    finally:
+        reader_store.close()
@@ -1,8 +1,10 @@
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 from sqlalchemy.orm import Session
-from app.utils.stock_data import fetch_stock_data, update_stock_prices, search_stocks
+from datetime import datetime, timedelta, timezone
+from app.utils.stock_data import fetch_stock_data, update_stock_prices, save_stock_prices, search_stocks, get_price_history
 from app.models.stock import Stock
+from app.models.stock_price import StockPrice
 from app.config import settings
 
 
@@ -38,6 +40,20 @@ class TestFetchStockData:
             assert result['change'] == 3.25
             assert result['change_percent'] == 1.89
     
+    @patch('app.utils.stock_data.requests.get')
+    def test_fetch_stock_data_served_from_cache(self, mock_get):
+        """Test repeated lookups of a ticker share one upstream call"""
+        mock_response = Mock()
+        mock_response.json.return_value = {"c": 175.50, "d": 3.25, "dp": 1.89}
+        mock_get.return_value = mock_response
+        
+        with patch.object(settings, 'FINNHUB_API_KEY', 'test_key'):
+            first = fetch_stock_data('AAPL')
+            second = fetch_stock_data('aapl')
+            
+            assert first == second
+            assert mock_get.call_count == 1
+    
     @patch('app.utils.stock_data.requests.get')
     def test_fetch_stock_data_api_limit(self, mock_get):
         """Test API rate limit response"""
@@ -130,13 +146,12 @@ class TestUpdateStockPrices:
         db_session.add_all([stock1, stock2])
         db_session.commit()
         
-        with patch('app.utils.stock_data.fetch_stock_data') as mock_fetch:
-            mock_fetch.side_effect = [
-                {"price": 175.50, "change": 25.50, "change_percent": 17.0},
-                {"price": 2850.00, "change": 50.00, "change_percent": 1.79}
-            ]
-            
-            update_stock_prices(db_session)
+        quotes = {
+            "AAPL": {"price": 175.50, "change": 25.50, "change_percent": 17.0},
+            "GOOGL": {"price": 2850.00, "change": 50.00, "change_percent": 1.79}
+        }
+        with patch('app.utils.bulk_refresh.market_data_client.fetch_quote', side_effect=lambda t: quotes.get(t)):
+            result = update_stock_prices(db_session)
             
             # Verify prices were updated
             updated_stock1 = db_session.query(Stock).filter_by(ticker_symbol="AAPL").first()
@@ -144,6 +159,7 @@ class TestUpdateStockPrices:
             
             assert updated_stock1.current_price == 175.50
             assert updated_stock2.current_price == 2850.00
+            assert result["updated"] == 2
     
     def test_update_stock_prices_partial_failure(self, db_session):
         """Test update when some stock data fetch fails"""
@@ -153,13 +169,10 @@ class TestUpdateStockPrices:
         db_session.add_all([stock1, stock2])
         db_session.commit()
         
-        with patch('app.utils.stock_data.fetch_stock_data') as mock_fetch:
-            mock_fetch.side_effect = [
-                {"price": 175.50, "change": 25.50, "change_percent": 17.0},
-                None  # Failed fetch for INVALID stock
-            ]
-            
-            update_stock_prices(db_session)
+        quotes = {"AAPL": {"price": 175.50, "change": 25.50, "change_percent": 17.0}}
+        with patch('app.utils.bulk_refresh.market_data_client.fetch_quote', side_effect=lambda t: quotes.get(t)) as mock_fetch, \
+                patch.object(settings, 'MARKET_DATA_REFRESH_RETRY_BASE_DELAY_SECONDS', 0):
+            result = update_stock_prices(db_session)
             
             # Verify only successful update was applied
             updated_stock1 = db_session.query(Stock).filter_by(ticker_symbol="AAPL").first()
@@ -167,6 +180,62 @@ class TestUpdateStockPrices:
             
             assert updated_stock1.current_price == 175.50
             assert updated_stock2.current_price == 100.00  # Unchanged
+            assert result["failed"] == ["INVALID"]
+            # Only the failing ticker is retried
+            calls = [call.args[0] for call in mock_fetch.call_args_list]
+            assert calls.count("AAPL") == 1
+            assert calls.count("INVALID") == settings.MARKET_DATA_REFRESH_MAX_RETRIES + 1
+    
+    def test_save_stock_prices_bulk_update(self, db_session):
+        """Test new prices are written back in one statement"""
+        stock1 = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.00)
+        stock2 = Stock(ticker_symbol="MSFT", company_name="Microsoft Corporation", current_price=300.00)
+        db_session.add_all([stock1, stock2])
+        db_session.commit()
+        
+        assert save_stock_prices(db_session, {stock1.stock_id: 151.25, stock2.stock_id: 299.5}) == 2
+        
+        assert db_session.query(Stock).filter_by(ticker_symbol="AAPL").first().current_price == 151.25
+        assert db_session.query(Stock).filter_by(ticker_symbol="MSFT").first().current_price == 299.50
+        # Each write is also appended to the price history
+        history = db_session.query(StockPrice).filter_by(stock_id=stock1.stock_id).all()
+        assert [float(row.price) for row in history] == [151.25]
+    
+    def test_save_stock_prices_records_volume(self, db_session):
+        """Test traded volume is stored alongside the price"""
+        stock = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.00)
+        db_session.add(stock)
+        db_session.commit()
+        
+        save_stock_prices(db_session, {stock.stock_id: 151.0}, {stock.stock_id: 1200})
+        
+        assert db_session.query(StockPrice).filter_by(stock_id=stock.stock_id).one().volume == 1200
+
+
+class TestPriceHistory:
+    """Test cases for get_price_history function"""
+    
+    def _seed(self, db_session):
+        stock = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.00)
+        db_session.add(stock)
+        db_session.commit()
+        base = datetime(2024, 8, 20, 14, 0, tzinfo=timezone.utc)
+        db_session.add_all([
+            StockPrice(stock_id=stock.stock_id, price=150.0, ts=base),
+            StockPrice(stock_id=stock.stock_id, price=151.0, ts=base + timedelta(seconds=20)),
+            StockPrice(stock_id=stock.stock_id, price=152.0, ts=base + timedelta(minutes=1, seconds=5)),
+            StockPrice(stock_id=stock.stock_id, price=149.0, ts=base + timedelta(days=1)),
+        ])
+        db_session.commit()
+        return stock, base
+    
+    def test_raw_history_in_range(self, db_session):
+        stock, base = self._seed(db_session)
+        
+        timestamps, prices = get_price_history(db_session, stock.stock_id, base, base + timedelta(hours=1))
+        
+        assert prices == [150.0, 151.0, 152.0]
+        assert timestamps[0] == base.timestamp()
 
 
 class TestSearchStocks:
@@ -2,7 +2,17 @@
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
+from unittest.mock import patch
+from datetime import datetime, timedelta, timezone
 from app.models.stock import Stock
+from app.models.stock_candle import StockCandle
+from app.models.stock_price import StockPrice
+from app.models.transaction import Transaction
+from app.models.user import User
+from app.utils.price_book import price_book
+from app.utils.candles import candle_aggregator
+from app.utils.market_overview import market_overview
+from app.config import settings
 
 
 def test_get_all_stocks(client: TestClient, db_session: Session):
@@ -48,3 +58,229 @@ def test_get_stock_details_not_found(client: TestClient, db_session: Session):
     response = client.get("/api/stocks/NONEXISTENT")
     assert response.status_code == 404
     assert response.json() == {"detail": "Stock not found"}
+
+
+def test_get_stock_history(client: TestClient, db_session: Session):
+    stock = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.00)
+    db_session.add(stock)
+    db_session.commit()
+    now = datetime.now(timezone.utc)
+    db_session.add_all([
+        StockPrice(stock_id=stock.stock_id, price=149.0, ts=now - timedelta(days=3)),
+        StockPrice(stock_id=stock.stock_id, price=150.0, ts=now - timedelta(hours=2)),
+        StockPrice(stock_id=stock.stock_id, price=151.0, ts=now - timedelta(hours=1)),
+    ])
+    db_session.commit()
+
+    # Defaults to the last day
+    response = client.get("/api/stocks/aapl/history")
+    assert response.status_code == 200
+    json_response = response.json()
+    assert json_response["prices"] == [150.0, 151.0]
+    assert len(json_response["timestamps"]) == 2
+
+    start = (now - timedelta(days=4)).isoformat()
+    response = client.get("/api/stocks/AAPL/history", params={"from": start})
+    assert response.status_code == 200
+    assert response.json()["prices"] == [149.0, 150.0, 151.0]
+
+
+def test_get_stock_history_pages_raw_prices(client: TestClient, db_session: Session):
+    stock = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.00)
+    db_session.add(stock)
+    db_session.commit()
+    now = datetime.now(timezone.utc)
+    # Two prices share a timestamp across the page boundary
+    stamps = [now - timedelta(minutes=5), now - timedelta(minutes=4), now - timedelta(minutes=4), now]
+    db_session.add_all([
+        StockPrice(stock_id=stock.stock_id, price=150.0 + i, ts=ts) for i, ts in enumerate(stamps)
+    ])
+    db_session.commit()
+
+    pages, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/stocks/AAPL/history", params=params)
+        assert response.status_code == 200
+        pages.append(response.json()["prices"])
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert pages == [[150.0, 151.0], [152.0, 153.0]]
+
+    assert client.get("/api/stocks/AAPL/history", params={"cursor": "bogus"}).status_code == 400
+    assert client.get("/api/stocks/AAPL/history", params={"limit": 0}).status_code == 422
+
+
+def test_get_stock_history_reads_candles(client: TestClient, db_session: Session):
+    stock = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.00)
+    db_session.add(stock)
+    db_session.commit()
+    now = datetime.now(timezone.utc)
+    candle_aggregator.add_tick(stock.stock_id, 150.0, now - timedelta(minutes=5))
+    candle_aggregator.add_tick(stock.stock_id, 152.0, now)
+
+    response = client.get("/api/stocks/AAPL/history", params={"interval": "1m"})
+    assert response.status_code == 200
+    assert response.json()["prices"] == [150.0, 152.0]
+
+    response = client.get("/api/stocks/AAPL/candles", params={"interval": "1h"})
+    assert response.status_code == 200
+    candles = response.json()
+    assert candles["close"][-1] == 152.0
+    assert candles["high"][-1] == 152.0
+
+
+def test_candles_page_across_stored_and_open_buckets(client: TestClient, db_session: Session):
+    stock = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.00)
+    db_session.add(stock)
+    db_session.commit()
+    now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    db_session.add_all([
+        StockCandle(stock_id=stock.stock_id, interval="1m", bucket_start=now - timedelta(minutes=3 - i),
+                    open=140.0 + i, high=140.0 + i, low=140.0 + i, close=140.0 + i, volume=1)
+        for i in range(3)
+    ])
+    db_session.commit()
+    # The open bucket only exists in memory
+    candle_aggregator.add_tick(stock.stock_id, 150.0, now)
+
+    pages, cursor = [], None
+    while True:
+        params = {"interval": "1m", "limit": 2, "from": (now - timedelta(hours=1)).isoformat(),
+                  **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/stocks/AAPL/candles", params=params)
+        assert response.status_code == 200
+        pages.append(response.json()["close"])
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert pages == [[140.0, 141.0], [142.0, 150.0]]
+
+    first = client.get("/api/stocks/AAPL/history", params={"interval": "1m", "limit": 3,
+                                                           "from": (now - timedelta(hours=1)).isoformat()})
+    assert first.json()["prices"] == [140.0, 141.0, 142.0]
+    rest = client.get("/api/stocks/AAPL/history", params={
+        "interval": "1m", "limit": 3, "from": (now - timedelta(hours=1)).isoformat(),
+        "cursor": first.headers["X-Next-Cursor"]
+    })
+    assert (rest.json()["prices"], rest.headers.get("X-Next-Cursor")) == ([150.0], None)
+
+
+def test_get_stock_history_errors(client: TestClient, db_session: Session):
+    stock = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.00)
+    db_session.add(stock)
+    db_session.commit()
+
+    assert client.get("/api/stocks/NONEXISTENT/history").status_code == 404
+    assert client.get("/api/stocks/AAPL/history?interval=2w").status_code == 400
+
+
+def test_get_market_data_stats(client: TestClient, db_session: Session):
+    response = client.get("/api/stocks/market-data/stats")
+    assert response.status_code == 200
+    stats = response.json()["quote_cache"]
+    assert {"hits", "misses", "coalesced", "size"} <= set(stats)
+
+
+def test_get_stock_details_served_from_price_book(client: TestClient, db_session: Session):
+    stock = Stock(ticker_symbol="NVDA", company_name="NVIDIA Corporation", current_price=400.00)
+    db_session.add(stock)
+    db_session.commit()
+    price_book.update("NVDA", {"price": 420.5, "change": 20.5, "change_percent": 5.12})
+
+    with patch("app.utils.stock_data.market_data_client.fetch_quote") as mock_fetch:
+        response = client.get("/api/stocks/NVDA")
+
+    assert response.status_code == 200
+    json_response = response.json()
+    assert json_response["current_price"] == 420.5
+    assert json_response["historical_data"]["change"] == 20.5
+    assert json_response["is_stale"] is False
+    mock_fetch.assert_not_called()
+
+
+def test_get_market_overview_falls_back_to_database(client: TestClient, db_session: Session):
+    stock = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.00)
+    db_session.add(stock)
+    db_session.commit()
+
+    response = client.get("/api/stocks/market-overview")
+    assert response.status_code == 200
+    json_response = response.json()
+    assert len(json_response) == 1
+    assert json_response[0]["current_price"] == 150.0
+    assert json_response[0]["change"] == 0.0
+
+
+def test_get_market_overview_conditional_get(client: TestClient, db_session: Session):
+    stock = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.00)
+    db_session.add(stock)
+    db_session.commit()
+    price_book.update("AAPL", {"price": 151.0, "change": 1.0, "change_percent": 0.67}, stock_id=stock.stock_id)
+
+    response = client.get("/api/stocks/market-overview")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    last_modified = response.headers["last-modified"]
+    assert response.json()[0]["current_price"] == 151.0
+
+    assert client.get("/api/stocks/market-overview", headers={"If-None-Match": etag}).status_code == 304
+    response = client.get("/api/stocks/market-overview", headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+
+    # A price change rebuilds the snapshot and changes the validator
+    price_book.update("AAPL", {"price": 152.0, "change": 2.0, "change_percent": 1.33}, stock_id=stock.stock_id)
+    response = client.get("/api/stocks/market-overview", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()[0]["current_price"] == 152.0
+
+
+def test_get_market_overview_rebuild_reads_current_prices(client: TestClient, db_session: Session):
+    stocks = [
+        Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.00),
+        Stock(ticker_symbol="MSFT", company_name="Microsoft Corporation", current_price=300.00),
+    ]
+    db_session.add_all(stocks)
+    db_session.commit()
+    assert client.get("/api/stocks/market-overview").json()[0]["current_price"] == 150.0
+
+    # Written by another worker while the universe stays cached; a tick for MSFT triggers the rebuild
+    stocks[0].current_price = 155.00
+    db_session.commit()
+    price_book.update("MSFT", {"price": 301.0, "change": 1.0, "change_percent": 0.33}, stock_id=stocks[1].stock_id)
+    prices = [item["current_price"] for item in client.get("/api/stocks/market-overview").json()]
+    assert prices == [155.0, 301.0]
+
+
+def test_get_market_overview_unrelated_price_keeps_snapshot(client: TestClient, db_session: Session):
+    db_session.add(Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.00))
+    db_session.commit()
+
+    client.get("/api/stocks/market-overview")
+    rebuilds = market_overview.rebuilds
+    price_book.update("IBM", {"price": 140.0})
+    client.get("/api/stocks/market-overview")
+    assert market_overview.rebuilds == rebuilds
+
+
+def test_get_market_overview_from_trading_activity(client: TestClient, db_session: Session):
+    user = User(username="trader", email="trader@example.com", password_hash="x")
+    stocks = [
+        Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.00),
+        Stock(ticker_symbol="IBM", company_name="IBM", current_price=140.00),
+    ]
+    db_session.add_all([user, *stocks])
+    db_session.commit()
+    db_session.add_all([
+        Transaction(user_id=user.user_id, stock_id=stocks[1].stock_id, transaction_type="BUY",
+                    quantity=1, price_per_share=140.00)
+        for _ in range(2)
+    ])
+    db_session.commit()
+
+    with patch.object(settings, "MARKET_OVERVIEW_TICKERS", ""), patch.object(market_overview, "size", 2):
+        response = client.get("/api/stocks/market-overview")
+    assert [item["ticker_symbol"] for item in response.json()] == ["IBM", "AAPL"]
+
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.holding import Holding
+from app.models.stock import Stock
+from app.models.stock_price import StockPrice
+from app.models.user import User
+from app.utils.portfolio_valuation import portfolio_valuations
+from app.utils.price_book import price_book
+from app.utils.tick_replay import TickReplayer, load_ticks, read_binary_ticks, write_binary_ticks
+from tests.conftest import TestingSessionLocal
+
+CSV = """timestamp,ticker,price,volume
+1724162400020,MSFT,410.5,20
+1724162400000,AAPL,150.0,100
+2024-08-20T14:00:00.040,aapl,151.25,50
+1724162400030,NOPE,10.0,1
+"""
+
+
+def _write_csv(tmp_path):
+    path = tmp_path / "ticks.csv"
+    path.write_text(CSV)
+    return str(path)
+
+
+def _seed(db_session: Session):
+    user = User(username="replayer", email="replayer@example.com", password_hash="x")
+    aapl = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=140.00)
+    msft = Stock(ticker_symbol="MSFT", company_name="Microsoft Corporation", current_price=400.00)
+    db_session.add_all([user, aapl, msft])
+    db_session.commit()
+    db_session.add(Holding(user_id=user.user_id, stock_id=aapl.stock_id, quantity=10, average_cost=120.00))
+    db_session.commit()
+    return aapl, msft
+
+
+class TestTickFiles:
+    def test_csv_ticks_are_sorted_and_symbols_normalized(self, tmp_path):
+        symbols, ticks = load_ticks(_write_csv(tmp_path))
+        assert symbols == ["MSFT", "AAPL", "NOPE"]
+        assert ticks["t"].tolist() == [1724162400000, 1724162400020, 1724162400030, 1724162400040]
+        assert [symbols[i] for i in ticks["s"]] == ["AAPL", "MSFT", "NOPE", "AAPL"]
+
+    def test_binary_round_trip(self, tmp_path):
+        symbols, ticks = load_ticks(_write_csv(tmp_path))
+        path = str(tmp_path / "ticks.ktik")
+        write_binary_ticks(path, symbols, ticks)
+
+        loaded_symbols, loaded = read_binary_ticks(path)
+        assert loaded_symbols == symbols
+        assert np.array_equal(loaded, ticks)
+        assert load_ticks(path)[0] == symbols
+
+
+class TestTickReplayer:
+    def test_replay_at_max_speed_updates_prices(self, db_session: Session, tmp_path):
+        aapl, msft = _seed(db_session)
+        symbols, ticks = load_ticks(_write_csv(tmp_path))
+
+        report = TickReplayer(TestingSessionLocal, speed=None).replay(symbols, ticks)
+
+        assert report["ticks"] == 3
+        assert report["skipped"] == 1
+        assert report["speed"] == "max"
+        assert report["rows_written"] >= 2
+        # The holder's valuation is revalued by the price book listener on both AAPL ticks
+        assert report["portfolios_loaded"] == 1
+        assert report["portfolios_valued"] == 2
+        assert 0 <= report["lag_ms"]["p50"] <= report["lag_ms"]["p99"] <= report["lag_ms"]["max"]
+        assert report["persist_lag_ms"]["p50"] >= 0
+        assert price_book.get("AAPL")["price"] == 151.25
+        user_id = db_session.query(Holding.user_id).scalar()
+        assert portfolio_valuations.current_value(db_session, user_id)["current_value"] == 1512.5
+
+        db_session.expire_all()
+        assert float(db_session.get(Stock, aapl.stock_id).current_price) == 151.25
+        assert float(db_session.get(Stock, msft.stock_id).current_price) == 410.5
+        assert db_session.query(StockPrice).filter(StockPrice.stock_id == aapl.stock_id).count() >= 1
+
+    def test_replay_stamps_ticks_with_their_recorded_spacing(self, db_session: Session, tmp_path):
+        aapl, _ = _seed(db_session)
+        symbols, ticks = load_ticks(_write_csv(tmp_path))
+
+        TickReplayer(TestingSessionLocal, speed=None).replay(symbols, ticks)
+        # AAPL last traded 40ms into the recording, MSFT 20ms in
+        gap = price_book.get("AAPL")["last_updated"] - price_book.get("MSFT")["last_updated"]
+        assert gap == timedelta(milliseconds=20)
+        # Unpaced, the recording ends at the start of the replay rather than running ahead of the clock
+        assert price_book.get("AAPL")["last_updated"] <= datetime.now(timezone.utc)
+        db_session.expire_all()
+        latest = db_session.query(func.max(StockPrice.ts)).filter(StockPrice.stock_id == aapl.stock_id).scalar()
+        assert latest.replace(tzinfo=timezone.utc) == price_book.get("AAPL")["last_updated"]
+
+        # At half speed the gaps double, matching the replay clock
+        TickReplayer(TestingSessionLocal, speed=0.5).replay(symbols, ticks)
+        gap = price_book.get("AAPL")["last_updated"] - price_book.get("MSFT")["last_updated"]
+        assert gap == timedelta(milliseconds=40)
+
+    def test_replay_keeps_recorded_pace(self, db_session: Session, tmp_path):
+        _seed(db_session)
+        symbols, ticks = load_ticks(_write_csv(tmp_path))
+
+        # 40ms of recorded ticks at 0.5x take at least 80ms
+        report = TickReplayer(TestingSessionLocal, speed=0.5).replay(symbols, ticks)
+        assert report["duration_seconds"] >= 0.08
+        assert report["ticks"] == 3
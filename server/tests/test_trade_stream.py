@@ -0,0 +1,172 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+
+import websockets
+from sqlalchemy.orm import Session
+
+from app.models.stock import Stock
+from app.models.stock_price import StockPrice
+from app.utils.price_book import price_book
+from app.utils.price_refresher import price_refresher
+from app.utils.trade_stream import TradeStreamIngestor
+from tests.conftest import TestingSessionLocal
+
+
+NOW_MS = int(time.time() * 1000) + 60000
+
+
+def trade_message(*trades):
+    return json.dumps({
+        "type": "trade",
+        "data": [{"s": s, "p": p, "t": t, "v": 100} for s, p, t in trades]
+    })
+
+
+def seed(db_session: Session):
+    stocks = [
+        Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=150.0),
+        Stock(ticker_symbol="MSFT", company_name="Microsoft Corporation", current_price=300.0),
+    ]
+    db_session.add_all(stocks)
+    db_session.commit()
+    return {stock.ticker_symbol: stock.stock_id for stock in stocks}
+
+
+class FeedStandIn:
+    """Local stand-in for the Finnhub trade WebSocket"""
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.subscriptions = []
+
+    async def handler(self, websocket, *args):
+        for _ in range(2):
+            self.subscriptions.append(json.loads(await websocket.recv())["symbol"])
+        for message in self.messages:
+            await websocket.send(message)
+        await websocket.wait_closed()
+
+
+class TestTradeStreamIngestor:
+    """Test cases for TradeStreamIngestor"""
+
+    def test_handle_message_updates_price_book(self, db_session: Session):
+        stock_ids = seed(db_session)
+        ingestor = TradeStreamIngestor(session_factory=TestingSessionLocal)
+        ingestor.set_stocks(stock_ids)
+        price_book.update("AAPL", {"price": 150.0, "change": 5.0, "change_percent": 3.45})
+
+        applied = ingestor.handle_message(trade_message(
+            ("AAPL", 151.0, NOW_MS), ("AAPL", 152.0, NOW_MS + 1000), ("UNKNOWN", 1.0, NOW_MS)
+        ))
+
+        assert applied == 1
+        entry = price_book.get_by_id(stock_ids["AAPL"])
+        assert entry["price"] == 152.0
+        # Change is measured from the previous close implied by the REST quote
+        assert entry["change"] == 7.0
+
+    def test_ignores_non_trade_messages(self):
+        ingestor = TradeStreamIngestor(session_factory=TestingSessionLocal)
+        assert ingestor.handle_message(json.dumps({"type": "ping"})) == 0
+
+    def test_skips_malformed_messages(self, db_session: Session):
+        ingestor = TradeStreamIngestor(session_factory=TestingSessionLocal)
+        ingestor.set_stocks(seed(db_session))
+        assert ingestor.handle_message("{not json") == 0
+        assert ingestor.handle_message(json.dumps(["trade"])) == 0
+        assert ingestor.handle_message(trade_message(("AAPL", 151.0, NOW_MS))) == 1
+
+    def test_skips_malformed_trade_entries(self, db_session: Session):
+        ingestor = TradeStreamIngestor(session_factory=TestingSessionLocal)
+        ingestor.set_stocks(seed(db_session))
+        good = {"s": "MSFT", "p": 305.0, "t": NOW_MS, "v": 10}
+        bad_entries = [
+            {"s": "AAPL", "p": "abc", "t": NOW_MS},
+            {"s": "AAPL", "p": 151.0, "t": "x"},
+            {"s": "AAPL", "p": float("nan"), "t": NOW_MS},
+            {"s": "AAPL", "p": 151.0, "t": NOW_MS, "v": "lots"},
+            "x",
+            None,
+        ]
+        for bad in bad_entries:
+            # The good entry after the bad one is still applied
+            assert ingestor.handle_message(json.dumps({"type": "trade", "data": [bad, good]})) == 1
+        assert ingestor.handle_message(json.dumps({"type": "trade", "data": {"s": "MSFT", "p": 1.0}})) == 0
+        assert ingestor.malformed == len(bad_entries) + 1
+        assert price_book.get("MSFT")["price"] == 305.0
+        assert price_book.get("AAPL") is None
+
+    def test_subscriptions_follow_the_refresher_universe(self, db_session: Session):
+        stock_ids = seed(db_session)
+        ingestor = TradeStreamIngestor(max_symbols=1, session_factory=TestingSessionLocal)
+        ingestor.set_stocks({"AAPL": stock_ids["AAPL"]})
+
+        class SentMessages(list):
+            async def send(self, message):
+                self.append(json.loads(message))
+
+        websocket = SentMessages()
+        # Before the refresher has a universe the first stocks are used
+        asyncio.run(ingestor._sync_subscriptions(websocket))
+        assert websocket == [{"type": "subscribe", "symbol": "AAPL"}]
+
+        # A recently requested ticker goes first, even one the ingestor did not know about
+        price_refresher._universe = dict(stock_ids)
+        price_refresher.touch("MSFT")
+        websocket.clear()
+        assert asyncio.run(ingestor._sync_subscriptions(websocket)) == 2
+        assert websocket == [{"type": "unsubscribe", "symbol": "AAPL"}, {"type": "subscribe", "symbol": "MSFT"}]
+        assert ingestor.handle_message(trade_message(("MSFT", 305.0, NOW_MS))) == 1
+        assert asyncio.run(ingestor._sync_subscriptions(websocket)) == 0
+
+    def test_flush_coalesces_to_one_write_per_stock(self, db_session: Session):
+        stock_ids = seed(db_session)
+        ingestor = TradeStreamIngestor(session_factory=TestingSessionLocal)
+        ingestor.set_stocks(stock_ids)
+        ingestor.handle_message(trade_message(("AAPL", 151.0, NOW_MS)))
+        ingestor.handle_message(trade_message(("AAPL", 153.5, NOW_MS + 2000), ("MSFT", 305.0, NOW_MS + 2000)))
+
+        assert asyncio.run(ingestor.flush()) == 2
+        assert asyncio.run(ingestor.flush()) == 0
+
+        db_session.expire_all()
+        assert db_session.query(Stock).filter_by(ticker_symbol="AAPL").first().current_price == 153.5
+        assert db_session.query(Stock).filter_by(ticker_symbol="MSFT").first().current_price == 305.0
+        # History is stamped with the trade time, not the flush time
+        recorded = db_session.query(StockPrice.ts).filter_by(stock_id=stock_ids["AAPL"]).scalar()
+        assert recorded.replace(tzinfo=timezone.utc) == datetime.fromtimestamp((NOW_MS + 2000) / 1000, tz=timezone.utc)
+
+    def test_streams_from_local_feed(self, db_session: Session):
+        stock_ids = seed(db_session)
+        feed = FeedStandIn([
+            json.dumps({"type": "ping"}),
+            trade_message(("MSFT", 310.25, NOW_MS)),
+        ])
+
+        async def run():
+            async with websockets.serve(feed.handler, "127.0.0.1", 0) as server:
+                port = server.sockets[0].getsockname()[1]
+                ingestor = TradeStreamIngestor(
+                    url=f"ws://127.0.0.1:{port}",
+                    flush_interval_seconds=0.05,
+                    session_factory=TestingSessionLocal,
+                )
+                ingestor.set_stocks(stock_ids)
+                await ingestor.start()
+                for _ in range(100):
+                    if ingestor.rows_flushed:
+                        break
+                    await asyncio.sleep(0.02)
+                await ingestor.stop()
+                return ingestor
+
+        ingestor = asyncio.run(run())
+
+        assert sorted(feed.subscriptions) == ["AAPL", "MSFT"]
+        assert ingestor.trades_received == 1
+        assert price_book.get("MSFT")["price"] == 310.25
+        db_session.expire_all()
+        assert db_session.query(Stock).filter_by(ticker_symbol="MSFT").first().current_price == 310.25
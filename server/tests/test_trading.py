@@ -0,0 +1,175 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app.models.fund import Fund
+from app.models.holding import Holding
+from app.models.stock import Stock
+from app.models.transaction import Transaction
+from app.models.user import User
+from app.utils.trading import (
+    ALL_OR_NOTHING, BEST_EFFORT, BUY, SELL, BasketRejected, InsufficientFunds, InsufficientShares,
+    StockNotFound, TradeError, execute_basket, execute_trade
+)
+from tests.conftest import TestingSessionLocal
+
+
+def _seed(db_session: Session, balance: float = 10000.0):
+    user = User(username="trader", email="trader@example.com", password_hash="x")
+    stock = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=100.00)
+    db_session.add_all([user, stock])
+    db_session.commit()
+    db_session.add(Fund(user_id=user.user_id, balance=balance))
+    db_session.commit()
+    return user, stock
+
+
+def _trade(user_id: int, stock_id: int, quantity: int, side: str):
+    db = TestingSessionLocal()
+    try:
+        return execute_trade(db, user_id, stock_id, quantity, side)
+    finally:
+        db.close()
+
+
+class TestExecuteTrade:
+    def test_buys_average_into_one_position(self, db_session: Session):
+        user, stock = _seed(db_session)
+        _trade(user.user_id, stock.stock_id, 10, BUY)
+        db_session.query(Stock).filter(Stock.stock_id == stock.stock_id).update({"current_price": 130.00})
+        db_session.commit()
+        result = _trade(user.user_id, stock.stock_id, 20, BUY)
+
+        assert result.position == 30
+        assert result.balance_minor == 1000000 - 100000 - 260000
+        holdings = db_session.query(Holding).filter(Holding.user_id == user.user_id).all()
+        assert len(holdings) == 1
+        assert float(holdings[0].average_cost) == 120.0
+
+    def test_selling_everything_closes_the_position(self, db_session: Session):
+        user, stock = _seed(db_session)
+        _trade(user.user_id, stock.stock_id, 5, BUY)
+        result = _trade(user.user_id, stock.stock_id, 5, SELL)
+
+        assert result.position == 0
+        assert result.balance_minor == 1000000
+        assert db_session.query(Holding).count() == 0
+        assert [t.transaction_type for t in db_session.query(Transaction).order_by(Transaction.transaction_id)] == [BUY, SELL]
+
+    def test_rejections_write_nothing(self, db_session: Session):
+        user, stock = _seed(db_session, balance=50.0)
+        with pytest.raises(InsufficientFunds):
+            _trade(user.user_id, stock.stock_id, 1, BUY)
+        with pytest.raises(InsufficientShares):
+            _trade(user.user_id, stock.stock_id, 1, SELL)
+        with pytest.raises(StockNotFound):
+            _trade(user.user_id, 9999, 1, BUY)
+        with pytest.raises(TradeError):
+            _trade(user.user_id, stock.stock_id, -5, BUY)
+
+        assert float(db_session.query(Fund).one().balance) == 50.0
+        assert db_session.query(Transaction).count() == 0
+        assert db_session.query(Holding).count() == 0
+
+    def test_concurrent_buys_never_overdraw(self, db_session: Session):
+        user, stock = _seed(db_session, balance=1000.0)
+
+        def buy(_):
+            try:
+                _trade(user.user_id, stock.stock_id, 1, BUY)
+                return True
+            except InsufficientFunds:
+                return False
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            filled = sum(pool.map(buy, range(20)))
+
+        assert filled == 10
+        assert float(db_session.query(Fund).one().balance) == 0.0
+        assert db_session.query(Holding).one().quantity == 10
+        assert db_session.query(Transaction).count() == 10
+
+
+def _basket(user_id: int, legs, mode: str = ALL_OR_NOTHING):
+    db = TestingSessionLocal()
+    try:
+        return execute_basket(db, user_id, legs, mode)
+    finally:
+        db.close()
+
+
+class TestExecuteBasket:
+    def test_legs_are_checked_in_order_against_running_totals(self, db_session: Session):
+        user, stock = _seed(db_session, balance=1000.0)
+        # The second buy is only affordable after the sell in between
+        result = _basket(user.user_id, [
+            (stock.stock_id, 10, BUY), (stock.stock_id, 4, SELL), (stock.stock_id, 4, BUY)
+        ])
+
+        assert [fill.error for fill in result.legs] == [None, None, None]
+        assert result.balance_minor == 0
+        assert db_session.query(Holding).one().quantity == 10
+        transactions = db_session.query(Transaction).order_by(Transaction.transaction_id).all()
+        assert [t.transaction_id for t in transactions] == [fill.transaction_id for fill in result.legs]
+        assert [t.transaction_type for t in transactions] == [BUY, SELL, BUY]
+
+    def test_all_or_nothing_writes_nothing_when_a_leg_fails(self, db_session: Session):
+        user, stock = _seed(db_session, balance=1000.0)
+        with pytest.raises(BasketRejected) as excinfo:
+            _basket(user.user_id, [(stock.stock_id, 5, BUY), (stock.stock_id, 6, BUY)])
+
+        assert excinfo.value.leg == 1
+        assert str(excinfo.value) == "Leg 1: Insufficient funds"
+        assert float(db_session.query(Fund).one().balance) == 1000.0
+        assert db_session.query(Holding).count() == 0
+        assert db_session.query(Transaction).count() == 0
+
+    def test_best_effort_fills_what_it_can(self, db_session: Session):
+        user, stock = _seed(db_session, balance=1000.0)
+        _trade(user.user_id, stock.stock_id, 3, BUY)
+        result = _basket(user.user_id, [
+            (stock.stock_id, 7, BUY),
+            (9999, 1, BUY),
+            (stock.stock_id, 0, SELL),
+            (stock.stock_id, 10, SELL),
+            (stock.stock_id, 11, BUY),
+        ], BEST_EFFORT)
+
+        assert [type(fill.error) for fill in result.legs] == [
+            type(None), StockNotFound, TradeError, type(None), InsufficientFunds
+        ]
+        assert result.balance_minor == 100000
+        assert db_session.query(Holding).count() == 0
+        assert db_session.query(Transaction).count() == 3
+
+    def test_concurrent_baskets_never_overdraw(self, db_session: Session):
+        user, stock = _seed(db_session, balance=1000.0)
+
+        def basket(_):
+            try:
+                _basket(user.user_id, [(stock.stock_id, 1, BUY), (stock.stock_id, 2, BUY)])
+                return True
+            except BasketRejected:
+                return False
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            filled = sum(pool.map(basket, range(6)))
+
+        assert filled == 3
+        assert float(db_session.query(Fund).one().balance) == 100.0
+        assert db_session.query(Holding).one().quantity == 9
+
+    def test_sells_without_a_funds_row_create_it(self, db_session: Session):
+        user = User(username="holder", email="holder@example.com", password_hash="x")
+        stock = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", current_price=100.00)
+        db_session.add_all([user, stock])
+        db_session.commit()
+        db_session.add(Holding(user_id=user.user_id, stock_id=stock.stock_id, quantity=6, average_cost=90.0))
+        db_session.commit()
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            list(pool.map(lambda _: _basket(user.user_id, [(stock.stock_id, 2, SELL)]), range(3)))
+
+        assert float(db_session.query(Fund).one().balance) == 600.0
+        assert db_session.query(Holding).count() == 0
@@ -191,3 +191,48 @@ def test_trade_sell_success_flow(client: TestClient, db_session: Session, auth_h
     fund = db_session.query(Fund).filter(Fund.user_id == test_user.user_id).first()
     # Initial balance 10000 - (10*150) + (4*150) = 10000 - 1500 + 600 = 9100
     assert round(fund.balance, 2) == 9100.0
+
+
+def test_trade_basket_best_effort(client: TestClient, db_session: Session, auth_headers: dict, test_user: User, sample_stocks):
+    db_session.add(Fund(user_id=test_user.user_id, balance=3000.0))
+    db_session.commit()
+    aapl, googl, msft = (stock.stock_id for stock in sample_stocks)
+
+    response = client.post("/api/trade/basket", headers=auth_headers, json={
+        "mode": "best_effort",
+        "legs": [
+            {"stock_id": aapl, "quantity": 10, "side": "BUY"},
+            {"stock_id": googl, "quantity": 1, "side": "BUY"},
+            {"stock_id": msft, "quantity": 1, "side": "SELL"},
+        ],
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["filled"], data["rejected"], data["balance"]) == (1, 2, 1500.0)
+    assert [leg["status"] for leg in data["legs"]] == ["FILLED", "REJECTED", "REJECTED"]
+    assert data["legs"][1]["reason"] == "Insufficient funds"
+    assert data["legs"][2]["reason"] == "Insufficient shares"
+    assert data["legs"][0]["transaction_id"] is not None
+
+
+def test_trade_basket_all_or_nothing_rejects(client: TestClient, db_session: Session, auth_headers: dict, test_user: User, sample_stocks):
+    db_session.add(Fund(user_id=test_user.user_id, balance=3000.0))
+    db_session.commit()
+
+    response = client.post("/api/trade/basket", headers=auth_headers, json={
+        "legs": [
+            {"stock_id": sample_stocks[0].stock_id, "quantity": 10, "side": "BUY"},
+            {"stock_id": 9999, "quantity": 1, "side": "BUY"},
+        ],
+    })
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Leg 1: Stock not found"
+    assert db_session.query(Transaction).count() == 0
+
+
+def test_trade_basket_rejects_empty_and_oversized(client: TestClient, auth_headers: dict, sample_stocks):
+    assert client.post("/api/trade/basket", headers=auth_headers, json={"legs": []}).status_code == 400
+    leg = {"stock_id": sample_stocks[0].stock_id, "quantity": 1, "side": "BUY"}
+    response = client.post("/api/trade/basket", headers=auth_headers, json={"legs": [leg] * 501})
+    assert response.status_code == 400
+